@@ -0,0 +1,296 @@
+"""
+Agent Metrics for EYProject
+
+Records where the time of each agent v2 request goes: every graph node
+(classify_request, extract_scenarios, handle_visualization, execute_code, ...)
+and every LLM call with its token counts. A RequestTimings object is created per
+request and made current through a context variable, which LangGraph and
+asyncio.to_thread carry into the node functions; LLM calls are recorded by a
+LangChain callback handler passed in the graph config.
+
+Finished requests are kept by request id (the most recent MAX_REQUESTS) and
+aggregated into latency histograms per node and request type.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+MAX_REQUESTS = 200
+# Upper bounds (ms) of the latency histogram buckets; slower observations go to "+Inf"
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+# Timings of the request the current node or LLM call belongs to
+current_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("current_timings", default=None)
+
+
+@dataclass
+class RequestTimings:
+    """Node and LLM call timings of one agent request"""
+    request_id: str
+    user_request: str = ""
+    request_type: str = ""
+    started_at: float = field(default_factory=time.time)
+    started_perf: float = field(default_factory=time.perf_counter, repr=False)
+    total_ms: float = 0.0
+    nodes: List[Dict[str, Any]] = field(default_factory=list)
+    llm_calls: List[Dict[str, Any]] = field(default_factory=list)
+    # How the request was handled (e.g. scenario_extraction: deterministic), counted per value
+    tags: Dict[str, str] = field(default_factory=dict)
+
+    def add_node(self, node: str, duration_ms: float, error: Optional[str] = None):
+        entry = {"node": node, "duration_ms": round(duration_ms, 2)}
+        if error:
+            entry["error"] = error
+        self.nodes.append(entry)
+
+    def add_llm_call(self, node: Optional[str], duration_ms: float, model: Optional[str] = None,
+                     input_tokens: int = 0, output_tokens: int = 0, total_tokens: int = 0,
+                     error: Optional[str] = None):
+        entry = {
+            "node": node,
+            "model": model,
+            "duration_ms": round(duration_ms, 2),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": total_tokens or input_tokens + output_tokens,
+        }
+        if error:
+            entry["error"] = error
+        self.llm_calls.append(entry)
+
+    def to_dict(self) -> Dict[str, Any]:
+        node_ms: Dict[str, float] = {}
+        for entry in self.nodes:
+            node_ms[entry["node"]] = round(node_ms.get(entry["node"], 0.0) + entry["duration_ms"], 2)
+        return {
+            "request_id": self.request_id,
+            "request_type": self.request_type,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_ms, 2),
+            "node_ms": node_ms,
+            "llm_ms": round(sum(c["duration_ms"] for c in self.llm_calls), 2),
+            "tokens": {
+                "input": sum(c["input_tokens"] for c in self.llm_calls),
+                "output": sum(c["output_tokens"] for c in self.llm_calls),
+                "total": sum(c["total_tokens"] for c in self.llm_calls),
+            },
+            "nodes": list(self.nodes),
+            "llm_calls": list(self.llm_calls),
+            "tags": dict(self.tags),
+        }
+
+
+def record_node(node: str, started_at: float, error: Optional[str] = None):
+    """Add a node that started at started_at (perf_counter) to the current request"""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add_node(node, (time.perf_counter() - started_at) * 1000, error)
+
+
+def record_tag(name: str, value: str):
+    """Tag the current request (e.g. with the path a node took)"""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.tags[name] = value
+
+
+class LatencyHistogram:
+    """Per-bucket counts plus count, sum and max of observed durations"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if duration_ms <= bound), len(LATENCY_BUCKETS_MS))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (max for the last bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 2)
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["+Inf"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class TimingCallbackHandler(BaseCallbackHandler):
+    """Records the duration and token usage of every LLM call made during a request"""
+
+    run_inline = True
+
+    def __init__(self, timings: RequestTimings):
+        self.timings = timings
+        self._started: Dict[Any, Tuple[float, Optional[str], Optional[str]]] = {}
+
+    def _start(self, serialized, run_id, metadata, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name")
+        node = (metadata or {}).get("langgraph_node")
+        self._started[run_id] = (time.perf_counter(), node, model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        self._start(serialized, run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        self._start(serialized, run_id, metadata, kwargs)
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        started_at, node, model = started
+        input_tokens, output_tokens, total_tokens = _token_usage(response)
+        self.timings.add_llm_call(node, (time.perf_counter() - started_at) * 1000, model,
+                                  input_tokens, output_tokens, total_tokens)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        started_at, node, model = started
+        self.timings.add_llm_call(node, (time.perf_counter() - started_at) * 1000, model, error=str(error))
+
+
+def _token_usage(response) -> Tuple[int, int, int]:
+    """(input, output, total) tokens of an LLMResult, from message usage metadata or llm_output"""
+    input_tokens = output_tokens = total_tokens = 0
+    for generations in response.generations or []:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+                total_tokens += usage.get("total_tokens", 0)
+    if not (input_tokens or output_tokens):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+        total_tokens = usage.get("total_tokens", 0)
+    return input_tokens, output_tokens, total_tokens
+
+
+class AgentMetrics:
+    """Per-request timings and latency histograms per node and request type"""
+
+    def __init__(self, max_requests: int = MAX_REQUESTS):
+        self.max_requests = max_requests
+        self._lock = threading.Lock()
+        self._requests: "OrderedDict[str, RequestTimings]" = OrderedDict()
+        self._totals: Dict[str, LatencyHistogram] = {}
+        self._nodes: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._llm: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._tokens: Dict[str, Dict[str, int]] = {}
+        self._tags: Dict[str, Dict[str, int]] = {}
+
+    def start(self, request_id: Optional[str] = None, user_request: str = "") -> RequestTimings:
+        """Timings object for a new request"""
+        return RequestTimings(request_id=request_id or uuid.uuid4().hex[:12], user_request=user_request[:200])
+
+    def finish(self, timings: RequestTimings, request_type: Optional[str]):
+        """Store a finished request and add it to the histograms"""
+        total_ms = (time.perf_counter() - timings.started_perf) * 1000
+        timings.request_type = request_type or "unknown"
+        timings.total_ms = total_ms
+        request_type = timings.request_type
+        with self._lock:
+            self._requests[timings.request_id] = timings
+            self._requests.move_to_end(timings.request_id)
+            while len(self._requests) > self.max_requests:
+                self._requests.popitem(last=False)
+            self._totals.setdefault(request_type, LatencyHistogram()).observe(total_ms)
+            for entry in timings.nodes:
+                self._nodes.setdefault(entry["node"], {}).setdefault(request_type, LatencyHistogram()).observe(entry["duration_ms"])
+            tokens = self._tokens.setdefault(request_type, {"llm_calls": 0, "input": 0, "output": 0, "total": 0})
+            for call in timings.llm_calls:
+                node = call["node"] or "unknown"
+                self._llm.setdefault(node, {}).setdefault(request_type, LatencyHistogram()).observe(call["duration_ms"])
+                tokens["llm_calls"] += 1
+                tokens["input"] += call["input_tokens"]
+                tokens["output"] += call["output_tokens"]
+                tokens["total"] += call["total_tokens"]
+            for name, value in timings.tags.items():
+                counts = self._tags.setdefault(name, {})
+                counts[value] = counts.get(value, 0) + 1
+        slowest = max(timings.nodes, key=lambda entry: entry["duration_ms"], default=None)
+        print(f"DEBUG: Agent request {timings.request_id} ({request_type}) took {total_ms:.0f} ms"
+              + (f", slowest node {slowest['node']} {slowest['duration_ms']:.0f} ms" if slowest else ""))
+
+    def get_request(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            timings = self._requests.get(request_id)
+        return timings.to_dict() if timings else None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            requests = list(self._requests.values())[-limit:]
+        return [timings.to_dict() for timings in reversed(requests)]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": sum(h.count for h in self._totals.values()),
+                "total": {rt: h.to_dict() for rt, h in self._totals.items()},
+                "nodes": {node: {rt: h.to_dict() for rt, h in by_type.items()} for node, by_type in self._nodes.items()},
+                "llm_calls": {node: {rt: h.to_dict() for rt, h in by_type.items()} for node, by_type in self._llm.items()},
+                "tokens": {rt: dict(tokens) for rt, tokens in self._tokens.items()},
+                "tags": {name: dict(counts) for name, counts in self._tags.items()},
+                "bucket_bounds_ms": list(LATENCY_BUCKETS_MS),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._totals.clear()
+            self._nodes.clear()
+            self._llm.clear()
+            self._tokens.clear()
+            self._tags.clear()
+
+
+# Global metrics instance
+agent_metrics: Optional[AgentMetrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_agent_metrics() -> AgentMetrics:
+    """Get the global agent metrics instance, creating it on first use"""
+    global agent_metrics
+    with _metrics_lock:
+        if agent_metrics is None:
+            agent_metrics = AgentMetrics()
+        return agent_metrics
+
+
+def set_agent_metrics(metrics: Optional[AgentMetrics]):
+    """Set the global agent metrics instance"""
+    global agent_metrics
+    with _metrics_lock:
+        agent_metrics = metrics
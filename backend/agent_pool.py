@@ -0,0 +1,191 @@
+"""
+Agent Pool for EYProject
+
+main.py used to keep a single global agent_v2 whose LLM client was created on its
+first request and then kept for good (switching the LangGraph model changed the
+cache keys but not the client), and /switch-agent-version dropped the agent and
+recompiled the graph while other requests might be using it.
+
+AgentPool compiles the SimplifiedAgent graph once per AI provider and hands the
+same agent to every request. All per-request data lives in the graph state, and
+the request's model and timings live in context variables, so concurrent chats
+share the compiled graph without sharing state.
+
+LLMClientPool keeps one chat model client per model id. All clients share one
+HTTP connection pool with keep-alive, so consecutive requests reuse warm TLS
+connections. Each request pins the model selected when it starts (request_model);
+a model switch only affects requests that start afterwards, while in-flight ones
+finish with the client they started with.
+
+Settings: EYPOR_LLM_MAX_CONNECTIONS (default 100), EYPOR_LLM_KEEPALIVE_CONNECTIONS
+(default 20) and EYPOR_LLM_TIMEOUT_SECONDS (default 120).
+"""
+
+import os
+import threading
+from contextvars import ContextVar
+from typing import Dict, Optional, Any, Tuple
+
+# Model name ("GPT-4.1", ...) pinned by the request being processed
+request_model: ContextVar[Optional[str]] = ContextVar("request_model", default=None)
+
+MAX_CONNECTIONS = int(os.getenv("EYPOR_LLM_MAX_CONNECTIONS", "100"))
+KEEPALIVE_CONNECTIONS = int(os.getenv("EYPOR_LLM_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("EYPOR_LLM_TIMEOUT_SECONDS", "120"))
+
+
+def _load_environment():
+    """Load the API keys from EY.env in the project root"""
+    from dotenv import load_dotenv
+
+    ey_env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "EY.env")
+    if os.path.exists(ey_env_path):
+        load_dotenv(ey_env_path)
+        print(f"DEBUG: Loaded environment from {ey_env_path}")
+    else:
+        print(f"DEBUG: EY.env file not found at {ey_env_path}")
+
+
+class LLMClientPool:
+    """One chat model client per (provider, model id), sharing keep-alive HTTP connections"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._http_client = None
+        self._http_async_client = None
+        self._environment_loaded = False
+        self.in_flight: Dict[str, int] = {}
+        self.stats = {"clients_created": 0, "client_reuses": 0}
+
+    def _http_clients(self):
+        import httpx
+
+        if self._http_client is None:
+            limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+                                  keepalive_expiry=60)
+            timeout = httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10)
+            self._http_client = httpx.Client(limits=limits, timeout=timeout)
+            self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return self._http_client, self._http_async_client
+
+    def get(self, ai_model: str, model_id: str):
+        """Shared client for a model, created on first use"""
+        key = (ai_model, model_id)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.stats["client_reuses"] += 1
+                return client
+            if not self._environment_loaded:
+                _load_environment()
+                self._environment_loaded = True
+            if ai_model != "openai":
+                raise ValueError(f"Unsupported AI model: {ai_model}")
+            from langchain_openai import ChatOpenAI
+
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your EY.env file.")
+            http_client, http_async_client = self._http_clients()
+            print(f"DEBUG: Creating shared LLM client for {model_id}")
+            client = ChatOpenAI(model=model_id, temperature=0.1, stream_usage=True,
+                                http_client=http_client, http_async_client=http_async_client)
+            self._clients[key] = client
+            self.stats["clients_created"] += 1
+            return client
+
+    def request_started(self, model_name: str):
+        with self._lock:
+            self.in_flight[model_name] = self.in_flight.get(model_name, 0) + 1
+
+    def request_finished(self, model_name: str):
+        with self._lock:
+            remaining = self.in_flight.get(model_name, 0) - 1
+            if remaining > 0:
+                self.in_flight[model_name] = remaining
+            else:
+                self.in_flight.pop(model_name, None)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "clients": [f"{provider}:{model_id}" for provider, model_id in self._clients],
+                "in_flight_by_model": dict(self.in_flight),
+                "max_connections": MAX_CONNECTIONS,
+                "keepalive_connections": KEEPALIVE_CONNECTIONS,
+            }
+
+
+class AgentPool:
+    """Compiled agents shared by all requests, one per AI provider"""
+
+    def __init__(self, scenario_manager=None, llm_pool: Optional[LLMClientPool] = None):
+        self.scenario_manager = scenario_manager
+        self.llm_pool = llm_pool
+        self._lock = threading.Lock()
+        self._agents: Dict[str, Any] = {}
+
+    def get_agent(self, ai_model: str = "openai", scenario_manager=None):
+        """The shared agent for a provider; its graph is compiled on first use only"""
+        agent = self._agents.get(ai_model)
+        if agent is not None:
+            return agent
+        with self._lock:
+            agent = self._agents.get(ai_model)
+            if agent is None:
+                from langgraph_agent_v2 import SimplifiedAgent
+
+                print(f"DEBUG: Compiling agent v2 graph for {ai_model}")
+                agent = SimplifiedAgent(ai_model=ai_model, scenario_manager=scenario_manager or self.scenario_manager,
+                                        llm_pool=self.llm_pool)
+                self._agents[ai_model] = agent
+            return agent
+
+    def has_agent(self, ai_model: str = "openai") -> bool:
+        return ai_model in self._agents
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "agents": list(self._agents.keys()),
+            "llm_clients": (self.llm_pool or get_llm_client_pool()).get_status(),
+        }
+
+
+# Global pool instances
+llm_client_pool: Optional[LLMClientPool] = None
+agent_pool: Optional[AgentPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_client_pool() -> LLMClientPool:
+    """Get the global LLM client pool, creating it on first use"""
+    global llm_client_pool
+    with _pool_lock:
+        if llm_client_pool is None:
+            llm_client_pool = LLMClientPool()
+        return llm_client_pool
+
+
+def set_llm_client_pool(pool: Optional[LLMClientPool]):
+    """Set the global LLM client pool"""
+    global llm_client_pool
+    with _pool_lock:
+        llm_client_pool = pool
+
+
+def get_agent_pool() -> AgentPool:
+    """Get the global agent pool, creating it on first use"""
+    global agent_pool
+    with _pool_lock:
+        if agent_pool is None:
+            agent_pool = AgentPool()
+        return agent_pool
+
+
+def set_agent_pool(pool: Optional[AgentPool]):
+    """Set the global agent pool"""
+    global agent_pool
+    with _pool_lock:
+        agent_pool = pool
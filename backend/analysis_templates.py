@@ -0,0 +1,519 @@
+"""
+Analysis Templates for EYProject
+
+Many requests against the hub location model are the same few analyses asked in
+different words: the top hubs by the demand they serve, the distribution of route
+costs, a map of the active hubs. Generating their scripts with the LLM costs
+seconds and tokens every time, and the result varies from run to run.
+
+Each AnalysisTemplate here is a hand-written SQL + Plotly script with typed slots
+(table, metric, N, chart type and the like). TemplateRegistry.match fills the
+slots from the request and the scenario schema and returns a confidence: the
+share of the request's terms that the template accounts for. A request that says
+anything the template cannot express ("...in the north", "...compared to") scores
+low and goes to the LLM as before, and so does a request with a number no slot
+takes or a filter word ("excluding", "above", "only"...) the template does not
+list in its vocabulary. Identifiers in the SQL only ever come from the
+schema, never from the request text.
+
+Settings: EYPOR_TEMPLATE_THRESHOLD (minimum confidence, default 0.8) and
+EYPOR_ANALYSIS_TEMPLATES=0 to always use the LLM.
+"""
+
+import os
+import re
+import time
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+from schema_retrieval import identifier_terms, request_terms
+
+DEFAULT_THRESHOLD = float(os.getenv("EYPOR_TEMPLATE_THRESHOLD", "0.8"))
+MAX_ROWS = 100
+
+# Words that carry no analysis meaning in a request to any template
+_FILLER_TERMS = {
+    "interactive", "visualization", "visualisation", "visualize", "visualise", "display", "get", "find",
+    "see", "want", "like", "would", "need", "using", "use", "based", "result", "current", "scenario",
+    "model", "value", "number", "there", "their", "them", "they", "this", "that", "those", "these",
+    "could", "should", "let", "look", "overview", "sorted", "sort", "order", "ordered", "descending",
+    "figure", "diagram", "output", "input", "be", "do", "does", "view", "draw", "generate", "produce",
+}
+_CHART_TERMS = {"bar", "barchart", "column", "histogram", "box", "boxplot", "map", "tabular", "grid"}
+_DESCENDING_TERMS = {"top", "highest", "largest", "biggest", "most", "busiest", "best", "greatest", "max", "maximum"}
+_ASCENDING_TERMS = {"bottom", "lowest", "least", "smallest", "fewest", "worst", "min", "minimum"}
+_CHART_NAMES = {"bar": "bar chart", "box": "box plot", "histogram": "histogram", "table": "table"}
+# Filters and comparisons that no template can express unless its vocabulary lists them
+_CONSTRAINT_TERMS = {"excluding", "exclude", "except", "without", "not", "above", "below", "over", "under",
+                     "where", "only", "than", "between"}
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+_NUMBER = re.compile(r"\b(?:top|bottom|first|last|highest|lowest|largest|smallest|busiest)\s+(\d{1,3})\b|\b(\d{1,3})\s+(?:\w+\s+)?hubs?\b",
+                     re.IGNORECASE)
+
+
+@dataclass
+class TemplateMatch:
+    """A template with its slots filled for one request"""
+    template_id: str
+    slots: Dict[str, Any]
+    confidence: float
+    explanation: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "template_id": self.template_id,
+            "slots": self.slots,
+            "confidence": round(self.confidence, 3),
+            "explanation": self.explanation,
+        }
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _columns(schema_info: Dict[str, Any], table: str) -> Dict[str, str]:
+    """Column name -> upper-case type of a table"""
+    info = schema_info.get("tables", {}).get(table, {})
+    return {c.get("name"): (c.get("type") or "").upper() for c in info.get("columns", [])}
+
+
+def _numeric(column_type: str) -> bool:
+    return any(t in column_type for t in ("REAL", "INT", "NUM", "FLOAT", "DOUBLE", "DEC"))
+
+
+def _candidate_tables(schema_info: Dict[str, Any], pattern: str, required: List[str]) -> List[str]:
+    """Tables whose name matches pattern and which have all required columns"""
+    regex = re.compile(pattern, re.IGNORECASE)
+    return [name for name in schema_info.get("tables", {})
+            if regex.match(name) and all(c in _columns(schema_info, name) for c in required)]
+
+
+def _pick_table(candidates: List[str], terms: List[str], preferred: Tuple[str, ...]) -> Tuple[Optional[str], Set[str]]:
+    """
+    The candidate whose distinguishing name parts (for example the scenario suffix
+    of outputs_routes_basecase) appear in the request, else the first preferred
+    suffix present. Returns the table and the request terms it accounts for.
+    """
+    if not candidates:
+        return None, set()
+    term_set = set(terms)
+    shared = set.intersection(*(set(identifier_terms(c)) for c in candidates))
+    best, best_hits = None, set()
+    for candidate in candidates:
+        hits = (set(identifier_terms(candidate)) - shared) & term_set
+        if len(hits) > len(best_hits):
+            best, best_hits = candidate, hits
+    if best is not None:
+        return best, best_hits | (shared & term_set)
+    for suffix in preferred:
+        for candidate in candidates:
+            if candidate.lower().endswith(suffix):
+                return candidate, shared & term_set
+    return candidates[0], shared & term_set
+
+
+def _number_span(request: str) -> Optional[Tuple[int, int]]:
+    """Span of the row count in the request ("top 5", "10 hubs")"""
+    match = _NUMBER.search(request or "")
+    if not match:
+        return None
+    return match.span(1) if match.group(1) else match.span(2)
+
+
+def _requested_number(request: str, default: int) -> int:
+    span = _number_span(request)
+    if span is None:
+        return default
+    return max(1, min(MAX_ROWS, int(request[span[0]:span[1]])))
+
+
+class AnalysisTemplate:
+    """
+    Base class of an analysis template. Subclasses set the class attributes and
+    implement fill_slots (which returns None when the schema does not fit) and body.
+    """
+
+    id = ""
+    title = ""
+    description = ""
+    request_types: Tuple[str, ...] = ("sql_query", "visualization")
+    # Every group needs at least one of its terms in the request
+    required_terms: List[Set[str]] = []
+    # Further terms the template accounts for
+    vocabulary: Set[str] = set()
+    # Whether a number in the request fills the row count slot
+    number_slot = False
+
+    def match(self, request: str, terms: List[str], schema_info: Dict[str, Any],
+              request_type: str) -> Optional[TemplateMatch]:
+        if request_type not in self.request_types or not terms:
+            return None
+        # "hub ... hub" must not count twice towards the confidence
+        terms = list(dict.fromkeys(terms))
+        term_set = set(terms)
+        if term_set & (_CONSTRAINT_TERMS - self.vocabulary):
+            return None
+        slot_number = _number_span(request) if self.number_slot else None
+        if any(m.span() != slot_number for m in _NUMBER_LITERAL.finditer(request or "")):
+            return None
+        if not all(group & term_set for group in self.required_terms):
+            return None
+        filled = self.fill_slots(request, terms, schema_info, request_type)
+        if filled is None:
+            return None
+        slots, slot_terms = filled
+        known = _FILLER_TERMS | _CHART_TERMS | self.vocabulary | slot_terms
+        for group in self.required_terms:
+            known |= group
+        covered = sum(1 for t in terms if t in known)
+        confidence = covered / len(terms)
+        return TemplateMatch(template_id=self.id, slots=slots, confidence=confidence,
+                             explanation=self.describe(slots))
+
+    def fill_slots(self, request: str, terms: List[str], schema_info: Dict[str, Any],
+                   request_type: str) -> Optional[Tuple[Dict[str, Any], Set[str]]]:
+        raise NotImplementedError
+
+    def describe(self, slots: Dict[str, Any]) -> str:
+        return self.description
+
+    def body(self, slots: Dict[str, Any]) -> Tuple[str, str]:
+        """(SQL query, Python code building fig from df)"""
+        raise NotImplementedError
+
+    def render(self, match: TemplateMatch, db_filename: str) -> str:
+        """Complete script for a match"""
+        sql, figure_code = self.body(match.slots)
+        figure_code = "\n".join(("    " + line) if line else "" for line in figure_code.strip("\n").split("\n"))
+        return f'''"""
+{self.title}
+Generated from the analysis template "{self.id}" with {match.slots}
+"""
+import sqlite3
+from datetime import datetime
+import pandas as pd
+import plotly.graph_objects as go
+
+DB_FILE = {db_filename!r}
+QUERY = """
+{sql}
+"""
+
+try:
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        df = pd.read_sql_query(QUERY, conn).reset_index(drop=True)
+    finally:
+        conn.close()
+    print(f"Query returned {{len(df)}} rows")
+    print(df.head(20).to_string(index=False))
+
+{figure_code}
+
+    html_file_path = f"{self.id}_{{datetime.now().strftime('%Y%m%d_%H%M%S')}}.html"
+    fig.write_html(html_file_path)
+    print(f"Saved {{html_file_path}}")
+except Exception as e:
+    print(f"Error: {{e}}")
+    raise
+'''
+
+
+def _table_figure(title: str) -> str:
+    return f'''
+fig = go.Figure(data=[go.Table(
+    header=dict(values=list(df.columns), fill_color="lightgrey", align="left"),
+    cells=dict(values=[df[c].tolist() for c in df.columns], align="left"),
+)])
+fig.update_layout(title={title!r})
+'''
+
+
+def _chart_kind(terms: List[str], request_type: str, charts: Tuple[str, ...]) -> str:
+    """First chart of charts named in the request; the first one for visualizations, a table otherwise"""
+    aliases = {"barchart": "bar", "column": "bar", "boxplot": "box", "tabular": "table", "grid": "table"}
+    named = [aliases.get(t, t) for t in terms]
+    for chart in charts:
+        if chart in named:
+            return chart
+    return charts[0] if request_type == "visualization" else "table"
+
+
+class TopHubsByDemandTemplate(AnalysisTemplate):
+    """Top (or bottom) N hubs by the destination demand they serve in a model output"""
+
+    id = "top_hubs_by_demand"
+    title = "Hubs ranked by the destination demand they serve"
+    description = "Ranks hubs by the total supply of their routes"
+    required_terms = [
+        _DESCENDING_TERMS | _ASCENDING_TERMS | {"rank", "ranking", "ranked", "busy"},
+        {"hub"},
+        {"demand", "supply", "served", "serve", "serving", "throughput", "volume", "flow", "load", "utilization", "utilisation"},
+    ]
+    vocabulary = {"aggregated", "aggregate", "total", "sum", "destination", "assigned", "allocated", "customer",
+                  "handled", "handle", "amount", "table", "chart", "list", "per", "each", "open", "active"}
+    number_slot = True
+
+    def fill_slots(self, request, terms, schema_info, request_type):
+        candidates = _candidate_tables(schema_info, r"^outputs_routes_", ["HubID", "Supply"])
+        table, table_terms = _pick_table(candidates, terms, ("default", "basecase"))
+        if table is None:
+            return None
+        hubs_columns = _columns(schema_info, "inputs_hubs")
+        slots = {
+            "table": table,
+            "n": _requested_number(request, 10),
+            "order": "asc" if set(terms) & _ASCENDING_TERMS else "desc",
+            "chart": _chart_kind(terms, request_type, ("bar", "table")),
+            "location_table": "inputs_hubs" if {"HubID", "Location"} <= set(hubs_columns) else None,
+        }
+        return slots, table_terms
+
+    def describe(self, slots):
+        direction = "Top" if slots["order"] == "desc" else "Bottom"
+        return (f"{direction} {slots['n']} hubs by the demand they serve (sum of route Supply in "
+                f"{slots['table']}), shown as a {_CHART_NAMES[slots['chart']]}.")
+
+    def body(self, slots):
+        table = _quote(slots["table"])
+        order = "DESC" if slots["order"] == "desc" else "ASC"
+        if slots["location_table"]:
+            sql = (f"SELECT r.HubID, h.Location, SUM(r.Supply) AS Demand\n"
+                   f"FROM {table} r\nLEFT JOIN {_quote(slots['location_table'])} h ON h.HubID = r.HubID\n"
+                   f"GROUP BY r.HubID, h.Location")
+            label = 'df["Location"].fillna(df["HubID"]).astype(str) + " (" + df["HubID"].astype(str) + ")"'
+        else:
+            sql = f"SELECT r.HubID, SUM(r.Supply) AS Demand\nFROM {table} r\nGROUP BY r.HubID"
+            label = 'df["HubID"].astype(str)'
+        sql += f"\nHAVING SUM(r.Supply) > 0\nORDER BY Demand {order}\nLIMIT {int(slots['n'])}"
+        title = self.describe(slots).split(" (")[0]
+        if slots["chart"] == "table":
+            return sql, _table_figure(title)
+        return sql, f'''
+labels = ({label}).tolist()
+fig = go.Figure(data=[go.Bar(x=labels, y=df["Demand"].tolist(), marker_color="steelblue")])
+fig.update_layout(title={title!r}, xaxis_title="Hub", yaxis_title="Demand served")
+'''
+
+
+class RouteCostDistributionTemplate(AnalysisTemplate):
+    """Distribution of a route cost or distance column of a model output"""
+
+    id = "route_cost_distribution"
+    title = "Distribution of route costs"
+    description = "Distribution of a route metric"
+    required_terms = [
+        {"route"},
+        {"cost", "distance", "price"},
+        {"distribution", "histogram", "spread", "breakdown", "range", "box", "boxplot", "statistic", "stat",
+         "summary", "describe", "vary", "variation", "distributed", "frequency"},
+    ]
+    vocabulary = {"unit", "base", "per", "all", "across", "table", "chart", "active", "used", "only", "served", "km"}
+
+    def fill_slots(self, request, terms, schema_info, request_type):
+        candidates = _candidate_tables(schema_info, r"^outputs_routes_", ["HubID", "DestinationID"])
+        table, table_terms = _pick_table(candidates, terms, ("default", "basecase"))
+        if table is None:
+            return None
+        columns = _columns(schema_info, table)
+        metrics = [c for c, t in columns.items() if _numeric(t) and ("cost" in identifier_terms(c) or c == "Distance")]
+        if not metrics:
+            return None
+        term_set = set(terms)
+        # "route" names the table, not the metric: "unit cost of routes" is Cost_Unit
+        metric_terms = term_set - {"route"}
+
+        def metric_score(column):
+            column_terms = set(identifier_terms(column))
+            return (len(column_terms & metric_terms), -len(column_terms - metric_terms), column == "Cost_Route")
+
+        metric = max(metrics, key=metric_score)
+        active_only = bool(term_set & {"active", "used", "served"}) and "Supply" in columns
+        slots = {
+            "table": table,
+            "metric": metric,
+            "active_only": active_only,
+            "chart": _chart_kind(terms, request_type, ("histogram", "box", "table")),
+        }
+        return slots, table_terms | set(identifier_terms(metric))
+
+    def describe(self, slots):
+        routes = "active routes" if slots["active_only"] else "all routes"
+        shown = "summary statistics" if slots["chart"] == "table" else f"a {_CHART_NAMES[slots['chart']]}"
+        return f"Distribution of {slots['metric']} over {routes} in {slots['table']}, shown as {shown}."
+
+    def body(self, slots):
+        metric = _quote(slots["metric"])
+        sql = f"SELECT HubID, DestinationID, {metric} AS Value\nFROM {_quote(slots['table'])}\nWHERE {metric} IS NOT NULL"
+        if slots["active_only"]:
+            sql += "\n  AND Supply > 0"
+        title = self.describe(slots).split(" in ")[0]
+        if slots["chart"] == "table":
+            return sql, f'''
+stats = df["Value"].describe(percentiles=[0.1, 0.25, 0.5, 0.75, 0.9])
+df = pd.DataFrame({{"Statistic": stats.index.tolist(), {slots['metric']!r}: [round(float(v), 3) for v in stats.tolist()]}})
+{_table_figure(title).strip()}
+'''
+        if slots["chart"] == "box":
+            trace = f'go.Box(y=df["Value"].tolist(), name={slots["metric"]!r}, boxpoints="outliers")'
+            axes = f'yaxis_title={slots["metric"]!r}'
+        else:
+            trace = 'go.Histogram(x=df["Value"].tolist(), nbinsx=40, marker_color="steelblue")'
+            axes = f'xaxis_title={slots["metric"]!r}, yaxis_title="Routes"'
+        return sql, f'''
+fig = go.Figure(data=[{trace}])
+fig.update_layout(title={title!r}, {axes})
+'''
+
+
+class ActiveHubMapTemplate(AnalysisTemplate):
+    """Map of hubs coloured by whether they are active"""
+
+    id = "active_hub_map"
+    title = "Map of active hubs"
+    description = "Map of hubs coloured by status"
+    request_types = ("visualization",)
+    required_terms = [
+        {"map", "geographic", "geographical", "geo", "geography", "plotted", "spatial"},
+        {"hub"},
+    ]
+    vocabulary = {"active", "inactive", "open", "opened", "closed", "initial", "initially", "status", "location",
+                  "located", "where", "position", "latitude", "longitude", "lat", "long", "lon", "coordinate",
+                  "which", "are", "uk", "country", "colour", "color", "coloured", "colored", "highlight",
+                  "highlighted", "showing", "along", "operating", "operational"}
+
+    def fill_slots(self, request, terms, schema_info, request_type):
+        coordinates = ["HubID", "Latitude", "Longitude"]
+        outputs = _candidate_tables(schema_info, r"^outputs_hubs_", coordinates + ["Active"])
+        table, table_terms = _pick_table(outputs, terms, ())
+        # Scenario outputs only when named in the request; the input table otherwise
+        if table is not None and (set(identifier_terms(table)) - {"output", "hub"}) & set(terms):
+            status_column = "Active"
+        elif "Initial_Active" in _columns(schema_info, "inputs_hubs") and all(
+                c in _columns(schema_info, "inputs_hubs") for c in coordinates):
+            table, table_terms, status_column = "inputs_hubs", set(), "Initial_Active"
+        else:
+            return None
+        location = "Location" if "Location" in _columns(schema_info, table) else None
+        return {"table": table, "status_column": status_column, "location_column": location}, table_terms
+
+    def describe(self, slots):
+        return f"Map of hubs in {slots['table']}, coloured by {slots['status_column']}."
+
+    def body(self, slots):
+        label = _quote(slots["location_column"]) if slots["location_column"] else "HubID"
+        sql = (f"SELECT HubID, {label} AS Label, Latitude, Longitude, {_quote(slots['status_column'])} AS Status\n"
+               f"FROM {_quote(slots['table'])}")
+        title = f"Hubs by status ({slots['table']}.{slots['status_column']})"
+        return sql, f'''
+df["State"] = ["Active" if (s or 0) > 0.5 else "Inactive" for s in df["Status"].tolist()]
+fig = go.Figure()
+for state, colour, size in (("Inactive", "lightgrey", 7), ("Active", "crimson", 12)):
+    part = df[df["State"] == state].reset_index(drop=True)
+    fig.add_trace(go.Scattergeo(
+        lat=part["Latitude"].tolist(), lon=part["Longitude"].tolist(),
+        text=(part["Label"].astype(str) + " (" + part["HubID"].astype(str) + ")").tolist(),
+        mode="markers", name=f"{{state}} ({{len(part)}})", marker=dict(size=size, color=colour),
+    ))
+fig.update_geos(fitbounds="locations", showcountries=True, showland=True, landcolor="whitesmoke")
+fig.update_layout(title={title!r})
+print(f"Active hubs: {{int((df['State'] == 'Active').sum())}} of {{len(df)}}")
+'''
+
+
+class TemplateRegistry:
+    """Registered analysis templates and their match statistics"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, enabled: Optional[bool] = None):
+        self.threshold = threshold
+        self.enabled = os.getenv("EYPOR_ANALYSIS_TEMPLATES", "1") != "0" if enabled is None else enabled
+        self.templates: Dict[str, AnalysisTemplate] = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "matched": 0, "below_threshold": 0, "match_ms": 0.0}
+        self.matches_by_template: Dict[str, int] = {}
+
+    def register(self, template: AnalysisTemplate) -> AnalysisTemplate:
+        self.templates[template.id] = template
+        return template
+
+    def match(self, request: str, schema_info: Optional[Dict[str, Any]], request_type: str) -> Optional[TemplateMatch]:
+        """Best matching template at or above the threshold, or None"""
+        if not self.enabled or not schema_info or not schema_info.get("tables"):
+            return None
+        started_at = time.perf_counter()
+        terms = request_terms(request)
+        best: Optional[TemplateMatch] = None
+        for template in self.templates.values():
+            try:
+                candidate = template.match(request, terms, schema_info, request_type)
+            except Exception as e:
+                print(f"DEBUG: Analysis template {template.id} failed to match: {e}")
+                continue
+            if candidate is not None and (best is None or candidate.confidence > best.confidence):
+                best = candidate
+        accepted = best if best is not None and best.confidence >= self.threshold else None
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["match_ms"] += (time.perf_counter() - started_at) * 1000
+            if accepted is not None:
+                self.stats["matched"] += 1
+                self.matches_by_template[accepted.template_id] = self.matches_by_template.get(accepted.template_id, 0) + 1
+            elif best is not None:
+                self.stats["below_threshold"] += 1
+        if best is not None:
+            print(f"DEBUG: Analysis template {best.template_id} confidence {best.confidence:.2f} "
+                  f"({'used' if accepted else 'below threshold'})")
+        return accepted
+
+    def render(self, match: TemplateMatch, db_filename: str) -> str:
+        return self.templates[match.template_id].render(match, db_filename)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            by_template = dict(self.matches_by_template)
+        requests = stats["requests"]
+        stats["avg_match_ms"] = round(stats.pop("match_ms") / requests, 3) if requests else 0.0
+        stats["match_rate"] = round(stats["matched"] / requests, 3) if requests else 0.0
+        return {
+            **stats,
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "templates": [
+                {"id": t.id, "description": t.description, "request_types": list(t.request_types),
+                 "matches": by_template.get(t.id, 0)}
+                for t in self.templates.values()
+            ],
+        }
+
+
+def create_default_registry(**kwargs) -> TemplateRegistry:
+    """Registry with the built-in hub location templates"""
+    registry = TemplateRegistry(**kwargs)
+    registry.register(TopHubsByDemandTemplate())
+    registry.register(RouteCostDistributionTemplate())
+    registry.register(ActiveHubMapTemplate())
+    return registry
+
+
+# Global registry instance
+template_registry: Optional[TemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Get the global template registry, creating it with the built-in templates on first use"""
+    global template_registry
+    with _registry_lock:
+        if template_registry is None:
+            template_registry = create_default_registry()
+        return template_registry
+
+
+def set_template_registry(registry: Optional[TemplateRegistry]):
+    """Set the global template registry"""
+    global template_registry
+    with _registry_lock:
+        template_registry = registry
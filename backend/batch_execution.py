@@ -0,0 +1,187 @@
+"""
+Batch Model Execution for EYProject
+
+This module runs one model file (e.g. runall.py) against many scenarios. Every
+scenario gets its own job in the JobManager, so each run is a separate process
+with its own working directory and its own database redirect. All jobs of a
+batch share a job group whose concurrency cap limits how many of them run at
+once, on top of the manager's global and per-scenario limits.
+
+BatchManager keeps track of the jobs of each batch and reports progress and
+per-scenario results (status, timings, output tables and files).
+"""
+
+import os
+import uuid
+import asyncio
+import threading
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Callable, AsyncIterator, Tuple
+
+from job_manager import (JobManager, Job, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED,
+                         JOB_CANCELLED, FINISHED_STATUSES, _sse)
+from execution_pool import ExecutionResult
+
+DEFAULT_BATCH_CONCURRENCY = 4
+
+
+def written_tables(result: ExecutionResult, db_path: str) -> List[Dict[str, Any]]:
+    """Tables a run wrote in a database (the model's output tables), from the runtime table manifest"""
+    return [{"table": name} for name in result.tables_written.get(os.path.abspath(db_path), [])]
+
+
+@dataclass
+class BatchRun:
+    """A model executed against a list of scenarios"""
+    id: str
+    model_filename: str
+    max_concurrent: int
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    # (scenario_id, scenario_name, job)
+    runs: List[Tuple[int, str, Job]] = field(default_factory=list)
+
+    @property
+    def is_finished(self) -> bool:
+        return all(job.is_finished for _, _, job in self.runs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING) + FINISHED_STATUSES}
+        scenarios = []
+        for scenario_id, scenario_name, job in self.runs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+            usage = job.result.get("resource_usage") or {}
+            scenarios.append({
+                "scenario_id": scenario_id,
+                "scenario_name": scenario_name,
+                "job_id": job.id,
+                "status": job.status,
+                "return_code": job.return_code,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+                "execution_time_ms": usage.get("execution_time_ms"),
+                "resource_usage": usage,
+                "output_tables": job.result.get("output_tables", []),
+                "output_files": job.output_files,
+                "error": job.error or (job.stderr[-2000:] if job.is_finished and job.return_code else None),
+            })
+
+        total = len(self.runs)
+        finished = sum(counts[s] for s in FINISHED_STATUSES)
+        if finished < total:
+            status = "running" if counts[JOB_RUNNING] or finished else "queued"
+        elif counts[JOB_COMPLETED] == total:
+            status = "completed"
+        elif counts[JOB_CANCELLED] == total:
+            status = "cancelled"
+        else:
+            status = "completed_with_errors"
+
+        return {
+            "batch_id": self.id,
+            "model_filename": self.model_filename,
+            "max_concurrent": self.max_concurrent,
+            "created_at": self.created_at,
+            "status": status,
+            "total": total,
+            "finished": finished,
+            "progress": round(finished / total, 3) if total else 1.0,
+            "counts": counts,
+            "scenarios": scenarios,
+        }
+
+
+class BatchManager:
+    """Submits and tracks batch model executions"""
+
+    def __init__(self, job_manager: JobManager, max_batches_retained: int = 50):
+        self.job_manager = job_manager
+        self.max_batches_retained = max_batches_retained
+        self._batches: Dict[str, BatchRun] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, model_filename: str, scenarios: List[Tuple[int, str]],
+               runner_factory: Callable[[int], Callable[[Job], Dict[str, Any]]],
+               max_concurrent: int = DEFAULT_BATCH_CONCURRENCY,
+               priority: int = 0) -> BatchRun:
+        """Queue one job per (scenario_id, scenario_name); runner_factory builds each job's runner"""
+        batch = BatchRun(id=uuid.uuid4().hex[:12], model_filename=model_filename,
+                         max_concurrent=max(1, max_concurrent))
+        # Set the cap before the first job is queued so it can never be exceeded
+        self.job_manager.set_group_limit(batch.id, batch.max_concurrent)
+        for scenario_id, scenario_name in scenarios:
+            job = self.job_manager.submit(
+                runner_factory(scenario_id),
+                command=f"Model Execution: {model_filename} [{scenario_name}]",
+                kind="model",
+                scenario_id=scenario_id,
+                metadata={"filename": model_filename, "batch_id": batch.id},
+                priority=priority,
+                group=batch.id,
+            )
+            batch.runs.append((scenario_id, scenario_name, job))
+
+        with self._lock:
+            self._batches[batch.id] = batch
+            self._prune_finished_batches()
+        print(f"DEBUG: Batch {batch.id} submitted: {model_filename} x {len(batch.runs)} scenarios "
+              f"(max {batch.max_concurrent} concurrent)")
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[BatchRun]:
+        with self._lock:
+            return self._batches.get(batch_id)
+
+    def list_batches(self) -> List[BatchRun]:
+        with self._lock:
+            return sorted(self._batches.values(), key=lambda b: b.created_at, reverse=True)
+
+    def cancel(self, batch_id: str) -> Optional[BatchRun]:
+        """Cancel every queued or running job of a batch"""
+        batch = self.get_batch(batch_id)
+        if batch is None:
+            return None
+        for _, _, job in batch.runs:
+            if not job.is_finished:
+                self.job_manager.cancel(job.id)
+        return batch
+
+    async def wait_for(self, batch_id: str) -> Optional[BatchRun]:
+        batch = self.get_batch(batch_id)
+        if batch is None:
+            return None
+        for _, _, job in batch.runs:
+            await self.job_manager.wait_for(job.id)
+        return batch
+
+    async def stream_progress(self, batch_id: str, poll_interval: float = 0.5) -> AsyncIterator[str]:
+        """
+        Yield Server-Sent Events for a batch: a "progress" event whenever a job
+        changes state and a final "done" event with all per-scenario results.
+        """
+        batch = self.get_batch(batch_id)
+        if batch is None:
+            yield _sse("error", {"error": f"Batch '{batch_id}' not found"})
+            return
+
+        last_state = None
+        while True:
+            finished = batch.is_finished
+            state = [job.status for _, _, job in batch.runs]
+            if state != last_state:
+                last_state = state
+                summary = batch.to_dict()
+                summary.pop("scenarios")
+                yield _sse("progress", summary)
+            if finished:
+                yield _sse("done", batch.to_dict())
+                return
+            await asyncio.sleep(poll_interval)
+
+    def _prune_finished_batches(self):
+        """Forget the oldest finished batches beyond the retention limit (lock held)"""
+        finished = sorted((b for b in self._batches.values() if b.is_finished), key=lambda b: b.created_at)
+        excess = len(self._batches) - self.max_batches_retained
+        for batch in finished[:max(0, excess)]:
+            del self._batches[batch.id]
+            self.job_manager.set_group_limit(batch.id, None)
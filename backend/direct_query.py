@@ -0,0 +1,313 @@
+"""
+Direct Query for EYProject
+
+Plain data questions (sql_query requests) normally make the LLM write a whole
+Python program that is saved as sql_query_<ts>.py, run in a Python process that
+imports pandas and plotly, and turned into a Plotly table HTML file, which the
+frontend then downloads. In direct-answer mode the LLM returns a single SQL
+statement instead. The statement is checked (one read-only SELECT that prepares
+with EXPLAIN) and run in-process on a pooled read-only connection, with a row
+cap and a timeout. The result is returned as compact JSON rows. The Plotly table
+HTML is only rendered if /query-results/{result_id}/html is requested.
+
+Direct answers are enabled per chat request ("direct_answer": true) or by
+default with EYPOR_SQL_DIRECT_ANSWER=1. Limits: EYPOR_DIRECT_QUERY_MAX_ROWS
+(default 1000), EYPOR_DIRECT_QUERY_TIMEOUT_SECONDS (default 10) and
+EYPOR_DIRECT_QUERY_CONNECTIONS (per database, default 4).
+"""
+
+import os
+import re
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any
+
+from sql_validation import validate_sql, connect_read_only
+
+DIRECT_ANSWER_DEFAULT = os.getenv("EYPOR_SQL_DIRECT_ANSWER", "0").lower() in ("1", "true", "yes")
+MAX_ROWS = int(os.getenv("EYPOR_DIRECT_QUERY_MAX_ROWS", "1000"))
+TIMEOUT_SECONDS = float(os.getenv("EYPOR_DIRECT_QUERY_TIMEOUT_SECONDS", "10"))
+CONNECTIONS_PER_DATABASE = int(os.getenv("EYPOR_DIRECT_QUERY_CONNECTIONS", "4"))
+MAX_DATABASES = 16
+MAX_RESULTS = 100
+# Rows shown in the chat message; the full (capped) result is in the JSON rows
+PREVIEW_ROWS = 20
+
+_SQL_BLOCK = re.compile(r"```(?:sql|sqlite)?\s*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def extract_sql(llm_response: str) -> str:
+    """The SQL statement of an LLM response (a ```sql block, or the whole text)"""
+    match = _SQL_BLOCK.search(llm_response)
+    sql = match.group(1) if match else llm_response
+    return sql.strip().rstrip(";").strip()
+
+
+def check_statement(sql: str) -> Optional[str]:
+    """Why sql cannot be answered directly (not a single SELECT), or None"""
+    statement = _COMMENTS.sub(" ", sql).strip().rstrip(";").strip()
+    if not statement:
+        return "The response contains no SQL statement"
+    if ";" in statement:
+        return "Only one SQL statement can be run"
+    if statement.split(None, 1)[0].upper() not in ("SELECT", "WITH"):
+        return "Only SELECT statements can be answered directly"
+    return None
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+@dataclass
+class QueryResult:
+    """Rows of a directly answered query"""
+    result_id: str
+    sql: str
+    database_path: str
+    columns: List[str]
+    rows: List[List[Any]]
+    truncated: bool
+    duration_ms: float
+    created_at: float = field(default_factory=time.time)
+    html: Optional[str] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "result_id": self.result_id,
+            "sql": self.sql,
+            "columns": self.columns,
+            "rows": self.rows,
+            "row_count": len(self.rows),
+            "truncated": self.truncated,
+            "duration_ms": round(self.duration_ms, 2),
+            "html_url": f"/query-results/{self.result_id}/html",
+        }
+
+    def preview(self, limit: int = PREVIEW_ROWS) -> str:
+        """Markdown table of the first rows"""
+        if not self.columns:
+            return "The query returned no columns."
+        lines = ["| " + " | ".join(self.columns) + " |", "|" + "---|" * len(self.columns)]
+        for row in self.rows[:limit]:
+            lines.append("| " + " | ".join("" if value is None else str(value) for value in row) + " |")
+        shown = min(limit, len(self.rows))
+        summary = f"{len(self.rows)}{'+' if self.truncated else ''} rows in {self.duration_ms:.0f} ms"
+        if shown < len(self.rows) or self.truncated:
+            summary += f", first {shown} shown"
+        return "\n".join(lines) + f"\n\n{summary}"
+
+
+class _ConnectionPool:
+    """Read-only connections to one database"""
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                conn = connect_read_only(self.db_path)
+                conn.execute("PRAGMA query_only = 1")
+                return conn
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("All read-only connections to the database are busy")
+
+    def release(self, conn: sqlite3.Connection):
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class DirectQueryRunner:
+    """Validates and runs single SELECT statements on pooled read-only connections"""
+
+    def __init__(self, max_rows: int = MAX_ROWS, timeout: float = TIMEOUT_SECONDS,
+                 connections_per_database: int = CONNECTIONS_PER_DATABASE, enabled_by_default: bool = DIRECT_ANSWER_DEFAULT):
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self.connections_per_database = connections_per_database
+        self.enabled_by_default = enabled_by_default
+        self._lock = threading.Lock()
+        self._pools: "OrderedDict[str, _ConnectionPool]" = OrderedDict()
+        self._results: "OrderedDict[str, QueryResult]" = OrderedDict()
+        self.stats = {
+            "queries": 0,
+            "rejected": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "truncated": 0,
+            "html_rendered": 0,
+            "total_ms": 0.0,
+        }
+
+    def _pool(self, db_path: str) -> _ConnectionPool:
+        key = os.path.abspath(db_path)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = _ConnectionPool(key, self.connections_per_database)
+                self._pools[key] = pool
+                while len(self._pools) > MAX_DATABASES:
+                    _, evicted = self._pools.popitem(last=False)
+                    evicted.close()
+            self._pools.move_to_end(key)
+            return pool
+
+    def validate(self, db_path: str, sql: str) -> Optional[str]:
+        """Error message if sql is not a single SELECT that prepares against the database, else None"""
+        problem = check_statement(sql)
+        if problem:
+            return problem
+        pool = self._pool(db_path)
+        conn = pool.acquire(self.timeout)
+        try:
+            return validate_sql(conn, sql)
+        finally:
+            pool.release(conn)
+
+    def run(self, db_path: str, sql: str, result_id: Optional[str] = None) -> QueryResult:
+        """Run a validated SELECT, keeping at most max_rows rows; raises sqlite3.Error on failure or timeout"""
+        problem = check_statement(sql)
+        if problem:
+            self._count("rejected")
+            raise sqlite3.ProgrammingError(problem)
+        started_at = time.perf_counter()
+        deadline = started_at + self.timeout
+        pool = self._pool(db_path)
+        conn = pool.acquire(self.timeout)
+        # Interrupt the statement once the deadline passed (checked every 10k VM instructions)
+        conn.set_progress_handler(lambda: int(time.perf_counter() > deadline), 10000)
+        try:
+            cursor = conn.execute(sql)
+            columns = [description[0] for description in cursor.description or []]
+            fetched = cursor.fetchmany(self.max_rows + 1)
+            cursor.close()
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                self._count("timeouts")
+                raise sqlite3.OperationalError(f"Query stopped after the {self.timeout:g} s limit") from e
+            self._count("failed")
+            raise
+        except sqlite3.Error:
+            self._count("failed")
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            pool.release(conn)
+        duration_ms = (time.perf_counter() - started_at) * 1000
+        truncated = len(fetched) > self.max_rows
+        result = QueryResult(
+            result_id=result_id or uuid.uuid4().hex[:12],
+            sql=sql,
+            database_path=db_path,
+            columns=columns,
+            rows=[[_json_value(value) for value in row] for row in fetched[:self.max_rows]],
+            truncated=truncated,
+            duration_ms=duration_ms,
+        )
+        with self._lock:
+            self.stats["queries"] += 1
+            self.stats["truncated"] += truncated
+            self.stats["total_ms"] += duration_ms
+            self._results[result.result_id] = result
+            self._results.move_to_end(result.result_id)
+            while len(self._results) > MAX_RESULTS:
+                self._results.popitem(last=False)
+        print(f"DEBUG: Direct query returned {len(result.rows)} rows in {duration_ms:.1f} ms")
+        return result
+
+    def _count(self, event: str):
+        with self._lock:
+            self.stats[event] += 1
+
+    def get_result(self, result_id: str) -> Optional[QueryResult]:
+        with self._lock:
+            return self._results.get(result_id)
+
+    def render_html(self, result_id: str) -> Optional[str]:
+        """Plotly table HTML of a stored result, rendered on the first request"""
+        result = self.get_result(result_id)
+        if result is None:
+            return None
+        if result.html is None:
+            import plotly.graph_objects as go
+
+            columns = [[row[i] for row in result.rows] for i in range(len(result.columns))]
+            fig = go.Figure(data=[go.Table(header=dict(values=result.columns, align="left"),
+                                           cells=dict(values=columns, align="left"))])
+            title = f"{len(result.rows)}{'+' if result.truncated else ''} rows"
+            fig.update_layout(title=title, margin=dict(l=20, r=20, t=50, b=20))
+            result.html = fig.to_html(full_html=True)
+            self._count("html_rendered")
+        return result.html
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            databases = len(self._pools)
+            stored = len(self._results)
+        queries = stats["queries"]
+        stats["avg_ms"] = round(stats.pop("total_ms") / queries, 2) if queries else 0.0
+        stats.update({
+            "enabled_by_default": self.enabled_by_default,
+            "max_rows": self.max_rows,
+            "timeout_seconds": self.timeout,
+            "databases": databases,
+            "stored_results": stored,
+        })
+        return stats
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+
+
+# Global runner instance
+direct_query_runner: Optional[DirectQueryRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_direct_query_runner() -> DirectQueryRunner:
+    """Get the global direct query runner, creating it on first use"""
+    global direct_query_runner
+    with _runner_lock:
+        if direct_query_runner is None:
+            direct_query_runner = DirectQueryRunner()
+        return direct_query_runner
+
+
+def set_direct_query_runner(runner: Optional[DirectQueryRunner]):
+    """Set the global direct query runner"""
+    global direct_query_runner
+    with _runner_lock:
+        if direct_query_runner is not None and direct_query_runner is not runner:
+            direct_query_runner.close()
+        direct_query_runner = runner
@@ -0,0 +1,329 @@
+"""
+Execution Runtime Hooks for EYProject
+
+This module is loaded at interpreter start (through the sitecustomize.py next to
+it) in every script and model process started by the backend, and in the warm
+pool workers. It redirects database access and records written files based on
+environment variables, so scripts can run unmodified from their own location:
+
+    EYPOR_DB_REDIRECTS  JSON object mapping logical database file names to real
+                        paths, e.g. {"database.db": "/.../scenario_x/database.db"}
+
+    EYPOR_WRITE_MANIFEST
+                        Path of a manifest file. Every file the script opens for
+                        writing (or renames into place) is appended to it once,
+                        so the backend can find a run's outputs without scanning
+                        directories.
+
+    EYPOR_DATABASE_MANIFEST
+                        Path of a manifest file listing every SQLite database the
+                        script connected to (after redirection), used to tell
+                        whether a cached result is still valid.
+
+    EYPOR_TABLE_MANIFEST
+                        Path of a manifest file listing the tables the script
+                        read and wrote, one "read|write<TAB>database<TAB>table"
+                        line each, recorded by a sqlite3 authorizer installed on
+                        every connection.
+
+    EYPOR_READ_MANIFEST
+                        Path of a manifest file listing the files the script
+                        opened for reading and the local .py modules it
+                        imported (outside the Python installation and
+                        site-packages).
+
+Redirection happens at the sqlite3.connect and pandas.read_sql* level. Only
+relative paths whose file name is a key of the mapping are redirected; absolute
+paths (as used by multi-scenario comparison scripts) are left alone.
+"""
+
+import io
+import os
+import sys
+import json
+import sqlite3
+import builtins
+import functools
+import importlib.abc
+import importlib.machinery
+import importlib.util
+
+REDIRECTS_ENV = "EYPOR_DB_REDIRECTS"
+WRITE_MANIFEST_ENV = "EYPOR_WRITE_MANIFEST"
+DATABASE_MANIFEST_ENV = "EYPOR_DATABASE_MANIFEST"
+TABLE_MANIFEST_ENV = "EYPOR_TABLE_MANIFEST"
+READ_MANIFEST_ENV = "EYPOR_READ_MANIFEST"
+
+# Authorizer actions that modify a table (arg1 is the table name)
+_TABLE_WRITE_ACTIONS = {
+    sqlite3.SQLITE_INSERT,
+    sqlite3.SQLITE_UPDATE,
+    sqlite3.SQLITE_DELETE,
+    sqlite3.SQLITE_CREATE_TABLE,
+    sqlite3.SQLITE_DROP_TABLE,
+}
+# Reads below these prefixes (the Python installation, pseudo file systems) are not inputs
+_UNTRACKED_READ_PREFIXES = tuple(
+    {os.path.abspath(p) + os.sep for p in (sys.prefix, sys.base_prefix, sys.exec_prefix)}
+    | ({"/proc/", "/sys/", "/dev/"} if os.name != "nt" else set())
+)
+
+_original_connect = sqlite3.connect
+_original_open = builtins.open
+_original_rename = os.rename
+_original_replace = os.replace
+_original_exec_module = importlib.machinery.SourceFileLoader.exec_module
+_redirects = {}
+_manifest_path = None
+_written_files = set()
+_database_manifest_path = None
+_databases = set()
+_table_manifest_path = None
+_table_access = set()
+_read_manifest_path = None
+_read_files = set()
+
+
+def configure_from_env():
+    """(Re)load the redirection mapping and write manifest from the environment"""
+    global _redirects, _manifest_path, _written_files, _database_manifest_path, _databases
+    global _table_manifest_path, _table_access, _read_manifest_path, _read_files
+    raw = os.environ.get(REDIRECTS_ENV)
+    try:
+        _redirects = json.loads(raw) if raw else {}
+    except ValueError:
+        _redirects = {}
+    manifest = os.environ.get(WRITE_MANIFEST_ENV)
+    _manifest_path = os.path.abspath(manifest) if manifest else None
+    _written_files = set()
+    manifest = os.environ.get(DATABASE_MANIFEST_ENV)
+    _database_manifest_path = os.path.abspath(manifest) if manifest else None
+    _databases = set()
+    manifest = os.environ.get(TABLE_MANIFEST_ENV)
+    _table_manifest_path = os.path.abspath(manifest) if manifest else None
+    _table_access = set()
+    manifest = os.environ.get(READ_MANIFEST_ENV)
+    _read_manifest_path = os.path.abspath(manifest) if manifest else None
+    _read_files = set()
+
+
+def resolve_database_path(database):
+    """Return the redirected path for a database argument (or the argument itself)"""
+    if not _redirects or not isinstance(database, (str, os.PathLike)):
+        return database
+    path = os.fspath(database)
+    if isinstance(path, bytes) or path == ":memory:" or path.startswith("file:") or os.path.isabs(path):
+        return database
+    target = _redirects.get(os.path.basename(path))
+    return target if target else database
+
+
+@functools.wraps(_original_connect)
+def _redirecting_connect(database, *args, **kwargs):
+    database = resolve_database_path(database)
+    _record_database(database)
+    connection = _original_connect(database, *args, **kwargs)
+    _track_tables(connection, database)
+    return connection
+
+
+def _looks_like_database_path(con):
+    if not isinstance(con, (str, os.PathLike)):
+        return False
+    path = os.fspath(con)
+    # SQLAlchemy URLs ("sqlite:///x.db", "postgresql://...") are left to pandas
+    return isinstance(path, str) and "://" not in path and os.path.basename(path) in _redirects
+
+
+def _wrap_read_sql(original):
+    @functools.wraps(original)
+    def wrapper(sql, con, *args, **kwargs):
+        if _looks_like_database_path(con):
+            # pandas cannot open a plain file path itself; open the redirected database
+            database = resolve_database_path(con)
+            _record_database(database)
+            connection = _original_connect(database)
+            _track_tables(connection, database)
+            try:
+                return original(sql, connection, *args, **kwargs)
+            finally:
+                connection.close()
+        return original(sql, con, *args, **kwargs)
+    wrapper._eypor_wrapped = True
+    return wrapper
+
+
+def _patch_pandas(pandas_module):
+    for name in ("read_sql", "read_sql_query", "read_sql_table"):
+        original = getattr(pandas_module, name, None)
+        if original is not None and not getattr(original, "_eypor_wrapped", False):
+            setattr(pandas_module, name, _wrap_read_sql(original))
+
+
+def _append_to_manifest(manifest_path, seen, file):
+    """Append the absolute path of file to a manifest (once per file)"""
+    if manifest_path is None or isinstance(file, int):
+        return
+    try:
+        path = os.fspath(file)
+        if isinstance(path, bytes):
+            path = os.fsdecode(path)
+        path = os.path.abspath(path)
+    except TypeError:
+        return
+    if path in seen or path == manifest_path:
+        return
+    seen.add(path)
+    try:
+        with _original_open(manifest_path, "a", encoding="utf-8") as manifest:
+            manifest.write(path + "\n")
+    except OSError:
+        pass
+
+
+def _record_write(file):
+    _append_to_manifest(_manifest_path, _written_files, file)
+
+
+def _record_database(database):
+    if isinstance(database, str) and (database == ":memory:" or database.startswith("file:")):
+        return
+    _append_to_manifest(_database_manifest_path, _databases, database)
+
+
+def _record_read(file):
+    if _read_manifest_path is None or isinstance(file, int):
+        return
+    try:
+        path = os.path.abspath(os.fsdecode(os.fspath(file)))
+    except TypeError:
+        return
+    if path.startswith(_UNTRACKED_READ_PREFIXES):
+        return
+    _append_to_manifest(_read_manifest_path, _read_files, path)
+
+
+def _record_table_access(access, database_path, table):
+    entry = f"{access}\t{database_path}\t{table}"
+    if entry in _table_access:
+        return
+    _table_access.add(entry)
+    try:
+        with _original_open(_table_manifest_path, "a", encoding="utf-8") as manifest:
+            manifest.write(entry + "\n")
+    except OSError:
+        pass
+
+
+def _track_tables(connection, database):
+    """Install an authorizer recording which tables of the main database are read and written"""
+    if _table_manifest_path is None or not isinstance(database, (str, os.PathLike)):
+        return
+    path = os.fspath(database)
+    if isinstance(path, bytes) or path == ":memory:" or path.startswith("file:"):
+        return
+    path = os.path.abspath(path)
+
+    def authorizer(action, arg1, arg2, db_name, trigger):
+        # SQLite passes no database name for table-only reads such as COUNT(*)
+        if db_name in ("main", None):
+            if action == sqlite3.SQLITE_READ and arg1 and not arg1.startswith("sqlite_"):
+                _record_table_access("read", path, arg1)
+            elif action in _TABLE_WRITE_ACTIONS and arg1 and not arg1.startswith("sqlite_"):
+                _record_table_access("write", path, arg1)
+        elif action == sqlite3.SQLITE_ALTER_TABLE and arg1 == "main" and arg2:
+            _record_table_access("write", path, arg2)
+        return sqlite3.SQLITE_OK
+
+    try:
+        connection.set_authorizer(authorizer)
+    except Exception:
+        pass
+
+
+def _record_import(path):
+    # Installed packages outside sys.prefix (user site, system dist-packages) are not inputs
+    parts = os.path.normcase(os.path.abspath(path)).split(os.sep)
+    if "site-packages" in parts or "dist-packages" in parts:
+        return
+    _record_read(path)
+
+
+@functools.wraps(_original_exec_module)
+def _tracking_exec_module(self, module):
+    # The import system reads sources through io.open_code, not builtins.open
+    if _read_manifest_path is not None and isinstance(self.path, str):
+        _record_import(self.path)
+    return _original_exec_module(self, module)
+
+
+@functools.wraps(_original_open)
+def _tracking_open(file, mode="r", *args, **kwargs):
+    handle = _original_open(file, mode, *args, **kwargs)
+    if isinstance(mode, str) and any(c in mode for c in "wax+"):
+        if _manifest_path is not None:
+            _record_write(file)
+    elif _read_manifest_path is not None:
+        _record_read(file)
+    return handle
+
+
+@functools.wraps(_original_rename)
+def _tracking_rename(src, dst, *args, **kwargs):
+    _original_rename(src, dst, *args, **kwargs)
+    _record_write(dst)
+
+
+@functools.wraps(_original_replace)
+def _tracking_replace(src, dst, *args, **kwargs):
+    _original_replace(src, dst, *args, **kwargs)
+    _record_write(dst)
+
+
+class _PostImportFinder(importlib.abc.MetaPathFinder):
+    """Patches pandas right after it is imported, without importing it eagerly"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname != "pandas":
+            return None
+        # Let the regular finders locate pandas, then wrap its loader
+        sys.meta_path.remove(self)
+        try:
+            spec = importlib.util.find_spec(fullname)
+        finally:
+            sys.meta_path.insert(0, self)
+        if spec is None or spec.loader is None:
+            return spec
+
+        original_exec = spec.loader.exec_module
+
+        def exec_module(module):
+            original_exec(module)
+            _patch_pandas(module)
+
+        spec.loader.exec_module = exec_module
+        return spec
+
+
+def install():
+    """Install the hooks in this interpreter (idempotent)"""
+    if getattr(sqlite3, "_eypor_hooks_installed", False):
+        configure_from_env()
+        return
+    configure_from_env()
+    sqlite3.connect = _redirecting_connect
+    # SQLAlchemy and other DB-API users call sqlite3.dbapi2.connect
+    sqlite3.dbapi2.connect = _redirecting_connect
+    sqlite3._eypor_hooks_installed = True
+
+    # pathlib and most libraries go through io.open, which is builtins.open
+    builtins.open = _tracking_open
+    io.open = _tracking_open
+    os.rename = _tracking_rename
+    os.replace = _tracking_replace
+    importlib.machinery.SourceFileLoader.exec_module = _tracking_exec_module
+
+    if "pandas" in sys.modules:
+        _patch_pandas(sys.modules["pandas"])
+    else:
+        sys.meta_path.insert(0, _PostImportFinder())
@@ -0,0 +1,36 @@
+"""
+Interpreter start-up hook for scripts executed by the EYProject backend.
+
+The backend puts this directory on PYTHONPATH for every script, model and pool
+worker it starts, so Python imports this module automatically at start-up and
+installs the runtime hooks (see eypor_hooks.py). Any other sitecustomize that
+would have been imported is still executed afterwards.
+"""
+
+import os
+import sys
+import importlib.machinery
+import importlib.util
+
+try:
+    import eypor_hooks
+    eypor_hooks.install()
+except Exception as e:
+    print(f"Warning: could not install EYProject runtime hooks: {e}", file=sys.stderr)
+
+
+def _chain_next_sitecustomize():
+    """Run the sitecustomize this one shadows (e.g. a distribution's own)"""
+    here = os.path.normcase(os.path.dirname(os.path.abspath(__file__)))
+    search_path = [p for p in sys.path if os.path.normcase(os.path.abspath(p or os.curdir)) != here]
+    spec = importlib.machinery.PathFinder.find_spec("sitecustomize", search_path)
+    if spec is None or spec.loader is None:
+        return
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+
+try:
+    _chain_next_sitecustomize()
+except Exception as e:
+    print(f"Warning: error in chained sitecustomize: {e}", file=sys.stderr)
@@ -0,0 +1,403 @@
+"""
+Execution Result Cache for EYProject
+
+Re-running the same sql_query_*.py or comparison script against an unchanged
+scenario database produces the same stdout and the same HTML file. This module
+stores the result of successful script runs and serves them again without
+executing anything.
+
+Cache entries are keyed by:
+- the SHA-256 of the script
+- the interpreter (executable and version), working directory, arguments and
+  the EYPOR_* environment passed to the script (database redirects)
+
+Each entry also records a fingerprint (mtime_ns + size of the file and its WAL)
+of every database the script connected to, and the SHA-256 of every other file
+it read (CSV, Excel, JSON inputs and the local .py modules it imported), as
+reported by the runtime hooks. A lookup only hits if all of them are unchanged,
+so other scripts written next to this one do not affect its entry. Output artifacts are stored
+content-addressed (one blob per distinct file content) and restored into place
+on a hit. Entries are evicted least-recently-used once the cache exceeds its
+entry or size limit.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Any
+
+from execution_pool import ExecutionResult
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.getenv("EYPOR_EXECUTION_CACHE_DIR", os.path.join(BACKEND_DIR, "execution_cache"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("EYPOR_EXECUTION_CACHE_MAX_ENTRIES", "500"))
+DEFAULT_MAX_MB = int(os.getenv("EYPOR_EXECUTION_CACHE_MAX_MB", "256"))
+
+INDEX_FILE = "index.json"
+BLOB_DIR = "blobs"
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_hash(path: str) -> Optional[str]:
+    try:
+        return _sha256_file(path)
+    except OSError:
+        return None
+
+
+def database_fingerprint(path: str) -> Optional[List[int]]:
+    """mtime_ns and size of a SQLite database and its WAL file (None if missing)"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    fingerprint = [st.st_mtime_ns, st.st_size]
+    try:
+        wal = os.stat(path + "-wal")
+        fingerprint += [wal.st_mtime_ns, wal.st_size]
+    except OSError:
+        pass
+    return fingerprint
+
+
+@dataclass
+class CacheEntry:
+    """A stored execution result"""
+    key: str
+    script_path: str
+    stdout: str
+    stderr: str
+    return_code: int
+    # database path -> fingerprint at the time of the run
+    databases: Dict[str, Optional[List[int]]] = field(default_factory=dict)
+    # path of every other file the script read or imported -> SHA-256 at the time of the run
+    input_files: Dict[str, str] = field(default_factory=dict)
+    # path relative to the working directory -> blob hash
+    artifacts: Dict[str, str] = field(default_factory=dict)
+    size: int = 0
+    created_at: float = 0.0
+    last_used: float = 0.0
+    hits: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ExecutionCache:
+    """Content-addressed cache of successful script executions"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 enabled: Optional[bool] = None):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, BLOB_DIR)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        if enabled is None:
+            enabled = os.getenv("EYPOR_EXECUTION_CACHE", "1") != "0"
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bypassed": 0,
+            "invalidated": 0,
+            "evictions": 0,
+            "not_cacheable": 0,
+        }
+        self._load_index()
+
+    # ------------------------------------------------------------------ keys
+
+    def make_key(self, script_path: str, cwd: Optional[str] = None,
+                 env: Optional[Dict[str, str]] = None,
+                 args: Optional[List[str]] = None) -> Optional[str]:
+        """Key for a run, or None if the script cannot be read"""
+        script_path = os.path.abspath(script_path)
+        cwd = os.path.abspath(cwd or os.path.dirname(script_path))
+        # Local modules the script imports are validated per entry, like its other input files
+        script_hash = _file_hash(script_path)
+        if script_hash is None:
+            return None
+
+        material = {
+            "script": script_hash,
+            "script_path": script_path,
+            "cwd": cwd,
+            "args": list(args or []),
+            "env": {k: v for k, v in sorted((env or {}).items()) if k.startswith("EYPOR_")},
+            "python": [sys.executable, sys.version],
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # --------------------------------------------------------------- lookup
+
+    def lookup(self, script_path: str, cwd: Optional[str] = None,
+               env: Optional[Dict[str, str]] = None,
+               args: Optional[List[str]] = None,
+               bypass: bool = False) -> Optional[ExecutionResult]:
+        """Return the stored result for this run if it is still valid, restoring its artifacts"""
+        if not self.enabled or bypass:
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return None
+
+        key = self.make_key(script_path, cwd, env, args)
+        cwd = os.path.abspath(cwd or os.path.dirname(os.path.abspath(script_path)))
+        with self._lock:
+            entry = self._entries.get(key) if key else None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            changed = next((f"database changed: {db_path}" for db_path, fingerprint in entry.databases.items()
+                            if database_fingerprint(db_path) != fingerprint), None)
+            if changed is None:
+                changed = next((f"input file changed: {path}" for path, file_hash in entry.input_files.items()
+                                if _file_hash(path) != file_hash), None)
+            if changed is not None:
+                print(f"DEBUG: Execution cache entry invalidated, {changed}")
+                self._remove(key)
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                self._save_index()
+                return None
+
+            try:
+                written_files = self._restore_artifacts(entry, cwd)
+            except OSError as e:
+                print(f"DEBUG: Could not restore cached artifacts: {e}")
+                self._remove(key)
+                self.stats["misses"] += 1
+                self._save_index()
+                return None
+
+            entry.hits += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self._save_index()
+
+        print(f"DEBUG: Execution cache hit for {os.path.basename(script_path)}")
+        return ExecutionResult(
+            stdout=entry.stdout,
+            stderr=entry.stderr,
+            return_code=entry.return_code,
+            written_files=written_files,
+            databases=list(entry.databases),
+            cached=True,
+        )
+
+    def _restore_artifacts(self, entry: CacheEntry, cwd: str) -> List[str]:
+        restored = []
+        for rel_path, blob_hash in entry.artifacts.items():
+            target = os.path.join(cwd, rel_path)
+            blob = os.path.join(self.blob_dir, blob_hash)
+            if not (os.path.isfile(target) and _sha256_file(target) == blob_hash):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(blob, target)
+            restored.append(target)
+        return restored
+
+    # ---------------------------------------------------------------- store
+
+    def store(self, script_path: str, result: ExecutionResult,
+              started_at: float, cwd: Optional[str] = None,
+              env: Optional[Dict[str, str]] = None,
+              args: Optional[List[str]] = None) -> bool:
+        """
+        Store a finished run. started_at is the time.time() before the run started;
+        runs that changed a database they used (or whose databases changed
+        meanwhile) are not cached.
+        """
+        if not self.enabled or result.cached:
+            return False
+        if result.return_code != 0 or result.timed_out or result.cancelled:
+            return False
+
+        key = self.make_key(script_path, cwd, env, args)
+        cwd = os.path.abspath(cwd or os.path.dirname(os.path.abspath(script_path)))
+        if key is None:
+            return False
+
+        databases = {}
+        for db_path in result.databases:
+            fingerprint = database_fingerprint(db_path)
+            if fingerprint is not None and max(fingerprint[0::2]) >= int(started_at * 1e9):
+                print(f"DEBUG: Not caching {os.path.basename(script_path)}: {db_path} was modified during the run")
+                return self._not_cacheable()
+            databases[db_path] = fingerprint
+
+        # Databases are checked by fingerprint; their files (and journals) are not inputs
+        database_paths = {p + suffix for p in databases for suffix in ("", "-wal", "-shm", "-journal")}
+        input_files = {}
+        for path in result.read_files:
+            if path in database_paths or path in result.written_files or not os.path.isfile(path):
+                continue
+            try:
+                if os.stat(path).st_mtime_ns >= int(started_at * 1e9):
+                    print(f"DEBUG: Not caching {os.path.basename(script_path)}: {path} was modified during the run")
+                    return self._not_cacheable()
+                input_files[path] = _sha256_file(path)
+            except OSError:
+                return self._not_cacheable()
+
+        artifacts = {}
+        size = len(result.stdout.encode("utf-8")) + len(result.stderr.encode("utf-8"))
+        for path in result.written_files:
+            rel_path = os.path.relpath(path, cwd)
+            if rel_path.startswith("..") or os.path.isabs(rel_path):
+                # Cannot be restored relative to the working directory
+                return self._not_cacheable()
+            if not os.path.isfile(path):
+                continue
+            if path in databases:
+                return self._not_cacheable()
+            artifacts[rel_path] = path
+            size += os.path.getsize(path)
+        if size > self.max_bytes:
+            return self._not_cacheable()
+
+        with self._lock:
+            try:
+                os.makedirs(self.blob_dir, exist_ok=True)
+                for rel_path, path in list(artifacts.items()):
+                    blob_hash = _sha256_file(path)
+                    blob = os.path.join(self.blob_dir, blob_hash)
+                    if not os.path.exists(blob):
+                        tmp = f"{blob}.{threading.get_ident()}.tmp"
+                        shutil.copyfile(path, tmp)
+                        os.replace(tmp, blob)
+                    artifacts[rel_path] = blob_hash
+            except OSError as e:
+                print(f"DEBUG: Could not store execution cache artifacts: {e}")
+                return False
+
+            now = time.time()
+            self._entries[key] = CacheEntry(
+                key=key,
+                script_path=os.path.abspath(script_path),
+                stdout=result.stdout,
+                stderr=result.stderr,
+                return_code=result.return_code,
+                databases=databases,
+                input_files=input_files,
+                artifacts=artifacts,
+                size=size,
+                created_at=now,
+                last_used=now,
+            )
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            self._evict()
+            self._save_index()
+        return True
+
+    def _not_cacheable(self) -> bool:
+        with self._lock:
+            self.stats["not_cacheable"] += 1
+        return False
+
+    # ------------------------------------------------------------- eviction
+
+    def _total_bytes(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes() > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        in_use = {h for e in self._entries.values() for h in e.artifacts.values()}
+        for blob_hash in set(entry.artifacts.values()) - in_use:
+            try:
+                os.remove(os.path.join(self.blob_dir, blob_hash))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove all entries and stored artifacts"""
+        with self._lock:
+            self._entries.clear()
+            shutil.rmtree(self.blob_dir, ignore_errors=True)
+            self._save_index()
+
+    # ---------------------------------------------------------- persistence
+
+    def _load_index(self):
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entries = sorted((CacheEntry(**e) for e in data.get("entries", [])), key=lambda e: e.last_used)
+            for entry in entries:
+                self._entries[entry.key] = entry
+        except (OSError, ValueError, TypeError):
+            self._entries.clear()
+
+    def _save_index(self):
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{index_path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"entries": [e.to_dict() for e in self._entries.values()]}, f)
+            os.replace(tmp, index_path)
+        except OSError as e:
+            print(f"DEBUG: Could not save execution cache index: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Hit/miss counters and cache size"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes(),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                **self.stats,
+            }
+
+
+# Global cache instance
+execution_cache: Optional[ExecutionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_execution_cache() -> ExecutionCache:
+    """Get the global execution cache instance, creating it on first use"""
+    global execution_cache
+    with _cache_lock:
+        if execution_cache is None:
+            execution_cache = ExecutionCache()
+        return execution_cache
+
+
+def set_execution_cache(cache: Optional[ExecutionCache]):
+    """Set the global execution cache instance"""
+    global execution_cache
+    with _cache_lock:
+        execution_cache = cache
@@ -0,0 +1,716 @@
+"""
+Warm Execution Pool for EYProject
+
+This module manages a small pool of long-lived Python worker processes
+(see execution_worker.py) that already have pandas, numpy and plotly imported.
+Scripts executed through the pool run in a fresh __main__ namespace with their
+own working directory and stdout/stderr capture, so the small generated
+sql_query_*.py / visualization_*.py scripts no longer pay interpreter start-up
+and import cost on every run.
+
+Workers are recycled after a configurable number of jobs or when their resident
+memory grows past a limit. If the pool is disabled (EYPOR_EXECUTION_POOL=0), a
+worker cannot be started or every worker stays busy for EYPOR_POOL_ACQUIRE_TIMEOUT
+seconds, scripts fall back to a plain subprocess with the same result shape.
+
+Output is written straight to capture files on disk while a script runs. Only a
+bounded head and tail of each stream is read back into the ExecutionResult, so
+a chatty model cannot fill the backend's memory; the full log stays on disk.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Any
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_SCRIPT = os.path.join(BACKEND_DIR, "execution_worker.py")
+# Holds the sitecustomize.py that installs the runtime hooks in child interpreters
+RUNTIME_DIR = os.path.join(BACKEND_DIR, "exec_runtime")
+
+DEFAULT_POOL_SIZE = int(os.getenv("EYPOR_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+DEFAULT_MAX_JOBS_PER_WORKER = int(os.getenv("EYPOR_POOL_MAX_JOBS", "50"))
+DEFAULT_MAX_RSS_MB = int(os.getenv("EYPOR_POOL_MAX_RSS_MB", "1024"))
+# Seconds start() waits for a busy pool to free a worker before starting a cold subprocess
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv("EYPOR_POOL_ACQUIRE_TIMEOUT", "2"))
+WORKER_STARTUP_TIMEOUT = 120
+# How much of the start and end of each output stream is kept in memory
+OUTPUT_HEAD_BYTES = int(os.getenv("EYPOR_OUTPUT_HEAD_KB", "64")) * 1024
+OUTPUT_TAIL_BYTES = int(os.getenv("EYPOR_OUTPUT_TAIL_KB", "64")) * 1024
+
+
+@dataclass
+class ExecutionResult:
+    """Outcome of one script execution"""
+    stdout: str
+    stderr: str
+    return_code: int
+    timed_out: bool = False
+    cancelled: bool = False
+    duration_ms: int = 0
+    worker_pid: Optional[int] = None
+    pooled: bool = False
+    written_files: List[str] = field(default_factory=list)
+    databases: List[str] = field(default_factory=list)
+    # Files opened for reading and tables read/written, keyed by database path
+    read_files: List[str] = field(default_factory=list)
+    tables_read: Dict[str, List[str]] = field(default_factory=dict)
+    tables_written: Dict[str, List[str]] = field(default_factory=dict)
+    cached: bool = False
+    # Resource accounting (None where the platform cannot measure it)
+    cpu_user_ms: Optional[int] = None
+    cpu_system_ms: Optional[int] = None
+    peak_rss_kb: Optional[int] = None
+    output_bytes: int = 0
+    # Full size of each stream; stdout/stderr above hold only its head and tail
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+
+    @property
+    def returncode(self) -> int:
+        """Alias matching subprocess.CompletedProcess"""
+        return self.return_code
+
+    @property
+    def output_truncated(self) -> bool:
+        """True if stdout or stderr was too large to keep in full"""
+        return (self.stdout_bytes > len(self.stdout.encode("utf-8", errors="replace"))
+                or self.stderr_bytes > len(self.stderr.encode("utf-8", errors="replace")))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def resource_usage(self) -> Dict[str, Optional[int]]:
+        """Wall time, CPU time, peak RSS and output size of the run"""
+        return {
+            "execution_time_ms": self.duration_ms,
+            "cpu_user_ms": self.cpu_user_ms,
+            "cpu_system_ms": self.cpu_system_ms,
+            "peak_rss_kb": self.peak_rss_kb,
+            "output_bytes": self.output_bytes,
+        }
+
+
+def popen_group_kwargs() -> Dict[str, Any]:
+    """Popen arguments that put the child in its own process group"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def kill_process_tree(process: subprocess.Popen):
+    """Kill a process started with popen_group_kwargs() and all of its children"""
+    if process is None or process.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        else:
+            os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+    except Exception:
+        try:
+            process.kill()
+        except Exception:
+            pass
+
+
+def runtime_env(env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Environment for a child interpreter: os.environ + env, with the runtime hooks enabled"""
+    child_env = dict(os.environ)
+    child_env.update(env or {})
+    python_path = child_env.get("PYTHONPATH")
+    child_env["PYTHONPATH"] = RUNTIME_DIR + (os.pathsep + python_path if python_path else "")
+    child_env.setdefault("PYTHONIOENCODING", "utf-8")
+    return child_env
+
+
+# Logical database names that scripts use and that are redirected to a scenario's database
+DB_REDIRECTS_ENV = "EYPOR_DB_REDIRECTS"
+REDIRECTED_DATABASE_NAMES = ['database.db', 'project_data.db', 'original_upload.db', 'uploaded_files.db']
+
+
+def database_redirect_env(database_path: str) -> Dict[str, str]:
+    """Environment redirecting the logical database names to one scenario's database"""
+    target = os.path.abspath(database_path)
+    return {DB_REDIRECTS_ENV: json.dumps({name: target for name in REDIRECTED_DATABASE_NAMES})}
+
+
+def is_comparison_script(filename: str, abs_path: str) -> bool:
+    """Check if this is a comparison file (contains multiple database paths or comparison logic)"""
+    try:
+        with open(abs_path, 'r', encoding='utf-8') as f:
+            file_content = f.read()
+    except Exception as e:
+        print(f"Warning: Could not read file content: {e}")
+        file_content = ""
+    
+    return (
+        'comparison' in filename.lower() or
+        'vs_' in filename.lower() or
+        'scenario' in filename.lower() and ('vs' in filename.lower() or 'comparison' in filename.lower()) or
+        any(keyword in file_content.lower() for keyword in [
+            'base_scenario_db', 'test_scenario_db', 'alternative_scenario_db',
+            'scenario_names', 'multi_database', 'comparison_visualization',
+            'scenario_name', 'scenario_names', 'scenario_data'
+        ]) or
+        file_content.count('database.db') > 1 or  # Multiple database references
+        file_content.count('sqlite3.connect') > 1  # Multiple database connections
+    )
+
+
+def omission_marker(omitted: int) -> str:
+    return f"\n... [{omitted} bytes omitted] ...\n"
+
+
+def read_head_tail(path: str, head_bytes: int = OUTPUT_HEAD_BYTES,
+                   tail_bytes: int = OUTPUT_TAIL_BYTES):
+    """Return (text, total_bytes): the whole file if small, else its head and tail around a marker"""
+    try:
+        with open(path, "rb") as f:
+            total = os.fstat(f.fileno()).st_size
+            if total <= head_bytes + tail_bytes:
+                return f.read().decode("utf-8", errors="replace"), total
+            head = f.read(head_bytes)
+            f.seek(total - tail_bytes)
+            tail = f.read(tail_bytes)
+    except OSError:
+        return "", 0
+    text = (head.decode("utf-8", errors="replace")
+            + omission_marker(total - head_bytes - tail_bytes)
+            + tail.decode("utf-8", errors="replace"))
+    return text, total
+
+
+def truncate_middle(text: Optional[str], limit: int) -> Optional[str]:
+    """Keep the first and last limit/2 characters of text around an omission marker"""
+    if text is None or len(text) <= limit:
+        return text
+    half = limit // 2
+    omitted = len(text[half:len(text) - half].encode("utf-8", errors="replace"))
+    return text[:half] + omission_marker(omitted) + text[len(text) - half:]
+
+
+def _maxrss_kb(ru_maxrss: int) -> int:
+    # ru_maxrss is in bytes on macOS and KB on Linux
+    return ru_maxrss // 1024 if sys.platform == "darwin" else ru_maxrss
+
+
+def wait_with_rusage(process: subprocess.Popen, timeout: Optional[float] = None):
+    """
+    Wait for a child process and return (return_code, rusage).
+
+    Uses os.wait4 so the CPU time and peak RSS of exactly this child (and the
+    descendants it reaped) are available; rusage is None where wait4 does not
+    exist. Raises subprocess.TimeoutExpired like Popen.wait.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(timeout=timeout), None
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        if process.returncode is not None:
+            # Reaped elsewhere (e.g. Popen.poll); no usage available any more
+            return process.returncode, None
+        try:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        except ChildProcessError:
+            return process.wait(), None
+        if pid == process.pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return process.returncode, rusage
+        if deadline is not None and time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+def _read_manifest(path: str) -> List[str]:
+    """Files recorded by the runtime write hook, in first-write order"""
+    written = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line and line not in written:
+                    written.append(line)
+    except OSError:
+        pass
+    return written
+
+
+def _read_table_manifest(path: str):
+    """Tables recorded by the runtime sqlite3 authorizer: (read, written), keyed by database"""
+    access: Dict[str, Dict[str, List[str]]] = {"read": {}, "write": {}}
+    for line in _read_manifest(path):
+        parts = line.split("\t")
+        if len(parts) != 3 or parts[0] not in access:
+            continue
+        tables = access[parts[0]].setdefault(parts[1], [])
+        if parts[2] not in tables:
+            tables.append(parts[2])
+    return access["read"], access["write"]
+
+
+class _PoolWorker:
+    """One warm worker process and the thread that reads its replies"""
+
+    def __init__(self, env: Optional[Dict[str, str]] = None):
+        worker_env = runtime_env(env)
+        worker_env.setdefault("MPLBACKEND", "Agg")
+
+        self.process = subprocess.Popen(
+            [sys.executable, "-u", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            env=worker_env,
+            **popen_group_kwargs()
+        )
+        self.pid = self.process.pid
+        self.jobs_run = 0
+        self.rss_kb: Optional[int] = None
+        self.ready = False
+        self._replies: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+
+    def _read_replies(self):
+        try:
+            for line in self.process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._replies.put(json.loads(line))
+                except ValueError:
+                    continue
+        except Exception:
+            pass
+        # EOF: the worker exited (crash, os._exit, or killed)
+        self._replies.put(None)
+
+    def wait_ready(self, timeout: float = WORKER_STARTUP_TIMEOUT) -> bool:
+        if self.ready:
+            return True
+        try:
+            message = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if message and message.get("status") == "ready":
+            self.ready = True
+            self.rss_kb = message.get("rss_kb")
+        return self.ready
+
+    def send(self, message: Dict[str, Any]):
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+
+    def get_reply(self, timeout: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Next reply from the worker; raises queue.Empty on timeout"""
+        return self._replies.get(timeout=timeout)
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def stop(self):
+        if self.is_alive():
+            try:
+                self.send({"cmd": "exit"})
+                self.process.wait(timeout=5)
+            except Exception:
+                pass
+        kill_process_tree(self.process)
+
+
+class PoolExecution:
+    """Handle for a script started by WorkerPool.start()"""
+
+    def __init__(self, pool: "WorkerPool", job_id: str, capture_dir: str,
+                 worker: Optional[_PoolWorker] = None,
+                 process: Optional[subprocess.Popen] = None,
+                 keep_capture: bool = False):
+        self.pool = pool
+        self.job_id = job_id
+        self.capture_dir = capture_dir
+        self.keep_capture = keep_capture
+        self.stdout_path = os.path.join(capture_dir, "stdout.log")
+        self.stderr_path = os.path.join(capture_dir, "stderr.log")
+        self.manifest_path = os.path.join(capture_dir, "written_files.txt")
+        self.database_manifest_path = os.path.join(capture_dir, "databases.txt")
+        self.table_manifest_path = os.path.join(capture_dir, "tables.txt")
+        self.read_manifest_path = os.path.join(capture_dir, "read_files.txt")
+        self.worker = worker
+        self.process = process
+        self.start_time = time.time()
+        # When the caller asked for the run; time spent waiting for a worker counts against wait()'s timeout
+        self.requested_at = self.start_time
+        self.cancelled = False
+        self.result: Optional[ExecutionResult] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pid(self) -> Optional[int]:
+        if self.worker:
+            return self.worker.pid
+        return self.process.pid if self.process else None
+
+    def kill(self):
+        """Cancel the execution, killing its process group"""
+        self.cancelled = True
+        if self.worker:
+            # The worker is in the middle of a job; it cannot be reused
+            kill_process_tree(self.worker.process)
+        elif self.process:
+            kill_process_tree(self.process)
+
+    cancel = kill
+
+    def manifest_env(self) -> Dict[str, str]:
+        """Environment telling the runtime hooks where to record files, databases and tables"""
+        return {
+            "EYPOR_WRITE_MANIFEST": self.manifest_path,
+            "EYPOR_DATABASE_MANIFEST": self.database_manifest_path,
+            "EYPOR_TABLE_MANIFEST": self.table_manifest_path,
+            "EYPOR_READ_MANIFEST": self.read_manifest_path,
+        }
+
+    def wait(self, timeout: Optional[float] = None) -> ExecutionResult:
+        """
+        Block until the script finishes (or times out) and return its result. The
+        timeout runs from when start() was called, including any wait for a worker.
+        """
+        with self._lock:
+            if self.result is not None:
+                return self.result
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.time() - self.requested_at))
+
+            timed_out = False
+            return_code = -1
+            worker_pid = self.pid
+            usage: Dict[str, Optional[int]] = {}
+            if self.worker:
+                try:
+                    reply = self.worker.get_reply(timeout)
+                except queue.Empty:
+                    reply = None
+                    timed_out = True
+                    kill_process_tree(self.worker.process)
+
+                if reply and reply.get("status") == "done":
+                    return_code = reply.get("return_code", 1)
+                    self.worker.jobs_run += 1
+                    self.worker.rss_kb = reply.get("rss_kb")
+                    usage = {k: reply.get(k) for k in ("cpu_user_ms", "cpu_system_ms", "peak_rss_kb")}
+                    self.pool._release(self.worker)
+                else:
+                    if reply and reply.get("error"):
+                        with open(self.stderr_path, "a", encoding="utf-8") as f:
+                            f.write(f"\nWorker error: {reply['error']}\n")
+                    elif not timed_out and not self.cancelled:
+                        with open(self.stderr_path, "a", encoding="utf-8") as f:
+                            f.write("\nWorker process exited unexpectedly\n")
+                    self.pool._discard(self.worker)
+            else:
+                try:
+                    return_code, rusage = wait_with_rusage(self.process, timeout=timeout)
+                    if rusage is not None:
+                        usage = {
+                            "cpu_user_ms": int(rusage.ru_utime * 1000),
+                            "cpu_system_ms": int(rusage.ru_stime * 1000),
+                            "peak_rss_kb": _maxrss_kb(rusage.ru_maxrss),
+                        }
+                except subprocess.TimeoutExpired:
+                    timed_out = True
+                    kill_process_tree(self.process)
+                    self.process.wait()
+
+            if timed_out or self.cancelled:
+                return_code = -1
+
+            tables_read, tables_written = _read_table_manifest(self.table_manifest_path)
+            stdout, stdout_bytes = read_head_tail(self.stdout_path)
+            stderr, stderr_bytes = read_head_tail(self.stderr_path)
+            self.result = ExecutionResult(
+                stdout=stdout,
+                stderr=stderr,
+                stdout_bytes=stdout_bytes,
+                stderr_bytes=stderr_bytes,
+                return_code=return_code,
+                timed_out=timed_out,
+                cancelled=self.cancelled,
+                duration_ms=int((time.time() - self.start_time) * 1000),
+                worker_pid=worker_pid,
+                pooled=self.worker is not None,
+                written_files=_read_manifest(self.manifest_path),
+                databases=_read_manifest(self.database_manifest_path),
+                read_files=_read_manifest(self.read_manifest_path),
+                tables_read=tables_read,
+                tables_written=tables_written,
+                output_bytes=stdout_bytes + stderr_bytes,
+                **usage,
+            )
+            if not self.keep_capture:
+                shutil.rmtree(self.capture_dir, ignore_errors=True)
+            return self.result
+
+
+class WorkerPool:
+    """
+    Pool of warm Python worker processes.
+
+    Each worker runs one job at a time. start() hands a script to an idle
+    worker (spawning one if the pool is below its size, otherwise waiting for
+    one to become free) and returns a PoolExecution handle; run() is the
+    blocking convenience wrapper.
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE,
+                 max_jobs_per_worker: int = DEFAULT_MAX_JOBS_PER_WORKER,
+                 max_rss_mb: int = DEFAULT_MAX_RSS_MB,
+                 enabled: Optional[bool] = None,
+                 worker_env: Optional[Dict[str, str]] = None,
+                 acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT):
+        self.size = max(1, size)
+        self.acquire_timeout = acquire_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_rss_kb = max_rss_mb * 1024
+        if enabled is None:
+            enabled = os.getenv("EYPOR_EXECUTION_POOL", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.worker_env = worker_env or {}
+
+        self._idle: List[_PoolWorker] = []
+        self._busy: List[_PoolWorker] = []
+        self._condition = threading.Condition()
+        self._job_counter = 0
+        self.stats = {"pooled_jobs": 0, "subprocess_jobs": 0, "workers_started": 0, "workers_recycled": 0,
+                      "acquire_timeouts": 0}
+
+    # ------------------------------------------------------------------
+    # Worker bookkeeping
+    # ------------------------------------------------------------------
+
+    def _spawn(self) -> _PoolWorker:
+        worker = _PoolWorker(env=self.worker_env)
+        self.stats["workers_started"] += 1
+        return worker
+
+    def _acquire(self) -> Optional[_PoolWorker]:
+        """
+        Take an idle worker, starting a new one if there is room. Returns None if
+        no worker becomes free within acquire_timeout.
+        """
+        deadline = time.time() + self.acquire_timeout
+        with self._condition:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.is_alive():
+                        self._busy.append(worker)
+                        return worker
+                if len(self._busy) < self.size:
+                    try:
+                        worker = self._spawn()
+                    except Exception as e:
+                        print(f"DEBUG: Could not start pool worker: {e}")
+                        return None
+                    self._busy.append(worker)
+                    return worker
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.stats["acquire_timeouts"] += 1
+                    print(f"DEBUG: All {self.size} pool workers busy for {self.acquire_timeout}s, falling back to subprocess")
+                    return None
+                self._condition.wait(remaining)
+
+    def _release(self, worker: _PoolWorker):
+        """Return a worker to the pool, recycling it if it has done enough work"""
+        recycle = (
+            worker.jobs_run >= self.max_jobs_per_worker or
+            (worker.rss_kb is not None and worker.rss_kb > self.max_rss_kb) or
+            not worker.is_alive()
+        )
+        with self._condition:
+            if worker in self._busy:
+                self._busy.remove(worker)
+            if not recycle:
+                self._idle.append(worker)
+            self._condition.notify()
+        if recycle:
+            self.stats["workers_recycled"] += 1
+            print(f"DEBUG: Recycling pool worker {worker.pid} after {worker.jobs_run} jobs (rss={worker.rss_kb} KB)")
+            worker.stop()
+
+    def _discard(self, worker: _PoolWorker):
+        """Drop a worker that died or was killed mid-job"""
+        with self._condition:
+            if worker in self._busy:
+                self._busy.remove(worker)
+            self._condition.notify()
+        kill_process_tree(worker.process)
+
+    def warm_up(self, count: Optional[int] = None):
+        """Start workers ahead of the first job so that it does not pay the imports"""
+        if not self.enabled:
+            return
+        count = min(count or self.size, self.size)
+        with self._condition:
+            missing = count - len(self._idle) - len(self._busy)
+            for _ in range(max(0, missing)):
+                try:
+                    self._idle.append(self._spawn())
+                except Exception as e:
+                    print(f"DEBUG: Could not start pool worker: {e}")
+                    break
+
+    def shutdown(self):
+        with self._condition:
+            workers = self._idle + self._busy
+            self._idle = []
+            self._busy = []
+        for worker in workers:
+            worker.stop()
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "enabled": self.enabled,
+                "size": self.size,
+                "idle_workers": len(self._idle),
+                "busy_workers": len(self._busy),
+                "max_jobs_per_worker": self.max_jobs_per_worker,
+                "max_rss_mb": self.max_rss_kb // 1024,
+                **self.stats,
+            }
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def _next_job_id(self) -> str:
+        with self._condition:
+            self._job_counter += 1
+            return f"{os.getpid()}-{self._job_counter}"
+
+    def _new_capture(self, capture_dir: Optional[str]):
+        """Return (capture_dir, keep_capture) for a new execution"""
+        if capture_dir:
+            os.makedirs(capture_dir, exist_ok=True)
+            return capture_dir, True
+        return tempfile.mkdtemp(prefix="eypor_exec_"), False
+
+    def start(self, script_path: str, cwd: Optional[str] = None,
+              env: Optional[Dict[str, str]] = None,
+              args: Optional[List[str]] = None,
+              use_pool: bool = True,
+              capture_dir: Optional[str] = None) -> PoolExecution:
+        """
+        Start a script and return a handle to wait on or cancel.
+
+        stdout/stderr are written to stdout.log / stderr.log in capture_dir while
+        the script runs. A caller-supplied capture_dir is kept after the run;
+        otherwise a temporary one is created and removed once the result is read.
+        """
+        requested_at = time.time()
+        script_path = os.path.abspath(script_path)
+        cwd = cwd or os.path.dirname(script_path)
+
+        if self.enabled and use_pool:
+            worker = self._acquire()
+            if worker is not None and worker.wait_ready():
+                job_id = self._next_job_id()
+                capture_dir, keep_capture = self._new_capture(capture_dir)
+                execution = PoolExecution(self, job_id, capture_dir, worker=worker, keep_capture=keep_capture)
+                execution.requested_at = requested_at
+                try:
+                    worker.send({
+                        "job_id": job_id,
+                        "script_path": script_path,
+                        "cwd": cwd,
+                        "env": {**(env or {}), **execution.manifest_env()},
+                        "args": args or [],
+                        "stdout_path": execution.stdout_path,
+                        "stderr_path": execution.stderr_path,
+                    })
+                    self.stats["pooled_jobs"] += 1
+                    return execution
+                except Exception as e:
+                    print(f"DEBUG: Could not send job to pool worker {worker.pid}: {e}")
+                    self._discard(worker)
+            elif worker is not None:
+                print(f"DEBUG: Pool worker {worker.pid} did not become ready, falling back to subprocess")
+                self._discard(worker)
+
+        # Fallback: a plain subprocess with the same capture files
+        execution = self.start_command([sys.executable, script_path] + list(args or []),
+                                       cwd=cwd, env=env, capture_dir=capture_dir)
+        execution.requested_at = requested_at
+        return execution
+
+    def start_command(self, command, cwd: Optional[str] = None,
+                      env: Optional[Dict[str, str]] = None,
+                      shell: bool = False,
+                      capture_dir: Optional[str] = None) -> PoolExecution:
+        """Start an arbitrary command in its own process group (no warm worker)"""
+        job_id = self._next_job_id()
+        capture_dir, keep_capture = self._new_capture(capture_dir)
+        execution = PoolExecution(self, job_id, capture_dir, keep_capture=keep_capture)
+        process_env = runtime_env(env)
+        process_env.update(execution.manifest_env())
+        with open(execution.stdout_path, "wb") as out_file, open(execution.stderr_path, "wb") as err_file:
+            execution.process = subprocess.Popen(
+                command,
+                cwd=cwd,
+                stdout=out_file,
+                stderr=err_file,
+                env=process_env,
+                shell=shell,
+                **popen_group_kwargs()
+            )
+        self.stats["subprocess_jobs"] += 1
+        return execution
+
+    def run(self, script_path: str, cwd: Optional[str] = None,
+            timeout: Optional[float] = 120,
+            env: Optional[Dict[str, str]] = None,
+            args: Optional[List[str]] = None,
+            use_pool: bool = True) -> ExecutionResult:
+        """Run a script to completion"""
+        execution = self.start(script_path, cwd=cwd, env=env, args=args, use_pool=use_pool)
+        return execution.wait(timeout=timeout)
+
+
+# Global pool instance
+execution_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_execution_pool() -> WorkerPool:
+    """Get the global execution pool instance, creating it on first use"""
+    global execution_pool
+    with _pool_lock:
+        if execution_pool is None:
+            execution_pool = WorkerPool()
+        return execution_pool
+
+
+def set_execution_pool(pool: Optional[WorkerPool]):
+    """Set the global execution pool instance"""
+    global execution_pool
+    with _pool_lock:
+        execution_pool = pool
@@ -0,0 +1,292 @@
+"""
+Execution Worker for EYProject
+
+This module is the entry point of a warm worker process managed by
+execution_pool.WorkerPool. The worker imports the heavy analysis libraries once
+at start-up and then executes scripts sent by the parent process, one at a time,
+each in a fresh __main__ namespace with its own working directory and its own
+stdout/stderr capture files.
+
+The parent talks to the worker over a private copy of the original stdin/stdout
+pipes using one JSON message per line, so anything a script prints can never be
+confused with the protocol.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import runpy
+import sysconfig
+import traceback
+
+# Libraries that most generated and uploaded scripts import. Importing them here
+# once is what makes the pool worthwhile.
+DEFAULT_PRELOAD_MODULES = [
+    "sqlite3",
+    "json",
+    "numpy",
+    "pandas",
+    "plotly",
+    "plotly.express",
+    "plotly.graph_objects",
+    "plotly.io",
+]
+
+
+def _library_prefixes():
+    """Return path prefixes of the standard library and installed packages"""
+    prefixes = set()
+    for key in ("stdlib", "platstdlib", "purelib", "platlib"):
+        try:
+            path = sysconfig.get_paths().get(key)
+        except Exception:
+            path = None
+        if path:
+            prefixes.add(os.path.normcase(os.path.abspath(path)))
+    return tuple(prefixes)
+
+
+LIBRARY_PREFIXES = _library_prefixes()
+
+
+def current_rss_kb():
+    """Return the current resident set size of this process in KB (or None)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except Exception:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss // 1024
+    except Exception:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and KB on Linux
+        return peak // 1024 if sys.platform == "darwin" else peak
+    except Exception:
+        return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (VmHWM) for this process; Linux only"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except Exception:
+        return False
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in KB (or None)"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except Exception:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+    except Exception:
+        return None
+
+
+def _cpu_seconds():
+    """User and system CPU seconds of this process plus its reaped children"""
+    try:
+        # Microsecond resolution, unlike the clock ticks of os.times()
+        import resource
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return own.ru_utime + children.ru_utime, own.ru_stime + children.ru_stime
+    except ImportError:
+        times = os.times()
+        return times.user + times.children_user, times.system + times.children_system
+
+
+def _is_library_module(module):
+    """True for built-in, standard library and site-packages modules"""
+    module_file = getattr(module, "__file__", None)
+    if not module_file:
+        return True
+    module_file = os.path.normcase(os.path.abspath(module_file))
+    return module_file.startswith(LIBRARY_PREFIXES)
+
+
+def _preload(modules):
+    """Import the preload modules, ignoring the ones that are not installed"""
+    loaded = []
+    for name in modules:
+        try:
+            __import__(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+def _reset_interpreter_state(baseline_modules):
+    """Drop per-job state so the next job starts from a clean slate"""
+    # Local modules (e.g. an uploaded dataprocessing.py) must be re-imported by
+    # the next job, otherwise it would see a stale copy. Library modules stay
+    # loaded - that is the whole point of the warm worker.
+    for name in list(sys.modules):
+        if name in baseline_modules:
+            continue
+        module = sys.modules.get(name)
+        if module is None or not _is_library_module(module):
+            sys.modules.pop(name, None)
+
+    if "matplotlib.pyplot" in sys.modules:
+        try:
+            sys.modules["matplotlib.pyplot"].close("all")
+        except Exception:
+            pass
+
+    gc.collect()
+
+
+def _configure_runtime_hooks():
+    """Re-read hook settings (e.g. database redirects) from os.environ"""
+    hooks = sys.modules.get("eypor_hooks")
+    if hooks is not None:
+        hooks.configure_from_env()
+
+
+def run_job(job, baseline_modules):
+    """Execute one script and return the protocol reply for it"""
+    script_path = os.path.abspath(job["script_path"])
+    cwd = job.get("cwd") or os.path.dirname(script_path)
+    start_time = time.time()
+    # Per-job accounting: CPU time is a delta, the peak RSS counter is reset
+    start_user, start_system = _cpu_seconds()
+    reset_peak_rss()
+
+    saved_cwd = os.getcwd()
+    saved_path = list(sys.path)
+    saved_argv = list(sys.argv)
+    saved_environ = dict(os.environ)
+    saved_streams = (sys.stdout, sys.stderr)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout_fd = os.dup(1)
+    saved_stderr_fd = os.dup(2)
+
+    return_code = 0
+    with open(job["stdout_path"], "wb") as out_file, open(job["stderr_path"], "wb") as err_file:
+        os.dup2(out_file.fileno(), 1)
+        os.dup2(err_file.fileno(), 2)
+        try:
+            os.environ.update(job.get("env") or {})
+            _configure_runtime_hooks()
+            os.chdir(cwd)
+            # Same sys.path[0] semantics as "python script.py"
+            sys.path.insert(0, os.path.dirname(script_path))
+            sys.argv = [script_path] + list(job.get("args") or [])
+            runpy.run_path(script_path, run_name="__main__")
+        except SystemExit as e:
+            if e.code is None:
+                return_code = 0
+            elif isinstance(e.code, int):
+                return_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                return_code = 1
+        except BaseException:
+            traceback.print_exc()
+            return_code = 1
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            except Exception:
+                pass
+            # Scripts sometimes re-wrap sys.stdout (e.g. to force UTF-8)
+            sys.stdout, sys.stderr = saved_streams
+            os.dup2(saved_stdout_fd, 1)
+            os.dup2(saved_stderr_fd, 2)
+            os.close(saved_stdout_fd)
+            os.close(saved_stderr_fd)
+
+            os.chdir(saved_cwd)
+            sys.path[:] = saved_path
+            sys.argv = saved_argv
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            end_user, end_system = _cpu_seconds()
+            job_peak_rss_kb = peak_rss_kb()
+            _configure_runtime_hooks()
+            _reset_interpreter_state(baseline_modules)
+
+    return {
+        "status": "done",
+        "job_id": job.get("job_id"),
+        "return_code": return_code,
+        "duration_ms": int((time.time() - start_time) * 1000),
+        "rss_kb": current_rss_kb(),
+        "cpu_user_ms": int((end_user - start_user) * 1000),
+        "cpu_system_ms": int((end_system - start_system) * 1000),
+        "peak_rss_kb": job_peak_rss_kb,
+    }
+
+
+def main():
+    # Keep private copies of the protocol pipes and point the standard streams
+    # somewhere harmless between jobs.
+    protocol_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    protocol_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull_fd = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull_fd, 0)
+    os.dup2(devnull_fd, 1)
+    os.close(devnull_fd)
+
+    # Generated scripts print emoji; never let the console encoding break them
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.reconfigure(encoding="utf-8", errors="replace")
+        except Exception:
+            pass
+
+    def send(message):
+        protocol_out.write(json.dumps(message) + "\n")
+        protocol_out.flush()
+
+    preload = os.environ.get("EYPOR_WORKER_PRELOAD")
+    modules = preload.split(",") if preload else DEFAULT_PRELOAD_MODULES
+    loaded = _preload([m.strip() for m in modules if m.strip()])
+    baseline_modules = set(sys.modules)
+
+    send({"status": "ready", "pid": os.getpid(), "preloaded": loaded, "rss_kb": current_rss_kb()})
+
+    for line in protocol_in:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError:
+            send({"status": "error", "error": "invalid job message"})
+            continue
+
+        if job.get("cmd") == "exit":
+            break
+
+        try:
+            reply = run_job(job, baseline_modules)
+        except Exception as e:
+            reply = {"status": "error", "job_id": job.get("job_id"), "error": str(e)}
+        send(reply)
+
+
+if __name__ == "__main__":
+    main()
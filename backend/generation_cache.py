@@ -0,0 +1,288 @@
+"""
+LLM Generation Cache for EYProject
+
+Analysts ask near-identical questions ("show top 10 hubs by demand") again and
+again, across sessions and scenarios. Every one of them used to cost a full LLM
+call in the agent's SQL query and visualization handlers. This module stores the
+generated script code and reuses it for the same request.
+
+Entries are keyed by:
+- the normalized request text (case, whitespace, quotes and trailing
+  punctuation do not matter) and the request type
+- the model id that generated the code
+- a fingerprint of the database schema (table names, column names and types).
+  Row counts and sample values are not part of it, so an entry applies to every
+  scenario with the same schema
+- the database file name the script connects to
+
+Code is only stored after it executed successfully, and an entry whose code
+fails on a later run is removed. Entries expire after a TTL and the least
+recently used ones are evicted beyond a maximum count. Entries live in a small
+SQLite database so hit counts survive restarts.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DB = os.getenv("EYPOR_GENERATION_CACHE_DB", os.path.join(BACKEND_DIR, "generation_cache.db"))
+DEFAULT_TTL_HOURS = float(os.getenv("EYPOR_GENERATION_CACHE_TTL_HOURS", "168"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("EYPOR_GENERATION_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize_request(text: str) -> str:
+    """Canonical form of a request: lower case, unified quotes and whitespace, no trailing punctuation"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"[\"'`‘’“”]", "", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip().rstrip("?!.;: ").strip()
+
+
+def schema_fingerprint(schema_info: Optional[Dict[str, Any]]) -> str:
+    """SHA-256 of the table and column names and types of a schema (no data)"""
+    tables = (schema_info or {}).get("tables") or {}
+    if isinstance(tables, list):
+        # main.get_database_info shape: [{"name", "columns", ...}]
+        tables = {t.get("name"): t for t in tables}
+    material = sorted(
+        (name, [(c.get("name"), (c.get("type") or "").upper()) for c in info.get("columns", [])])
+        for name, info in tables.items()
+    )
+    return hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class GenerationEntry:
+    """Generated code stored for one request"""
+    key: str
+    request_type: str
+    normalized_request: str
+    model_id: str
+    schema_fingerprint: str
+    code: str
+    explanation: str
+    created_at: float
+    last_used: float
+    hits: int = 0
+
+    def to_dict(self, include_code: bool = True) -> Dict[str, Any]:
+        data = asdict(self)
+        if not include_code:
+            data.pop("code")
+        return data
+
+
+class GenerationCache:
+    """Persistent cache of LLM-generated scripts"""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_DB,
+                 ttl_seconds: float = DEFAULT_TTL_HOURS * 3600,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 enabled: Optional[bool] = None):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        if enabled is None:
+            enabled = os.getenv("EYPOR_GENERATION_CACHE", "1") != "0"
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0, "invalidated": 0}
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_database(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS generations (
+                    key TEXT PRIMARY KEY,
+                    request_type TEXT NOT NULL,
+                    normalized_request TEXT NOT NULL,
+                    model_id TEXT NOT NULL,
+                    schema_fingerprint TEXT NOT NULL,
+                    code TEXT NOT NULL,
+                    explanation TEXT,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_generations_last_used ON generations(last_used)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(request_type: str, request: str, model_id: str, schema_fp: str,
+                 database_name: Optional[str] = None) -> str:
+        material = [request_type, normalize_request(request), model_id, schema_fp, database_name or ""]
+        return hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _row_to_entry(row) -> GenerationEntry:
+        return GenerationEntry(*row)
+
+    def lookup(self, key: str) -> Optional[GenerationEntry]:
+        """Return the entry for key (counting the hit) unless missing, expired or disabled"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute('SELECT * FROM generations WHERE key = ?', (key,)).fetchone()
+                if row is not None and now - row[7] > self.ttl_seconds:
+                    conn.execute('DELETE FROM generations WHERE key = ?', (key,))
+                    conn.commit()
+                    self.stats["expired"] += 1
+                    row = None
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                conn.execute('UPDATE generations SET hits = hits + 1, last_used = ? WHERE key = ?', (now, key))
+                conn.commit()
+                self.stats["hits"] += 1
+            finally:
+                conn.close()
+        entry = self._row_to_entry(row)
+        entry.hits += 1
+        entry.last_used = now
+        return entry
+
+    def store(self, key: str, request_type: str, request: str, model_id: str, schema_fp: str,
+              code: str, explanation: str = "") -> bool:
+        if not self.enabled or not code.strip():
+            return False
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    INSERT OR REPLACE INTO generations
+                    (key, request_type, normalized_request, model_id, schema_fingerprint, code, explanation,
+                     created_at, last_used, hits)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                ''', (key, request_type, normalize_request(request), model_id, schema_fp, code,
+                      explanation or "", now, now))
+                count = conn.execute('SELECT COUNT(*) FROM generations').fetchone()[0]
+                if count > self.max_entries:
+                    # Least recently used first
+                    conn.execute('''
+                        DELETE FROM generations WHERE key IN
+                        (SELECT key FROM generations ORDER BY last_used ASC LIMIT ?)
+                    ''', (count - self.max_entries,))
+                    self.stats["evictions"] += count - self.max_entries
+                conn.commit()
+                self.stats["stores"] += 1
+            finally:
+                conn.close()
+        return True
+
+    def invalidate(self, key: str) -> bool:
+        """Remove one entry (e.g. because its code failed); True if it existed"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                deleted = conn.execute('DELETE FROM generations WHERE key = ?', (key,)).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+            if deleted:
+                self.stats["invalidated"] += 1
+        return bool(deleted)
+
+    def purge(self, request_type: Optional[str] = None, model_id: Optional[str] = None,
+              expired_only: bool = False) -> int:
+        """Remove all entries matching the filters; returns the number removed"""
+        query = 'DELETE FROM generations WHERE 1 = 1'
+        params: List[Any] = []
+        if request_type:
+            query += ' AND request_type = ?'
+            params.append(request_type)
+        if model_id:
+            query += ' AND model_id = ?'
+            params.append(model_id)
+        if expired_only:
+            query += ' AND created_at < ?'
+            params.append(time.time() - self.ttl_seconds)
+        with self._lock:
+            conn = self._connect()
+            try:
+                deleted = conn.execute(query, params).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+        return deleted
+
+    def list_entries(self, limit: int = 100, request_type: Optional[str] = None) -> List[GenerationEntry]:
+        """Most recently used entries first"""
+        query = 'SELECT * FROM generations'
+        params: List[Any] = []
+        if request_type:
+            query += ' WHERE request_type = ?'
+            params.append(request_type)
+        query += ' ORDER BY last_used DESC LIMIT ?'
+        params.append(limit)
+        conn = self._connect()
+        try:
+            return [self._row_to_entry(row) for row in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+
+    def get_entry(self, key: str) -> Optional[GenerationEntry]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM generations WHERE key = ?', (key,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_entry(row) if row else None
+
+    def get_status(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            entries, total_hits = conn.execute('SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM generations').fetchone()
+        finally:
+            conn.close()
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "total_entry_hits": total_hits,
+                "max_entries": self.max_entries,
+                "ttl_hours": round(self.ttl_seconds / 3600, 2),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                **self.stats,
+            }
+
+
+# Global cache instance
+generation_cache: Optional[GenerationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    """Get the global generation cache instance, creating it on first use"""
+    global generation_cache
+    with _cache_lock:
+        if generation_cache is None:
+            generation_cache = GenerationCache()
+        return generation_cache
+
+
+def set_generation_cache(cache: Optional[GenerationCache]):
+    """Set the global generation cache instance"""
+    global generation_cache
+    with _cache_lock:
+        generation_cache = cache
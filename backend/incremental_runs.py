@@ -0,0 +1,431 @@
+"""
+Incremental Model Runs for EYProject
+
+After a small edit to one input table users re-run the whole model, even if the
+model never reads that table. This module remembers, for every model and
+working directory, what the last successful run depended on and lets the
+execution layer skip a re-run whose inputs are unchanged:
+
+- the tables the model read and wrote in each SQLite database, as recorded by
+  the sqlite3 authorizer the runtime hooks install on every connection
+- a content fingerprint of each of those tables (schema and rows)
+- the files the model opened for reading and the files it wrote
+- the SHA-256 of the model file and of the local .py modules it imported
+
+Tables the model both reads and writes count as outputs. A run is skipped when
+the model code, every input table and input file, and every output table and
+output file still match the recorded run; its stored stdout is then returned
+as the result. Otherwise the decision names what changed.
+
+Fingerprints are taken after the run finishes, so they are checked against the
+state at job start: check() fingerprints the input tables of the previous
+record before the run, and input files and databases the model only read must
+not have been modified after that. A run whose inputs were edited while it was
+running (by a concurrent job or a chat edit) is not recorded. Tables read for
+the first time in a database the model also writes have no start fingerprint;
+such a record is kept unverified and never skipped, and the next run - whose
+start fingerprints it provides - records a verified one.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Any
+
+from execution_pool import ExecutionResult
+from execution_cache import _sha256_file, database_fingerprint
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STATE_DIR = os.getenv("EYPOR_MODEL_RUN_STATE_DIR", os.path.join(BACKEND_DIR, "model_run_state"))
+
+REASON_UNCHANGED = "all inputs unchanged"
+
+
+def table_fingerprint(conn: sqlite3.Connection, table: str) -> Optional[str]:
+    """SHA-256 of a table's schema and rows (None if the table does not exist)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    digest = hashlib.sha256((row[0] or "").encode("utf-8"))
+    cursor.execute(f'SELECT * FROM "{table}"')
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            break
+        digest.update(repr(rows).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def table_fingerprints(db_path: str, tables: List[str]) -> Dict[str, Optional[str]]:
+    """Fingerprints of the given tables of a database (all None if it cannot be opened)"""
+    if not os.path.exists(db_path):
+        return {table: None for table in tables}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        fingerprints = {}
+        for table in tables:
+            try:
+                fingerprints[table] = table_fingerprint(conn, table)
+            except sqlite3.Error:
+                fingerprints[table] = None
+        return fingerprints
+    finally:
+        conn.close()
+
+
+def _file_hash(path: str) -> Optional[str]:
+    try:
+        return _sha256_file(path)
+    except OSError:
+        return None
+
+
+@dataclass
+class ModelRunRecord:
+    """What the last successful run of a model depended on and produced"""
+    slot: str
+    model_path: str
+    code_hash: str
+    # path of every local module the model imported -> SHA-256
+    modules: Dict[str, Optional[str]] = field(default_factory=dict)
+    # database path -> {table: fingerprint}
+    input_tables: Dict[str, Dict[str, Optional[str]]] = field(default_factory=dict)
+    output_tables: Dict[str, Dict[str, Optional[str]]] = field(default_factory=dict)
+    # database path -> file fingerprint when the table fingerprints were taken
+    database_files: Dict[str, Optional[List[int]]] = field(default_factory=dict)
+    # path -> SHA-256
+    input_files: Dict[str, Optional[str]] = field(default_factory=dict)
+    output_files: Dict[str, Optional[str]] = field(default_factory=dict)
+    stdout: str = ""
+    stderr: str = ""
+    duration_ms: int = 0
+    # Caller-provided summary of the run (e.g. output tables and files for the UI)
+    outputs: Dict[str, Any] = field(default_factory=dict)
+    recorded_at: float = 0.0
+    # False if some input table had no fingerprint from before the run
+    verified: bool = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def to_result(self) -> ExecutionResult:
+        """The recorded run as an execution result, marked as cached"""
+        return ExecutionResult(
+            stdout=self.stdout,
+            stderr=self.stderr,
+            return_code=0,
+            written_files=list(self.output_files),
+            databases=list(self.database_files),
+            read_files=list(self.input_files) + list(self.modules),
+            tables_read={db: list(tables) for db, tables in self.input_tables.items()},
+            tables_written={db: list(tables) for db, tables in self.output_tables.items()},
+            cached=True,
+        )
+
+
+@dataclass
+class RunBaseline:
+    """Input state taken by check() right before a run, verified by record()"""
+    started_at: float
+    # database path -> {table: fingerprint} for the tables the previous run read
+    input_tables: Dict[str, Dict[str, Optional[str]]] = field(default_factory=dict)
+
+
+@dataclass
+class RerunDecision:
+    """Whether a model has to run again, and why"""
+    skip: bool
+    reason: str
+    changed_tables: List[str] = field(default_factory=list)
+    changed_files: List[str] = field(default_factory=list)
+    record: Optional[ModelRunRecord] = None
+    # Set when the model has to run; pass it to record() after the run
+    baseline: Optional[RunBaseline] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "skipped": self.skip,
+            "reason": self.reason,
+            "changed_tables": self.changed_tables,
+            "changed_files": self.changed_files,
+        }
+
+
+class IncrementalRunTracker:
+    """Records model runs and decides whether a re-run can be skipped"""
+
+    def __init__(self, state_dir: str = DEFAULT_STATE_DIR):
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self.stats = {"skipped": 0, "executed": 0, "recorded": 0, "not_recordable": 0}
+
+    # ------------------------------------------------------------------ keys
+
+    @staticmethod
+    def slot_key(model_path: str, cwd: Optional[str] = None,
+                 env: Optional[Dict[str, str]] = None,
+                 args: Optional[List[str]] = None) -> str:
+        """Identity of a model run independent of the model's code"""
+        model_path = os.path.abspath(model_path)
+        material = {
+            "model_path": model_path,
+            "cwd": os.path.abspath(cwd or os.path.dirname(model_path)),
+            "args": list(args or []),
+            "env": {k: v for k, v in sorted((env or {}).items()) if k.startswith("EYPOR_")},
+            "python": sys.executable,
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def code_hash(model_path: str) -> Optional[str]:
+        """SHA-256 of the model file (imported modules are recorded per run)"""
+        return _file_hash(os.path.abspath(model_path))
+
+    # --------------------------------------------------------------- checks
+
+    def check(self, model_path: str, cwd: Optional[str] = None,
+              env: Optional[Dict[str, str]] = None,
+              args: Optional[List[str]] = None,
+              force: bool = False) -> RerunDecision:
+        """Decide whether the model must run again for this working directory and environment"""
+        record = self._load(self.slot_key(model_path, cwd, env, args))
+        decision = self._decide(model_path, record, force)
+        if not decision.skip:
+            decision.baseline = self._baseline(record)
+        with self._lock:
+            self.stats["skipped" if decision.skip else "executed"] += 1
+        print(f"DEBUG: Incremental run check for {os.path.basename(model_path)}: "
+              f"{'skip' if decision.skip else 'run'} ({decision.reason})")
+        return decision
+
+    def _decide(self, model_path, record, force) -> RerunDecision:
+        if force:
+            return RerunDecision(False, "re-run forced", record=record)
+        if record is None:
+            return RerunDecision(False, "no previous successful run with recorded inputs")
+        if self.code_hash(model_path) != record.code_hash or \
+                any(_file_hash(p) != h for p, h in record.modules.items()):
+            return RerunDecision(False, "model code changed", record=record)
+        if not record.verified:
+            return RerunDecision(False, "inputs of the previous run were not fingerprinted before it started",
+                                 record=record)
+
+        qualify = len(set(record.input_tables) | set(record.output_tables)) > 1
+        changed_inputs = self._changed_tables(record, record.input_tables, qualify)
+        changed_outputs = self._changed_tables(record, record.output_tables, qualify)
+        changed_input_files = [p for p, h in record.input_files.items() if _file_hash(p) != h]
+        changed_output_files = [p for p, h in record.output_files.items() if _file_hash(p) != h]
+
+        reasons = []
+        if changed_inputs:
+            reasons.append("input tables changed: " + ", ".join(changed_inputs))
+        if changed_input_files:
+            reasons.append("input files changed: " + ", ".join(os.path.basename(p) for p in changed_input_files))
+        if changed_outputs:
+            reasons.append("output tables changed: " + ", ".join(changed_outputs))
+        if changed_output_files:
+            reasons.append("output files changed: " + ", ".join(os.path.basename(p) for p in changed_output_files))
+        if reasons:
+            return RerunDecision(False, "; ".join(reasons),
+                                 changed_tables=changed_inputs + changed_outputs,
+                                 changed_files=changed_input_files + changed_output_files,
+                                 record=record)
+        return RerunDecision(True, REASON_UNCHANGED, record=record)
+
+    def _changed_tables(self, record: ModelRunRecord, tables_by_db: Dict[str, Dict[str, Optional[str]]],
+                        qualify: bool) -> List[str]:
+        changed = []
+        current = self._current_tables(record, tables_by_db)
+        for db_path, recorded in tables_by_db.items():
+            for table, fingerprint in recorded.items():
+                if current[db_path].get(table) != fingerprint:
+                    changed.append(f"{os.path.basename(db_path)}:{table}" if qualify else table)
+        return changed
+
+    @staticmethod
+    def _current_tables(record: ModelRunRecord, tables_by_db: Dict[str, Dict[str, Optional[str]]]
+                        ) -> Dict[str, Dict[str, Optional[str]]]:
+        current = {}
+        for db_path, recorded in tables_by_db.items():
+            # Untouched database file: the recorded fingerprints still hold
+            if record.database_files.get(db_path) is not None and \
+                    database_fingerprint(db_path) == record.database_files[db_path]:
+                current[db_path] = dict(recorded)
+            else:
+                current[db_path] = table_fingerprints(db_path, list(recorded))
+        return current
+
+    def _baseline(self, record: Optional[ModelRunRecord]) -> RunBaseline:
+        started_at = time.time()
+        input_tables = self._current_tables(record, record.input_tables) if record else {}
+        return RunBaseline(started_at=started_at, input_tables=input_tables)
+
+    # ------------------------------------------------------------- recording
+
+    def record(self, model_path: str, result: ExecutionResult, cwd: Optional[str] = None,
+               env: Optional[Dict[str, str]] = None, args: Optional[List[str]] = None,
+               outputs: Optional[Dict[str, Any]] = None,
+               baseline: Optional[RunBaseline] = None) -> bool:
+        """
+        Remember what a finished run read and wrote. baseline is the one from
+        the check() made before the run; without it the record is unverified.
+        Only successful runs whose table reads were observed and whose inputs
+        did not change during the run are recorded; any other run forgets the
+        previous record so the next run executes.
+        """
+        slot = self.slot_key(model_path, cwd, env, args)
+        code_hash = self.code_hash(model_path)
+        if result.return_code != 0 or result.timed_out or result.cancelled or result.cached \
+                or not result.tables_read or code_hash is None:
+            if not result.cached:
+                self._not_recordable(slot)
+            return False
+
+        started_ns = int(baseline.started_at * 1e9) if baseline else None
+        verified = baseline is not None
+        input_tables, output_tables, database_files = {}, {}, {}
+        for db_path in set(result.tables_read) | set(result.tables_written):
+            written = result.tables_written.get(db_path, [])
+            read = [t for t in result.tables_read.get(db_path, []) if t not in written]
+            database_files[db_path] = database_fingerprint(db_path)
+            fingerprints = table_fingerprints(db_path, read + written)
+            if read:
+                input_tables[db_path] = {t: fingerprints[t] for t in read}
+            if written:
+                output_tables[db_path] = {t: fingerprints[t] for t in written}
+            if baseline is None:
+                continue
+            start = baseline.input_tables.get(db_path, {})
+            for table in read:
+                if table in start:
+                    if start[table] != fingerprints[table]:
+                        return self._not_recordable(slot, f"{table} changed during the run")
+                elif written:
+                    verified = False
+                elif database_files[db_path] is not None and max(database_files[db_path][0::2]) >= started_ns:
+                    return self._not_recordable(slot, f"{db_path} was modified during the run")
+
+        # Databases are tracked per table; their files (and journals) are not inputs
+        database_paths = {p + suffix for p in database_files for suffix in ("", "-wal", "-shm", "-journal")}
+        output_files = {p: _file_hash(p) for p in result.written_files
+                        if p not in database_paths and os.path.isfile(p)}
+        model_path = os.path.abspath(model_path)
+        input_files, modules = {}, {}
+        for path in result.read_files:
+            if path in database_paths or path in output_files or path == model_path or not os.path.isfile(path):
+                continue
+            try:
+                if started_ns is not None and os.stat(path).st_mtime_ns >= started_ns:
+                    return self._not_recordable(slot, f"{path} was modified during the run")
+            except OSError:
+                return self._not_recordable(slot)
+            (modules if path.endswith(".py") else input_files)[path] = _file_hash(path)
+
+        record = ModelRunRecord(
+            slot=slot,
+            model_path=model_path,
+            code_hash=code_hash,
+            modules=modules,
+            input_tables=input_tables,
+            output_tables=output_tables,
+            database_files=database_files,
+            input_files=input_files,
+            output_files=output_files,
+            stdout=result.stdout,
+            stderr=result.stderr,
+            duration_ms=result.duration_ms,
+            outputs=outputs or {},
+            recorded_at=time.time(),
+            verified=verified,
+        )
+        self._save(record)
+        with self._lock:
+            self.stats["recorded"] += 1
+        return True
+
+    def _not_recordable(self, slot: str, reason: Optional[str] = None) -> bool:
+        if reason:
+            print(f"DEBUG: Not recording model run: {reason}")
+        self.forget(slot)
+        with self._lock:
+            self.stats["not_recordable"] += 1
+        return False
+
+    def forget(self, slot: str):
+        try:
+            os.remove(self._path(slot))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Forget every recorded run"""
+        with self._lock:
+            try:
+                names = os.listdir(self.state_dir)
+            except OSError:
+                return
+            for name in names:
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.state_dir, name))
+                    except OSError:
+                        pass
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            try:
+                records = sum(1 for name in os.listdir(self.state_dir) if name.endswith(".json"))
+            except OSError:
+                records = 0
+            return {"records": records, **self.stats}
+
+    # ---------------------------------------------------------- persistence
+
+    def _path(self, slot: str) -> str:
+        return os.path.join(self.state_dir, f"{slot}.json")
+
+    def _load(self, slot: str) -> Optional[ModelRunRecord]:
+        try:
+            with open(self._path(slot), "r", encoding="utf-8") as f:
+                return ModelRunRecord(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save(self, record: ModelRunRecord):
+        path = self._path(record.slot)
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(record.to_dict(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"DEBUG: Could not save model run record: {e}")
+
+
+# Global tracker instance
+run_tracker: Optional[IncrementalRunTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_run_tracker() -> IncrementalRunTracker:
+    """Get the global incremental run tracker, creating it on first use"""
+    global run_tracker
+    with _tracker_lock:
+        if run_tracker is None:
+            run_tracker = IncrementalRunTracker()
+        return run_tracker
+
+
+def set_run_tracker(tracker: Optional[IncrementalRunTracker]):
+    """Set the global incremental run tracker"""
+    global run_tracker
+    with _tracker_lock:
+        run_tracker = tracker
@@ -0,0 +1,711 @@
+"""
+Execution Job Management for EYProject
+
+This module provides a small job subsystem for script and model executions.
+Submitting work returns a Job immediately; the execution itself runs on a
+background thread so the FastAPI event loop keeps serving other requests while
+long runall.py-style models run for minutes.
+
+Each job writes its stdout/stderr to log files under job_logs/<job_id>/ while it
+runs, so clients can poll its status or stream output incrementally (see
+JobManager.stream_events for the Server-Sent Events format). When the job
+finishes its logs are gzip-compressed in place (stdout.log.gz); JobManager.read_log
+serves byte ranges of either form. Compressed logs are written as one gzip member
+per LOG_SEEK_INTERVAL bytes of output, and the job keeps the offset of each member,
+so a range read decompresses at most one member before its start instead of the
+whole log up to it. Results, return codes and detected output
+files are stored on the job; job.stdout/stderr only hold the bounded head and
+tail of the output reported by the runner.
+
+Finished jobs are written to a small index (job_logs/<job_id>/job.json), so
+get_job and the log readers still find a job after a restart or after it was
+pruned from memory. Logs of jobs marked with retain_logs (those referenced from
+execution_history) survive pruning; sweep_logs removes the log directories no
+history row points at any more.
+
+JobManager is also the execution scheduler: jobs wait in a priority queue
+(FIFO within the same priority) and are started as long as the global,
+per-scenario and (optional) per-group concurrency limits allow. Groups are used
+by batch executions to cap how many of their jobs run at once. Jobs can be cancelled by id; running
+jobs are killed together with their whole process group.
+"""
+
+import os
+import gzip
+import json
+import uuid
+import heapq
+import shutil
+import dataclasses
+import asyncio
+import threading
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Callable, AsyncIterator, BinaryIO, Tuple
+
+# Job status values
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_TIMED_OUT = "timed_out"
+
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED, JOB_TIMED_OUT)
+
+DEFAULT_MAX_CONCURRENT_JOBS = int(os.getenv("EYPOR_MAX_CONCURRENT_JOBS", str(os.cpu_count() or 1)))
+DEFAULT_MAX_JOBS_PER_SCENARIO = int(os.getenv("EYPOR_MAX_JOBS_PER_SCENARIO", "2"))
+COMPRESS_JOB_LOGS = os.getenv("EYPOR_COMPRESS_JOB_LOGS", "1") != "0"
+LOG_STREAMS = ("stdout", "stderr")
+STREAM_CHUNK_BYTES = 1024 * 1024
+# Uncompressed bytes per gzip member of a compressed log (see Job.log_seek_points)
+LOG_SEEK_INTERVAL = 4 * 1024 * 1024
+JOB_INDEX_FILE = "job.json"
+
+
+@dataclass
+class Job:
+    """Represents one script or model execution"""
+    id: str
+    kind: str
+    command: str
+    log_dir: str
+    scenario_id: Optional[int] = None
+    priority: int = 0
+    group: Optional[str] = None
+    status: str = JOB_QUEUED
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    return_code: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+    output_files: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    result: Dict[str, Any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    # Uncompressed size of each finished log
+    log_bytes: Dict[str, int] = field(default_factory=dict)
+    # (uncompressed offset, compressed offset) of each gzip member of a compressed log
+    log_seek_points: Dict[str, List[Tuple[int, int]]] = field(default_factory=dict)
+    # Set for jobs referenced from execution_history; their logs survive pruning
+    logs_retained: bool = False
+
+    def __post_init__(self):
+        self.execution = None
+        self.cancel_requested = False
+        self.done_event = threading.Event()
+
+    @property
+    def stdout_path(self) -> str:
+        return os.path.join(self.log_dir, "stdout.log")
+
+    @property
+    def stderr_path(self) -> str:
+        return os.path.join(self.log_dir, "stderr.log")
+
+    def log_path(self, stream: str) -> str:
+        """Current path of a log: the plain file while running, the .gz once compressed"""
+        path = self.stdout_path if stream == "stdout" else self.stderr_path
+        if not os.path.exists(path) and os.path.exists(path + ".gz"):
+            return path + ".gz"
+        return path
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def attach(self, execution):
+        """Register the running execution handle (see execution_pool.PoolExecution)"""
+        self.execution = execution
+        if self.cancel_requested:
+            # Cancelled between being scheduled and starting its process
+            execution.kill()
+
+    def to_dict(self, include_output: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "command": self.command,
+            "scenario_id": self.scenario_id,
+            "priority": self.priority,
+            "group": self.group,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "return_code": self.return_code,
+            "output_files": self.output_files,
+            "error": self.error,
+            "metadata": self.metadata,
+            "log_bytes": self.log_bytes,
+        }
+        if include_output:
+            data["stdout"] = self.stdout
+            data["stderr"] = self.stderr
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Schedules executions as background jobs and keeps their state and logs.
+
+    A runner is a callable taking the Job. It is expected to start its process
+    with capture_dir=job.log_dir, call job.attach(execution), wait for it and
+    return a result dict containing at least stdout, stderr and return_code
+    (and optionally output_files, timed_out, cancelled).
+    """
+
+    def __init__(self, log_root: str, max_jobs_retained: int = 200,
+                 max_concurrent: int = DEFAULT_MAX_CONCURRENT_JOBS,
+                 max_per_scenario: int = DEFAULT_MAX_JOBS_PER_SCENARIO):
+        self.log_root = log_root
+        self.max_jobs_retained = max_jobs_retained
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_scenario = max(1, max_per_scenario)
+        os.makedirs(self.log_root, exist_ok=True)
+        self._jobs: Dict[str, Job] = {}
+        self._runners: Dict[str, Callable[[Job], Dict[str, Any]]] = {}
+        self._queue: List[Any] = []  # heap of (-priority, sequence, job_id)
+        self._sequence = 0
+        self._running: Dict[str, Job] = {}
+        self._group_limits: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.stats = {"submitted": 0, JOB_COMPLETED: 0, JOB_FAILED: 0, JOB_CANCELLED: 0, JOB_TIMED_OUT: 0}
+
+    # ------------------------------------------------------------------
+    # Submission and scheduling
+    # ------------------------------------------------------------------
+
+    def submit(self, runner: Callable[[Job], Dict[str, Any]], command: str,
+               kind: str = "script", scenario_id: Optional[int] = None,
+               metadata: Optional[Dict[str, Any]] = None,
+               priority: int = 0, group: Optional[str] = None) -> Job:
+        """Queue a job; it starts as soon as the concurrency limits allow"""
+        job_id = uuid.uuid4().hex[:12]
+        log_dir = os.path.join(self.log_root, job_id)
+        os.makedirs(log_dir, exist_ok=True)
+
+        job = Job(
+            id=job_id,
+            kind=kind,
+            command=command,
+            log_dir=log_dir,
+            scenario_id=scenario_id,
+            priority=priority,
+            group=group,
+            metadata=metadata or {},
+        )
+        with self._lock:
+            self._jobs[job_id] = job
+            self._runners[job_id] = runner
+            self._sequence += 1
+            heapq.heappush(self._queue, (-priority, self._sequence, job_id))
+            self.stats["submitted"] += 1
+            self._prune_finished_jobs()
+            self._dispatch()
+        return job
+
+    def adopt(self, capture_dir: str, command: str, kind: str = "script",
+              scenario_id: Optional[int] = None, return_code: Optional[int] = None,
+              timed_out: bool = False) -> Optional[Job]:
+        """
+        Register an execution that ran outside the scheduler (e.g. one started by
+        the agent) as a finished job, taking over its capture directory as the
+        job's logs. Its logs are retained, as it is only adopted to be referenced
+        from execution history.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        log_dir = os.path.join(self.log_root, job_id)
+        try:
+            shutil.move(capture_dir, log_dir)
+        except OSError as e:
+            print(f"DEBUG: Could not adopt execution logs from {capture_dir}: {e}")
+            return None
+
+        if timed_out:
+            status = JOB_TIMED_OUT
+        else:
+            status = JOB_COMPLETED if return_code == 0 else JOB_FAILED
+        now = datetime.now().isoformat()
+        job = Job(
+            id=job_id,
+            kind=kind,
+            command=command,
+            log_dir=log_dir,
+            scenario_id=scenario_id,
+            status=status,
+            started_at=now,
+            finished_at=now,
+            return_code=return_code,
+            logs_retained=True,
+        )
+        self._finish_logs(job)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune_finished_jobs()
+        self._save_index(job)
+        job.done_event.set()
+        return job
+
+    def configure(self, max_concurrent: Optional[int] = None, max_per_scenario: Optional[int] = None):
+        """Change the concurrency limits; queued jobs are re-evaluated immediately"""
+        with self._lock:
+            if max_concurrent is not None:
+                self.max_concurrent = max(1, max_concurrent)
+            if max_per_scenario is not None:
+                self.max_per_scenario = max(1, max_per_scenario)
+            self._dispatch()
+
+    def set_group_limit(self, group: str, max_concurrent: Optional[int]):
+        """Cap the number of running jobs of a group (None removes the cap)"""
+        with self._lock:
+            if max_concurrent is None:
+                self._group_limits.pop(group, None)
+            else:
+                self._group_limits[group] = max(1, max_concurrent)
+            self._dispatch()
+
+    def _running_for_scenario(self, scenario_id: Optional[int]) -> int:
+        return sum(1 for j in self._running.values() if j.scenario_id == scenario_id)
+
+    def _running_for_group(self, group: str) -> int:
+        return sum(1 for j in self._running.values() if j.group == group)
+
+    def _can_start(self, job: Job) -> bool:
+        if job.scenario_id is not None and self._running_for_scenario(job.scenario_id) >= self.max_per_scenario:
+            return False
+        group_limit = self._group_limits.get(job.group) if job.group else None
+        if group_limit is not None and self._running_for_group(job.group) >= group_limit:
+            return False
+        return True
+
+    def _dispatch(self):
+        """Start queued jobs in priority order while there is capacity (lock held)"""
+        if len(self._running) >= self.max_concurrent or not self._queue:
+            return
+
+        deferred = []
+        while self._queue and len(self._running) < self.max_concurrent:
+            entry = heapq.heappop(self._queue)
+            job = self._jobs.get(entry[2])
+            if job is None or job.status != JOB_QUEUED:
+                continue
+            if not self._can_start(job):
+                # Scenario or group is at its limit; let other jobs go first
+                deferred.append(entry)
+                continue
+            self._start(job)
+
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+    def _start(self, job: Job):
+        job.status = JOB_RUNNING
+        job.started_at = datetime.now().isoformat()
+        self._running[job.id] = job
+        runner = self._runners.pop(job.id)
+        thread = threading.Thread(target=self._run_job, args=(job, runner), daemon=True,
+                                  name=f"job-{job.id}")
+        thread.start()
+
+    def _run_job(self, job: Job, runner: Callable[[Job], Dict[str, Any]]):
+        print(f"DEBUG: Job {job.id} started: {job.command}")
+        result: Dict[str, Any] = {}
+        error = None
+        try:
+            result = runner(job) or {}
+        except Exception as e:
+            print(f"DEBUG: Job {job.id} raised an exception: {e}")
+            error = str(e)
+        finally:
+            self._finish_logs(job)
+            # Output, artifacts and final status are published together, so a
+            # reader never sees a finished job without its output files
+            with self._lock:
+                if error is None:
+                    job.result = {k: v for k, v in result.items() if k not in ("stdout", "stderr")}
+                    job.stdout = result.get("stdout", "") or ""
+                    job.stderr = result.get("stderr", "") or ""
+                    job.return_code = result.get("return_code")
+                    job.output_files = result.get("output_files", []) or []
+                    job.error = result.get("error")
+
+                    if result.get("cancelled") or job.cancel_requested:
+                        job.status = JOB_CANCELLED
+                    elif result.get("timed_out"):
+                        job.status = JOB_TIMED_OUT
+                    elif job.return_code == 0 and not job.error:
+                        job.status = JOB_COMPLETED
+                    else:
+                        job.status = JOB_FAILED
+                else:
+                    job.error = error
+                    job.status = JOB_CANCELLED if job.cancel_requested else JOB_FAILED
+                job.finished_at = datetime.now().isoformat()
+                self._running.pop(job.id, None)
+                self.stats[job.status] = self.stats.get(job.status, 0) + 1
+                self._dispatch()
+            self._save_index(job)
+            job.done_event.set()
+            print(f"DEBUG: Job {job.id} finished with status {job.status}")
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; running jobs have their process group killed"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return job
+            job.cancel_requested = True
+            if job.status == JOB_QUEUED:
+                # Never started: drop it from the queue (lazily skipped by _dispatch)
+                self._runners.pop(job.id, None)
+                job.status = JOB_CANCELLED
+                job.finished_at = datetime.now().isoformat()
+                self.stats[JOB_CANCELLED] += 1
+                job.done_event.set()
+                return job
+            execution = job.execution
+
+        print(f"DEBUG: Cancelling running job {job.id}")
+        if execution is not None:
+            execution.kill()
+        return job
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, running jobs and per-scenario load"""
+        with self._lock:
+            queued = [self._jobs[e[2]] for e in self._queue
+                      if e[2] in self._jobs and self._jobs[e[2]].status == JOB_QUEUED]
+            running = list(self._running.values())
+
+            per_scenario: Dict[str, Dict[str, int]] = {}
+            for job in running + queued:
+                key = str(job.scenario_id)
+                entry = per_scenario.setdefault(key, {"running": 0, "queued": 0})
+                entry["running" if job.status == JOB_RUNNING else "queued"] += 1
+
+            return {
+                "queue_depth": len(queued),
+                "running_jobs": len(running),
+                "max_concurrent": self.max_concurrent,
+                "max_per_scenario": self.max_per_scenario,
+                "running": [j.to_dict(include_output=False) for j in running],
+                "per_scenario": per_scenario,
+                "totals": dict(self.stats),
+            }
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """A job by id, including finished jobs only known from their index on disk"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load_index(job_id)
+
+    def list_jobs(self, scenario_id: Optional[int] = None, status: Optional[str] = None,
+                  limit: int = 50) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if scenario_id is not None:
+            jobs = [j for j in jobs if j.scenario_id == scenario_id]
+        if status:
+            jobs = [j for j in jobs if j.status == status]
+        jobs.sort(key=lambda j: j.created_at, reverse=True)
+        return jobs[:limit]
+
+    async def wait_for(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """Wait for a job without blocking the event loop"""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        await asyncio.to_thread(job.done_event.wait, timeout)
+        return job
+
+    def _prune_finished_jobs(self):
+        """
+        Forget the oldest finished jobs beyond the retention limit. Their logs
+        are removed too, unless a history row refers to them (see retain_logs).
+        """
+        if len(self._jobs) <= self.max_jobs_retained:
+            return
+        finished = sorted(
+            (j for j in self._jobs.values() if j.is_finished),
+            key=lambda j: j.created_at,
+        )
+        for job in finished[:len(self._jobs) - self.max_jobs_retained]:
+            self._jobs.pop(job.id, None)
+            if not job.logs_retained:
+                shutil.rmtree(job.log_dir, ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Log retention
+    # ------------------------------------------------------------------
+
+    def retain_logs(self, job_id: str):
+        """Keep a job's logs beyond in-memory pruning (its history row points at them)"""
+        job = self.get_job(job_id)
+        if job is None or job.logs_retained:
+            return
+        job.logs_retained = True
+        if job.is_finished:
+            self._save_index(job)
+
+    def sweep_logs(self, referenced_job_ids) -> int:
+        """
+        Remove the log directories of jobs that are neither known to this manager
+        nor in referenced_job_ids (the log_job_id values of execution_history).
+        Run on start-up; returns the number of directories removed.
+        """
+        referenced = set(referenced_job_ids)
+        with self._lock:
+            referenced.update(self._jobs)
+        try:
+            names = os.listdir(self.log_root)
+        except OSError:
+            return 0
+        removed = 0
+        for name in names:
+            path = os.path.join(self.log_root, name)
+            if name in referenced or not os.path.isdir(path):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        if removed:
+            print(f"DEBUG: Removed {removed} job log directories not referenced by execution history")
+        return removed
+
+    def _index_path(self, job_id: str) -> Optional[str]:
+        # Job ids are generated hex strings; anything else never names a log directory
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        return os.path.join(self.log_root, job_id, JOB_INDEX_FILE)
+
+    def _save_index(self, job: Job):
+        path = self._index_path(job.id)
+        if path is None or not os.path.isdir(job.log_dir):
+            return
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dataclasses.asdict(job), f, default=str)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"DEBUG: Could not save index of job {job.id}: {e}")
+
+    def _load_index(self, job_id: str) -> Optional[Job]:
+        path = self._index_path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["log_dir"] = os.path.dirname(path)
+            data["log_seek_points"] = {stream: [tuple(p) for p in points]
+                                       for stream, points in data.get("log_seek_points", {}).items()}
+            job = Job(**data)
+        except (OSError, ValueError, TypeError):
+            return None
+        job.done_event.set()
+        return job
+
+    # ------------------------------------------------------------------
+    # Output streaming
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _finish_logs(job: Job):
+        """Record the size of each log and replace it with a gzip-compressed copy made of seekable members"""
+        for stream in LOG_STREAMS:
+            path = job.stdout_path if stream == "stdout" else job.stderr_path
+            try:
+                job.log_bytes[stream] = os.path.getsize(path)
+            except OSError:
+                continue
+            if not COMPRESS_JOB_LOGS:
+                continue
+            tmp = path + ".gz.tmp"
+            seek_points = []
+            try:
+                with open(path, "rb") as src, open(tmp, "wb") as dst:
+                    while True:
+                        block = src.read(LOG_SEEK_INTERVAL)
+                        if not block and seek_points:
+                            break
+                        seek_points.append((src.tell() - len(block), dst.tell()))
+                        dst.write(gzip.compress(block, compresslevel=6))
+                        if not block:
+                            break
+                os.replace(tmp, path + ".gz")
+                job.log_seek_points[stream] = seek_points
+                # Readers fall back to the .gz as soon as the plain file is gone
+                os.remove(path)
+            except OSError as e:
+                print(f"DEBUG: Could not compress {stream} log of job {job.id}: {e}")
+
+    @staticmethod
+    def log_size(job: Job, stream: str = "stdout") -> int:
+        """Uncompressed size of a job's log so far"""
+        if stream in job.log_bytes:
+            return job.log_bytes[stream]
+        try:
+            return os.path.getsize(job.stdout_path if stream == "stdout" else job.stderr_path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _open_log(job: Job, stream: str, offset: int) -> BinaryIO:
+        """
+        Open a job's log positioned at an uncompressed offset. A compressed log is
+        entered at the last gzip member starting at or before offset.
+        """
+        path = job.log_path(stream)
+        if not path.endswith(".gz"):
+            f = open(path, "rb")
+            f.seek(offset)
+            return f
+        member_offset, compressed_offset = 0, 0
+        for point in job.log_seek_points.get(stream, ()):
+            if point[0] > offset:
+                break
+            member_offset, compressed_offset = point
+        raw = open(path, "rb")
+        try:
+            raw.seek(compressed_offset)
+            f = _MemberReader(raw, member_offset)
+            f.seek(offset - member_offset)
+            return f
+        except Exception:
+            raw.close()
+            raise
+
+    @staticmethod
+    def read_log(job: Job, stream: str = "stdout", offset: int = 0,
+                 length: Optional[int] = None) -> bytes:
+        """Read raw (uncompressed) bytes of a job's stdout/stderr log starting at offset"""
+        try:
+            with JobManager._open_log(job, stream, offset) as f:
+                return f.read() if length is None else f.read(length)
+        except (OSError, EOFError):
+            return b""
+
+    def _read_stream_chunk(self, job: Job, stream: str, offset: int, open_logs: Dict[str, "_MemberReader"]) -> bytes:
+        """
+        Next chunk of a log for stream_events. A compressed log stays open between
+        calls and is read sequentially; it is only reopened (at the nearest seek
+        point) when the reader has to step back over an incomplete character.
+        """
+        if not job.log_path(stream).endswith(".gz"):
+            return self.read_log(job, stream, offset, STREAM_CHUNK_BYTES)
+        try:
+            f = open_logs.get(stream)
+            if f is None or f.log_offset() != offset:
+                if f is not None:
+                    f.close()
+                f = open_logs[stream] = self._open_log(job, stream, offset)
+            return f.read(STREAM_CHUNK_BYTES)
+        except (OSError, EOFError):
+            return b""
+
+    async def stream_events(self, job_id: str, poll_interval: float = 0.25) -> AsyncIterator[str]:
+        """
+        Yield Server-Sent Events for a job.
+
+        Events: "status" (job summary), "stdout"/"stderr" (new output text) and a
+        final "done" event carrying the full job result.
+        """
+        job = self.get_job(job_id)
+        if job is None:
+            yield _sse("error", {"error": f"Job '{job_id}' not found"})
+            return
+
+        offsets = {"stdout": 0, "stderr": 0}
+        open_logs: Dict[str, _MemberReader] = {}
+        last_status = None
+        try:
+            while True:
+                finished = job.is_finished
+                if job.status != last_status:
+                    last_status = job.status
+                    yield _sse("status", job.to_dict(include_output=False))
+
+                for stream in LOG_STREAMS:
+                    # Bounded reads, so a huge log is sent in pieces rather than loaded at once
+                    while True:
+                        chunk = self._read_stream_chunk(job, stream, offsets[stream], open_logs)
+                        if not chunk:
+                            break
+                        # Only emit complete UTF-8 sequences; keep the rest for later
+                        last = len(chunk) < STREAM_CHUNK_BYTES
+                        text, consumed = _decode_complete(chunk, final=finished and last)
+                        offsets[stream] += consumed
+                        if text:
+                            yield _sse(stream, {"text": text})
+                        if last or not consumed:
+                            break
+
+                if finished:
+                    yield _sse("done", job.to_dict())
+                    return
+                await asyncio.sleep(poll_interval)
+        finally:
+            for f in open_logs.values():
+                f.close()
+
+
+class _MemberReader(gzip.GzipFile):
+    """
+    GzipFile reading a compressed log from the gzip member the raw file is
+    positioned at (member_offset uncompressed bytes into the log). Closes the raw
+    file with it. Seek forward only: a backward seek would rewind the raw file to
+    the first member.
+    """
+
+    def __init__(self, raw: BinaryIO, member_offset: int = 0):
+        super().__init__(fileobj=raw, mode="rb")
+        self._raw = raw
+        self.member_offset = member_offset
+
+    def log_offset(self) -> int:
+        """Uncompressed offset in the whole log"""
+        return self.member_offset + self.tell()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+
+def _decode_complete(chunk: bytes, final: bool = False):
+    """Decode as much of chunk as forms complete UTF-8 characters"""
+    if final:
+        return chunk.decode("utf-8", errors="replace"), len(chunk)
+    for cut in range(len(chunk), max(len(chunk) - 4, -1), -1):
+        try:
+            return chunk[:cut].decode("utf-8"), cut
+        except UnicodeDecodeError:
+            continue
+    return chunk.decode("utf-8", errors="replace"), len(chunk)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Global job manager instance
+job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> Optional[JobManager]:
+    """Get the global job manager instance"""
+    return job_manager
+
+
+def set_job_manager(manager: JobManager):
+    """Set the global job manager instance"""
+    global job_manager
+    job_manager = manager
@@ -11,7 +11,9 @@ This is a redesigned agent that addresses the following issues:
 """
 
 import os
-import sys
+import asyncio
+import shutil
+import threading
 import sqlite3
 import time
 import random
@@ -23,17 +25,33 @@ import hashlib
 import tempfile
 import subprocess
 import traceback
-from typing import Dict, List, Any, Optional, Tuple, Literal, TYPE_CHECKING
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, Literal, TYPE_CHECKING
 from datetime import datetime
 from dataclasses import dataclass
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.callbacks.manager import dispatch_custom_event
 from typing_extensions import Annotated, TypedDict
 
 # Import scenario management
-from scenario_manager import ScenarioManager
+from scenario_manager import ScenarioManager, HISTORY_OUTPUT_LIMIT
+from job_manager import get_job_manager
+from execution_pool import get_execution_pool, database_redirect_env, is_comparison_script
+from execution_cache import get_execution_cache
+from schema_cache import get_schema_cache
+from generation_cache import get_generation_cache, schema_fingerprint
+from request_classifier import get_classifier_service
+from schema_retrieval import get_schema_retriever, full_schema_context
+from sql_validation import get_sql_validator, format_issues, SqlIssue
+from analysis_templates import get_template_registry
+from agent_metrics import get_agent_metrics, current_timings, record_node, record_tag, RequestTimings, TimingCallbackHandler
+from agent_pool import get_llm_client_pool, request_model, LLMClientPool
+from request_planner import get_request_planner, RequestPlan
+from direct_query import get_direct_query_runner, extract_sql
+from scenario_index import get_scenario_index_cache, ScenarioNameIndex
 
 # Type hints for pandas (avoid circular imports)
 if TYPE_CHECKING:
@@ -151,6 +169,8 @@ class AgentState(TypedDict):
     comparison_data: Dict[str, Any]  # aggregated data from multiple scenarios
     comparison_type: str  # type of comparison ('table', 'chart', 'analysis')
     scenario_name_mapping: Dict[str, int]  # map scenario names to IDs
+    request_plan: Optional[Dict[str, Any]] = None  # RequestPlan of the planner call, if one was made
+    scenario_extraction: Optional[Dict[str, Any]] = None  # How the comparison scenarios were found (path, confidences)
     
     # Edit mode specific fields
     edit_mode: bool = False
@@ -162,6 +182,20 @@ class AgentState(TypedDict):
     query_file_mappings: Dict[str, List[str]] = {}  # query_id -> [file_paths]
     current_query_context: Optional[Dict[str, Any]] = None
     
+    # Generation cache entry of the generated script (stored once it executed successfully)
+    generation_cache_entry: Optional[Dict[str, Any]] = None
+    
+    # Dispatch script stdout lines as "execution_output" events (streaming runs)
+    stream_execution_output: bool = False
+    
+    # SQL errors of generated code that could not be fixed (the code is not executed)
+    sql_validation_error: str = ""
+    
+    # Direct-answer mode: sql_query requests become one SELECT run in-process
+    direct_answer: bool = False
+    direct_query: Optional[Dict[str, Any]] = None  # sql, validation error and generation cache entry
+    query_result: Optional[Dict[str, Any]] = None  # QueryResult.to_dict() of the executed query
+    
     def is_valid(self) -> bool:
         """Check if state is valid and usable"""
         return (
@@ -175,67 +209,299 @@ class AgentState(TypedDict):
         )
 
 
+# File name prefix and response label of generated scripts per request type
+GENERATED_SCRIPT_KINDS = {
+    "sql_query": ("sql_query", "📊 Generated SQL query script"),
+    "visualization": ("visualization", "📈 Generated visualization script"),
+}
+
+# LLM retries for generated code whose SQL does not prepare against the database
+SQL_FIX_ATTEMPTS = int(os.getenv("EYPOR_SQL_FIX_ATTEMPTS", "2"))
+
+# Lowest match confidence of every scenario for extracting comparison scenarios without the LLM
+SCENARIO_MATCH_CONFIDENCE = int(os.getenv("EYPOR_SCENARIO_MATCH_CONFIDENCE", "80"))
+
+# How comparison scenarios were extracted, as reported in the response
+SCENARIO_EXTRACTION_PATHS = {
+    "deterministic": "matched in the request, no LLM call",
+    "request_plan": "from the request plan",
+    "planner": "planned by the LLM",
+    "llm": "extracted by the LLM",
+}
+
+
+# Request tag set once the agent has written the execution_history row of a script run
+EXECUTION_RECORDED_TAG = "execution_history"
+
+
 class SimplifiedAgent:
     """Simplified agent with proper scenario database routing"""
     
-    def __init__(self, ai_model: str = "openai", scenario_manager: ScenarioManager = None):
+    def __init__(self, ai_model: str = "openai", scenario_manager: ScenarioManager = None,
+                 llm_pool: Optional[LLMClientPool] = None):
         self.ai_model = ai_model
         self.scenario_manager = scenario_manager
-        self.llm = None  # Initialize lazily
+        self.llm_pool = llm_pool
+        self.llm = None  # Set explicitly to override the pooled clients
         
         # Build the workflow graph
         self.workflow = self._build_graph()
         self.graph = self.workflow.compile()
     
+    def _request_model(self) -> str:
+        """Model name pinned by the current request (the selected model outside a request)"""
+        return request_model.get() or get_langgraph_model()
+    
     def _get_llm(self):
-        """Get or create the LLM instance (lazy initialization)"""
-        if self.llm is None:
-            # Load environment variables from EY.env file
-            import os
-            from dotenv import load_dotenv
-            
-            # Try to load from EY.env file
-            ey_env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "EY.env")
-            if os.path.exists(ey_env_path):
-                load_dotenv(ey_env_path)
-                print(f"DEBUG: Loaded environment from {ey_env_path}")
-            else:
-                print(f"DEBUG: EY.env file not found at {ey_env_path}")
-            
-            if self.ai_model == "openai":
-                from langchain_openai import ChatOpenAI
-                # Check if API key is available
-                api_key = os.getenv("OPENAI_API_KEY")
-                if not api_key:
-                    raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your EY.env file.")
-                
-                # Get the current model from global configuration
-                model_name = get_langgraph_model()
-                model_id = AVAILABLE_MODELS.get(model_name, AVAILABLE_MODELS[DEFAULT_MODEL])
-                
-                print(f"DEBUG: Using OpenAI API key: {api_key[:10]}...")
-                print(f"DEBUG: Using model: {model_name} ({model_id})")
-                self.llm = ChatOpenAI(model=model_id, temperature=0.1)
-            else:
-                raise ValueError(f"Unsupported AI model: {self.ai_model}")
-        return self.llm
+        """Shared LLM client for the model of the current request"""
+        if self.llm is not None:
+            return self.llm
+        model_id = AVAILABLE_MODELS.get(self._request_model(), AVAILABLE_MODELS[DEFAULT_MODEL])
+        return (self.llm_pool or get_llm_client_pool()).get(self.ai_model, model_id)
+    
+    def _current_model_id(self) -> str:
+        """Identifier of the model that would generate code now (without creating the LLM)"""
+        model_name = self._request_model()
+        return f"{self.ai_model}:{AVAILABLE_MODELS.get(model_name, AVAILABLE_MODELS[DEFAULT_MODEL])}"
+    
+    def _generation_cache_entry(self, state: AgentState, request_type: str) -> Dict[str, Any]:
+        """Generation cache key and key fields for a request"""
+        user_request = state["user_request"]
+        db_context = state["db_context"]
+        model_id = self._current_model_id()
+        schema_fp = schema_fingerprint(db_context.schema_info)
+        key = get_generation_cache().make_key(request_type, user_request, model_id, schema_fp,
+                                              os.path.basename(db_context.database_path))
+        return {
+            "key": key,
+            "hit": False,
+            "request_type": request_type,
+            "request": user_request,
+            "model_id": model_id,
+            "schema_fingerprint": schema_fp,
+        }
+    
+    def _cached_generation(self, entry: Dict[str, Any]) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """(code, explanation, cache entry) of a cached generation, or None"""
+        cached = get_generation_cache().lookup(entry["key"])
+        if cached is None:
+            return None
+        print(f"DEBUG: Generation cache hit for {entry['request_type']} request ({cached.hits} hits)")
+        return cached.code, cached.explanation, {"key": entry["key"], "hit": True}
+    
+    def _finish_generation(self, llm_response: str, entry: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+        """Extract and clean the generated code of an LLM response"""
+        # Extract code and explanation
+        code_content, explanation = self._extract_code_and_explanation(llm_response.strip())
+        
+        # Clean up code
+        code_content = self._clean_generated_code(code_content)
+        
+        return code_content, explanation, {**entry, "code": code_content, "explanation": explanation}
+    
+    def _generate_script(self, state: AgentState, request_type: str, system_prompt: str) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Generate script code for a request, reusing cached code for the same normalized
+        request, model and schema. Returns (code, explanation, generation cache entry).
+        """
+        templated = self._template_generation(state, request_type)
+        if templated is not None:
+            return templated
+        
+        entry = self._generation_cache_entry(state, request_type)
+        cached = self._cached_generation(entry)
+        if cached is not None:
+            return cached
+        
+        response = self._get_llm().invoke([HumanMessage(content=system_prompt)])
+        code_content, explanation, entry = self._finish_generation(response.content, entry)
+        
+        # Fail fast on SQL that does not prepare: ask the LLM to fix it before anything runs
+        issues = self._sql_issues(state, code_content)
+        attempts = 0
+        while issues and attempts < SQL_FIX_ATTEMPTS:
+            attempts += 1
+            get_sql_validator().record("fix_attempts")
+            fix_prompt = self._sql_fix_prompt(system_prompt, code_content, issues)
+            response = self._get_llm().invoke([HumanMessage(content=fix_prompt)])
+            code_content, explanation, entry = self._finish_generation(response.content, entry)
+            issues = self._sql_issues(state, code_content)
+        return self._settle_sql_validation(code_content, explanation, entry, attempts, issues)
+    
+    async def _agenerate_script(self, state: AgentState, request_type: str, system_prompt: str) -> Tuple[str, str, Dict[str, Any]]:
+        """Async variant of _generate_script"""
+        templated = self._template_generation(state, request_type)
+        if templated is not None:
+            return templated
+        
+        entry = self._generation_cache_entry(state, request_type)
+        cached = await asyncio.to_thread(self._cached_generation, entry)
+        if cached is not None:
+            return cached
+        
+        response = await self._get_llm().ainvoke([HumanMessage(content=system_prompt)])
+        code_content, explanation, entry = self._finish_generation(response.content, entry)
+        
+        issues = await asyncio.to_thread(self._sql_issues, state, code_content)
+        attempts = 0
+        while issues and attempts < SQL_FIX_ATTEMPTS:
+            attempts += 1
+            get_sql_validator().record("fix_attempts")
+            fix_prompt = self._sql_fix_prompt(system_prompt, code_content, issues)
+            response = await self._get_llm().ainvoke([HumanMessage(content=fix_prompt)])
+            code_content, explanation, entry = self._finish_generation(response.content, entry)
+            issues = await asyncio.to_thread(self._sql_issues, state, code_content)
+        return self._settle_sql_validation(code_content, explanation, entry, attempts, issues)
+    
+    def _template_generation(self, state: AgentState, request_type: str) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """(code, explanation, entry) from an analysis template that confidently matches the request, or None"""
+        db_context = state["db_context"]
+        if db_context.comparison_mode:
+            return None
+        registry = get_template_registry()
+        match = registry.match(state["user_request"], db_context.schema_info, request_type)
+        if match is None:
+            return None
+        code_content = registry.render(match, os.path.basename(db_context.database_path))
+        return code_content, match.explanation, {"key": None, "hit": False, "template": match.to_dict()}
+    
+    def _sql_issues(self, state: AgentState, code_content: str) -> List[SqlIssue]:
+        """SQL statements of generated code that do not prepare against the scenario database"""
+        db_context = state["db_context"]
+        if db_context.comparison_mode or not db_context.database_path:
+            return []
+        try:
+            _, issues = get_sql_validator().validate_code(code_content, db_context.database_path)
+            return issues
+        except Exception as e:
+            print(f"DEBUG: SQL validation failed: {e}")
+            return []
+    
+    def _sql_fix_prompt(self, system_prompt: str, code_content: str, issues: List[SqlIssue]) -> str:
+        """Prompt asking the LLM to fix SQL that failed to prepare"""
+        return f"""{system_prompt}
+
+You previously generated the code below, but its SQL failed to prepare against the database:
+{format_issues(issues)}
+
+```python
+{code_content}
+```
+
+Fix the SQL using only the tables and columns listed above and return the complete corrected Python code:"""
+    
+    def _settle_sql_validation(self, code_content: str, explanation: str, entry: Dict[str, Any], attempts: int,
+                               issues: List[SqlIssue]) -> Tuple[str, str, Dict[str, Any]]:
+        """Record the validation outcome; unfixed SQL errors are kept on the entry so the code is not executed"""
+        validator = get_sql_validator()
+        if issues:
+            validator.record("scripts_rejected")
+            entry = {**entry, "sql_errors": format_issues(issues)}
+        elif attempts:
+            validator.record("fixed")
+            print(f"DEBUG: SQL fixed by the LLM after {attempts} attempt(s)")
+        return code_content, explanation, entry
+    
+    def _save_generated_script(self, state: AgentState, request_type: str, code_content: str,
+                               explanation: str, cache_entry: Dict[str, Any]) -> AgentState:
+        """Write generated code to the scenario's temp directory and queue it for execution"""
+        db_context = state["db_context"]
+        prefix, label = GENERATED_SCRIPT_KINDS[request_type]
+        
+        # Generate filename
+        timestamp = int(time.time())
+        random_id = random.randint(1000, 9999)
+        filename = f"{prefix}_{timestamp}_{random_id}.py"
+        file_path = os.path.join(db_context.temp_dir, filename)
+        
+        # Write the file with UTF-8 encoding
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(code_content)
+        
+        # Create response message with explanation
+        response_message = f"{label}: {filename}"
+        if cache_entry["hit"]:
+            response_message += " (reused previously generated code)"
+        elif cache_entry.get("template"):
+            response_message += f" (from the {cache_entry['template']['template_id']} analysis template)"
+        if explanation:
+            response_message += f"\n\n{explanation}"
+        sql_errors = cache_entry.get("sql_errors", "")
+        
+        return {
+            **state,
+            "generated_files": [filename],
+            "generation_cache_entry": cache_entry,
+            "sql_validation_error": sql_errors,
+            "messages": state["messages"] + [AIMessage(content=response_message)]
+        }
+    
+    def _settle_generation_cache(self, entry: Optional[Dict[str, Any]], result) -> None:
+        """Store generated code that ran successfully; drop cached code that failed"""
+        if not entry or entry.get("template"):
+            return
+        cache = get_generation_cache()
+        succeeded = result.returncode == 0 and not result.timed_out
+        if succeeded and not entry["hit"]:
+            cache.store(entry["key"], entry["request_type"], entry["request"], entry["model_id"],
+                        entry["schema_fingerprint"], entry["code"], entry["explanation"])
+        elif not succeeded and entry["hit"]:
+            print(f"DEBUG: Cached generation failed, removing it from the generation cache")
+            cache.invalidate(entry["key"])
+    
+    def _node(self, func, afunc=None) -> RunnableLambda:
+        """
+        Graph node running func under graph.invoke and afunc under graph.ainvoke.
+        Without an async handler the sync one runs in a worker thread, so its
+        blocking database, file and execution work never stalls the event loop.
+        Both are timed into the current request's timings.
+        """
+        node_name = func.__name__.lstrip("_")
+        if afunc is None:
+            async def afunc(state: AgentState) -> AgentState:
+                return await asyncio.to_thread(func, state)
+        async_handler = afunc
+        
+        def timed(state: AgentState) -> AgentState:
+            started_at = time.perf_counter()
+            error = None
+            try:
+                return func(state)
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                record_node(node_name, started_at, error)
+        
+        async def atimed(state: AgentState) -> AgentState:
+            started_at = time.perf_counter()
+            error = None
+            try:
+                return await async_handler(state)
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                record_node(node_name, started_at, error)
+        
+        return RunnableLambda(timed, afunc=atimed, name=func.__name__)
     
     def _build_graph(self) -> StateGraph:
         """Build simplified workflow graph"""
         workflow = StateGraph(AgentState)
         
-        # Core nodes
-        workflow.add_node("classify_request", self._classify_request)
-        workflow.add_node("extract_scenarios", self._extract_scenarios)  # New node for scenario extraction
-        workflow.add_node("handle_chat", self._handle_chat)
-        workflow.add_node("handle_sql_query", self._handle_sql_query)
-        workflow.add_node("handle_visualization", self._handle_visualization)
-        workflow.add_node("handle_scenario_comparison", self._handle_scenario_comparison)
-        workflow.add_node("handle_file_edit", self._handle_file_edit)  # New node for file editing
-        workflow.add_node("prepare_db_modification", self._prepare_db_modification)
-        workflow.add_node("execute_db_modification", self._execute_db_modification)
-        workflow.add_node("execute_code", self._execute_code)
-        workflow.add_node("respond", self._respond)
+        # Core nodes (graph.invoke runs the sync handlers, graph.ainvoke the async ones)
+        workflow.add_node("classify_request", self._node(self._classify_request))
+        workflow.add_node("extract_scenarios", self._node(self._extract_scenarios))  # New node for scenario extraction
+        workflow.add_node("handle_chat", self._node(self._handle_chat, self._ahandle_chat))
+        workflow.add_node("handle_sql_query", self._node(self._handle_sql_query, self._ahandle_sql_query))
+        workflow.add_node("handle_visualization", self._node(self._handle_visualization, self._ahandle_visualization))
+        workflow.add_node("handle_scenario_comparison", self._node(self._handle_scenario_comparison))
+        workflow.add_node("handle_file_edit", self._node(self._handle_file_edit))  # New node for file editing
+        workflow.add_node("prepare_db_modification", self._node(self._prepare_db_modification))
+        workflow.add_node("execute_db_modification", self._node(self._execute_db_modification))
+        workflow.add_node("execute_code", self._node(self._execute_code))
+        workflow.add_node("respond", self._node(self._respond))
         
         # Entry point
         workflow.add_edge(START, "classify_request")
@@ -317,15 +583,19 @@ class SimplifiedAgent:
             temp_dir=temp_dir
         )
     
-    def _resolve_scenario_names(self, scenario_names: List[str]) -> Dict[str, str]:
+    def _scenario_index(self) -> ScenarioNameIndex:
+        """Cached name index of the scenario manager's scenarios (rebuilt after scenario changes)"""
+        return get_scenario_index_cache().get(self.scenario_manager)
+    
+    def _resolve_scenarios(self, scenario_names: List[str]) -> Dict[str, Any]:
         """
-        Resolve scenario names to their database paths with fuzzy matching.
+        Resolve scenario names from user input to scenarios with fuzzy matching.
         
         Args:
             scenario_names: List of scenario names (strings) from user input
             
         Returns:
-            Dict mapping scenario names to their database paths
+            Dict mapping scenario names to their Scenario objects
             
         Raises:
             ValueError: If scenarios cannot be found or resolved
@@ -333,77 +603,44 @@ class SimplifiedAgent:
         if not self.scenario_manager:
             raise ValueError("No scenario manager available")
         
-        # Get all available scenarios
-        all_scenarios = self.scenario_manager.list_scenarios()
-        if not all_scenarios:
+        index = self._scenario_index()
+        if not len(index):
             raise ValueError("No scenarios available in the system")
         
-        # Create a mapping of normalized names to scenario objects
-        name_to_scenario = {}
-        for scenario in all_scenarios:
-            # Store both exact and normalized versions
-            name_to_scenario[scenario.name] = scenario
-            name_to_scenario[scenario.name.lower()] = scenario
-            name_to_scenario[scenario.name.strip()] = scenario
-            
-            # Also store partial matches (for fuzzy matching)
-            words = scenario.name.lower().split()
-            for word in words:
-                if len(word) > 2:  # Only consider words longer than 2 characters
-                    name_to_scenario[word] = scenario
-        
-        # Resolve each requested scenario name
+        # Exact, case-insensitive, substring and word matches, in that order
         resolved_scenarios = {}
         missing_scenarios = []
-        
         for requested_name in scenario_names:
             requested_name = requested_name.strip()
-            resolved = False
-            
-            # Try exact match first
-            if requested_name in name_to_scenario:
-                scenario = name_to_scenario[requested_name]
-                resolved_scenarios[requested_name] = scenario.database_path
-                resolved = True
-                continue
-            
-            # Try case-insensitive match
-            if requested_name.lower() in name_to_scenario:
-                scenario = name_to_scenario[requested_name.lower()]
-                resolved_scenarios[requested_name] = scenario.database_path
-                resolved = True
-                continue
-            
-            # Try partial matching (substring search)
-            for scenario in all_scenarios:
-                if requested_name.lower() in scenario.name.lower():
-                    resolved_scenarios[requested_name] = scenario.database_path
-                    resolved = True
-                    break
-            
-            # Try word-based matching
-            if not resolved:
-                requested_words = requested_name.lower().split()
-                for scenario in all_scenarios:
-                    scenario_words = scenario.name.lower().split()
-                    # Check if any requested word matches any scenario word
-                    if any(req_word in scenario_words for req_word in requested_words):
-                        resolved_scenarios[requested_name] = scenario.database_path
-                        resolved = True
-                        break
-            
-            if not resolved:
+            scenario = index.resolve(requested_name)
+            if scenario is None:
                 missing_scenarios.append(requested_name)
+            else:
+                resolved_scenarios[requested_name] = scenario
         
         # If any scenarios couldn't be resolved, provide detailed error message
         if missing_scenarios:
-            available_names = [s.name for s in all_scenarios]
             error_msg = f"Could not find the following scenarios: {', '.join(missing_scenarios)}\n"
-            error_msg += f"Available scenarios: {', '.join(available_names)}"
+            error_msg += f"Available scenarios: {', '.join(index.names)}"
             raise ValueError(error_msg)
         
         return resolved_scenarios
     
+    def _resolve_scenario_names(self, scenario_names: List[str]) -> Dict[str, str]:
+        """
+        Resolve scenario names to their database paths with fuzzy matching.
+        
+        Args:
+            scenario_names: List of scenario names (strings) from user input
+            
+        Returns:
+            Dict mapping scenario names to their database paths
+            
+        Raises:
+            ValueError: If scenarios cannot be found or resolved
+        """
+        return {name: scenario.database_path for name, scenario in self._resolve_scenarios(scenario_names).items()}
+    
     def _create_comparison_database_context(self, scenario_names: List[str], primary_scenario: Optional[str] = None) -> DatabaseContext:
         """
         Create a multi-database context for comparison operations.
@@ -421,11 +658,11 @@ class SimplifiedAgent:
             print(f"🔍 DEBUG: No scenario manager available, returning empty context")
             return DatabaseContext(None, None, None, None, comparison_mode=True)
         
-        # Resolve scenario names to database paths
+        # Resolve scenario names to scenarios
         try:
-            print(f"🔍 DEBUG: Resolving scenario names to database paths...")
-            scenario_paths = self._resolve_scenario_names(scenario_names)
-            print(f"🔍 DEBUG: Resolved scenario paths: {scenario_paths}")
+            print(f"🔍 DEBUG: Resolving scenario names to scenarios...")
+            resolved_scenarios = self._resolve_scenarios(scenario_names)
+            print(f"🔍 DEBUG: Resolved scenario paths: { {name: s.database_path for name, s in resolved_scenarios.items()} }")
         except ValueError as e:
             print(f"🔍 DEBUG: Error resolving scenario names: {e}")
             return DatabaseContext(None, None, None, None, comparison_mode=True)
@@ -433,21 +670,10 @@ class SimplifiedAgent:
         # Create individual database contexts for each scenario
         multi_contexts = {}
         print(f"🔍 DEBUG: Creating individual database contexts...")
-        for scenario_name, database_path in scenario_paths.items():
+        for scenario_name, scenario in resolved_scenarios.items():
+            database_path = scenario.database_path
             print(f"🔍 DEBUG: Processing scenario '{scenario_name}' with path '{database_path}'")
             
-            # Get scenario ID
-            scenario = None
-            all_scenarios = self.scenario_manager.list_scenarios()
-            for s in all_scenarios:
-                if s.database_path == database_path:
-                    scenario = s
-                    break
-            
-            if not scenario:
-                print(f"🔍 DEBUG: Could not find scenario object for '{scenario_name}'")
-                continue
-            
             print(f"🔍 DEBUG: Found scenario object with ID: {scenario.id}")
             
             # Get schema info
@@ -535,31 +761,45 @@ class SimplifiedAgent:
             print(f"🔍 DEBUG: No comparison keywords found, returning empty list")
             return []
         
+        return [scenario for scenario, _ in self._score_comparison_scenarios(user_request)]
+    
+    def _score_comparison_scenarios(self, user_request: str) -> List[Tuple[str, int]]:
+        """
+        Scenarios named in a comparison request, matched with regex patterns and the
+        scenario name index, with a confidence score each.
+        
+        Args:
+            user_request: The user's request text
+            
+        Returns:
+            List of (scenario name, confidence 0-100); the confidence is the match score
+            (100 exact, 80 substring, else the fuzzy ratio), or 0 when another scenario
+            matches the same name equally well. Empty if fewer than 2 scenarios matched.
+        """
         # Get all available scenario names for matching
         if not self.scenario_manager:
             print(f"🔍 DEBUG: No scenario manager available")
             return []
         
-        all_scenarios = self.scenario_manager.list_scenarios()
-        scenario_names = [s.name for s in all_scenarios]
-        print(f"🔍 DEBUG: Available scenarios: {scenario_names}")
+        index = self._scenario_index()
+        print(f"🔍 DEBUG: Available scenarios: {len(index)}")
         
-        # Try different regex patterns to extract scenario names
+        # Try different regex patterns to extract scenario names (words may contain digits, as in "test1")
         
         # Pattern 1: "scenario A vs scenario B" or "compare A and B"
         patterns = [
             # "compare Base and Test" - simple pattern
-            r'compare\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)\s+(?:and|&)\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+            r'compare\s+(\w+(?:\s+\w+)*)\s+(?:and|&)\s+(\w+(?:\s+\w+)*)',
             # "compare Base Scenario and Test Scenario" - with "Scenario" keyword
-            r'compare\s+([A-Za-z]+\s+Scenario)\s+(?:and|&)\s+([A-Za-z]+\s+Scenario)',
+            r'compare\s+(\w+\s+Scenario)\s+(?:and|&)\s+(\w+\s+Scenario)',
             # "Base vs Test" - simple vs pattern
-            r'([A-Za-z]+(?:\s+[A-Za-z]+)*)\s+(?:vs|versus)\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+            r'(\w+(?:\s+\w+)*)\s+(?:vs|versus)\s+(\w+(?:\s+\w+)*)',
             # "compare Base, Test" - comma separated
-            r'compare\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)\s*,\s*([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+            r'compare\s+(\w+(?:\s+\w+)*)\s*,\s*(\w+(?:\s+\w+)*)',
             # "between Base and Test"
-            r'between\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)\s+and\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+            r'between\s+(\w+(?:\s+\w+)*)\s+and\s+(\w+(?:\s+\w+)*)',
             # "across Base, Test"
-            r'across\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)\s*,\s*([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+            r'across\s+(\w+(?:\s+\w+)*)\s*,\s*(\w+(?:\s+\w+)*)',
         ]
         
         print(f"🔍 DEBUG: Testing regex patterns...")
@@ -577,33 +817,18 @@ class SimplifiedAgent:
                 
                 print(f"🔍 DEBUG: Found scenarios from pattern: {found_scenarios}")
                 
-                # Clean up scenario names and validate against available scenarios
+                # Validate scenario names against available scenarios (exact, substring, fuzzy)
                 valid_scenarios = []
                 for scenario_name in found_scenarios:
-                    scenario_name_clean = scenario_name.strip().lower()
-                    best_match = None
-                    best_score = 0
-                    for available_name in scenario_names:
-                        available_name_lower = available_name.lower()
-                        # Exact match
-                        if scenario_name_clean == available_name_lower:
-                            best_match = available_name
-                            best_score = 100
-                            break
-                        # Substring match
-                        if scenario_name_clean in available_name_lower or available_name_lower in scenario_name_clean:
-                            if best_score < 80:
-                                best_match = available_name
-                                best_score = 80
-                        # Fuzzy match (sequence matcher)
-                        import difflib
-                        ratio = difflib.SequenceMatcher(None, scenario_name_clean, available_name_lower).ratio()
-                        if ratio > best_score/100 and ratio >= 0.5:
-                            best_match = available_name
-                            best_score = int(ratio*100)
-                    if best_match and best_match not in valid_scenarios:
-                        print(f"🔍 DEBUG: Fuzzy matched '{scenario_name}' to '{best_match}' (score={best_score})")
-                        valid_scenarios.append(best_match)
+                    matches = index.matches(scenario_name, limit=2)
+                    if not matches:
+                        continue
+                    best_match, best_score = matches[0]
+                    # A tie with another scenario leaves the name ambiguous
+                    confidence = 0 if len(matches) > 1 and matches[1][1] == best_score else best_score
+                    if best_match not in [name for name, _ in valid_scenarios]:
+                        print(f"🔍 DEBUG: Fuzzy matched '{scenario_name}' to '{best_match}' (score={best_score}, confidence={confidence})")
+                        valid_scenarios.append((best_match, confidence))
                 print(f"🔍 DEBUG: Valid scenarios found: {valid_scenarios}")
                 if len(valid_scenarios) >= 2:
                     print(f"🔍 DEBUG: Returning valid scenarios: {valid_scenarios}")
@@ -612,16 +837,15 @@ class SimplifiedAgent:
         # If no patterns matched, try to find scenario names in the text
         # Look for scenario names that appear in the request
         print(f"🔍 DEBUG: No regex patterns matched, looking for scenario names in text...")
-        found_scenarios = []
-        for scenario_name in scenario_names:
-            if scenario_name.lower() in request_lower:
-                print(f"🔍 DEBUG: Found scenario name '{scenario_name}' in request")
-                found_scenarios.append(scenario_name)
+        found_scenarios = index.find_in_text(user_request)
+        print(f"🔍 DEBUG: Found scenario names in request: {found_scenarios}")
         
-        # If we found multiple scenarios and there are comparison keywords, it's likely a comparison
-        if len(found_scenarios) >= 2 and has_comparison_keyword:
-            print(f"🔍 DEBUG: Found multiple scenarios with comparison keywords: {found_scenarios}")
-            return found_scenarios
+        # If we found multiple scenarios, it's likely a comparison ("Base" is ambiguous
+        # when "Base Scenario" is mentioned too)
+        if len(found_scenarios) >= 2:
+            print(f"🔍 DEBUG: Found multiple scenarios in request: {found_scenarios}")
+            return [(name, 0 if any(name.lower() in other.lower() for other in found_scenarios if other != name) else 100)
+                    for name in found_scenarios]
         
         print(f"🔍 DEBUG: No valid scenarios found, returning empty list")
         return []
@@ -716,6 +940,7 @@ class SimplifiedAgent:
         if has_comparison_keyword:
             print(f"🔍 DEBUG: Comparison keywords detected, classifying as scenario_comparison")
             request_type = "scenario_comparison"
+            get_classifier_service().record("keyword")
             
             # Get database context for current scenario (will be updated by extract_scenarios node)
             db_context = self._get_database_context()
@@ -735,12 +960,22 @@ class SimplifiedAgent:
         
         print(f"🔍 DEBUG: Not a comparison request, checking other patterns...")
         
+        # An LLM classification plans the request in the same call, so a comparison
+        # arrives at extract_scenarios with its scenarios already resolved
+        plan = None
+        
+        def llm_classify(text: str) -> str:
+            nonlocal plan
+            plan = self._plan_request(text)
+            return plan.request_type if plan else self._llm_classify_request(text)
+        
         # Simple keyword-based classification with LLM fallback
         # Check for visualization patterns
         if any(pattern in request_lower for pattern in [
             "chart", "graph", "plot", "visualiz", "draw", "map", "diagram"
         ]):
             request_type = "visualization"
+            get_classifier_service().record("keyword")
             print(f"🔍 DEBUG: Classified as visualization")
         
         # Check for SQL patterns
@@ -748,13 +983,15 @@ class SimplifiedAgent:
             "select", "query", "find", "search", "get", "retrieve", "list", "show", "count", "sum"
         ]):
             request_type = "sql_query"
+            get_classifier_service().record("keyword")
             print(f"🔍 DEBUG: Classified as sql_query")
         
-        # For ambiguous cases, use LLM classification
+        # For ambiguous cases, use the local classifier (LLM below its confidence threshold)
         else:
-            print(f"🔍 DEBUG: Using LLM classification for ambiguous request")
-            request_type = self._llm_classify_request(user_request)
-            print(f"🔍 DEBUG: LLM classified as: {request_type}")
+            request_type, source, prediction = get_classifier_service().classify(user_request, llm_classify)
+            if prediction is not None:
+                print(f"🔍 DEBUG: Local classifier: {prediction.label} ({prediction.confidence:.2f})")
+            print(f"🔍 DEBUG: Classified as {request_type} by {source} classifier")
         
         # Get database context for current scenario
         print(f"🔍 DEBUG: Getting database context for current scenario...")
@@ -771,7 +1008,8 @@ class SimplifiedAgent:
             "comparison_scenarios": [],
             "comparison_data": {},
             "comparison_type": "",
-            "scenario_name_mapping": {}
+            "scenario_name_mapping": {},
+            "request_plan": plan.to_dict() if plan else None
         }
     
     def _llm_classify_request(self, user_request: str) -> str:
@@ -806,13 +1044,32 @@ Respond with exactly one word: chat, sql_query, visualization, db_modification,
         # Default fallback
         return "chat"
     
+    def _plan_request(self, user_request: str, scenario_names: Optional[List[str]] = None) -> Optional[RequestPlan]:
+        """
+        Request type, scenarios, comparison type and chart type in one structured LLM
+        call; None when the planner is disabled, fewer than two scenarios exist or
+        the call gave no usable plan
+        """
+        planner = get_request_planner()
+        if not planner.enabled or not self.scenario_manager:
+            return None
+        index = self._scenario_index()
+        if scenario_names is None:
+            scenario_names = index.names
+        if len(scenario_names) < 2:
+            return None
+        # Only the scenarios the request may refer to go into the prompt, not every scenario
+        candidates = [name for name in index.candidates(user_request) if name in scenario_names]
+        return planner.plan(self._get_llm(), user_request, scenario_names, self._find_best_scenario_match,
+                            candidates=candidates)
+    
     def _route_request(self, state: AgentState) -> str:
         """Route request based on classification"""
         request_type = state.get("request_type", "chat")
         return request_type
     
-    def _handle_chat(self, state: AgentState) -> AgentState:
-        """Handle general chat/Q&A requests without code execution"""
+    def _chat_messages(self, state: AgentState) -> List[BaseMessage]:
+        """LLM messages answering a chat request"""
         user_request = state["user_request"]
         db_context = state["db_context"]
         
@@ -836,13 +1093,30 @@ The user is working with optimization models that typically involve:
 
 Provide helpful, informative responses about the model, data, or optimization concepts. 
 If the user needs data analysis or visualizations, suggest they rephrase their request to be more specific about what data they want to see or analyze."""
-
+        
+        return [
+            AIMessage(content=system_prompt),
+            HumanMessage(content=user_request)
+        ]
+    
+    def _handle_chat(self, state: AgentState) -> AgentState:
+        """Handle general chat/Q&A requests without code execution"""
         try:
-            response = self._get_llm().invoke([
-                AIMessage(content=system_prompt),
-                HumanMessage(content=user_request)
-            ])
+            response = self._get_llm().invoke(self._chat_messages(state))
+            chat_response = response.content
             
+        except Exception as e:
+            chat_response = f"I apologize, but I encountered an error processing your question: {str(e)}"
+        
+        return {
+            **state,
+            "messages": state["messages"] + [AIMessage(content=chat_response)]
+        }
+    
+    async def _ahandle_chat(self, state: AgentState) -> AgentState:
+        """Async variant of _handle_chat"""
+        try:
+            response = await self._get_llm().ainvoke(self._chat_messages(state))
             chat_response = response.content
             
         except Exception as e:
@@ -853,19 +1127,13 @@ If the user needs data analysis or visualizations, suggest they rephrase their r
             "messages": state["messages"] + [AIMessage(content=chat_response)]
         }
     
-    def _handle_sql_query(self, state: AgentState) -> AgentState:
-        """Generate Python code for SQL query execution with Plotly table output"""
+    def _sql_query_prompt(self, state: AgentState) -> str:
+        """Code generation prompt for a SQL query request"""
         user_request = state["user_request"]
         db_context = state["db_context"]
         
-        if not db_context.is_valid():
-            return {
-                **state,
-                "messages": state["messages"] + [AIMessage(content="❌ No database available for the current scenario")]
-            }
-        
         # Build schema context
-        schema_context = self._build_schema_context(db_context.schema_info)
+        schema_context = self._build_schema_context(db_context.schema_info, user_request)
         
         # Get database filename for relative path usage
         db_filename = os.path.basename(db_context.database_path)
@@ -905,44 +1173,162 @@ CRITICAL REQUIREMENTS:
 User request: {user_request}
 
 Generate complete Python code:"""
+        return system_prompt
+    
+    def _handle_sql_query(self, state: AgentState) -> AgentState:
+        """Generate Python code for SQL query execution with Plotly table output"""
+        db_context = state["db_context"]
+        
+        if not db_context.is_valid():
+            return {
+                **state,
+                "messages": state["messages"] + [AIMessage(content="❌ No database available for the current scenario")]
+            }
         
         try:
-            response = self._get_llm().invoke([HumanMessage(content=system_prompt)])
-            llm_response = response.content.strip()
-            
-            # Extract code and explanation
-            code_content, explanation = self._extract_code_and_explanation(llm_response)
-            
-            # Clean up code
-            code_content = self._clean_generated_code(code_content)
-            
-            # Generate filename
-            timestamp = int(time.time())
-            random_id = random.randint(1000, 9999)
-            filename = f"sql_query_{timestamp}_{random_id}.py"
-            file_path = os.path.join(db_context.temp_dir, filename)
-            
-            # Write the file with UTF-8 encoding
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(code_content)
-            
-            # Create response message with explanation
-            response_message = f"📊 Generated SQL query script: {filename}"
-            if explanation:
-                response_message += f"\n\n{explanation}"
-            
+            if state.get("direct_answer"):
+                return self._generate_direct_query(state)
+            code_content, explanation, cache_entry = self._generate_script(state, "sql_query", self._sql_query_prompt(state))
+            return self._save_generated_script(state, "sql_query", code_content, explanation, cache_entry)
+        except Exception as e:
             return {
                 **state,
-                "generated_files": [filename],
-                "messages": state["messages"] + [AIMessage(content=response_message)]
+                "messages": state["messages"] + [AIMessage(content=f"❌ Error generating SQL query: {str(e)}")]
             }
-            
+    
+    async def _ahandle_sql_query(self, state: AgentState) -> AgentState:
+        """Async variant of _handle_sql_query (awaits the LLM instead of blocking)"""
+        db_context = state["db_context"]
+        
+        if not db_context.is_valid():
+            return {
+                **state,
+                "messages": state["messages"] + [AIMessage(content="❌ No database available for the current scenario")]
+            }
+        
+        try:
+            if state.get("direct_answer"):
+                return await self._agenerate_direct_query(state)
+            code_content, explanation, cache_entry = await self._agenerate_script(state, "sql_query", self._sql_query_prompt(state))
+            return self._save_generated_script(state, "sql_query", code_content, explanation, cache_entry)
         except Exception as e:
             return {
                 **state,
                 "messages": state["messages"] + [AIMessage(content=f"❌ Error generating SQL query: {str(e)}")]
             }
     
+    def _direct_query_prompt(self, state: AgentState) -> str:
+        """Prompt asking for a single SELECT statement answering a sql_query request"""
+        user_request = state["user_request"]
+        schema_context = self._build_schema_context(state["db_context"].schema_info, user_request)
+        return f"""Write one SQLite SELECT statement that answers the user's question.
+
+Database Schema:
+{schema_context}
+
+Rules:
+- Use only the tables and columns listed above
+- Return a single SELECT (or WITH ... SELECT) statement; never modify data
+- Give computed columns readable aliases and order the rows meaningfully
+- Add a LIMIT only when the user asks for a number of rows
+
+User request: {user_request}
+
+Respond with only the SQL in a ```sql code block."""
+    
+    def _direct_query_fix_prompt(self, prompt: str, sql: str, error: str) -> str:
+        """Prompt asking the LLM to fix a SELECT statement that failed to prepare"""
+        return f"""{prompt}
+
+Your previous statement failed to prepare against the database:
+{error}
+
+```sql
+{sql}
+```
+
+Return the corrected statement in a ```sql code block."""
+    
+    def _generate_direct_query(self, state: AgentState) -> AgentState:
+        """Ask the LLM for one SELECT answering the request and validate it (run by execute_code)"""
+        runner = get_direct_query_runner()
+        db_path = state["db_context"].database_path
+        entry = self._generation_cache_entry(state, "sql_answer")
+        cached = self._cached_generation(entry)
+        if cached is not None:
+            return self._direct_query_state(state, cached[0], None, cached[2])
+        
+        prompt = self._direct_query_prompt(state)
+        sql = extract_sql(self._get_llm().invoke([HumanMessage(content=prompt)]).content)
+        error = runner.validate(db_path, sql)
+        attempts = 0
+        while error and attempts < SQL_FIX_ATTEMPTS:
+            attempts += 1
+            fix_prompt = self._direct_query_fix_prompt(prompt, sql, error)
+            sql = extract_sql(self._get_llm().invoke([HumanMessage(content=fix_prompt)]).content)
+            error = runner.validate(db_path, sql)
+        return self._direct_query_state(state, sql, error, {**entry, "code": sql, "explanation": ""})
+    
+    async def _agenerate_direct_query(self, state: AgentState) -> AgentState:
+        """Async variant of _generate_direct_query"""
+        runner = get_direct_query_runner()
+        db_path = state["db_context"].database_path
+        entry = self._generation_cache_entry(state, "sql_answer")
+        cached = await asyncio.to_thread(self._cached_generation, entry)
+        if cached is not None:
+            return self._direct_query_state(state, cached[0], None, cached[2])
+        
+        prompt = self._direct_query_prompt(state)
+        sql = extract_sql((await self._get_llm().ainvoke([HumanMessage(content=prompt)])).content)
+        error = await asyncio.to_thread(runner.validate, db_path, sql)
+        attempts = 0
+        while error and attempts < SQL_FIX_ATTEMPTS:
+            attempts += 1
+            fix_prompt = self._direct_query_fix_prompt(prompt, sql, error)
+            sql = extract_sql((await self._get_llm().ainvoke([HumanMessage(content=fix_prompt)])).content)
+            error = await asyncio.to_thread(runner.validate, db_path, sql)
+        return self._direct_query_state(state, sql, error, {**entry, "code": sql, "explanation": ""})
+    
+    def _direct_query_state(self, state: AgentState, sql: str, error: Optional[str],
+                            cache_entry: Dict[str, Any]) -> AgentState:
+        """State queueing a validated SELECT for in-process execution"""
+        response_message = f"📊 SQL query{' (reused)' if cache_entry['hit'] else ''}:\n```sql\n{sql}\n```"
+        return {
+            **state,
+            "generated_files": [],
+            "direct_query": {"sql": sql, "error": error or "", "cache_entry": cache_entry},
+            "messages": state["messages"] + [AIMessage(content=response_message)]
+        }
+    
+    def _run_direct_query(self, state: AgentState) -> AgentState:
+        """Run the request's SELECT on a pooled read-only connection instead of executing a script"""
+        direct_query = state["direct_query"]
+        sql = direct_query["sql"]
+        entry = direct_query["cache_entry"]
+        if direct_query["error"]:
+            return {
+                **state,
+                "execution_error": f"The generated SQL does not match the database, so it was not run:\n{direct_query['error']}\n\n{sql}"
+            }
+        timings = current_timings.get()
+        cache = get_generation_cache()
+        try:
+            result = get_direct_query_runner().run(state["db_context"].database_path, sql,
+                                                   timings.request_id if timings else None)
+        except sqlite3.Error as e:
+            if entry["hit"]:
+                cache.invalidate(entry["key"])
+            return {**state, "execution_error": f"Query failed: {e}\n\n{sql}"}
+        if not entry["hit"]:
+            cache.store(entry["key"], entry["request_type"], entry["request"], entry["model_id"],
+                        entry["schema_fingerprint"], sql, "")
+        return {
+            **state,
+            "execution_output": f"```sql\n{sql}\n```\n\n{result.preview()}",
+            "execution_error": "",
+            "query_result": result.to_dict()
+        }
+    
     def _handle_visualization(self, state: AgentState) -> AgentState:
         """Generate Python code for data visualization with Plotly"""
         user_request = state["user_request"]
@@ -964,13 +1350,27 @@ Generate complete Python code:"""
             # Handle single scenario visualization
             return self._handle_single_visualization(state)
     
-    def _handle_single_visualization(self, state: AgentState) -> AgentState:
-        """Generate Python code for single scenario visualization"""
+    async def _ahandle_visualization(self, state: AgentState) -> AgentState:
+        """Async variant of _handle_visualization"""
+        db_context = state["db_context"]
+        
+        if not db_context.is_valid():
+            return {
+                **state,
+                "messages": state["messages"] + [AIMessage(content="❌ No database available for the current scenario")]
+            }
+        
+        if db_context.comparison_mode and db_context.multi_database_contexts:
+            return await asyncio.to_thread(self._handle_comparison_visualization, state)
+        return await self._ahandle_single_visualization(state)
+    
+    def _single_visualization_prompt(self, state: AgentState) -> str:
+        """Code generation prompt for a single scenario visualization request"""
         user_request = state["user_request"]
         db_context = state["db_context"]
         
         # Build schema context
-        schema_context = self._build_schema_context(db_context.schema_info)
+        schema_context = self._build_schema_context(db_context.schema_info, user_request)
         
         # Get database filename for relative path usage
         db_filename = os.path.basename(db_context.database_path)
@@ -1053,38 +1453,26 @@ SUBPLOT SPECIFICATIONS FOR MIXED CONTENT:
 User request: {user_request}
 
 Generate complete Python code that creates an interactive Plotly visualization:"""
-        
+        return system_prompt
+    
+    def _handle_single_visualization(self, state: AgentState) -> AgentState:
+        """Generate Python code for single scenario visualization"""
         try:
-            response = self._get_llm().invoke([HumanMessage(content=system_prompt)])
-            llm_response = response.content.strip()
-            
-            # Extract code and explanation
-            code_content, explanation = self._extract_code_and_explanation(llm_response)
-            
-            # Clean up code
-            code_content = self._clean_generated_code(code_content)
-            
-            # Generate filename
-            timestamp = int(time.time())
-            random_id = random.randint(1000, 9999)
-            filename = f"visualization_{timestamp}_{random_id}.py"
-            file_path = os.path.join(db_context.temp_dir, filename)
-            
-            # Write the file with UTF-8 encoding
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(code_content)
-            
-            # Create response message with explanation
-            response_message = f"📈 Generated visualization script: {filename}"
-            if explanation:
-                response_message += f"\n\n{explanation}"
-            
+            code_content, explanation, cache_entry = self._generate_script(
+                state, "visualization", self._single_visualization_prompt(state))
+            return self._save_generated_script(state, "visualization", code_content, explanation, cache_entry)
+        except Exception as e:
             return {
                 **state,
-                "generated_files": [filename],
-                "messages": state["messages"] + [AIMessage(content=response_message)]
+                "messages": state["messages"] + [AIMessage(content=f"❌ Error generating visualization: {str(e)}")]
             }
-            
+    
+    async def _ahandle_single_visualization(self, state: AgentState) -> AgentState:
+        """Async variant of _handle_single_visualization"""
+        try:
+            code_content, explanation, cache_entry = await self._agenerate_script(
+                state, "visualization", self._single_visualization_prompt(state))
+            return self._save_generated_script(state, "visualization", code_content, explanation, cache_entry)
         except Exception as e:
             return {
                 **state,
@@ -1109,7 +1497,7 @@ Generate complete Python code that creates an interactive Plotly visualization:"
             }
         
         # Build schema context from primary scenario
-        schema_context = self._build_schema_context(primary_context.schema_info)
+        schema_context = self._build_schema_context(primary_context.schema_info, user_request)
         
         # Create database path mapping for the code - use absolute paths
         db_path_mapping = {}
@@ -1121,8 +1509,9 @@ Generate complete Python code that creates an interactive Plotly visualization:"
         
         print(f"🔍 DEBUG: Database path mapping (absolute paths): {db_path_mapping}")
         
-        # Determine chart type based on user request
-        chart_type = self._determine_comparison_chart_type(user_request)
+        # Determine chart type from the request plan, or else from the user request
+        request_plan = state.get("request_plan")
+        chart_type = request_plan["chart_type"] if request_plan else self._determine_comparison_chart_type(user_request)
         
         system_prompt = f"""Generate Python code to create an advanced comparison visualization across multiple scenarios.
 
@@ -1334,7 +1723,7 @@ Generate complete Python code that creates an advanced comparison visualization:
         print(f"🔍 DEBUG: Primary context found - valid: {primary_context.is_valid()}")
         
         # Build schema context from primary scenario
-        schema_context = self._build_schema_context(primary_context.schema_info)
+        schema_context = self._build_schema_context(primary_context.schema_info, user_request)
         
         # Get all database paths for comparison
         all_database_paths = db_context.get_all_database_paths()
@@ -1486,7 +1875,7 @@ Generate complete Python code that performs scenario comparison analysis:"""
             }
         
         # Get schema context
-        schema_context = self._build_schema_context(db_context.schema_info)
+        schema_context = self._build_schema_context(db_context.schema_info, user_request)
         
         try:
             # Enhanced extraction for both absolute values and percentage patterns
@@ -2090,6 +2479,7 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
             cursor.execute(update_sql, (calculated_value,))
             conn.commit()
             conn.close()
+            get_schema_cache().invalidate(db_context.database_path)
             
             # Create detailed success message with comprehensive information
             change_summary = "🔧 **DATABASE MODIFICATION COMPLETED**\n\n"
@@ -2394,6 +2784,9 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
         generated_files = state.get("generated_files", [])
         db_context = state["db_context"]
         
+        if state.get("direct_query") and db_context.is_valid():
+            return self._run_direct_query(state)
+        
         print(f"🔍 DEBUG: Generated files: {generated_files}")
         print(f"🔍 DEBUG: DB context valid: {db_context.is_valid()}")
         print(f"🔍 DEBUG: DB context temp_dir: {db_context.temp_dir}")
@@ -2419,6 +2812,14 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
                 "execution_error": f"Generated file not found: {filename}"
             }
         
+        sql_errors = state.get("sql_validation_error")
+        if sql_errors:
+            print(f"🔍 DEBUG: Not executing {filename}, its SQL failed validation")
+            return {
+                **state,
+                "execution_error": f"The generated SQL does not match the database, so the script was not run:\n{sql_errors}"
+            }
+        
         print(f"🔍 DEBUG: File exists, proceeding with execution")
         
         # Check if this is an edit operation
@@ -2459,42 +2860,52 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
             
             print(f"🔍 DEBUG: Execution directory: {db_dir}")
             
-            # Use the same Python executable as the current process
-            python_executable = sys.executable
-            print(f"🔍 DEBUG: Python executable: {python_executable}")
-            
-            # Record existing files BEFORE execution to avoid picking up old files
-            existing_files = set()
-            if os.path.exists(db_dir):
-                for file in os.listdir(db_dir):
-                    if file.endswith('.html'):
-                        existing_files.add(file)
-            print(f"🔍 DEBUG: Existing HTML files before execution: {existing_files}")
-            
-            print(f"🔍 DEBUG: Starting subprocess execution...")
-            result = subprocess.run(
-                [python_executable, file_path],
-                cwd=db_dir,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='replace',  # Replace problematic characters
-                timeout=120  # Increased timeout for slower imports
-            )
+            print(f"🔍 DEBUG: Starting pooled execution...")
+            # The same database redirect /run uses for this file, so the cache entry
+            # stored here serves a later /run of the generated script
+            if db_context.database_path and not is_comparison_script(filename, file_path):
+                env = database_redirect_env(db_context.database_path)
+            else:
+                env = {}
+            stream_output = state.get("stream_execution_output", False)
+            started_at = time.time()
+            # Kept until the run is recorded, so a large output can become a job log
+            capture_dir = tempfile.mkdtemp(prefix="eypor_agent_")
+            try:
+                if stream_output:
+                    result = self._run_streaming_output(file_path, db_dir, timeout=120, env=env,
+                                                        capture_dir=capture_dir)
+                else:
+                    # Warm pool worker: pandas/plotly are already imported
+                    result = get_execution_pool().start(file_path, cwd=db_dir, env=env,
+                                                        capture_dir=capture_dir).wait(timeout=120)
+            except Exception:
+                shutil.rmtree(capture_dir, ignore_errors=True)
+                raise
+            get_execution_cache().store(file_path, result, started_at, cwd=db_dir, env=env)
+            for written_db in result.tables_written:
+                get_schema_cache().invalidate(written_db)
+            self._record_execution(file_path, result, db_context, capture_dir)
+            self._settle_generation_cache(state.get("generation_cache_entry"), result)
+            
+            if result.timed_out:
+                raise subprocess.TimeoutExpired(file_path, 120)
             
             print(f"🔍 DEBUG: Subprocess completed with return code: {result.returncode}")
             print(f"🔍 DEBUG: Subprocess stdout: {result.stdout[:200]}...")
             print(f"🔍 DEBUG: Subprocess stderr: {result.stderr[:200]}...")
             
             if result.returncode == 0:
-                # Find ONLY newly generated output files (HTML files) in database directory
+                # Output files come from the run's write manifest: only HTML files
+                # this execution wrote into the database directory
                 output_files = []
-                if os.path.exists(db_dir):
-                    for file in os.listdir(db_dir):
-                        if file.endswith('.html'):
-                            # Only include files that didn't exist before execution
-                            if file not in existing_files:
-                                output_files.append(file)
+                execution_dir = os.path.normcase(os.path.abspath(db_dir))
+                for written_path in result.written_files:
+                    if (written_path.endswith('.html') and os.path.exists(written_path) and
+                            os.path.normcase(os.path.dirname(written_path)) == execution_dir):
+                        file = os.path.basename(written_path)
+                        if file not in output_files:
+                            output_files.append(file)
                 
                 print(f"🔍 DEBUG: Newly generated HTML files: {output_files}")
                 
@@ -2556,6 +2967,44 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
                 "execution_error": error_msg
             }
     
+    def _run_streaming_output(self, file_path: str, cwd: str, timeout: float,
+                              env: Optional[Dict[str, str]] = None,
+                              capture_dir: Optional[str] = None):
+        """
+        Run a script in the pool, dispatching each stdout line as an "execution_output" event.
+        A caller-supplied capture_dir is kept after the run.
+        """
+        keep_capture = capture_dir is not None
+        capture_dir = capture_dir or tempfile.mkdtemp(prefix="eypor_stream_")
+        try:
+            execution = get_execution_pool().start(file_path, cwd=cwd, env=env, capture_dir=capture_dir)
+            waiter = threading.Thread(target=execution.wait, args=(timeout,), daemon=True)
+            waiter.start()
+            offset = 0
+            pending = b""
+            while True:
+                finished = not waiter.is_alive()
+                try:
+                    with open(execution.stdout_path, "rb") as f:
+                        f.seek(offset)
+                        chunk = f.read()
+                except OSError:
+                    chunk = b""
+                offset += len(chunk)
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    dispatch_custom_event("execution_output", {"line": line.decode("utf-8", errors="replace").rstrip("\r")})
+                if finished:
+                    break
+                waiter.join(0.1)
+            if pending:
+                dispatch_custom_event("execution_output", {"line": pending.decode("utf-8", errors="replace")})
+            return execution.wait()
+        finally:
+            if not keep_capture:
+                shutil.rmtree(capture_dir, ignore_errors=True)
+    
     def _respond(self, state: AgentState) -> AgentState:
         """Generate final response"""
         request_type = state.get("request_type", "")
@@ -2579,18 +3028,25 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
             # Chat responses are already handled
             return state
         
-        elif execution_error:
+        # Comparisons report how their scenarios were found
+        extraction = state.get("scenario_extraction")
+        extraction_note = ""
+        if extraction and request_type == "scenario_comparison":
+            scenarios = ", ".join(state.get("comparison_scenarios") or [])
+            extraction_note = f"\n\n🎯 Scenarios: {scenarios} ({SCENARIO_EXTRACTION_PATHS[extraction['path']]})"
+        
+        if execution_error:
             error_msg = f"❌ **Execution Error**\n\n{execution_error}"
             if "ModuleNotFoundError" in execution_error:
                 error_msg += "\n\n💡 Try installing missing Python packages using the requirements.txt file."
             
             return {
                 **state,
-                "messages": state["messages"] + [AIMessage(content=error_msg)]
+                "messages": state["messages"] + [AIMessage(content=error_msg + extraction_note)]
             }
         
         elif execution_output:
-            success_msg = f"✅ **Execution Completed Successfully**\n\n{execution_output}"
+            success_msg = f"✅ **Execution Completed Successfully**\n\n{execution_output}{extraction_note}"
             return {
                 **state,
                 "messages": state["messages"] + [AIMessage(content=success_msg)]
@@ -2602,128 +3058,218 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
         return state
     
     def _get_database_info(self, db_path: str) -> Dict[str, Any]:
-        """Get database information (moved from main.py to avoid circular imports)"""
+        """Get database information from the shared schema cache (re-read only when the database changed)"""
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Get all tables
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            
-            db_info = {
-                "tables": {},
-                "total_tables": len(tables),
-                "database_path": db_path
-            }
-            
-            for (table_name,) in tables:
-                # Get table schema
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                
-                # Get row count
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                row_count = cursor.fetchone()[0]
-                
-                # Get sample data
-                cursor.execute(f"SELECT * FROM {table_name} LIMIT 5")
-                sample_data = cursor.fetchall()
-                
-                db_info["tables"][table_name] = {
-                    "columns": [{"name": col[1], "type": col[2]} for col in columns],
-                    "row_count": row_count,
-                    "sample_data": sample_data
-                }
-            
-            conn.close()
-            return db_info
-            
+            return get_schema_cache().get(db_path)
         except Exception as e:
             return {"error": str(e), "tables": {}, "total_tables": 0}
 
-    def _build_schema_context(self, schema_info: Optional[Dict[str, Any]]) -> str:
-        """Build schema context string for LLM"""
-        if not schema_info or "tables" not in schema_info:
-            return "No schema information available"
+    def _build_schema_context(self, schema_info: Optional[Dict[str, Any]], user_request: Optional[str] = None) -> str:
+        """Build schema context string for LLM, pruned to the tables relevant to user_request if given"""
+        if not user_request:
+            return full_schema_context(schema_info)
+        try:
+            return get_schema_retriever().build_context(schema_info, user_request)
+        except Exception as e:
+            print(f"DEBUG: Schema retrieval failed, using the full schema: {e}")
+            return full_schema_context(schema_info)
+    
+    def _initial_state(self, user_message: str, db_context: DatabaseContext, edit_mode: bool = False,
+                       editing_file_path: Optional[str] = None, direct_answer: Optional[bool] = None) -> AgentState:
+        """Workflow state for a new user message"""
+        return {
+            "messages": [HumanMessage(content=user_message)],
+            "user_request": user_message,
+            "request_type": "",
+            "db_context": db_context,
+            "generated_files": [],
+            "execution_output": "",
+            "execution_error": "",
+            "modification_request": None,
+            "db_modification_result": None,
+            # Initialize comparison fields
+            "comparison_scenarios": [],
+            "comparison_data": {},
+            "comparison_type": "",
+            "scenario_name_mapping": {},
+            "request_plan": None,
+            "scenario_extraction": None,
+            # Initialize edit mode fields with values from frontend
+            "edit_mode": edit_mode,
+            "editing_file_path": editing_file_path,
+            "original_file_content": None,
+            "file_modification_history": [],
+            # Initialize enhanced query tracking
+            "query_file_mappings": {},
+            "current_query_context": None,
+            "generation_cache_entry": None,
+            "stream_execution_output": False,
+            "sql_validation_error": "",
+            "direct_answer": get_direct_query_runner().enabled_by_default if direct_answer is None else direct_answer,
+            "direct_query": None,
+            "query_result": None
+        }
+    
+    def _run_result(self, final_state: AgentState) -> Tuple[str, List[str], str, str]:
+        """(response, generated files, execution output, execution error) of a finished workflow"""
+        # Extract response
+        response_messages = [msg for msg in final_state["messages"] if isinstance(msg, AIMessage)]
+        if response_messages:
+            response = response_messages[-1].content
+        else:
+            response = "No response generated"
         
-        context = "Available Tables:\n"
-        for table_name, table_info in schema_info["tables"].items():
-            context += f"\n{table_name}:\n"
-            if "columns" in table_info:
-                for col_info in table_info["columns"]:
-                    col_name = col_info.get("name", "UNKNOWN")
-                    col_type = col_info.get("type", "UNKNOWN")
-                    context += f"  - {col_name} ({col_type})\n"
+        # Extract generated files and execution results
+        generated_files = final_state.get("generated_files", [])
+        execution_output = final_state.get("execution_output", "")
+        execution_error = final_state.get("execution_error", "")
         
-        return context
+        # Check if this was an edit operation
+        is_edit_operation = final_state.get("request_type") == "file_edit"
+        
+        # If this was an edit operation, modify the response to indicate it
+        if is_edit_operation and generated_files:
+            # Add edit indicator to the response
+            edit_indicator = "\n\n[EDIT_OPERATION]"
+            response += edit_indicator
+            
+            # Also add the original file path for reference
+            editing_file_path = final_state.get("editing_file_path")
+            if editing_file_path:
+                response += f"\n[EDITED_FILE: {editing_file_path}]"
+            
+            # Clear the editing_file_path after using it
+            final_state["editing_file_path"] = None
+        
+        return response, generated_files, execution_output, execution_error
+    
+    def _begin_request(self, request_id: Optional[str], user_message: str) -> Tuple[RequestTimings, Any, Dict[str, Any]]:
+        """
+        (timings, context tokens, graph config) of a new request: pins the selected
+        model for the whole request and records node and LLM call timings
+        """
+        model_name = get_langgraph_model()
+        (self.llm_pool or get_llm_client_pool()).request_started(model_name)
+        timings = get_agent_metrics().start(request_id, user_message)
+        tokens = (current_timings.set(timings), request_model.set(model_name), model_name)
+        return timings, tokens, {"callbacks": [TimingCallbackHandler(timings)]}
     
-    def run(self, user_message: str, scenario_id: Optional[int] = None, edit_mode: bool = False, editing_file_path: Optional[str] = None) -> Tuple[str, List[str], str, str]:
-        """Run the agent with a user message"""
+    def _end_request(self, timings: RequestTimings, tokens, final_state: Optional[AgentState]):
+        """Release the request's model and store its timings in the agent metrics"""
+        timings_token, model_token, model_name = tokens
+        try:
+            current_timings.reset(timings_token)
+            request_model.reset(model_token)
+        except ValueError:
+            # Reset from another context (an async generator closed elsewhere)
+            current_timings.set(None)
+            request_model.set(None)
+        (self.llm_pool or get_llm_client_pool()).request_finished(model_name)
+        request_type = final_state.get("request_type") if final_state else "error"
+        get_agent_metrics().finish(timings, request_type)
+    
+    def run(self, user_message: str, scenario_id: Optional[int] = None, edit_mode: bool = False, editing_file_path: Optional[str] = None,
+            request_id: Optional[str] = None, direct_answer: Optional[bool] = None) -> Tuple[str, List[str], str, str]:
+        """
+        Run the agent with a user message (node and LLM timings are recorded under
+        request_id). direct_answer answers sql_query requests with one in-process
+        SELECT (default: EYPOR_SQL_DIRECT_ANSWER); its rows are stored under request_id.
+        """
+        timings, token, config = self._begin_request(request_id, user_message)
+        final_state = None
         try:
             # Initialize state
-            initial_state = {
-                "messages": [HumanMessage(content=user_message)],
-                "user_request": user_message,
-                "request_type": "",
-                "db_context": self._get_database_context(scenario_id),
-                "generated_files": [],
-                "execution_output": "",
-                "execution_error": "",
-                "modification_request": None,
-                "db_modification_result": None,
-                # Initialize comparison fields
-                "comparison_scenarios": [],
-                "comparison_data": {},
-                "comparison_type": "",
-                "scenario_name_mapping": {},
-                # Initialize edit mode fields with values from frontend
-                "edit_mode": edit_mode,
-                "editing_file_path": editing_file_path,
-                "original_file_content": None,
-                "file_modification_history": [],
-                # Initialize enhanced query tracking
-                "query_file_mappings": {},
-                "current_query_context": None
-            }
+            initial_state = self._initial_state(user_message, self._get_database_context(scenario_id),
+                                                edit_mode, editing_file_path, direct_answer)
             
             # Run the workflow
-            final_state = self.graph.invoke(initial_state)
-            
-            # Extract response
-            response_messages = [msg for msg in final_state["messages"] if isinstance(msg, AIMessage)]
-            if response_messages:
-                response = response_messages[-1].content
-            else:
-                response = "No response generated"
-            
-            # Extract generated files and execution results
-            generated_files = final_state.get("generated_files", [])
-            execution_output = final_state.get("execution_output", "")
-            execution_error = final_state.get("execution_error", "")
+            final_state = self.graph.invoke(initial_state, config=config)
+            return self._run_result(final_state)
             
-            # Check if this was an edit operation
-            is_edit_operation = final_state.get("request_type") == "file_edit"
-            
-            # If this was an edit operation, modify the response to indicate it
-            if is_edit_operation and generated_files:
-                # Add edit indicator to the response
-                edit_indicator = "\n\n[EDIT_OPERATION]"
-                response += edit_indicator
-                
-                # Also add the original file path for reference
-                editing_file_path = final_state.get("editing_file_path")
-                if editing_file_path:
-                    response += f"\n[EDITED_FILE: {editing_file_path}]"
-                
-                # Clear the editing_file_path after using it
-                final_state["editing_file_path"] = None
+        except Exception as e:
+            error_response = f"❌ Agent error: {str(e)}"
+            return error_response, [], "", str(e)
+        finally:
+            self._end_request(timings, token, final_state)
+    
+    async def arun(self, user_message: str, scenario_id: Optional[int] = None, edit_mode: bool = False, editing_file_path: Optional[str] = None,
+                   request_id: Optional[str] = None, direct_answer: Optional[bool] = None) -> Tuple[str, List[str], str, str]:
+        """
+        Async variant of run(): LLM calls are awaited and blocking work runs in worker
+        threads, so concurrent requests overlap on one event loop.
+        """
+        timings, token, config = self._begin_request(request_id, user_message)
+        final_state = None
+        try:
+            db_context = await asyncio.to_thread(self._get_database_context, scenario_id)
+            initial_state = self._initial_state(user_message, db_context, edit_mode, editing_file_path, direct_answer)
             
-            return response, generated_files, execution_output, execution_error
+            # Run the workflow
+            final_state = await self.graph.ainvoke(initial_state, config=config)
+            return self._run_result(final_state)
             
         except Exception as e:
             error_response = f"❌ Agent error: {str(e)}"
             return error_response, [], "", str(e)
+        finally:
+            self._end_request(timings, token, final_state)
+
+    async def astream(self, user_message: str, scenario_id: Optional[int] = None, edit_mode: bool = False,
+                      editing_file_path: Optional[str] = None, request_id: Optional[str] = None,
+                      direct_answer: Optional[bool] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the agent like arun(), yielding progress events as they happen:
+        "start", "node" (status "start"/"end" per graph node), "token" (LLM output
+        as it is generated), "execution_output" (script stdout lines) and finally
+        "result" (the values arun() returns plus the request's timings and, for
+        direct answers, the query_result rows) or "error".
+        """
+        started_at = time.perf_counter()
+        
+        def event(name: str, **data) -> Dict[str, Any]:
+            return {"event": name, "elapsed_ms": int((time.perf_counter() - started_at) * 1000), **data}
+        
+        timings, token, config = self._begin_request(request_id, user_message)
+        final_state = None
+        yield event("start", request_id=timings.request_id)
+        try:
+            db_context = await asyncio.to_thread(self._get_database_context, scenario_id)
+            initial_state = self._initial_state(user_message, db_context, edit_mode, editing_file_path, direct_answer)
+            initial_state["stream_execution_output"] = True
+            
+            final_state = None
+            node_started = {}
+            async for graph_event in self.graph.astream_events(initial_state, version="v2", config=config):
+                kind = graph_event["event"]
+                node = graph_event.get("metadata", {}).get("langgraph_node")
+                if kind == "on_chain_start" and node and graph_event["name"] == node:
+                    node_started[node] = time.perf_counter()
+                    yield event("node", node=node, status="start")
+                elif kind == "on_chain_end" and node and graph_event["name"] == node:
+                    duration_ms = int((time.perf_counter() - node_started.pop(node, started_at)) * 1000)
+                    yield event("node", node=node, status="end", duration_ms=duration_ms)
+                elif kind == "on_chat_model_stream":
+                    text = graph_event["data"]["chunk"].content
+                    if text:
+                        yield event("token", node=node, text=text)
+                elif kind == "on_custom_event" and graph_event["name"] == "execution_output":
+                    yield event("execution_output", line=graph_event["data"]["line"])
+                elif kind == "on_chain_end" and not graph_event.get("parent_ids"):
+                    final_state = graph_event["data"]["output"]
+            
+            response, generated_files, execution_output, execution_error = self._run_result(final_state)
+            self._end_request(timings, token, final_state)
+            token = None
+            yield event("result", response=response, generated_files=generated_files,
+                        execution_output=execution_output, execution_error=execution_error,
+                        request_id=timings.request_id, timings=timings.to_dict(),
+                        query_result=(final_state or {}).get("query_result"))
+            
+        except Exception as e:
+            yield event("error", error=f"❌ Agent error: {str(e)}", request_id=timings.request_id)
+        finally:
+            if token is not None:
+                self._end_request(timings, token, final_state)
 
     def _extract_code_and_explanation(self, llm_response: str) -> tuple[str, str]:
         """Extract Python code and explanatory text from LLM response"""
@@ -3518,13 +4064,9 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
         
         try:
             # Get scenario IDs from names
-            scenario_ids = []
-            all_scenarios = self.scenario_manager.list_scenarios()
-            scenario_name_to_id = {s.name: s.id for s in all_scenarios}
-            
-            for scenario_name in scenario_names:
-                if scenario_name in scenario_name_to_id:
-                    scenario_ids.append(scenario_name_to_id[scenario_name])
+            index = self._scenario_index()
+            scenarios = [index.get(scenario_name) for scenario_name in scenario_names]
+            scenario_ids = [scenario.id for scenario in scenarios if scenario]
             
             if not scenario_ids:
                 print(f"Warning: Could not find scenario IDs for names: {scenario_names}")
@@ -3570,9 +4112,36 @@ REFERENCE_COLUMN: [column name for relative calculations if applicable]"""
             print(f"🔍 DEBUG: No scenario manager available")
             return state
         
-        all_scenarios = self.scenario_manager.list_scenarios()
-        scenario_names = [s.name for s in all_scenarios]
-        print(f"🔍 DEBUG: Available scenarios: {scenario_names}")
+        scenario_names = self._scenario_index().names
+        print(f"🔍 DEBUG: Available scenarios: {len(scenario_names)}")
+        request_plan = state.get("request_plan")
+        
+        # Scenarios the request names unambiguously need no LLM call
+        scored = self._score_comparison_scenarios(user_request)
+        if self._is_confident_extraction(user_request, scored):
+            scenarios = [name for name, _ in scored]
+            comparison_type = request_plan["comparison_type"] if request_plan else self._determine_comparison_type(user_request)
+            return self._comparison_state(state, scenarios, comparison_type, request_plan,
+                                          self._scenario_extraction("deterministic", scored))
+        print(f"🔍 DEBUG: Deterministic scenario matches are ambiguous: {scored}")
+        
+        # Planned requests need no separate extraction call (the classification call
+        # may already have planned it)
+        path = "request_plan" if request_plan is not None else "planner"
+        if request_plan is None:
+            plan = self._plan_request(user_request, scenario_names)
+            request_plan = plan.to_dict() if plan else None
+        if request_plan is not None:
+            extraction = self._scenario_extraction(path, scored)
+            if len(request_plan["scenarios"]) >= 2:
+                return self._comparison_state(state, request_plan["scenarios"], request_plan["comparison_type"], request_plan, extraction)
+            print(f"🔍 DEBUG: Not enough planned scenarios: {request_plan['scenarios']}")
+            return {
+                **state,
+                "request_plan": request_plan,
+                "scenario_extraction": extraction,
+                "messages": state["messages"] + [AIMessage(content=f"❌ Could not identify at least 2 scenarios to compare. Available scenarios: {', '.join(scenario_names)}")]
+            }
         
         # Use LLM to extract scenario names from complex requests
         system_prompt = f"""You are an expert at identifying scenario names from user requests for a multi-scenario comparison system.
@@ -3638,24 +4207,15 @@ Respond with ONLY a JSON array of scenario names, like: ["Base Scenario", "test1
             
             print(f"🔍 DEBUG: Final valid scenarios: {valid_scenarios}")
             
+            extraction = self._scenario_extraction("llm", scored)
             if len(valid_scenarios) >= 2:
-                # Create comparison database context
-                db_context = self._create_comparison_database_context(valid_scenarios)
-                comparison_type = self._determine_comparison_type(user_request)
-                
-                return {
-                    **state,
-                    "comparison_scenarios": valid_scenarios,
-                    "comparison_data": {},
-                    "comparison_type": comparison_type,
-                    "scenario_name_mapping": {name: i for i, name in enumerate(valid_scenarios)},
-                    "db_context": db_context,
-                    "messages": state["messages"] + [AIMessage(content=f"🎯 Extracted scenarios: {', '.join(valid_scenarios)}")]
-                }
+                return self._comparison_state(state, valid_scenarios, self._determine_comparison_type(user_request),
+                                              scenario_extraction=extraction)
             else:
                 print(f"🔍 DEBUG: Not enough valid scenarios found: {valid_scenarios}")
                 return {
                     **state,
+                    "scenario_extraction": extraction,
                     "messages": state["messages"] + [AIMessage(content=f"❌ Could not identify at least 2 scenarios to compare. Available scenarios: {', '.join(scenario_names)}")]
                 }
                 
@@ -3666,6 +4226,43 @@ Respond with ONLY a JSON array of scenario names, like: ["Base Scenario", "test1
                 "messages": state["messages"] + [AIMessage(content=f"❌ Error extracting scenarios: {str(e)}")]
             }
     
+    def _is_confident_extraction(self, user_request: str, scored: List[Tuple[str, int]]) -> bool:
+        """
+        Whether deterministic scenario matches can be used without the LLM: at least
+        two scenarios, each matched with at least SCENARIO_MATCH_CONFIDENCE, and no
+        other scenario named in the request
+        """
+        if len(scored) < 2 or any(confidence < SCENARIO_MATCH_CONFIDENCE for _, confidence in scored):
+            return False
+        matched = {name for name, _ in scored}
+        return not [name for name in self._scenario_index().find_in_text(user_request) if name not in matched]
+    
+    def _scenario_extraction(self, path: str, scored: List[Tuple[str, int]]) -> Dict[str, Any]:
+        """Record how the comparison scenarios were found (tagged on the request's timings)"""
+        record_tag("scenario_extraction", path)
+        print(f"DEBUG: Scenario extraction path: {path}")
+        return {"path": path, "confidence": dict(scored)}
+    
+    def _comparison_state(self, state: AgentState, scenarios: List[str], comparison_type: str,
+                          request_plan: Optional[Dict[str, Any]] = None,
+                          scenario_extraction: Optional[Dict[str, Any]] = None) -> AgentState:
+        """State comparing the given scenarios"""
+        # Create comparison database context
+        db_context = self._create_comparison_database_context(scenarios)
+        path = scenario_extraction["path"] if scenario_extraction else None
+        return {
+            **state,
+            "comparison_scenarios": scenarios,
+            "comparison_data": {},
+            "comparison_type": comparison_type,
+            "scenario_name_mapping": {name: i for i, name in enumerate(scenarios)},
+            "db_context": db_context,
+            "request_plan": request_plan,
+            "scenario_extraction": scenario_extraction,
+            "messages": state["messages"] + [AIMessage(content=f"🎯 Extracted scenarios: {', '.join(scenarios)}"
+                                                       + (f" ({SCENARIO_EXTRACTION_PATHS[path]})" if path else ""))]
+        }
+    
     def _fallback_scenario_extraction(self, llm_response: str, available_scenarios: List[str]) -> List[str]:
         """Fallback method to extract scenario names from LLM response text"""
         extracted = []
@@ -3691,6 +4288,12 @@ Respond with ONLY a JSON array of scenario names, like: ["Base Scenario", "test1
         if not available_scenarios:
             return None
         
+        # Closest name from the scenario index (exact, substring or trigram-ranked fuzzy match)
+        if self.scenario_manager:
+            match = self._scenario_index().best_match(extracted_name)
+            if match and match[0] in available_scenarios:
+                return match[0]
+        
         # Simple fuzzy matching - find the scenario with the most common characters
         best_match = None
         best_score = 0
@@ -3895,6 +4498,43 @@ Respond with ONLY a JSON array of scenario names, like: ["Base Scenario", "test1
         import hashlib
         return hashlib.md5(content.encode('utf-8')).hexdigest()
     
+    def _record_execution(self, file_path: str, result, db_context, capture_dir: Optional[str] = None) -> None:
+        """
+        Store a summary and the resource usage of an executed script in the scenario's
+        execution history. If the output is longer than the summary, the run's capture
+        directory becomes a job log the history row points at; it is removed otherwise.
+        """
+        scenario_id = db_context.scenario_id if db_context else None
+        try:
+            if not self.scenario_manager or scenario_id is None:
+                return
+            command = f"python {os.path.basename(file_path)}"
+            log_job_id = None
+            job_manager = get_job_manager()
+            if capture_dir and job_manager is not None and result.output_bytes > HISTORY_OUTPUT_LIMIT:
+                job = job_manager.adopt(capture_dir, command, kind="agent", scenario_id=scenario_id,
+                                        return_code=result.return_code, timed_out=result.timed_out)
+                log_job_id = job.id if job else None
+            written = [os.path.basename(p) for p in result.written_files]
+            self.scenario_manager.log_execution(
+                scenario_id=scenario_id,
+                command=command,
+                output=result.stdout,
+                error=result.stderr,
+                output_files=json.dumps(written) if written else None,
+                result=result,
+                script=os.path.basename(file_path),
+                source="agent",
+                log_job_id=log_job_id
+            )
+            # The chat endpoints skip their own history row for this request
+            record_tag(EXECUTION_RECORDED_TAG, "agent")
+        except Exception as e:
+            print(f"⚠️ Could not record execution history: {e}")
+        finally:
+            if capture_dir:
+                shutil.rmtree(capture_dir, ignore_errors=True)
+
     def _store_query_file_mapping(self, query_id: str, file_path: str, 
                                  original_query: str, scenario_id: Optional[int] = None):
         """Store mapping between query and generated file"""
@@ -1,8 +1,8 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, HTMLResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Union
 import os
 import tempfile
 import zipfile
@@ -15,16 +15,34 @@ from dotenv import load_dotenv
 from datetime import datetime
 import google.generativeai as genai
 from openai import OpenAI
-import json
 import re
 import shutil
 import pandas as pd
 import glob
 import sqlite3
-from langgraph_agent_v2 import SimplifiedAgent, create_agent_v2, set_langgraph_model, get_langgraph_model, get_available_models
+import asyncio
+import uuid
+from langgraph_agent_v2 import SimplifiedAgent, set_langgraph_model, get_langgraph_model, get_available_models, EXECUTION_RECORDED_TAG
 
 # Scenario Manager imports and initialization
 from scenario_manager import ScenarioManager, Scenario, AnalysisFile, ExecutionHistory, ScenarioState
+from execution_pool import get_execution_pool, ExecutionResult, database_redirect_env, is_comparison_script
+from execution_cache import get_execution_cache
+from incremental_runs import get_run_tracker
+from schema_cache import get_schema_cache
+from schema_retrieval import get_schema_retriever
+from sql_validation import get_sql_validator
+from analysis_templates import get_template_registry
+from agent_metrics import get_agent_metrics
+from agent_pool import AgentPool, get_agent_pool, set_agent_pool, get_llm_client_pool
+from request_planner import get_request_planner
+from direct_query import get_direct_query_runner
+from scenario_index import get_scenario_index_cache
+from generation_cache import get_generation_cache
+from request_classifier import get_classifier_service, run_benchmark, load_examples, BENCHMARK_PATH
+from job_manager import JobManager, Job, set_job_manager, _sse
+from batch_execution import BatchManager, DEFAULT_BATCH_CONCURRENCY, written_tables
+from parameter_sweep import SweepManager, SweepAxis
 
 # Set project_root to the backend directory (where this file is located)
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -32,6 +50,13 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 # Use this project_root for ScenarioManager
 scenario_manager = ScenarioManager(project_root=project_root)
 
+# Background execution jobs (/run, /execute-model) and their logs
+job_manager = JobManager(log_root=os.path.join(project_root, "job_logs"))
+set_job_manager(job_manager)
+# Model runs across many scenarios (/execute-model/batch) and parameter sweeps (/sweeps)
+batch_manager = BatchManager(job_manager)
+sweep_manager = SweepManager(scenario_manager, batch_manager)
+
 # Clear scenarios on server startup to ensure fresh state
 def clear_scenarios_on_startup():
     """Clear all scenarios on server startup to ensure fresh state"""
@@ -111,8 +136,7 @@ converted_files = set()  # Track files that have been converted to SQL
 code_output = ""
 code_error = ""
 
-# Global variable to track running processes
-current_process = None
+# Running executions are tracked per job by job_manager (see /jobs endpoints)
 
 # Database handling
 current_database_path = None
@@ -123,8 +147,8 @@ database_schema = None
 # Database whitelist system
 table_whitelist = set()  # Tables allowed for modifications
 
-# Global agent v2 instance
-agent_v2 = None
+# Agent v2 instances are shared by all requests through the agent pool
+set_agent_pool(AgentPool(scenario_manager=scenario_manager, llm_pool=get_llm_client_pool()))
 use_langgraph_by_default = True
 
 # Temp directory management
@@ -200,6 +224,7 @@ class ChatMessage(BaseModel):
     thread_id: Optional[str] = "default"
     edit_mode: Optional[bool] = False
     editing_file_path: Optional[str] = None
+    direct_answer: Optional[bool] = None  # Answer data questions with one in-process SELECT (default: EYPOR_SQL_DIRECT_ANSWER)
 
 class ChatRequest(BaseModel):
     message: str
@@ -223,9 +248,31 @@ class ApprovalRequest(BaseModel):
     approval_response: str  # Model selection response
     approval_id: Optional[str] = None
 
+class JobLimitsRequest(BaseModel):
+    max_concurrent: Optional[int] = None
+    max_per_scenario: Optional[int] = None
+
 class ModelExecutionRequest(BaseModel):
     model_filename: str
     parameters: Optional[Dict[str, Any]] = {}
+    force: bool = False  # re-run even if the model's inputs are unchanged
+
+class SweepRequest(BaseModel):
+    base_scenario_id: int
+    axes: Dict[str, Dict[str, Any]]  # axis name -> {table, column, values, mode, key_column, key, where}
+    runs: Optional[List[Dict[str, Any]]] = None  # explicit assignments instead of the full grid
+    model_filename: Optional[str] = None
+    kpi_queries: Optional[Dict[str, str]] = None
+    max_concurrent: Optional[int] = None
+    timeout: Optional[int] = None
+    name_prefix: Optional[str] = None
+
+class BatchModelExecutionRequest(BaseModel):
+    model_filename: str
+    scenario_ids: Union[List[int], str] = "all"  # list of ids or "all"
+    max_concurrent: Optional[int] = None
+    timeout: Optional[int] = None
+    force: bool = False
 
 class WhitelistRequest(BaseModel):
     tables: List[str]
@@ -333,48 +380,32 @@ def connect_to_database(db_path: str):
         return None
 
 def get_database_info(db_path: str) -> Dict[str, Any]:
-    """Get information about the database"""
+    """Get information about the database (served from the shared schema cache)"""
     if not os.path.exists(db_path):
         return {"error": "Database file not found"}
     
     try:
-        conn = connect_to_database(db_path)
-        if not conn:
-            return {"error": "Could not connect to database"}
-        
-        cursor = conn.cursor()
-        
-        # Get list of tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        table_names = [row[0] for row in cursor.fetchall()]
+        info = get_schema_cache().get(db_path)
         
         # Build tables array with detailed info
         tables = []
         table_details = {}
         
-        for table_name in table_names:
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [{"name": row[1], "type": row[2]} for row in cursor.fetchall()]
-            
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            row_count = cursor.fetchone()[0]
-            
+        for table_name, table_info in info["tables"].items():
             # Create table object that frontend expects
             table_obj = {
                 "name": table_name,
-                "columns": columns,
-                "row_count": row_count
+                "columns": table_info["columns"],
+                "row_count": table_info["row_count"]
             }
             tables.append(table_obj)
             
             # Also keep the details dictionary for compatibility
             table_details[table_name] = {
-                "columns": columns,
-                "row_count": row_count
+                "columns": table_info["columns"],
+                "row_count": table_info["row_count"]
             }
         
-        conn.close()
-        
         return {
             "tables": tables,
             "table_details": table_details,
@@ -388,18 +419,15 @@ def get_database_info(db_path: str) -> Dict[str, Any]:
 # Removed v1 agent function - now using v2 agent only
 
 async def get_or_create_agent_v2():
-    """Get or create the simplified agent v2 instance"""
-    global agent_v2
-    
-    if agent_v2 is None:
-        # Get the current AI model setting
-        current_ai = await get_current_ai()
-        ai_model = current_ai.get("model", "openai")
-        
-        # Create agent with scenario manager
-        agent_v2 = create_agent_v2(ai_model=ai_model, scenario_manager=scenario_manager)
+    """Get the shared agent v2 instance (its graph is compiled once, in a worker thread)"""
+    # Get the current AI model setting
+    current_ai = await get_current_ai()
+    ai_model = current_ai.get("model", "openai")
     
-    return agent_v2
+    pool = get_agent_pool()
+    if pool.has_agent(ai_model):
+        return pool.get_agent(ai_model)
+    return await asyncio.to_thread(pool.get_agent, ai_model, scenario_manager)
 
 def refresh_file_list():
     """Refresh the file list to include newly created files and outputs from current scenario only"""
@@ -871,12 +899,10 @@ async def update_file(filename: str, request: FileEditRequest):
     else:
         raise HTTPException(status_code=500, detail="Failed to create file")
 
-@app.post("/run")
-async def run_file(filename: str):
-    global current_process
-    """Run a Python file with dynamic database path injection for cross-scenario compatibility"""
-    global code_output, code_error
-    
+RUN_OUTPUT_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.svg', '.html', '.csv', '.pdf', '.txt', '.json']
+
+def _prepare_run(filename: str) -> Dict[str, Any]:
+    """Resolve a /run filename to the script to execute, its working directory and database"""
     # Always define current_scenario at the very start
     current_scenario = scenario_manager.get_current_scenario()
     temp_dir = temp_directories.get('current')
@@ -951,437 +977,301 @@ async def run_file(filename: str):
     if not filename.endswith('.py'):
         raise HTTPException(status_code=400, detail="Only Python files can be executed")
     
-    try:
-        # Determine the correct working directory for execution
-        # For uploaded model files, execute in the uploaded files directory
-        # For scenario-generated files, execute in the scenario's database directory
-        # Otherwise, use the temp directory
-        
-        print(f"DEBUG: current_scenario exists: {current_scenario is not None}")
-        print(f"DEBUG: abs_path: {abs_path}")
-        print(f"DEBUG: current_scenario database_path: {current_scenario.database_path if current_scenario else 'None'}")
-        
-        # Check if this is a comparison file (contains multiple database paths or comparison logic)
-        is_comparison_file = (
-            'comparison' in filename.lower() or
-            'vs_' in filename.lower() or
-            'scenario' in filename.lower() and ('vs' in filename.lower() or 'comparison' in filename.lower())
-        )
-        
-        # FIXED: Determine execution directory based on where the file was originally created
+    # Determine the correct working directory for execution
+    # For uploaded model files, execute in the uploaded files directory
+    # For scenario-generated files, execute in the scenario's database directory
+    # Otherwise, use the temp directory
+
+    print(f"DEBUG: current_scenario exists: {current_scenario is not None}")
+    print(f"DEBUG: abs_path: {abs_path}")
+    print(f"DEBUG: current_scenario database_path: {current_scenario.database_path if current_scenario else 'None'}")
+
+    # FIXED: Determine execution directory based on where the file was originally created
+    # This ensures output files are created in the same location as the source file
+
+    # FIXED: Clean up uploaded_files to remove any scenario files that shouldn't be there
+    if current_scenario and uploaded_files:
+        scenario_dir = os.path.dirname(current_scenario.database_path)
+        print(f"DEBUG: Checking uploaded_files for scenario files in: {scenario_dir}")
+        print(f"DEBUG: Current uploaded_files: {list(uploaded_files.keys())}")
+        keys_to_remove = []
+        for key, file_path in uploaded_files.items():
+            print(f"DEBUG: Checking file: {key} -> {file_path}")
+            if file_path.startswith(scenario_dir):
+                keys_to_remove.append(key)
+                print(f"DEBUG: Removing scenario file from uploaded_files: {key}")
+
+        for key in keys_to_remove:
+            uploaded_files.pop(key, None)
+        print(f"DEBUG: After cleanup, uploaded_files: {list(uploaded_files.keys())}")
+
+    # Check if this is an uploaded model file (like runall.py, model.py, etc.)
+    is_uploaded_model = False
+    print(f"DEBUG: Checking if {filename} is in uploaded_files: {filename in uploaded_files}")
+    print(f"DEBUG: uploaded_files keys: {list(uploaded_files.keys())}")
+    if filename in uploaded_files:
+        is_uploaded_model = True
+        # For uploaded model files, execute in the uploaded files directory where all dependencies are located
+        execution_cwd = temp_dir  # Uploaded files directory
+        print(f"DEBUG: Using uploaded files directory for model execution: {execution_cwd}")
+    else:
+        # For all other files, execute in the directory where the file was found
         # This ensures output files are created in the same location as the source file
-        
-        # FIXED: Clean up uploaded_files to remove any scenario files that shouldn't be there
-        if current_scenario and uploaded_files:
-            scenario_dir = os.path.dirname(current_scenario.database_path)
-            print(f"DEBUG: Checking uploaded_files for scenario files in: {scenario_dir}")
-            print(f"DEBUG: Current uploaded_files: {list(uploaded_files.keys())}")
-            keys_to_remove = []
-            for key, file_path in uploaded_files.items():
-                print(f"DEBUG: Checking file: {key} -> {file_path}")
-                if file_path.startswith(scenario_dir):
-                    keys_to_remove.append(key)
-                    print(f"DEBUG: Removing scenario file from uploaded_files: {key}")
-            
-            for key in keys_to_remove:
-                uploaded_files.pop(key, None)
-            print(f"DEBUG: After cleanup, uploaded_files: {list(uploaded_files.keys())}")
-        
-        # Check if this is an uploaded model file (like runall.py, model.py, etc.)
-        is_uploaded_model = False
-        print(f"DEBUG: Checking if {filename} is in uploaded_files: {filename in uploaded_files}")
-        print(f"DEBUG: uploaded_files keys: {list(uploaded_files.keys())}")
-        if filename in uploaded_files:
-            is_uploaded_model = True
-            # For uploaded model files, execute in the uploaded files directory where all dependencies are located
-            execution_cwd = temp_dir  # Uploaded files directory
-            print(f"DEBUG: Using uploaded files directory for model execution: {execution_cwd}")
+        file_dir = os.path.dirname(abs_path) if abs_path else None
+
+        if file_dir and os.path.exists(file_dir):
+            # Use the directory where the file was found
+            execution_cwd = file_dir
+            print(f"DEBUG: Using file's original directory: {execution_cwd}")
+        elif current_scenario:
+            # Fallback to current scenario's database directory
+            execution_cwd = os.path.dirname(current_scenario.database_path)
+            print(f"DEBUG: Using scenario execution directory as fallback: {execution_cwd}")
         else:
-            # For all other files, execute in the directory where the file was found
-            # This ensures output files are created in the same location as the source file
-            file_dir = os.path.dirname(abs_path) if abs_path else None
-            
-            if file_dir and os.path.exists(file_dir):
-                # Use the directory where the file was found
-                execution_cwd = file_dir
-                print(f"DEBUG: Using file's original directory: {execution_cwd}")
-            elif current_scenario:
-                # Fallback to current scenario's database directory
-                execution_cwd = os.path.dirname(current_scenario.database_path)
-                print(f"DEBUG: Using scenario execution directory as fallback: {execution_cwd}")
-            else:
-                # Default to temp directory
-                execution_cwd = temp_dir
-                print(f"DEBUG: Using temp directory for execution: {execution_cwd}")
-        
-        # FIXED: Ensure we're not incorrectly using temp directory for scenario files
-        if not is_uploaded_model and abs_path and current_scenario:
-            # Double-check that we're using the correct directory for scenario files
-            scenario_db_dir = os.path.dirname(current_scenario.database_path)
-            if abs_path.startswith(scenario_db_dir):
-                execution_cwd = scenario_db_dir
-                print(f"DEBUG: Corrected to scenario directory: {execution_cwd}")
-        
-        # For uploaded model files, we're already executing in the uploaded files directory
-        # No need to check for shared uploaded files directory since we're using temp_dir
-        
-        # OPTIMIZATION: Only scan for specific output file types we care about
-        # Store file modification times before execution to detect changes
-        file_mod_times_before = {}
-        scan_dir = execution_cwd if execution_cwd else temp_dir
-        output_extensions = ['.png', '.jpg', '.jpeg', '.svg', '.html', '.csv', '.pdf', '.txt', '.json']
-        
+            # Default to temp directory
+            execution_cwd = temp_dir
+            print(f"DEBUG: Using temp directory for execution: {execution_cwd}")
+
+    # FIXED: Ensure we're not incorrectly using temp directory for scenario files
+    if not is_uploaded_model and abs_path and current_scenario:
+        # Double-check that we're using the correct directory for scenario files
+        scenario_db_dir = os.path.dirname(current_scenario.database_path)
+        if abs_path.startswith(scenario_db_dir):
+            execution_cwd = scenario_db_dir
+            print(f"DEBUG: Corrected to scenario directory: {execution_cwd}")
+
+    # For uploaded model files, we're already executing in the uploaded files directory
+    # No need to check for shared uploaded files directory since we're using temp_dir
+    
+    # Database redirection: the script runs unmodified from its own location and the
+    # runtime hooks (exec_runtime/eypor_hooks.py) map logical database names to the
+    # current scenario's database at the sqlite3.connect / pandas.read_sql* level.
+    env = {}
+    is_comparison_file = is_comparison_script(filename, abs_path)
+    print(f"DEBUG: Is comparison file: {is_comparison_file}")
+    if current_scenario and not is_comparison_file:
+        env = database_redirect_env(current_scenario.database_path)
+        print(f"DEBUG: Redirecting databases to: {current_scenario.database_path}")
+    
+    return {
+        "filename": filename,
+        "exec_path": abs_path,
+        "execution_cwd": execution_cwd,
+        "temp_dir": temp_dir,
+        "env": env,
+        "scenario_id": current_scenario.id if current_scenario else None
+    }
+
+def _collect_output_files(scan_dir: str, written_files: List[str]) -> List[Dict[str, Any]]:
+    """Build output file entries (visualizations, reports, etc.) from the files an execution wrote"""
+    output_files = []
+    output_extensions = RUN_OUTPUT_EXTENSIONS
+    try:
         if scan_dir and os.path.exists(scan_dir):
-            # OPTIMIZATION: Only scan for files with output extensions, not all files
-            for root, dirs, files in os.walk(scan_dir):
-                for file in files:
-                    if any(file.lower().endswith(ext) for ext in output_extensions):
-                        abs_file_path = os.path.join(root, file)
-                        try:
-                            file_mod_times_before[abs_file_path] = os.path.getmtime(abs_file_path)
-                        except OSError:
-                            pass
-        
-        # Record execution start time
-        import time
-        execution_start_time = time.time()
-        
-        # Execute the file with dynamic database path injection
-        file_content = None
-        temp_file_path = None
-        
-        try:
-            with open(abs_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-            
-            # Check if this is a comparison file (contains multiple database paths or comparison logic)
-            is_comparison_file = (
-                'comparison' in filename.lower() or
-                'vs_' in filename.lower() or
-                'scenario' in filename.lower() and ('vs' in filename.lower() or 'comparison' in filename.lower()) or
-                any(keyword in file_content.lower() for keyword in [
-                    'base_scenario_db', 'test_scenario_db', 'alternative_scenario_db',
-                    'scenario_names', 'multi_database', 'comparison_visualization',
-                    'scenario_name', 'scenario_names', 'scenario_data'
-                ]) or
-                file_content.count('database.db') > 1 or  # Multiple database references
-                file_content.count('sqlite3.connect') > 1  # Multiple database connections
-            )
-            
-            # Get current scenario's database path for injection
-            current_db_path = None
-            print(f"DEBUG: About to check current_scenario: {current_scenario}")
-            print(f"DEBUG: Is comparison file: {is_comparison_file}")
-            
-            if current_scenario and not is_comparison_file:
-                print(f"DEBUG: current_scenario is not None, database_path: {current_scenario.database_path}")
-                
-                # FIXED: Use relative database path based on execution directory
-                # This ensures the database path is correct regardless of where the file is executed
-                if execution_cwd and os.path.exists(execution_cwd):
-                    # Calculate relative path from execution directory to database
-                    try:
-                        db_relative_path = os.path.relpath(current_scenario.database_path, execution_cwd)
-                        current_db_path = db_relative_path
-                        print(f"DEBUG: Using relative database path: {current_db_path}")
-                    except ValueError:
-                        # If relative path calculation fails, use absolute path
-                        current_db_path = current_scenario.database_path
-                        print(f"DEBUG: Using absolute database path: {current_db_path}")
+            # The runtime hooks record every file the script opened for writing,
+            # so no directory scan or mtime comparison is needed
+            scan_root = os.path.abspath(scan_dir)
+            recently_modified_files = []
+            for abs_file_path in written_files:
+                if not abs_file_path.lower().endswith(tuple(output_extensions)):
+                    continue
+                if not os.path.isfile(abs_file_path):
+                    # Temporary file that was removed again
+                    continue
+                rel_path = os.path.relpath(abs_file_path, scan_root)
+                if rel_path.startswith('..') or os.path.isabs(rel_path):
+                    print(f"DEBUG: Ignoring output outside the execution directory: {abs_file_path}")
+                    continue
+                rel_path = rel_path.replace('\\', '/')  # Normalize for web
+                print(f"DEBUG: Output file written: {rel_path}")
+                recently_modified_files.append((rel_path, abs_file_path))
+
+            # Create output file objects for recently modified/created files
+            for rel_path, abs_file_path in recently_modified_files:
+                # Determine file type for frontend handling
+                file_type = "file"
+                if rel_path.lower().endswith(('.png', '.jpg', '.jpeg', '.svg')):
+                    file_type = "image"
+                elif rel_path.lower().endswith('.html'):
+                    # Check if it's a plotly chart based on filename patterns
+                    filename = os.path.basename(rel_path)
+                    if ('chart' in filename.lower() or 
+                        'plot' in filename.lower() or 
+                        'interactive' in filename.lower() or
+                        'sql_results' in filename.lower() or
+                        'visualization' in filename.lower() or
+                        'map' in filename.lower() or
+                        'hubs' in filename.lower() or
+                        'geo' in filename.lower() or
+                        'scatter' in filename.lower() or
+                        'bar' in filename.lower() or
+                        'line' in filename.lower() or
+                        'pie' in filename.lower() or
+                        'heatmap' in filename.lower() or
+                        'box' in filename.lower() or
+                        'histogram' in filename.lower()):
+                        file_type = "plotly-html"
+                    else:
+                        file_type = "html"
+                elif rel_path.lower().endswith('.csv'):
+                    file_type = "csv"
+                elif rel_path.lower().endswith('.pdf'):
+                    file_type = "pdf"
+
+                # Prioritize image files for display
+                if file_type == "image":
+                    output_files.insert(0, {
+                        "filename": os.path.basename(rel_path),
+                        "path": rel_path,
+                        "url": f"/files/{rel_path}/download",
+                        "type": file_type
+                    })
                 else:
-                    # Fallback to absolute path
-                    current_db_path = current_scenario.database_path
-                    print(f"DEBUG: Using fallback absolute database path: {current_db_path}")
-                
-                # Convert Windows backslashes to forward slashes for consistency
-                current_db_path = current_db_path.replace('\\', '/')
-                
-                print(f"DEBUG: Original database path: {current_scenario.database_path}")
-                print(f"DEBUG: Final database path: {current_db_path}")
-                
-                # Replace any hardcoded database paths with the current scenario's database
-                # Use forward slashes for consistency
-                file_content = file_content.replace('database.db', current_db_path)
-                file_content = file_content.replace('project_data.db', current_db_path)
-                file_content = file_content.replace('"database.db"', f'"{current_db_path}"')
-                file_content = file_content.replace("'database.db'", f"'{current_db_path}'")
-                file_content = file_content.replace('"project_data.db"', f'"{current_db_path}"')
-                file_content = file_content.replace("'project_data.db'", f"'{current_db_path}'")
-                
-                print(f"DEBUG: Database path injection completed")
-                print(f"DEBUG: Final database path in file: {current_db_path}")
-                
-                # For uploaded model files, also replace any relative database paths
-                if is_uploaded_model:
-                    # Replace common database filenames with the current scenario's database
-                    file_content = file_content.replace('"project_data.db"', f'"{current_db_path}"')
-                    file_content = file_content.replace("'project_data.db'", f"'{current_db_path}'")
-                    file_content = file_content.replace('"original_upload.db"', f'"{current_db_path}"')
-                    file_content = file_content.replace("'original_upload.db'", f"'{current_db_path}'")
-                    file_content = file_content.replace('"uploaded_files.db"', f'"{current_db_path}"')
-                    file_content = file_content.replace("'uploaded_files.db'", f"'{current_db_path}'")
-                    
-                    # Also replace any database path variables that might be set in the model
-                    file_content = file_content.replace('database_path = "project_data.db"', f'database_path = "{current_db_path}"')
-                    file_content = file_content.replace("database_path = 'project_data.db'", f"database_path = '{current_db_path}'")
-                    file_content = file_content.replace('database_path = "original_upload.db"', f'database_path = "{current_db_path}"')
-                    file_content = file_content.replace("database_path = 'original_upload.db'", f"database_path = '{current_db_path}'")
-                    
-                    # Replace any hardcoded database names in SQL queries or file operations
-                    file_content = file_content.replace('"project_data.db"', f'"{current_db_path}"')
-                    file_content = file_content.replace("'project_data.db'", f"'{current_db_path}'")
-                    file_content = file_content.replace('"original_upload.db"', f'"{current_db_path}"')
-                    file_content = file_content.replace("'original_upload.db'", f"'{current_db_path}'")
-                    
-                    # Replace database names in sqlite3.connect calls
-                    file_content = file_content.replace('sqlite3.connect("project_data.db")', f'sqlite3.connect("{current_db_path}")')
-                    file_content = file_content.replace("sqlite3.connect('project_data.db')", f"sqlite3.connect('{current_db_path}')")
-                    file_content = file_content.replace('sqlite3.connect("original_upload.db")', f'sqlite3.connect("{current_db_path}")')
-                    file_content = file_content.replace("sqlite3.connect('original_upload.db')", f"sqlite3.connect('{current_db_path}')")
-                    
-                    # Replace database names in pd.read_sql_query calls
-                    file_content = file_content.replace('pd.read_sql_query(query, "project_data.db")', f'pd.read_sql_query(query, "{current_db_path}")')
-                    file_content = file_content.replace("pd.read_sql_query(query, 'project_data.db')", f"pd.read_sql_query(query, '{current_db_path}')")
-                    
-                    # Add import path fix for uploaded model files
-                    if ('import dataprocessing' in file_content or 'from dataprocessing' in file_content or 
-                        'import model' in file_content or 'from model' in file_content):
-                        # Add uploaded files directory to Python path to ensure imports work
-                        import_path_fix = f"""
-import sys
-import os
-# Ensure uploaded files take precedence over backend files
-sys.path.insert(0, r"{temp_dir}")
-# Only add backend directory if needed for other dependencies
-if r"{temp_dir}" not in sys.path:
-    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-"""
-                        # Insert the path fix at the beginning of the file
-                        if file_content.startswith('# -*- coding: utf-8 -*-'):
-                            # Insert after encoding declaration
-                            file_content = file_content.replace('# -*- coding: utf-8 -*-', '# -*- coding: utf-8 -*-\n' + import_path_fix)
-                        else:
-                            # Insert at the very beginning
-                            file_content = import_path_fix + file_content
-            
-            # Create a temporary file with the modified content
-            import tempfile
-            import uuid
-            timestamp = int(time.time() * 1000)
-            # Unique timestamp
-            temp_filename = f"__temp_exec_{timestamp}.py"
-            # Define backend_dir if not already defined
-            backend_dir = os.path.dirname(os.path.abspath(__file__))
-            print(f"DEBUG: backend_dir defined as: {backend_dir}")
-            temp_file_path = os.path.join(backend_dir, temp_filename)
-            
-            # Write the modified content to the temp file
-            with open(temp_file_path, 'w', encoding='utf-8') as temp_file:
-                temp_file.write(file_content)
-            
-            # Use the temporary file for execution
-            abs_path = temp_file_path
-            
-        except Exception as e:
-            print(f"Warning: Could not modify file content: {e}")
-            # Continue with original file if modification fails
-        
-        # OPTIMIZATION: Reduce timeout from 300 seconds to 120 seconds for faster feedback
-        # Use Popen for better process control
-        print(f"DEBUG: Executing file: {abs_path}")
-        print(f"DEBUG: Working directory: {execution_cwd}")
-        print(f"DEBUG: Current scenario: {current_scenario.name if current_scenario else 'None'}")
-        
-        current_process = subprocess.Popen(
-            [sys.executable, abs_path],
-            cwd=execution_cwd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+                    output_files.append({
+                        "filename": os.path.basename(rel_path),
+                        "path": rel_path,
+                        "url": f"/files/{rel_path}/download",
+                        "type": file_type
+                    })
+
+            print(f"DEBUG: Found {len(output_files)} output files for display")
+    except Exception as e:
+        print(f"Error detecting output files: {e}")
+    return output_files
+
+def _invalidate_schema_cache(result: ExecutionResult):
+    """Forget cached schema information of the databases a run wrote to"""
+    for db_path in result.tables_written:
+        get_schema_cache().invalidate(db_path)
+
+def _write_job_logs(job: Job, result: ExecutionResult):
+    """Keep the job logs (and /jobs/{id}/stream) of a result served without running consistent with a real run"""
+    for path, text in ((job.stdout_path, result.stdout), (job.stderr_path, result.stderr)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+def _run_script_job(job: Job, run_spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Job runner for /run: execute the script in the warm pool and collect its output files"""
+    global code_output, code_error
+    
+    execution_cwd = run_spec["execution_cwd"]
+    scan_dir = execution_cwd if execution_cwd else run_spec["temp_dir"]
+    
+    print(f"DEBUG: Executing file: {run_spec['exec_path']}")
+    print(f"DEBUG: Working directory: {execution_cwd}")
+    
+    # Same script against unchanged databases: serve the stored result and artifacts
+    cache = get_execution_cache()
+    result = cache.lookup(run_spec["exec_path"], cwd=execution_cwd, env=run_spec["env"],
+                          bypass=not run_spec.get("use_cache", True))
+    if result is not None:
+        _write_job_logs(job, result)
+    else:
+        started_at = time.time()
+        # Run through the warm worker pool (pandas/plotly already imported)
+        execution = get_execution_pool().start(run_spec["exec_path"], cwd=execution_cwd, env=run_spec["env"], capture_dir=job.log_dir)
+        job.attach(execution)
+        # OPTIMIZATION: Reduce timeout from 300 seconds to 120 seconds
+        result = execution.wait(timeout=120)
+        cache.store(run_spec["exec_path"], result, started_at, cwd=execution_cwd, env=run_spec["env"])
+        _invalidate_schema_cache(result)
+    
+    code_output = result.stdout
+    code_error = result.stderr
+    
+    output_files = _collect_output_files(scan_dir, result.written_files)
+    
+    # Log execution (with its resource usage) to the scenario's history
+    log_execution_to_scenario(
+        command=f"python {run_spec['filename']}",
+        output=result.stdout,
+        error=result.stderr,
+        output_files=output_files,
+        result=result,
+        script=os.path.basename(run_spec['filename']),
+        source="run",
+        scenario_id=run_spec["scenario_id"],
+        job_id=job.id
+    )
+    
+    # OPTIMIZATION: Only refresh file list if we found output files
+    if output_files:
+        refresh_file_list()
+    
+    return {
+        "stdout": result.stdout,
+        "stderr": result.stderr,
+        "return_code": result.returncode,
+        "output_files": output_files,
+        "created_files": [f["filename"] for f in output_files],  # List of created/modified output files
+        "timed_out": result.timed_out,
+        "cancelled": result.cancelled,
+        "cached": result.cached,
+        "output_truncated": result.output_truncated,
+        "resource_usage": result.resource_usage()
+    }
+
+@app.post("/run")
+async def run_file(filename: str, wait: bool = True, priority: int = 0, use_cache: bool = True):
+    """Run a Python file with dynamic database path injection for cross-scenario compatibility.
+    
+    The execution is submitted as a background job. With wait=false the job id is
+    returned immediately and progress can be followed via /jobs/{job_id}/stream.
+    A previous result of the same script against unchanged databases is returned
+    from the execution cache unless use_cache=false.
+    """
+    try:
+        run_spec = await asyncio.to_thread(_prepare_run, filename)
+        run_spec["use_cache"] = use_cache
+        job = job_manager.submit(
+            lambda job: _run_script_job(job, run_spec),
+            command=f"python {filename}",
+            kind="script",
+            scenario_id=run_spec["scenario_id"],
+            metadata={"filename": filename},
+            priority=priority
         )
         
-        try:
-            # OPTIMIZATION: Reduce timeout from 300 seconds to 120 seconds
-            stdout, stderr = current_process.communicate(timeout=120)
-            return_code = current_process.returncode
-        except subprocess.TimeoutExpired:
-            # Process timed out, kill it
-            current_process.kill()
-            stdout, stderr = current_process.communicate()
-            return_code = -1
-        finally:
-            current_process = None
-        
-        result = type('Result', (), {
-            'stdout': stdout,
-            'stderr': stderr,
-            'returncode': return_code
-        })()
-        
-        # Clean up temporary file if it was created
-        if temp_file_path and temp_file_path != uploaded_files.get(filename, ''):
-            try:
-                # Clean up the temp file in the backend directory
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                    print(f"DEBUG: Cleaned up temp file: {temp_file_path}")
-            except Exception as e:
-                print(f"DEBUG: Could not clean up temp file {temp_file_path}: {e}")
-                pass
+        if not wait:
+            return {"job_id": job.id, "status": job.status}
         
-        code_output = result.stdout
-        code_error = result.stderr
-        
-        # OPTIMIZATION: Only refresh file list if we need to detect new files
-        # Detect output files (visualizations, reports, etc.) - both new and modified
-        output_files = []
-        try:
-            # Scan for output files in the execution directory
-            scan_dir = execution_cwd if execution_cwd else temp_dir
-            if scan_dir and os.path.exists(scan_dir):
-                # OPTIMIZATION: Use a more efficient file detection approach
-                # Get all output files in execution directory with their modification times
-                recently_modified_files = []
-                
-                # OPTIMIZATION: Only scan directories that are likely to contain output files
-                # Focus on the execution directory and immediate subdirectories
-                scan_paths = [scan_dir]
-                print(f"DEBUG: Scanning for output files in: {scan_dir}")
-                
-                # Add immediate subdirectories if they exist
-                if os.path.exists(scan_dir):
-                    for item in os.listdir(scan_dir):
-                        item_path = os.path.join(scan_dir, item)
-                        if os.path.isdir(item_path):
-                            scan_paths.append(item_path)
-                            print(f"DEBUG: Also scanning subdirectory: {item_path}")
-                
-                for scan_path in scan_paths:
-                    if os.path.exists(scan_path):
-                        for file in os.listdir(scan_path):
-                            if any(file.lower().endswith(ext) for ext in output_extensions):
-                                abs_file_path = os.path.join(scan_path, file)
-                                rel_path = os.path.relpath(abs_file_path, scan_dir)
-                                rel_path = rel_path.replace('\\', '/')  # Normalize for web
-                                
-                                try:
-                                    current_mod_time = os.path.getmtime(abs_file_path)
-                                    
-                                    # Check if file is new or was modified during execution
-                                    is_new_or_modified = False
-                                    if abs_file_path not in file_mod_times_before:
-                                        # New file created during execution
-                                        is_new_or_modified = True
-                                        print(f"DEBUG: New file detected: {rel_path}")
-                                    elif current_mod_time > file_mod_times_before[abs_file_path]:
-                                        # Existing file modified during execution
-                                        is_new_or_modified = True
-                                        print(f"DEBUG: Modified file detected: {rel_path}")
-                                    elif current_mod_time >= execution_start_time - 1:  # 1 second tolerance
-                                        # File modified around execution time (catch edge cases)
-                                        is_new_or_modified = True
-                                        print(f"DEBUG: Recently modified file detected: {rel_path}")
-                                    
-                                    if is_new_or_modified:
-                                        recently_modified_files.append((rel_path, abs_file_path))
-                                        
-                                except OSError:
-                                    # If we can't get mod time, include it to be safe
-                                    recently_modified_files.append((rel_path, abs_file_path))
-                
-                # Create output file objects for recently modified/created files
-                for rel_path, abs_file_path in recently_modified_files:
-                    # Determine file type for frontend handling
-                    file_type = "file"
-                    if rel_path.lower().endswith(('.png', '.jpg', '.jpeg', '.svg')):
-                        file_type = "image"
-                    elif rel_path.lower().endswith('.html'):
-                        # Check if it's a plotly chart based on filename patterns
-                        filename = os.path.basename(rel_path)
-                        if ('chart' in filename.lower() or 
-                            'plot' in filename.lower() or 
-                            'interactive' in filename.lower() or
-                            'sql_results' in filename.lower() or
-                            'visualization' in filename.lower() or
-                            'map' in filename.lower() or
-                            'hubs' in filename.lower() or
-                            'geo' in filename.lower() or
-                            'scatter' in filename.lower() or
-                            'bar' in filename.lower() or
-                            'line' in filename.lower() or
-                            'pie' in filename.lower() or
-                            'heatmap' in filename.lower() or
-                            'box' in filename.lower() or
-                            'histogram' in filename.lower()):
-                            file_type = "plotly-html"
-                        else:
-                            file_type = "html"
-                    elif rel_path.lower().endswith('.csv'):
-                        file_type = "csv"
-                    elif rel_path.lower().endswith('.pdf'):
-                        file_type = "pdf"
-                    
-                    # Prioritize image files for display
-                    if file_type == "image":
-                        output_files.insert(0, {
-                            "filename": os.path.basename(rel_path),
-                            "path": rel_path,
-                            "url": f"/files/{rel_path}/download",
-                            "type": file_type
-                        })
-                    else:
-                        output_files.append({
-                            "filename": os.path.basename(rel_path),
-                            "path": rel_path,
-                            "url": f"/files/{rel_path}/download",
-                            "type": file_type
-                        })
-                        
-                print(f"DEBUG: Found {len(output_files)} output files for display")
-                        
-        except Exception as e:
-            print(f"Error detecting output files: {e}")
-        
-        # Log execution to current scenario's history (only if output files were generated)
-        if output_files:
-            log_execution_to_scenario(
-                command=f"python {filename}",
-                output=result.stdout,
-                error=result.stderr,
-                output_files=output_files
-            )
-        
-        # OPTIMIZATION: Only refresh file list if we found output files
-        if output_files:
-            refresh_file_list()
+        await job_manager.wait_for(job.id)
+        if job.error:
+            raise HTTPException(status_code=500, detail=f"Execution failed: {job.error}")
         
         return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "return_code": result.returncode,
-            "output_files": output_files,
-            "created_files": [f["filename"] for f in output_files]  # List of created/modified output files
+            "stdout": job.stdout,
+            "stderr": job.stderr,
+            "return_code": job.return_code,
+            "output_files": job.output_files,
+            "created_files": job.result.get("created_files", []),
+            "cached": job.result.get("cached", False),
+            "output_truncated": job.result.get("output_truncated", False),
+            "job_id": job.id
         }
     
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=408, detail="Execution timed out after 120 seconds")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Execution failed: {str(e)}")
 
 @app.post("/stop-execution")
-async def stop_execution():
-    """Stop the currently running execution"""
-    global current_process
-    
-    if current_process is None:
-        raise HTTPException(status_code=400, detail="No execution is currently running")
+async def stop_execution(job_id: Optional[str] = None):
+    """Stop a running execution (the given job, or the most recently started one)"""
+    if job_id is None:
+        running = job_manager.list_jobs(status="running", limit=1000)
+        if not running:
+            raise HTTPException(status_code=400, detail="No execution is currently running")
+        job_id = max(running, key=lambda j: j.started_at or "").id
     
     try:
-        # Kill the process
-        current_process.kill()
-        current_process.communicate()  # Clean up
-        current_process = None
-        return {"message": "Execution stopped successfully"}
+        # Kills the job's whole process group
+        job = job_manager.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+        return {"message": "Execution stopped successfully", "job_id": job_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to stop execution: {str(e)}")
 
@@ -1408,21 +1298,22 @@ async def install_requirements(filename: str):
         raise HTTPException(status_code=400, detail="Only requirements.txt files can be installed")
     
     try:
-        
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "-r", abs_path],
-            capture_output=True,
-            text=True,
-            timeout=300
+        # Own process group and wait4-based accounting, off the event loop
+        execution = get_execution_pool().start_command(
+            [sys.executable, "-m", "pip", "install", "-r", abs_path]
         )
+        result = await asyncio.to_thread(execution.wait, 300)
+        if result.timed_out:
+            raise subprocess.TimeoutExpired(f"pip install -r {filename}", 300)
         
-        # Log execution to current scenario's history (only if there were errors)
-        if result.stderr:
-            log_execution_to_scenario(
-                command=f"pip install -r {filename}",
-                output=result.stdout,
-                error=result.stderr
-            )
+        log_execution_to_scenario(
+            command=f"pip install -r {filename}",
+            output=result.stdout,
+            error=result.stderr,
+            result=result,
+            script=filename,
+            source="install"
+        )
         
         return {
             "stdout": result.stdout,
@@ -1576,6 +1467,183 @@ async def get_status():
         }
     }
 
+@app.get("/execution-pool/status")
+async def get_execution_pool_status():
+    """Get the state of the warm script execution pool"""
+    return get_execution_pool().get_status()
+
+@app.get("/execution-cache/status")
+async def get_execution_cache_status():
+    """Get execution cache hit/miss counters and size"""
+    return get_execution_cache().get_status()
+
+@app.post("/execution-cache/clear")
+async def clear_execution_cache():
+    """Drop all cached execution results"""
+    await asyncio.to_thread(get_execution_cache().clear)
+    return {"success": True, "message": "Execution cache cleared"}
+
+@app.get("/schema-cache/status")
+async def get_schema_cache_status():
+    """Get hit/miss counters of the shared database schema cache"""
+    return get_schema_cache().get_status()
+
+@app.get("/schema-context/status")
+async def get_schema_context_status():
+    """Get how many prompt tokens relevance-pruned schema context has saved"""
+    return get_schema_retriever().get_status()
+
+@app.get("/sql-validation/status")
+async def get_sql_validation_status():
+    """Get how many generated scripts had their SQL checked, fixed or rejected before execution"""
+    return get_sql_validator().get_status()
+
+@app.get("/analysis-templates/status")
+async def get_analysis_templates_status():
+    """List the analysis templates and how many requests they answered without the LLM"""
+    return get_template_registry().get_status()
+
+@app.get("/agent/metrics")
+async def get_agent_metrics_summary():
+    """Latency histograms of agent v2 requests per graph node and request type, plus token totals"""
+    return get_agent_metrics().get_metrics()
+
+@app.get("/agent/metrics/requests")
+async def list_agent_request_timings(limit: int = 20):
+    """Node and LLM call timings of the most recent agent v2 requests"""
+    return {"requests": get_agent_metrics().recent(limit)}
+
+@app.get("/agent/metrics/requests/{request_id}")
+async def get_agent_request_timings(request_id: str):
+    """Node and LLM call timings of one agent v2 request"""
+    timings = get_agent_metrics().get_request(request_id)
+    if timings is None:
+        raise HTTPException(status_code=404, detail="No timings recorded for this request id")
+    return timings
+
+@app.get("/request-planner/status")
+async def get_request_planner_status():
+    """Count requests planned with one structured LLM call instead of separate classification and extraction calls"""
+    return get_request_planner().get_status()
+
+@app.get("/scenario-index/status")
+async def get_scenario_index_status():
+    """Builds and hits of the cached scenario name index used to resolve scenario names"""
+    return get_scenario_index_cache().get_status()
+
+@app.get("/direct-query/status")
+async def get_direct_query_status():
+    """Data questions answered with one in-process SELECT instead of a generated script"""
+    return get_direct_query_runner().get_status()
+
+@app.get("/query-results/{result_id}")
+async def get_query_result(result_id: str):
+    """Columns and rows of a direct answer"""
+    result = get_direct_query_runner().get_result(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Query result not found or expired")
+    return result.to_dict()
+
+@app.get("/query-results/{result_id}/html", response_class=HTMLResponse)
+async def get_query_result_html(result_id: str):
+    """Plotly table of a direct answer, rendered on the first request"""
+    html = await asyncio.to_thread(get_direct_query_runner().render_html, result_id)
+    if html is None:
+        raise HTTPException(status_code=404, detail="Query result not found or expired")
+    return HTMLResponse(content=html)
+
+@app.get("/agent-pool/status")
+async def get_agent_pool_status():
+    """Compiled agents, shared LLM clients and in-flight requests per model"""
+    return get_agent_pool().get_status()
+
+@app.get("/model-runs/status")
+async def get_model_run_status():
+    """Get counters of model runs skipped because their inputs were unchanged"""
+    return get_run_tracker().get_status()
+
+@app.post("/model-runs/clear")
+async def clear_model_runs():
+    """Forget recorded model runs so the next run of every model executes"""
+    await asyncio.to_thread(get_run_tracker().clear)
+    return {"success": True, "message": "Recorded model runs cleared"}
+
+@app.get("/classifier/metrics")
+async def get_classifier_metrics():
+    """Get how often requests were classified by keywords, the local model or the LLM"""
+    return get_classifier_service().get_metrics()
+
+@app.post("/classifier/benchmark")
+async def benchmark_classifier(include_llm: bool = False):
+    """Measure the local classifier's accuracy on the labelled benchmark set (optionally against the LLM)"""
+    service = get_classifier_service()
+    llm_classify = None
+    if include_llm:
+        agent = await get_or_create_agent_v2()
+        llm_classify = agent._llm_classify_request
+    examples = load_examples(BENCHMARK_PATH)
+    if not examples:
+        raise HTTPException(status_code=404, detail="Classifier benchmark set not found")
+    return await asyncio.to_thread(run_benchmark, service.classifier, examples, service.threshold, llm_classify)
+
+@app.post("/classifier/retrain")
+async def retrain_classifier():
+    """Retrain the local classifier on the shipped examples plus LLM-labelled requests"""
+    classifier = await asyncio.to_thread(get_classifier_service().retrain)
+    return {"success": True, "trained_on": classifier.trained_on}
+
+@app.get("/generation-cache/status")
+async def get_generation_cache_status():
+    """Get entry count, hit counters and limits of the generated code cache"""
+    return await asyncio.to_thread(get_generation_cache().get_status)
+
+@app.get("/generation-cache/entries")
+async def list_generation_cache_entries(limit: int = 100, request_type: Optional[str] = None, include_code: bool = False):
+    """List cached generations, most recently used first"""
+    entries = await asyncio.to_thread(get_generation_cache().list_entries, limit, request_type)
+    return {"entries": [entry.to_dict(include_code=include_code) for entry in entries]}
+
+@app.get("/generation-cache/entries/{key}")
+async def get_generation_cache_entry(key: str):
+    """Get one cached generation including its code"""
+    entry = await asyncio.to_thread(get_generation_cache().get_entry, key)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Generation cache entry not found")
+    return entry.to_dict()
+
+@app.delete("/generation-cache/entries/{key}")
+async def delete_generation_cache_entry(key: str):
+    """Remove one cached generation so the next identical request calls the LLM again"""
+    if not await asyncio.to_thread(get_generation_cache().invalidate, key):
+        raise HTTPException(status_code=404, detail="Generation cache entry not found")
+    return {"success": True, "message": "Generation cache entry removed"}
+
+@app.post("/generation-cache/purge")
+async def purge_generation_cache(request_type: Optional[str] = None, model_id: Optional[str] = None, expired_only: bool = False):
+    """Remove cached generations, optionally only for a request type, a model or expired entries"""
+    removed = await asyncio.to_thread(get_generation_cache().purge, request_type, model_id, expired_only)
+    return {"success": True, "removed": removed}
+
+@app.on_event("startup")
+async def warm_up_execution_pool():
+    """Start the pool workers in the background so the first run is already warm"""
+    await asyncio.to_thread(get_execution_pool().warm_up)
+
+@app.on_event("startup")
+async def sweep_job_logs():
+    """Remove job logs left by earlier processes that no execution history row points at"""
+    try:
+        referenced = await asyncio.to_thread(scenario_manager.get_log_job_ids)
+    except Exception as e:
+        print(f"Warning: Could not read job log references, keeping all job logs: {e}")
+        return
+    await asyncio.to_thread(job_manager.sweep_logs, referenced)
+
+@app.on_event("shutdown")
+async def shutdown_execution_pool():
+    """Stop the pool workers together with the server"""
+    get_execution_pool().shutdown()
+
 @app.post("/switch-ai")
 async def switch_ai_model(request: SwitchAIRequest):
     """Switch between AI models"""
@@ -1881,17 +1949,22 @@ async def langgraph_chat_v2(message: ChatMessage, request: Request = None):
         scenario_id = current_scenario.id if current_scenario else None
         
         # Run the agent with edit mode state if provided
-        response, generated_files, execution_output, execution_error = agent.run(
+        request_id = uuid.uuid4().hex[:12]
+        response, generated_files, execution_output, execution_error = await agent.arun(
             user_message=message.content,
             scenario_id=scenario_id,
             edit_mode=message.edit_mode,
-            editing_file_path=message.editing_file_path
+            editing_file_path=message.editing_file_path,
+            request_id=request_id,
+            direct_answer=message.direct_answer
         )
         
 
         
-        # Log execution to scenario history if files were generated
-        if generated_files:
+        # Log execution to scenario history if files were generated, unless the
+        # agent already recorded the script run (with its resource usage)
+        timings = get_agent_metrics().get_request(request_id)
+        if generated_files and not _execution_recorded(timings):
             log_execution_to_scenario(
                 command=f"Agent v2: {message.content}",
                 output=response,
@@ -1907,7 +1980,10 @@ async def langgraph_chat_v2(message: ChatMessage, request: Request = None):
             "query_timestamp": int(time.time() * 1000),  # Convert to milliseconds for frontend
             "execution_output": execution_output,  # Include actual execution output
             "execution_error": execution_error,  # Include actual execution error
-            "has_execution_results": bool(execution_output or execution_error or generated_files)
+            "has_execution_results": bool(execution_output or execution_error or generated_files),
+            "request_id": request_id,
+            "timings": timings,  # Per-node and LLM call timings
+            "query_result": _query_result(request_id)  # Rows of a direct answer
         }
         
     except Exception as e:
@@ -1922,6 +1998,59 @@ async def langgraph_chat_v2(message: ChatMessage, request: Request = None):
             "agent_version": "v2"
         }
 
+def _execution_recorded(timings: Optional[Dict[str, Any]]) -> bool:
+    """Whether the agent wrote the execution_history row of the request itself"""
+    return bool(timings and timings.get("tags", {}).get(EXECUTION_RECORDED_TAG))
+
+def _query_result(request_id: str) -> Optional[Dict[str, Any]]:
+    """Rows of the direct answer of a request, if it was answered directly"""
+    result = get_direct_query_runner().get_result(request_id)
+    return result.to_dict() if result else None
+
+async def _stream_chat_v2(agent, message: ChatMessage, scenario_id: Optional[int]):
+    """Server-Sent Events of an agent v2 run, ending with a "result" (or "error") event"""
+    async for event in agent.astream(
+        user_message=message.content,
+        scenario_id=scenario_id,
+        edit_mode=message.edit_mode,
+        editing_file_path=message.editing_file_path,
+        direct_answer=message.direct_answer
+    ):
+        name = event.pop("event")
+        if name == "result":
+            # Log execution to scenario history if files were generated (and not yet recorded by the agent)
+            if event["generated_files"] and not _execution_recorded(event.get("timings")):
+                await asyncio.to_thread(
+                    log_execution_to_scenario,
+                    command=f"Agent v2: {message.content}",
+                    output=event["response"],
+                    output_files=event["generated_files"]
+                )
+            event.update({
+                "scenario_id": scenario_id,
+                "agent_version": "v2",
+                "user_query": message.content,
+                "query_timestamp": int(time.time() * 1000),
+                "has_execution_results": bool(event["execution_output"] or event["execution_error"] or event["generated_files"])
+            })
+        yield _sse(name, event)
+
+@app.post("/langgraph-chat-v2/stream")
+async def langgraph_chat_v2_stream(message: ChatMessage):
+    """
+    Streaming variant of /langgraph-chat-v2 (Server-Sent Events): "start", "node"
+    transitions, LLM "token"s, script "execution_output" lines and a final "result"
+    with the same fields as the non-streaming response
+    """
+    agent = await get_or_create_agent_v2()
+    current_scenario = scenario_manager.get_current_scenario()
+    scenario_id = current_scenario.id if current_scenario else None
+    return StreamingResponse(
+        _stream_chat_v2(agent, message, scenario_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/agents")
 async def get_available_agents():
     """Get list of available agent types (only returns the main user-facing agent)"""
@@ -2045,6 +2174,7 @@ async def execute_raw_sql(sql: str = Form(...)):
         else:
             # For other queries (INSERT, UPDATE, DELETE), return affected rows
             conn.commit()
+            get_schema_cache().invalidate(db_path)
             
             # Don't log background SQL queries to execution history
             
@@ -2458,9 +2588,11 @@ async def action_chat_v2(request: ActionRequest):
         scenario_id = current_scenario.id if current_scenario else None
         
         # Run the agent (it will automatically classify and route the request)
-        response, generated_files = agent.run(
+        request_id = uuid.uuid4().hex[:12]
+        response, generated_files, _, _ = await agent.arun(
             user_message=request.message,
-            scenario_id=scenario_id
+            scenario_id=scenario_id,
+            request_id=request_id
         )
         
         # Log to scenario history
@@ -2478,7 +2610,10 @@ async def action_chat_v2(request: ActionRequest):
             "classification": "auto-detected",
             "agent_version": "v2",
             "user_query": request.message,  # Include the original user query
-            "query_timestamp": int(time.time())  # Include timestamp for organization
+            "query_timestamp": int(time.time()),  # Include timestamp for organization
+            "request_id": request_id,
+            "timings": get_agent_metrics().get_request(request_id),
+            "query_result": _query_result(request_id)
         }
         
     except Exception as e:
@@ -2863,9 +2998,92 @@ async def discover_models():
             "runall_files": []
         }
 
+MODEL_EXECUTION_TIMEOUT = 300  # 5 minute timeout
+
+def _model_command(file_path: str, file_ext: str):
+    """Return (command, shell) used to execute a model file"""
+    if file_ext == '.py':
+        return [sys.executable, file_path], False
+    elif file_ext in ['.bat', '.cmd']:
+        # Execute batch file (Windows); as a list so paths with spaces are quoted
+        return [file_path], True
+    elif file_ext == '.sh':
+        # Execute shell script (Unix/Linux)
+        return ['bash', file_path], False
+    return None, False
+
+def _resolve_model_file(model_filename: str) -> Optional[str]:
+    """Path of a model file: an uploaded file or a path relative to the backend"""
+    # Check if file exists in uploaded files
+    if model_filename in uploaded_files:
+        return uploaded_files[model_filename]
+    # Check if file exists in current directory
+    if os.path.exists(model_filename):
+        return os.path.abspath(model_filename)
+    return None
+
+def _run_model_job(job: Job, model_filename: str, file_path: str, file_ext: str, scenario_id: Optional[int],
+                   force: bool = False) -> Dict[str, Any]:
+    """Job runner for /execute-model: run the model in its own directory and process group"""
+    command, shell = _model_command(file_path, file_ext)
+    file_dir = os.path.dirname(file_path) or None
+    
+    # Skip the run if no table or file the model read last time has changed
+    tracker = get_run_tracker()
+    decision = tracker.check(file_path, cwd=file_dir, force=force)
+    if decision.skip:
+        result = decision.record.to_result()
+        _write_job_logs(job, result)
+    else:
+        # Models are long-running, so they get their own process rather than a warm
+        # pool worker; the working directory is passed to the process, never os.chdir'd
+        execution = get_execution_pool().start_command(command, cwd=file_dir, shell=shell, capture_dir=job.log_dir)
+        job.attach(execution)
+        result = execution.wait(timeout=MODEL_EXECUTION_TIMEOUT)
+        tracker.record(file_path, result, cwd=file_dir, baseline=decision.baseline)
+        _invalidate_schema_cache(result)
+    
+    # Log execution to scenario history
+    log_execution_to_scenario(
+        command=f"Model Execution: {model_filename}",
+        output=result.stdout if result.returncode == 0 else None,
+        error=result.stderr if result.returncode != 0 else None,
+        result=result,
+        script=model_filename,
+        source="model",
+        scenario_id=scenario_id,
+        job_id=job.id
+    )
+    
+    response = {
+        "success": result.returncode == 0,
+        "filename": model_filename,
+        "stdout": result.stdout,
+        "stderr": result.stderr,
+        "return_code": result.returncode,
+        "execution_time": "completed",
+        "scenario_id": scenario_id,
+        "timed_out": result.timed_out,
+        "cancelled": result.cancelled,
+        "skipped": decision.skip,
+        "rerun_reason": decision.reason,
+        "changed_tables": decision.changed_tables,
+        "output_truncated": result.output_truncated,
+        "resource_usage": result.resource_usage()
+    }
+    if result.timed_out:
+        response["error"] = "Execution timed out after 5 minutes"
+    elif result.cancelled:
+        response["error"] = "Execution was cancelled"
+    return response
+
 @app.post("/execute-model")
-async def execute_model(request: ModelExecutionRequest):
-    """Execute a selected model file using current scenario's database"""
+async def execute_model(request: ModelExecutionRequest, wait: bool = True, priority: int = 0):
+    """Execute a selected model file using current scenario's database.
+    
+    The model runs as a background job; with wait=false the job id is returned
+    immediately and output can be streamed from /jobs/{job_id}/stream.
+    """
     try:
         model_filename = request.model_filename
         parameters = request.parameters or {}
@@ -2874,157 +3092,51 @@ async def execute_model(request: ModelExecutionRequest):
         scenario = scenario_manager.get_current_scenario()
         db_path = get_active_scenario_database()
         
-        # Check if file exists in uploaded files
-        if model_filename in uploaded_files:
-            file_path = uploaded_files[model_filename]
-        else:
-            # Check if file exists in current directory
-            if os.path.exists(model_filename):
-                file_path = os.path.abspath(model_filename)
-            else:
-                return {
-                    "success": False,
-                    "error": f"Model file '{model_filename}' not found",
-                    "filename": model_filename
-                }
+        file_path = _resolve_model_file(model_filename)
+        if file_path is None:
+            return {
+                "success": False,
+                "error": f"Model file '{model_filename}' not found",
+                "filename": model_filename
+            }
         
         # Determine execution method based on file extension
         file_ext = os.path.splitext(model_filename)[1].lower()
-        
-        if file_ext == '.py':
-            # Execute Python file
-            try:
-                # Change to the directory containing the file
-                file_dir = os.path.dirname(file_path)
-                original_cwd = os.getcwd()
-                
-                if file_dir:
-                    os.chdir(file_dir)
-                
-                # Execute the Python file
-                result = subprocess.run(
-                    [sys.executable, os.path.basename(file_path)],
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
-                
-                # Restore original working directory
-                os.chdir(original_cwd)
-                
-                # Log execution to scenario history
-                log_execution_to_scenario(
-                    command=f"Model Execution: {model_filename}",
-                    output=result.stdout if result.returncode == 0 else None,
-                    error=result.stderr if result.returncode != 0 else None
-                )
-                
-                return {
-                    "success": result.returncode == 0,
-                    "filename": model_filename,
-                    "stdout": result.stdout,
-                    "stderr": result.stderr,
-                    "return_code": result.returncode,
-                    "execution_time": "completed",
-                    "scenario_id": scenario.id if scenario else None
-                }
-                
-            except subprocess.TimeoutExpired:
-                return {
-                    "success": False,
-                    "filename": model_filename,
-                    "error": "Execution timed out after 5 minutes",
-                    "stdout": "",
-                    "stderr": "Timeout"
-                }
-            except Exception as e:
-                return {
-                    "success": False,
-                    "filename": model_filename,
-                    "error": str(e),
-                    "stdout": "",
-                    "stderr": str(e)
-                }
-                
-        elif file_ext in ['.bat', '.cmd']:
-            # Execute batch file (Windows)
-            try:
-                result = subprocess.run(
-                    [file_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=300,
-                    shell=True
-                )
-                
-                # Log execution to scenario history
-                log_execution_to_scenario(
-                    command=f"Model Execution: {model_filename}",
-                    output=result.stdout if result.returncode == 0 else None,
-                    error=result.stderr if result.returncode != 0 else None
-                )
-                
-                return {
-                    "success": result.returncode == 0,
-                    "filename": model_filename,
-                    "stdout": result.stdout,
-                    "stderr": result.stderr,
-                    "return_code": result.returncode,
-                    "execution_time": "completed",
-                    "scenario_id": scenario.id if scenario else None
-                }
-                
-            except Exception as e:
-                return {
-                    "success": False,
-                    "filename": model_filename,
-                    "error": str(e),
-                    "stdout": "",
-                    "stderr": str(e)
-                }
-                
-        elif file_ext == '.sh':
-            # Execute shell script (Unix/Linux)
-            try:
-                result = subprocess.run(
-                    ['bash', file_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
-                
-                # Log execution to scenario history
-                log_execution_to_scenario(
-                    command=f"Model Execution: {model_filename}",
-                    output=result.stdout if result.returncode == 0 else None,
-                    error=result.stderr if result.returncode != 0 else None
-                )
-                
-                return {
-                    "success": result.returncode == 0,
-                    "filename": model_filename,
-                    "stdout": result.stdout,
-                    "stderr": result.stderr,
-                    "return_code": result.returncode,
-                    "execution_time": "completed",
-                    "scenario_id": scenario.id if scenario else None
-                }
-                
-            except Exception as e:
-                return {
-                    "success": False,
-                    "filename": model_filename,
-                    "error": str(e),
-                    "stdout": "",
-                    "stderr": str(e)
-                }
-        else:
+        command, _ = _model_command(file_path, file_ext)
+        if command is None:
             return {
                 "success": False,
                 "filename": model_filename,
                 "error": f"Unsupported file type: {file_ext}",
                 "supported_types": [".py", ".bat", ".cmd", ".sh"]
             }
+        
+        scenario_id = scenario.id if scenario else None
+        job = job_manager.submit(
+            lambda job: _run_model_job(job, model_filename, file_path, file_ext, scenario_id, request.force),
+            command=f"Model Execution: {model_filename}",
+            kind="model",
+            scenario_id=scenario_id,
+            metadata={"filename": model_filename},
+            priority=priority
+        )
+        
+        if not wait:
+            return {"success": True, "filename": model_filename, "job_id": job.id, "status": job.status}
+        
+        await job_manager.wait_for(job.id)
+        if not job.result:
+            # The runner itself failed before producing a result
+            return {
+                "success": False,
+                "filename": model_filename,
+                "error": job.error,
+                "stdout": "",
+                "stderr": job.error,
+                "job_id": job.id
+            }
+        
+        return {**job.result, "stdout": job.stdout, "stderr": job.stderr, "job_id": job.id}
             
     except Exception as e:
         return {
@@ -3033,6 +3145,323 @@ async def execute_model(request: ModelExecutionRequest):
             "filename": request.model_filename
         }
 
+def _run_batch_model_job(job: Job, model_filename: str, file_path: str, file_ext: str,
+                         scenario_id: int, timeout: int, force: bool = False) -> Dict[str, Any]:
+    """Job runner for one scenario of a batch: the model runs in the scenario directory against its database"""
+    scenario = scenario_manager.get_scenario(scenario_id)
+    if scenario is None or not scenario.database_path:
+        return {"success": False, "error": f"Scenario {scenario_id} not found", "stdout": "", "stderr": "", "return_code": None}
+    
+    database_path = os.path.abspath(scenario.database_path)
+    scenario_dir = os.path.dirname(database_path)
+    command, shell = _model_command(file_path, file_ext)
+    env = {
+        # Relative database names used by the model resolve to this scenario's database
+        **database_redirect_env(database_path),
+        "EYPOR_SCENARIO_ID": str(scenario_id),
+        "EYPOR_MODEL_DIR": os.path.dirname(file_path),
+    }
+    
+    tracker = get_run_tracker()
+    decision = tracker.check(file_path, cwd=scenario_dir, env=env, force=force)
+    if decision.skip:
+        # Unchanged inputs: the outputs of the recorded run are still in place
+        result = decision.record.to_result()
+        _write_job_logs(job, result)
+        output_tables = decision.record.outputs.get("output_tables", [])
+        output_files = decision.record.outputs.get("output_files", [])
+    else:
+        # Each scenario runs in its own directory, so parallel runs never share output files
+        execution = get_execution_pool().start_command(command, cwd=scenario_dir, env=env, shell=shell, capture_dir=job.log_dir)
+        job.attach(execution)
+        result = execution.wait(timeout=timeout)
+        
+        output_tables = written_tables(result, database_path)
+        output_files = _collect_output_files(scenario_dir, result.written_files)
+        tracker.record(file_path, result, cwd=scenario_dir, env=env,
+                       outputs={"output_tables": output_tables, "output_files": output_files},
+                       baseline=decision.baseline)
+        _invalidate_schema_cache(result)
+    
+    log_execution_to_scenario(
+        command=f"Model Execution: {model_filename}",
+        output=result.stdout if result.returncode == 0 else None,
+        error=result.stderr if result.returncode != 0 else None,
+        output_files=output_files,
+        result=result,
+        script=model_filename,
+        source="model",
+        scenario_id=scenario_id,
+        job_id=job.id
+    )
+    
+    return {
+        "success": result.returncode == 0,
+        "filename": model_filename,
+        "stdout": result.stdout,
+        "stderr": result.stderr,
+        "return_code": result.returncode,
+        "scenario_id": scenario_id,
+        "output_tables": output_tables,
+        "output_files": output_files,
+        "timed_out": result.timed_out,
+        "cancelled": result.cancelled,
+        "skipped": decision.skip,
+        "rerun_reason": decision.reason,
+        "changed_tables": decision.changed_tables,
+        "output_truncated": result.output_truncated,
+        "resource_usage": result.resource_usage()
+    }
+
+@app.post("/execute-model/batch")
+async def execute_model_batch(request: BatchModelExecutionRequest, wait: bool = False, priority: int = 0):
+    """Execute a model file against several scenarios (or "all") in parallel.
+    
+    Every scenario runs as its own job in the scenario's directory with its database
+    injected; at most max_concurrent of them run at once. Returns the batch id
+    immediately unless wait=true; follow progress with /execute-model/batch/{batch_id}
+    or its /stream.
+    """
+    model_filename = request.model_filename
+    file_path = _resolve_model_file(model_filename)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail=f"Model file '{model_filename}' not found")
+    
+    file_ext = os.path.splitext(model_filename)[1].lower()
+    command, _ = _model_command(file_path, file_ext)
+    if command is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_ext}")
+    
+    all_scenarios = {s.id: s for s in scenario_manager.list_scenarios()}
+    if isinstance(request.scenario_ids, str):
+        if request.scenario_ids != "all":
+            raise HTTPException(status_code=400, detail='scenario_ids must be a list of ids or "all"')
+        scenario_ids = sorted(all_scenarios)
+    else:
+        scenario_ids = list(dict.fromkeys(request.scenario_ids))
+    missing = [sid for sid in scenario_ids if sid not in all_scenarios]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Scenarios not found: {missing}")
+    if not scenario_ids:
+        raise HTTPException(status_code=400, detail="No scenarios to run")
+    
+    timeout = request.timeout or MODEL_EXECUTION_TIMEOUT
+    batch = batch_manager.submit(
+        model_filename,
+        [(sid, all_scenarios[sid].name) for sid in scenario_ids],
+        lambda sid: (lambda job: _run_batch_model_job(job, model_filename, file_path, file_ext, sid, timeout, request.force)),
+        max_concurrent=request.max_concurrent or DEFAULT_BATCH_CONCURRENCY,
+        priority=priority
+    )
+    
+    if wait:
+        await batch_manager.wait_for(batch.id)
+    return batch.to_dict()
+
+@app.get("/execute-model/batch/{batch_id}")
+async def get_model_batch(batch_id: str):
+    """Progress and per-scenario results (status, timings, output tables) of a batch"""
+    batch = batch_manager.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch '{batch_id}' not found")
+    return batch.to_dict()
+
+@app.get("/execute-model/batch/{batch_id}/stream")
+async def stream_model_batch(batch_id: str):
+    """Stream batch progress as Server-Sent Events"""
+    if batch_manager.get_batch(batch_id) is None:
+        raise HTTPException(status_code=404, detail=f"Batch '{batch_id}' not found")
+    return StreamingResponse(
+        batch_manager.stream_progress(batch_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/execute-model/batch/{batch_id}/cancel")
+async def cancel_model_batch(batch_id: str):
+    """Cancel all queued and running jobs of a batch"""
+    batch = batch_manager.cancel(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch '{batch_id}' not found")
+    return batch.to_dict()
+
+@app.get("/execute-model/batches")
+async def list_model_batches():
+    """Recent batches (without per-scenario details)"""
+    batches = []
+    for batch in batch_manager.list_batches():
+        summary = batch.to_dict()
+        summary.pop("scenarios")
+        batches.append(summary)
+    return {"batches": batches}
+
+# --- PARAMETER SWEEP ENDPOINTS ---
+@app.post("/sweeps")
+async def create_sweep(request: SweepRequest, wait: bool = False):
+    """Generate scenario variants of a base scenario from a parameter grid and run the model on each.
+    
+    Returns the sweep with its (growing) KPI table; poll /sweeps/{sweep_id} or stream
+    /execute-model/batch/{batch_id}/stream for progress.
+    """
+    model_runner = None
+    model_filename = request.model_filename
+    if model_filename:
+        file_path = _resolve_model_file(model_filename)
+        if file_path is None:
+            raise HTTPException(status_code=404, detail=f"Model file '{model_filename}' not found")
+        file_ext = os.path.splitext(model_filename)[1].lower()
+        if _model_command(file_path, file_ext)[0] is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_ext}")
+        timeout = request.timeout or MODEL_EXECUTION_TIMEOUT
+        model_runner = lambda job, scenario_id: _run_batch_model_job(job, model_filename, file_path, file_ext, scenario_id, timeout)
+    
+    try:
+        axes = [SweepAxis.from_dict(name, data) for name, data in request.axes.items()]
+        # Cloning hundreds of variants is disk-bound; keep it off the event loop
+        sweep = await asyncio.to_thread(
+            sweep_manager.create,
+            request.base_scenario_id,
+            axes,
+            runs=request.runs,
+            model_runner=model_runner,
+            model_filename=model_filename,
+            kpi_queries=request.kpi_queries,
+            max_concurrent=request.max_concurrent or DEFAULT_BATCH_CONCURRENCY,
+            name_prefix=request.name_prefix
+        )
+    except (KeyError, ValueError, sqlite3.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sweep: {e}")
+    
+    if wait:
+        await batch_manager.wait_for(sweep.batch.id)
+    return sweep.to_dict()
+
+@app.get("/sweeps")
+async def list_sweeps():
+    """Recent sweeps (without KPI tables)"""
+    return {"sweeps": [sweep.to_dict(include_kpis=False) for sweep in sweep_manager.list_sweeps()]}
+
+@app.get("/sweeps/{sweep_id}")
+async def get_sweep(sweep_id: str):
+    """Sweep progress and its KPI table (one row per run)"""
+    sweep = sweep_manager.get_sweep(sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail=f"Sweep '{sweep_id}' not found")
+    return sweep.to_dict()
+
+@app.get("/sweeps/{sweep_id}/kpis")
+async def get_sweep_kpis(sweep_id: str, format: str = "json"):
+    """The KPI table of a sweep as JSON rows or CSV (format=csv)"""
+    sweep = sweep_manager.get_sweep(sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail=f"Sweep '{sweep_id}' not found")
+    if format == "csv":
+        return Response(
+            content=sweep.kpi_csv(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename=sweep_{sweep_id}_kpis.csv"}
+        )
+    return {"sweep_id": sweep_id, "rows": sweep.kpi_table()}
+
+@app.post("/sweeps/{sweep_id}/cancel")
+async def cancel_sweep(sweep_id: str):
+    """Cancel the remaining model runs of a sweep (generated scenarios are kept)"""
+    sweep = sweep_manager.get_sweep(sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail=f"Sweep '{sweep_id}' not found")
+    batch_manager.cancel(sweep.batch.id)
+    return sweep.to_dict(include_kpis=False)
+
+# --- EXECUTION JOB ENDPOINTS ---
+@app.get("/jobs")
+async def list_jobs(scenario_id: Optional[int] = None, status: Optional[str] = None, limit: int = 50):
+    """List recent execution jobs"""
+    jobs = job_manager.list_jobs(scenario_id=scenario_id, status=status, limit=limit)
+    return {"jobs": [job.to_dict(include_output=False) for job in jobs]}
+
+@app.get("/jobs/metrics")
+async def get_job_metrics():
+    """Scheduler metrics: queue depth, running jobs and per-scenario load"""
+    return job_manager.get_metrics()
+
+@app.put("/jobs/limits")
+async def update_job_limits(request: JobLimitsRequest):
+    """Change the global and per-scenario concurrency limits"""
+    job_manager.configure(max_concurrent=request.max_concurrent, max_per_scenario=request.max_per_scenario)
+    return {"max_concurrent": job_manager.max_concurrent, "max_per_scenario": job_manager.max_per_scenario}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job (running jobs have their process group killed)"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return {"job_id": job.id, "status": job.status, "cancel_requested": job.cancel_requested}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get status, return code, output and output files of an execution job"""
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/logs/{stream}")
+async def read_job_log(job_id: str, stream: str, request: Request, offset: int = 0, length: Optional[int] = None):
+    """Read a byte range of a job's full stdout/stderr log.
+    
+    The range is taken from a "Range: bytes=start-end" header if present, else from
+    offset/length. Responses carry Content-Range with the total (uncompressed) size.
+    """
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    if stream not in ("stdout", "stderr"):
+        raise HTTPException(status_code=400, detail="stream must be 'stdout' or 'stderr'")
+    
+    total = job_manager.log_size(job, stream)
+    range_header = request.headers.get("range")
+    if range_header:
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+        if not match or match.groups() == ("", ""):
+            raise HTTPException(status_code=416, detail=f"Invalid range: {range_header}")
+        start, end = match.groups()
+        if start == "":
+            # Suffix range: the last N bytes
+            offset = max(0, total - int(end))
+            length = total - offset
+        else:
+            offset = int(start)
+            length = int(end) - offset + 1 if end else None
+    if offset < 0 or (length is not None and length < 0):
+        raise HTTPException(status_code=400, detail="offset and length must not be negative")
+    if offset > total or (range_header and offset >= total > 0):
+        raise HTTPException(status_code=416, detail=f"Range starts beyond the end of the log ({total} bytes)")
+    
+    data = await asyncio.to_thread(job_manager.read_log, job, stream, offset, length)
+    end = offset + len(data) - 1
+    partial = offset > 0 or offset + len(data) < total
+    return Response(
+        content=data,
+        status_code=206 if partial else 200,
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {offset}-{max(end, offset)}/{total}" if data else f"bytes */{total}",
+        }
+    )
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """Stream a job's stdout/stderr incrementally as Server-Sent Events"""
+    if job_manager.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return StreamingResponse(
+        job_manager.stream_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/session/info")
 async def get_session_info():
     """Get information about the current session and temp directory structure"""
@@ -3273,6 +3702,12 @@ def delete_analysis_file(id: int):
 def get_execution_history(id: int):
     return scenario_manager.get_execution_history(id)
 
+@app.get("/execution-stats")
+def get_execution_stats(scenario_id: Optional[int] = None, script: Optional[str] = None,
+                        source: Optional[str] = None):
+    """p50/p95/max wall time, CPU time, peak RSS and output bytes per scenario and per script"""
+    return scenario_manager.get_execution_stats(scenario_id=scenario_id, script=script, source=source)
+
 # --- PATCH EXISTING ENDPOINTS TO BE SCENARIO-AWARE ---
 # Helper to get current scenario's database path
 
@@ -3283,23 +3718,38 @@ def get_active_scenario_database():
     else:
         return current_database_path  # fallback for backward compatibility
 
-def log_execution_to_scenario(command: str, output: str = None, error: str = None, output_files: list = None):
-    """Helper function to log execution to current scenario's history"""
+def log_execution_to_scenario(command: str, output: str = None, error: str = None, output_files: list = None,
+                              result: Optional[ExecutionResult] = None, script: Optional[str] = None,
+                              source: Optional[str] = None, scenario_id: Optional[int] = None,
+                              job_id: Optional[str] = None):
+    """Helper function to log execution to a scenario's history (the current one by default).
+    
+    When the ExecutionResult of the run is passed, its wall time, CPU time, peak RSS
+    and output size are stored too (see GET /execution-stats). Only a head/tail
+    summary of the output is stored; for job runs the row points at the job whose
+    full log is served by /jobs/{job_id}/logs/{stream}, also after a restart.
+    """
     try:
-        scenario = scenario_manager.get_current_scenario()
-        if scenario:
+        if scenario_id is None:
+            scenario = scenario_manager.get_current_scenario()
+            scenario_id = scenario.id if scenario else None
+        if scenario_id is not None:
             # Convert output_files list to JSON string if provided
             output_files_json = None
             if output_files:
                 import json
                 output_files_json = json.dumps(output_files)
             
-            scenario_manager.add_execution_history(
-                scenario_id=scenario.id,
+            scenario_manager.log_execution(
+                scenario_id=scenario_id,
                 command=command,
                 output=output,
                 error=error,
-                output_files=output_files_json
+                output_files=output_files_json,
+                result=result,
+                script=script,
+                source=source,
+                log_job_id=job_id
             )
     except Exception as e:
         print(f"Warning: Could not log execution to scenario history: {e}")
@@ -3308,13 +3758,10 @@ def log_execution_to_scenario(command: str, output: str = None, error: str = Non
 @app.post("/switch-agent-version")
 async def switch_agent_version(request: dict):
     """Switch between agent v1 and v2"""
-    global agent_v2
-    
     version = request.get("version", "v2")
     
     if version == "v2":
-        # Initialize v2 agent
-        agent_v2 = None  # Force recreation
+        # The pooled agent is kept: requests in flight continue on it
         await get_or_create_agent_v2()
         return {"message": "Switched to Agent v2 (Simplified with proper scenario routing)", "version": "v2"}
     else:
@@ -3325,7 +3772,7 @@ async def get_agent_version():
     """Get current agent version info"""
     return {
         "v1_available": True,
-        "v2_available": agent_v2 is not None,
+        "v2_available": get_agent_pool().has_agent((await get_current_ai()).get("model", "openai")),
         "v2_features": [
             "Proper scenario database routing",
             "Simplified workflow", 
@@ -0,0 +1,334 @@
+"""
+Parameter Sweep Engine for EYProject
+
+This module generates scenario variants from a base scenario and runs the model
+on all of them, for sensitivity studies such as "MaxHubs in 3..6 times demand
+-10%/0/+10%".
+
+A sweep is described by axes. Each axis changes one column of one input table:
+- mode "set": assign the value, e.g. Value of the inputs_params row whose
+  Parameter is 'MaxHubs'
+- mode "percent": change the current value by a percentage, e.g. Demand in
+  inputs_destinations (optionally only rows matching `where`)
+
+The runs are either the full grid (cartesian product of all axis values) or an
+explicit list of assignments. Variants are cloned from the base database with
+the SQLite backup API and all changes of a variant are applied in one
+transaction (ScenarioManager.create_branch_scenarios). The model then runs for
+every variant as a batch (see batch_execution.py), and the results come back as
+one tidy KPI table with a row per run.
+"""
+
+import os
+import csv
+import io
+import uuid
+import sqlite3
+import itertools
+import threading
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Callable
+
+from batch_execution import BatchManager, BatchRun, DEFAULT_BATCH_CONCURRENCY
+from scenario_manager import ScenarioManager
+from job_manager import Job
+
+MAX_SWEEP_RUNS = int(os.getenv("EYPOR_MAX_SWEEP_RUNS", "1000"))
+SWEEP_MODES = ("set", "percent")
+OUTPUT_TABLE_PREFIX = "outputs_"
+
+
+@dataclass
+class SweepAxis:
+    """One swept input: a column of a table, restricted to a key row or a filter"""
+    name: str
+    table: str
+    column: str
+    values: List[Any]
+    mode: str = "set"
+    key_column: Optional[str] = None
+    key: Optional[Any] = None
+    where: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> 'SweepAxis':
+        return cls(
+            name=name,
+            table=data["table"],
+            column=data["column"],
+            values=list(data.get("values") or []),
+            mode=data.get("mode", "set"),
+            key_column=data.get("key_column"),
+            key=data.get("key"),
+            where=dict(data.get("where") or {}),
+        )
+
+    def filters(self) -> Dict[str, Any]:
+        filters = dict(self.where)
+        if self.key_column:
+            filters[self.key_column] = self.key
+        return filters
+
+    def validate(self, schema: Dict[str, List[str]]):
+        """Check table/column names against the database schema (they are not bindable)"""
+        if self.mode not in SWEEP_MODES:
+            raise ValueError(f"Axis '{self.name}': mode must be one of {SWEEP_MODES}")
+        if self.table not in schema:
+            raise ValueError(f"Axis '{self.name}': table '{self.table}' does not exist")
+        for column in [self.column] + list(self.filters()):
+            if column not in schema[self.table]:
+                raise ValueError(f"Axis '{self.name}': column '{column}' does not exist in '{self.table}'")
+        if self.key_column and self.key is None:
+            raise ValueError(f"Axis '{self.name}': key_column needs a key")
+
+    def apply(self, conn: sqlite3.Connection, value: Any) -> int:
+        """Apply one value of this axis; returns the number of rows changed"""
+        filters = self.filters()
+        where_sql = " AND ".join(f'"{column}" = ?' for column in filters) or "1"
+        if self.mode == "percent":
+            set_sql = f'"{self.column}" = "{self.column}" * (1 + ? / 100.0)'
+        else:
+            set_sql = f'"{self.column}" = ?'
+        cursor = conn.execute(f'UPDATE "{self.table}" SET {set_sql} WHERE {where_sql}',
+                              [value] + list(filters.values()))
+        if cursor.rowcount == 0:
+            raise ValueError(f"Axis '{self.name}': no rows of '{self.table}' match {filters}")
+        return cursor.rowcount
+
+    def label(self, value: Any) -> str:
+        if self.mode == "percent" and isinstance(value, (int, float)):
+            return f"{self.name}={value:+g}%"
+        return f"{self.name}={value}"
+
+
+def table_columns(db_path: str) -> Dict[str, List[str]]:
+    """Column names of every table in a database"""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+        return {table: [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')] for table in tables}
+    finally:
+        conn.close()
+
+
+def expand_runs(axes: List[SweepAxis], runs: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """The assignments (axis name -> value) to run: an explicit list, or the full grid"""
+    names = [axis.name for axis in axes]
+    if runs:
+        for assignment in runs:
+            unknown = set(assignment) - set(names)
+            if unknown:
+                raise ValueError(f"Unknown axes in run {assignment}: {sorted(unknown)}")
+        return [dict(assignment) for assignment in runs]
+    for axis in axes:
+        if not axis.values:
+            raise ValueError(f"Axis '{axis.name}' has no values")
+    return [dict(zip(names, combination)) for combination in itertools.product(*(axis.values for axis in axes))]
+
+
+def apply_assignment(conn: sqlite3.Connection, axes: List[SweepAxis], assignment: Dict[str, Any]):
+    """Apply all axis values of one run (the caller owns the transaction)"""
+    for axis in axes:
+        if axis.name in assignment:
+            axis.apply(conn, assignment[axis.name])
+
+
+def collect_kpis(db_path: str, kpi_queries: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    KPIs of a finished run. Custom kpi_queries map a KPI name to a SELECT returning
+    one value; by default every outputs_* table contributes its row count and the
+    sum of each numeric column.
+    """
+    kpis: Dict[str, Any] = {}
+    # Read-only: KPI queries must never change the variant
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        if kpi_queries:
+            for name, query in kpi_queries.items():
+                try:
+                    row = conn.execute(query).fetchone()
+                    kpis[name] = row[0] if row else None
+                except sqlite3.Error as e:
+                    kpis[name] = None
+                    print(f"DEBUG: KPI '{name}' failed: {e}")
+            return kpis
+
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ? ORDER BY name",
+            (OUTPUT_TABLE_PREFIX + "%",))]
+        for table in tables:
+            kpis[f"{table}.rows"] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            for column in conn.execute(f'PRAGMA table_info("{table}")').fetchall():
+                declared_type = (column[2] or "").upper()
+                if any(t in declared_type for t in ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC")):
+                    kpis[f"{table}.{column[1]}.sum"] = conn.execute(
+                        f'SELECT SUM("{column[1]}") FROM "{table}"').fetchone()[0]
+    finally:
+        conn.close()
+    return kpis
+
+
+@dataclass
+class ParameterSweep:
+    """A set of generated scenario variants and the batch running the model on them"""
+    id: str
+    base_scenario_id: int
+    axes: List[SweepAxis]
+    assignments: List[Dict[str, Any]]
+    scenario_ids: List[int]
+    batch: BatchRun
+    model_filename: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def kpi_table(self) -> List[Dict[str, Any]]:
+        """One row per run: run number, scenario, axis values, status, timing and KPIs"""
+        rows = []
+        jobs = {scenario_id: job for scenario_id, _, job in self.batch.runs}
+        names = {scenario_id: name for scenario_id, name, _ in self.batch.runs}
+        for run, (scenario_id, assignment) in enumerate(zip(self.scenario_ids, self.assignments), start=1):
+            job = jobs[scenario_id]
+            usage = job.result.get("resource_usage") or {}
+            rows.append({
+                "run": run,
+                "scenario_id": scenario_id,
+                "scenario_name": names[scenario_id],
+                **{axis.name: assignment.get(axis.name) for axis in self.axes},
+                "status": job.status,
+                "execution_time_ms": usage.get("execution_time_ms"),
+                **(job.result.get("kpis") or {}),
+            })
+        return rows
+
+    def kpi_csv(self) -> str:
+        rows = self.kpi_table()
+        columns: List[str] = []
+        for row in rows:
+            columns += [c for c in row if c not in columns]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+    def to_dict(self, include_kpis: bool = True) -> Dict[str, Any]:
+        progress = self.batch.to_dict()
+        progress.pop("scenarios")
+        data = {
+            "sweep_id": self.id,
+            "base_scenario_id": self.base_scenario_id,
+            "model_filename": self.model_filename,
+            "created_at": self.created_at,
+            "axes": [axis.__dict__ for axis in self.axes],
+            "runs": len(self.assignments),
+            "batch": progress,
+        }
+        if include_kpis:
+            data["kpi_table"] = self.kpi_table()
+        return data
+
+
+class SweepManager:
+    """Creates sweeps and keeps track of them"""
+
+    def __init__(self, scenario_manager: ScenarioManager, batch_manager: BatchManager,
+                 max_sweeps_retained: int = 50):
+        self.scenario_manager = scenario_manager
+        self.batch_manager = batch_manager
+        self.max_sweeps_retained = max_sweeps_retained
+        self._sweeps: Dict[str, ParameterSweep] = {}
+        self._lock = threading.Lock()
+
+    def create(self, base_scenario_id: int, axes: List[SweepAxis],
+               runs: Optional[List[Dict[str, Any]]] = None,
+               model_runner: Optional[Callable[[Job, int], Dict[str, Any]]] = None,
+               model_filename: Optional[str] = None,
+               kpi_queries: Optional[Dict[str, str]] = None,
+               max_concurrent: int = DEFAULT_BATCH_CONCURRENCY,
+               name_prefix: Optional[str] = None) -> ParameterSweep:
+        """
+        Generate the variants of base_scenario_id and queue their model runs.
+        model_runner(job, scenario_id) runs the model for one variant; without it
+        only the KPIs of the modified inputs are collected.
+        """
+        base = self.scenario_manager.get_scenario(base_scenario_id)
+        if base is None:
+            raise ValueError(f"Base scenario {base_scenario_id} not found")
+        if not axes:
+            raise ValueError("A sweep needs at least one axis")
+        if len({axis.name for axis in axes}) != len(axes):
+            raise ValueError("Axis names must be unique")
+
+        schema = table_columns(base.database_path)
+        for axis in axes:
+            axis.validate(schema)
+        assignments = expand_runs(axes, runs)
+        if not assignments:
+            raise ValueError("The sweep has no runs")
+        if len(assignments) > MAX_SWEEP_RUNS:
+            raise ValueError(f"The sweep has {len(assignments)} runs; the limit is {MAX_SWEEP_RUNS}")
+
+        sweep_id = uuid.uuid4().hex[:12]
+        prefix = name_prefix or f"{base.name} sweep"
+        axes_by_name = {axis.name: axis for axis in axes}
+        variants = []
+        for run, assignment in enumerate(assignments, start=1):
+            label = ", ".join(axes_by_name[name].label(value) for name, value in assignment.items())
+            variants.append((f"{prefix} #{run}: {label}", f"Parameter sweep {sweep_id} run {run}: {label}"))
+
+        scenarios = self.scenario_manager.create_branch_scenarios(
+            base_scenario_id, variants,
+            prepare=lambda conn, index: apply_assignment(conn, axes, assignments[index])
+        )
+
+        database_paths = {scenario.id: scenario.database_path for scenario in scenarios}
+
+        def runner_factory(scenario_id: int) -> Callable[[Job], Dict[str, Any]]:
+            database_path = database_paths[scenario_id]
+
+            def runner(job: Job) -> Dict[str, Any]:
+                if model_runner is not None:
+                    result = model_runner(job, scenario_id)
+                else:
+                    result = {"stdout": "", "stderr": "", "return_code": 0}
+                if result.get("return_code") == 0:
+                    result["kpis"] = collect_kpis(database_path, kpi_queries)
+                return result
+            return runner
+
+        batch = self.batch_manager.submit(
+            model_filename or "parameter sweep",
+            [(scenario.id, scenario.name) for scenario in scenarios],
+            runner_factory,
+            max_concurrent=max_concurrent,
+        )
+        sweep = ParameterSweep(
+            id=sweep_id,
+            base_scenario_id=base_scenario_id,
+            axes=axes,
+            assignments=assignments,
+            scenario_ids=[scenario.id for scenario in scenarios],
+            batch=batch,
+            model_filename=model_filename,
+        )
+        with self._lock:
+            self._sweeps[sweep.id] = sweep
+            self._prune_finished_sweeps()
+        print(f"DEBUG: Sweep {sweep.id} created {len(scenarios)} variants of scenario {base_scenario_id}")
+        return sweep
+
+    def get_sweep(self, sweep_id: str) -> Optional[ParameterSweep]:
+        with self._lock:
+            return self._sweeps.get(sweep_id)
+
+    def list_sweeps(self) -> List[ParameterSweep]:
+        with self._lock:
+            return sorted(self._sweeps.values(), key=lambda s: s.created_at, reverse=True)
+
+    def _prune_finished_sweeps(self):
+        """Forget the oldest finished sweeps beyond the retention limit (lock held)"""
+        finished = sorted((s for s in self._sweeps.values() if s.batch.is_finished), key=lambda s: s.created_at)
+        excess = len(self._sweeps) - self.max_sweeps_retained
+        for sweep in finished[:max(0, excess)]:
+            del self._sweeps[sweep.id]
@@ -0,0 +1,401 @@
+"""
+Local Request Classifier for EYProject
+
+Requests that match none of the keyword lists in the agent's _classify_request
+used to cost an extra LLM round trip just to get one label back. This module
+classifies them locally with a small linear model:
+
+- features: TF-IDF weighted word unigrams, word bigrams and character 3-4 grams
+  (digits are folded, so "top 5" and "top 10" look alike)
+- model: multinomial logistic regression trained with SGD, in pure Python
+- output: a label and a confidence (the softmax probability of the label)
+
+The agent only falls back to the LLM when the confidence is below a threshold.
+Labels the LLM returns in those cases are appended to a request log, and
+training reads that log together with the labelled examples shipped in
+classifier_data/train.jsonl, so the local model improves as it is retrained.
+
+Training happens offline:
+
+    python request_classifier.py train       # writes classifier_data/model.json
+    python request_classifier.py benchmark   # accuracy on classifier_data/benchmark.jsonl
+    python request_classifier.py benchmark --llm   # ... also against the LLM
+
+If no trained model exists, one is trained from the shipped data on first use.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import threading
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BACKEND_DIR, "classifier_data")
+TRAIN_PATH = os.path.join(DATA_DIR, "train.jsonl")
+BENCHMARK_PATH = os.path.join(DATA_DIR, "benchmark.jsonl")
+DEFAULT_MODEL_PATH = os.getenv("EYPOR_CLASSIFIER_MODEL", os.path.join(DATA_DIR, "model.json"))
+DEFAULT_LOG_PATH = os.getenv("EYPOR_CLASSIFIER_LOG", os.path.join(DATA_DIR, "request_log.jsonl"))
+DEFAULT_THRESHOLD = float(os.getenv("EYPOR_CLASSIFIER_THRESHOLD", "0.55"))
+
+LABELS = ["chat", "sql_query", "visualization", "db_modification", "scenario_comparison"]
+MODEL_VERSION = 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9_%]+")
+
+
+def extract_features(text: str) -> Counter:
+    """Raw feature counts of a request"""
+    tokens = [re.sub(r"\d+", "0", t) for t in _TOKEN_RE.findall((text or "").lower())]
+    features = Counter(f"w:{t}" for t in tokens)
+    features.update(f"b:{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    for token in tokens:
+        padded = f" {token} "
+        for n in (3, 4):
+            features.update(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+    return features
+
+
+def load_examples(path: str) -> List[Dict[str, str]]:
+    """Read {"text", "label"} lines from a JSONL file (missing file: no examples)"""
+    examples = []
+    if not os.path.exists(path):
+        return examples
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                example = json.loads(line)
+            except ValueError:
+                continue
+            if example.get("text") and example.get("label") in LABELS:
+                examples.append({"text": example["text"], "label": example["label"]})
+    return examples
+
+
+@dataclass
+class ClassifierPrediction:
+    """Label predicted for a request"""
+    label: str
+    confidence: float
+    probabilities: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RequestClassifier:
+    """TF-IDF features with a multinomial logistic regression on top"""
+
+    def __init__(self, labels: Optional[List[str]] = None):
+        self.labels = list(labels or LABELS)
+        self.idf: Dict[str, float] = {}
+        self.weights: Dict[str, Dict[str, float]] = {label: {} for label in self.labels}
+        self.bias: Dict[str, float] = {label: 0.0 for label in self.labels}
+        self.trained_on = 0
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        vector = {
+            feature: (1.0 + math.log(count)) * self.idf[feature]
+            for feature, count in extract_features(text).items() if feature in self.idf
+        }
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        return {f: v / norm for f, v in vector.items()} if norm else vector
+
+    def _probabilities(self, vector: Dict[str, float]) -> Dict[str, float]:
+        scores = {
+            label: self.bias[label] + sum(self.weights[label].get(f, 0.0) * v for f, v in vector.items())
+            for label in self.labels
+        }
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def train(self, examples: List[Dict[str, str]], epochs: int = 40, learning_rate: float = 0.5,
+              l2: float = 1e-4, seed: int = 13) -> "RequestClassifier":
+        """Fit the model on {"text", "label"} examples (deterministic for a given seed)"""
+        examples = [e for e in examples if e["label"] in self.labels]
+        if not examples:
+            raise ValueError("No labelled examples to train the request classifier on")
+
+        document_frequency = Counter()
+        for example in examples:
+            document_frequency.update(extract_features(example["text"]).keys())
+        n = len(examples)
+        self.idf = {f: math.log((1 + n) / (1 + df)) + 1.0 for f, df in document_frequency.items()}
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+
+        data = [(self._vectorize(e["text"]), e["label"]) for e in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1.0 + 0.1 * epoch)
+            for vector, target in data:
+                probabilities = self._probabilities(vector)
+                for label in self.labels:
+                    gradient = probabilities[label] - (1.0 if label == target else 0.0)
+                    weights = self.weights[label]
+                    for feature, value in vector.items():
+                        weight = weights.get(feature, 0.0)
+                        weights[feature] = weight - rate * (gradient * value + l2 * weight)
+                    self.bias[label] -= rate * gradient
+
+        # Drop negligible weights to keep the saved model small
+        self.weights = {
+            label: {f: round(w, 5) for f, w in weights.items() if abs(w) >= 1e-4}
+            for label, weights in self.weights.items()
+        }
+        self.trained_on = n
+        return self
+
+    def predict(self, text: str) -> ClassifierPrediction:
+        probabilities = self._probabilities(self._vectorize(text))
+        label = max(probabilities, key=probabilities.get)
+        return ClassifierPrediction(
+            label=label,
+            confidence=round(probabilities[label], 4),
+            probabilities={k: round(v, 4) for k, v in probabilities.items()},
+        )
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        model = {
+            "version": MODEL_VERSION,
+            "labels": self.labels,
+            "trained_on": self.trained_on,
+            "idf": {f: round(v, 5) for f, v in self.idf.items()},
+            "weights": self.weights,
+            "bias": self.bias,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(model, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RequestClassifier":
+        with open(path, encoding="utf-8") as f:
+            model = json.load(f)
+        if model.get("version") != MODEL_VERSION:
+            raise ValueError(f"Unsupported request classifier model version: {model.get('version')}")
+        classifier = cls(model["labels"])
+        classifier.idf = model["idf"]
+        classifier.weights = model["weights"]
+        classifier.bias = model["bias"]
+        classifier.trained_on = model.get("trained_on", 0)
+        return classifier
+
+
+def train_classifier(train_path: str = TRAIN_PATH, log_path: Optional[str] = DEFAULT_LOG_PATH,
+                     model_path: Optional[str] = DEFAULT_MODEL_PATH) -> RequestClassifier:
+    """Train on the shipped examples plus logged LLM labels and save the model"""
+    examples = load_examples(train_path)
+    if log_path:
+        examples += load_examples(log_path)
+    classifier = RequestClassifier().train(examples)
+    if model_path:
+        classifier.save(model_path)
+    return classifier
+
+
+class ClassifierService:
+    """Loads the model, applies the confidence threshold and keeps routing metrics"""
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, log_path: Optional[str] = DEFAULT_LOG_PATH,
+                 threshold: float = DEFAULT_THRESHOLD, classifier: Optional[RequestClassifier] = None):
+        self.model_path = model_path
+        self.log_path = log_path
+        self.threshold = threshold
+        self._classifier = classifier
+        self._lock = threading.Lock()
+        self.metrics = {
+            "keyword": 0,
+            "local": 0,
+            "llm_fallback": 0,
+            "local_seconds": 0.0,
+            "llm_seconds": 0.0,
+        }
+
+    @property
+    def classifier(self) -> RequestClassifier:
+        with self._lock:
+            if self._classifier is None:
+                if os.path.exists(self.model_path):
+                    self._classifier = RequestClassifier.load(self.model_path)
+                else:
+                    print(f"DEBUG: No request classifier model at {self.model_path}, training one")
+                    self._classifier = train_classifier(log_path=self.log_path, model_path=self.model_path)
+            return self._classifier
+
+    def retrain(self) -> RequestClassifier:
+        """Train a new model on the shipped examples plus the request log and use it"""
+        classifier = train_classifier(log_path=self.log_path, model_path=self.model_path)
+        with self._lock:
+            self._classifier = classifier
+        return classifier
+
+    def classify(self, text: str, llm_classify: Callable[[str], str]) -> Tuple[str, str, Optional[ClassifierPrediction]]:
+        """
+        Label a request locally, or with llm_classify when the local confidence is
+        below the threshold. Returns (label, source, local prediction) where source
+        is "local" or "llm".
+        """
+        prediction = None
+        try:
+            classifier = self.classifier
+            started_at = time.perf_counter()
+            prediction = classifier.predict(text)
+            local_seconds = time.perf_counter() - started_at
+        except Exception as e:
+            print(f"DEBUG: Local request classification failed: {e}")
+            local_seconds = 0.0
+
+        if prediction is not None and prediction.confidence >= self.threshold:
+            self.record("local", local_seconds)
+            return prediction.label, "local", prediction
+
+        started_at = time.perf_counter()
+        label = llm_classify(text)
+        self.record("llm_fallback", local_seconds + time.perf_counter() - started_at)
+        self.log_example(text, label)
+        return label, "llm", prediction
+
+    def record(self, path: str, seconds: float = 0.0):
+        """Count a classification by path: "keyword", "local" or "llm_fallback" """
+        with self._lock:
+            self.metrics[path] += 1
+            if path == "local":
+                self.metrics["local_seconds"] += seconds
+            elif path == "llm_fallback":
+                self.metrics["llm_seconds"] += seconds
+
+    def log_example(self, text: str, label: str):
+        """Append an LLM-labelled request to the log used for retraining"""
+        if not self.log_path or label not in LABELS:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"text": text, "label": label, "source": "llm", "logged_at": time.time()}) + "\n")
+        except OSError as e:
+            print(f"DEBUG: Could not log classified request: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics)
+        model_decisions = metrics["local"] + metrics["llm_fallback"]
+        total = model_decisions + metrics["keyword"]
+        metrics.update({
+            "threshold": self.threshold,
+            "total": total,
+            # Share of requests classified without an LLM call
+            "fast_path_rate": round((metrics["keyword"] + metrics["local"]) / total, 3) if total else 0.0,
+            # Share of keyword misses the local model handled
+            "local_rate": round(metrics["local"] / model_decisions, 3) if model_decisions else 0.0,
+            "avg_local_ms": round(1000 * metrics["local_seconds"] / metrics["local"], 3) if metrics["local"] else 0.0,
+            "avg_llm_ms": round(1000 * metrics["llm_seconds"] / metrics["llm_fallback"], 1) if metrics["llm_fallback"] else 0.0,
+        })
+        return metrics
+
+
+def run_benchmark(classifier: RequestClassifier, examples: List[Dict[str, str]],
+                  threshold: float = DEFAULT_THRESHOLD,
+                  llm_classify: Optional[Callable[[str], str]] = None) -> Dict[str, Any]:
+    """
+    Accuracy of the local model on labelled examples, of its confident subset (the
+    fast path) and, with llm_classify, of the LLM and of the combined routing.
+    """
+    results = {"examples": len(examples), "threshold": threshold, "errors": []}
+    per_label = {label: {"total": 0, "correct": 0} for label in classifier.labels}
+    local_correct = fast = fast_correct = 0
+    llm_correct = combined_correct = agreement = 0
+    local_seconds = llm_seconds = 0.0
+
+    for example in examples:
+        started_at = time.perf_counter()
+        prediction = classifier.predict(example["text"])
+        local_seconds += time.perf_counter() - started_at
+        correct = prediction.label == example["label"]
+        local_correct += correct
+        per_label[example["label"]]["total"] += 1
+        per_label[example["label"]]["correct"] += correct
+        confident = prediction.confidence >= threshold
+        if confident:
+            fast += 1
+            fast_correct += correct
+        if not correct:
+            results["errors"].append({"text": example["text"], "expected": example["label"], **prediction.to_dict()})
+
+        if llm_classify is not None:
+            started_at = time.perf_counter()
+            llm_label = llm_classify(example["text"])
+            llm_seconds += time.perf_counter() - started_at
+            llm_correct += llm_label == example["label"]
+            agreement += llm_label == prediction.label
+            combined_correct += (prediction.label if confident else llm_label) == example["label"]
+
+    n = len(examples) or 1
+    results.update({
+        "local_accuracy": round(local_correct / n, 3),
+        "fast_path_rate": round(fast / n, 3),
+        "fast_path_accuracy": round(fast_correct / fast, 3) if fast else 0.0,
+        "avg_local_ms": round(1000 * local_seconds / n, 3),
+        "per_label": {label: round(v["correct"] / v["total"], 3) if v["total"] else None for label, v in per_label.items()},
+    })
+    if llm_classify is not None:
+        results.update({
+            "llm_accuracy": round(llm_correct / n, 3),
+            "combined_accuracy": round(combined_correct / n, 3),
+            "agreement_with_llm": round(agreement / n, 3),
+            "avg_llm_ms": round(1000 * llm_seconds / n, 1),
+        })
+    return results
+
+
+# Global classifier service instance
+classifier_service: Optional[ClassifierService] = None
+_service_lock = threading.Lock()
+
+
+def get_classifier_service() -> ClassifierService:
+    """Get the global classifier service instance, creating it on first use"""
+    global classifier_service
+    with _service_lock:
+        if classifier_service is None:
+            classifier_service = ClassifierService()
+        return classifier_service
+
+
+def set_classifier_service(service: Optional[ClassifierService]):
+    """Set the global classifier service instance"""
+    global classifier_service
+    with _service_lock:
+        classifier_service = service
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "benchmark"
+    if command == "train":
+        trained = train_classifier()
+        print(f"Trained request classifier on {trained.trained_on} examples: {DEFAULT_MODEL_PATH}")
+    elif command == "benchmark":
+        service = get_classifier_service()
+        llm = None
+        if "--llm" in sys.argv:
+            from langgraph_agent_v2 import SimplifiedAgent
+            llm = SimplifiedAgent()._llm_classify_request
+        report = run_benchmark(service.classifier, load_examples(BENCHMARK_PATH), service.threshold, llm)
+        print(json.dumps(report, indent=2))
+    else:
+        print("Usage: python request_classifier.py [train | benchmark [--llm]]")
+        sys.exit(1)
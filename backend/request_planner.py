@@ -0,0 +1,337 @@
+"""
+Request Planner for EYProject
+
+A scenario comparison used to cost up to three sequential LLM calls: classifying
+the request (when neither the keywords nor the local classifier were sure),
+extracting the scenario names, and generating the comparison code. The planner
+replaces the first two with one structured-output call that returns the request
+type, the scenarios to compare, the comparison type (chart, table or analysis)
+and the chart type together, so code generation can start right after it.
+
+The plan is requested with OpenAI structured outputs (a strict JSON schema);
+models without structured output support are asked for the same JSON object as
+text. Scenario names are resolved against the existing scenarios before use.
+
+EYPOR_REQUEST_PLANNER=0 restores the separate classification and extraction
+calls. `python request_planner.py benchmark [--latency-ms N] [--llm]` measures
+comparison requests end to end with and without the planner.
+"""
+
+import os
+import re
+import sys
+import json
+import importlib
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Any
+
+from langchain_core.messages import HumanMessage
+
+REQUEST_TYPES = ["chat", "sql_query", "visualization", "db_modification", "scenario_comparison"]
+COMPARISON_TYPES = ["chart", "table", "analysis"]
+CHART_TYPES = ["grouped_bars", "side_by_side_bars", "faceted_plots", "scatter_plot", "heatmap", "line_chart", "pie_chart"]
+
+PLAN_SCHEMA = {
+    "title": "request_plan",
+    "description": "How to handle a request to the optimization project assistant",
+    "type": "object",
+    "properties": {
+        "request_type": {"type": "string", "enum": REQUEST_TYPES},
+        "scenarios": {"type": "array", "items": {"type": "string"},
+                      "description": "Scenarios to compare, from the available scenarios; empty unless comparing"},
+        "comparison_type": {"type": "string", "enum": COMPARISON_TYPES},
+        "chart_type": {"type": "string", "enum": CHART_TYPES},
+    },
+    "required": ["request_type", "scenarios", "comparison_type", "chart_type"],
+    "additionalProperties": False,
+}
+
+
+@dataclass
+class RequestPlan:
+    """Request type plus, for comparisons, the resolved scenarios and output format"""
+    request_type: str
+    scenarios: List[str] = field(default_factory=list)
+    comparison_type: str = "analysis"
+    chart_type: str = "grouped_bars"
+    source: str = "structured"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_type": self.request_type,
+            "scenarios": list(self.scenarios),
+            "comparison_type": self.comparison_type,
+            "chart_type": self.chart_type,
+            "source": self.source,
+        }
+
+
+def build_plan_prompt(user_request: str, scenario_names: List[str]) -> str:
+    """Prompt asking for the plan of a request; scenario_names are the scenarios it may refer to"""
+    scenario_list = f"\nScenarios the request may refer to: {json.dumps(scenario_names)}\n" if scenario_names else ""
+    return f"""Plan how to handle a request to the assistant of an Operations Research optimization project.
+
+request_type, one of:
+- chat: general questions and explanations that need no data or code ("What is this model about?")
+- sql_query: retrieving or analyzing data ("Show me the top 10 hubs", "What is the total demand?")
+- visualization: charts, graphs, plots or maps of one scenario ("Plot the results")
+- db_modification: changing database values or parameters ("Set capacity to 1000")
+- scenario_comparison: comparing two or more scenarios ("Base Scenario vs test1", "differences between base and test1")
+{scenario_list}
+For scenario_comparison:
+- scenarios: the scenarios the user names, written exactly as in the list of scenarios when they are in it. Match loosely ("base" is "Base Scenario", "test" is "test1") and ignore other words such as metrics or locations.
+- comparison_type: "chart" if a chart, graph, plot or map is asked for, "table" if a table or a list of values is asked for, otherwise "analysis".
+- chart_type: the chart that fits best ({", ".join(CHART_TYPES)}); grouped_bars if unsure.
+For other request types, return an empty scenarios list, comparison_type "analysis" and chart_type "grouped_bars".
+
+Respond with a JSON object with the keys request_type, scenarios, comparison_type and chart_type.
+
+User request: {user_request}"""
+
+
+def parse_plan(output: Any, scenario_names: List[str],
+               match_scenario: Optional[Callable[[str, List[str]], Optional[str]]] = None,
+               source: str = "structured") -> Optional[RequestPlan]:
+    """RequestPlan from the LLM output (a dict or JSON text), or None if it is not a valid plan"""
+    data = output
+    if not isinstance(data, dict):
+        text = getattr(output, "content", output)
+        if not isinstance(text, str):
+            return None
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            return None
+        try:
+            data = json.loads(match.group())
+        except json.JSONDecodeError:
+            return None
+    request_type = str(data.get("request_type", "")).strip().lower()
+    if request_type not in REQUEST_TYPES:
+        return None
+
+    scenarios: List[str] = []
+    for name in data.get("scenarios") or []:
+        name = str(name).strip()
+        resolved = name if name in scenario_names else (match_scenario(name, scenario_names) if match_scenario else None)
+        if resolved and resolved not in scenarios:
+            scenarios.append(resolved)
+    comparison_type = data.get("comparison_type")
+    chart_type = data.get("chart_type")
+    return RequestPlan(
+        request_type=request_type,
+        scenarios=scenarios,
+        comparison_type=comparison_type if comparison_type in COMPARISON_TYPES else "analysis",
+        chart_type=chart_type if chart_type in CHART_TYPES else "grouped_bars",
+        source=source,
+    )
+
+
+def _model_key(llm) -> str:
+    return f"{type(llm).__name__}:{getattr(llm, 'model_name', None) or getattr(llm, 'model', '')}"
+
+
+class RequestPlanner:
+    """Plans requests with one LLM call and counts how the plans were obtained"""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv("EYPOR_REQUEST_PLANNER", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # Models that rejected structured output; they get the text prompt right away
+        self._text_only: set = set()
+        self.stats = {
+            "plans": 0,
+            "structured": 0,
+            "text": 0,
+            "failures": 0,
+            "comparisons": 0,
+            "total_ms": 0.0,
+        }
+
+    def _structured_llm(self, llm):
+        """llm constrained to PLAN_SCHEMA, or None if the model does not support structured output"""
+        if _model_key(llm) in self._text_only:
+            return None
+        try:
+            return llm.with_structured_output(PLAN_SCHEMA, method="json_schema", strict=True)
+        except (AttributeError, NotImplementedError, TypeError, ValueError):
+            with self._lock:
+                self._text_only.add(_model_key(llm))
+            return None
+
+    def plan(self, llm, user_request: str, scenario_names: List[str],
+             match_scenario: Optional[Callable[[str, List[str]], Optional[str]]] = None,
+             candidates: Optional[List[str]] = None) -> Optional[RequestPlan]:
+        """
+        Plan a request with one LLM call; None if the model gave no usable plan.
+        The prompt lists candidates (default: all scenario_names); the planned
+        scenarios are validated against all scenario_names.
+        """
+        started_at = time.perf_counter()
+        prompt_names = scenario_names if candidates is None else candidates
+        prompt = [HumanMessage(content=build_plan_prompt(user_request, prompt_names))]
+        plan = None
+        structured = self._structured_llm(llm)
+        if structured is not None:
+            try:
+                plan = parse_plan(structured.invoke(prompt), scenario_names, match_scenario, "structured")
+            except Exception as e:
+                # Rejected response_format (for example chatgpt-4o-latest): use the text prompt for this model
+                print(f"DEBUG: Structured request plan failed, using a text plan: {e}")
+                with self._lock:
+                    self._text_only.add(_model_key(llm))
+                structured = None
+        if structured is None:
+            try:
+                plan = parse_plan(llm.invoke(prompt), scenario_names, match_scenario, "text")
+            except Exception as e:
+                print(f"DEBUG: Request planning failed: {e}")
+        self._record(plan, time.perf_counter() - started_at)
+        if plan is not None:
+            print(f"DEBUG: Request plan ({plan.source}): {plan.to_dict()}")
+        return plan
+
+    def _record(self, plan: Optional[RequestPlan], seconds: float):
+        with self._lock:
+            self.stats["plans"] += 1
+            self.stats["total_ms"] += seconds * 1000
+            if plan is None:
+                self.stats["failures"] += 1
+            else:
+                self.stats[plan.source] += 1
+                self.stats["comparisons"] += plan.request_type == "scenario_comparison"
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            text_only = sorted(self._text_only)
+        stats["avg_ms"] = round(stats.pop("total_ms") / stats["plans"], 1) if stats["plans"] else 0.0
+        stats["enabled"] = self.enabled
+        stats["text_only_models"] = text_only
+        return stats
+
+
+BENCHMARK_SCENARIOS = ["Base Scenario", "test1", "High Demand"]
+BENCHMARK_REQUESTS = [
+    "compare total cost between base and test1",
+    "base vs high demand: which hubs are active",
+    "how does test1 stack up against the base scenario on total cost",
+    "is high demand cheaper to operate than base",
+    "test1 relative to base for the number of open hubs",
+]
+
+
+class _SimulatedLLM:
+    """Answers the agent's prompts after a fixed delay, like a remote model with constant latency"""
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def invoke(self, messages):
+        from langchain_core.messages import AIMessage
+
+        time.sleep(self.latency_ms / 1000)
+        self.calls += 1
+        prompt = messages[-1].content
+        request = prompt.rsplit("User request:", 1)[-1].lower()
+        named = [name for name in BENCHMARK_SCENARIOS if name.split()[0].lower() in request]
+        if prompt.startswith("Plan how to handle"):
+            content = json.dumps({"request_type": "scenario_comparison", "scenarios": named,
+                                  "comparison_type": "analysis", "chart_type": "grouped_bars"})
+        elif prompt.startswith("Classify this user request"):
+            content = "scenario_comparison"
+        elif "extract the scenario names" in prompt:
+            content = json.dumps(named)
+        else:
+            content = "```python\nprint('compared')\n```"
+        return AIMessage(content=content)
+
+
+def run_benchmark(latency_ms: float = 800, use_llm: bool = False,
+                  requests: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    End-to-end time and LLM calls of comparison requests with the separate
+    classification and extraction calls ("legacy") and with the planner
+    """
+    import shutil
+    import tempfile
+    from scenario_manager import ScenarioManager
+    from langgraph_agent_v2 import SimplifiedAgent
+    from agent_metrics import AgentMetrics, set_agent_metrics, get_agent_metrics
+    from request_classifier import ClassifierService, train_classifier, set_classifier_service
+
+    requests = requests or BENCHMARK_REQUESTS
+    project_root = tempfile.mkdtemp(prefix="request_planner_benchmark_")
+    results: Dict[str, Any] = {"requests": len(requests), "latency_ms": None if use_llm else latency_ms}
+    try:
+        scenario_manager = ScenarioManager(project_root)
+        for name in BENCHMARK_SCENARIOS:
+            scenario_manager.create_scenario(name, description="Request planner benchmark")
+        model_path = os.path.join(project_root, "classifier_model.json")
+        set_classifier_service(ClassifierService(model_path=model_path, log_path=None,
+                                                 classifier=train_classifier(log_path=None, model_path=None)))
+        for mode in ("legacy", "planner"):
+            set_request_planner(RequestPlanner(enabled=mode == "planner"))
+            set_agent_metrics(AgentMetrics())
+            agent = SimplifiedAgent(scenario_manager=scenario_manager)
+            if not use_llm:
+                agent.llm = _SimulatedLLM(latency_ms)
+            # Untimed first run: starts the execution workers and loads the schema caches
+            agent.run(requests[0], request_id=f"{mode}-warmup")
+            per_request = []
+            for i, request in enumerate(requests):
+                request_id = f"{mode}-{i}"
+                calls_before = 0 if use_llm else agent.llm.calls
+                agent.run(request, request_id=request_id)
+                timings = get_agent_metrics().get_request(request_id)
+                llm_calls = len(timings["llm_calls"]) if use_llm else agent.llm.calls - calls_before
+                per_request.append({"request": request, "total_ms": timings["total_ms"], "llm_calls": llm_calls})
+            results[mode] = {
+                "avg_ms": round(sum(e["total_ms"] for e in per_request) / len(requests), 1),
+                "avg_llm_calls": round(sum(e["llm_calls"] for e in per_request) / len(requests), 2),
+                "per_request": per_request,
+            }
+        results["speedup"] = round(results["legacy"]["avg_ms"] / results["planner"]["avg_ms"], 2) if results["planner"]["avg_ms"] else None
+        return results
+    finally:
+        set_request_planner(None)
+        set_agent_metrics(None)
+        set_classifier_service(None)
+        shutil.rmtree(project_root, ignore_errors=True)
+
+
+# Global planner instance
+request_planner: Optional[RequestPlanner] = None
+_planner_lock = threading.Lock()
+
+
+def get_request_planner() -> RequestPlanner:
+    """Get the global request planner, creating it on first use"""
+    global request_planner
+    with _planner_lock:
+        if request_planner is None:
+            request_planner = RequestPlanner()
+        return request_planner
+
+
+def set_request_planner(planner: Optional[RequestPlanner]):
+    """Set the global request planner"""
+    global request_planner
+    with _planner_lock:
+        request_planner = planner
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "benchmark"
+    if command == "benchmark":
+        # Run through the importable module, whose planner instance the agent uses
+        benchmark = importlib.import_module("request_planner").run_benchmark
+        latency_ms = float(sys.argv[sys.argv.index("--latency-ms") + 1]) if "--latency-ms" in sys.argv else 800
+        print(json.dumps(benchmark(latency_ms, use_llm="--llm" in sys.argv), indent=2))
+    else:
+        print("Usage: python request_planner.py benchmark [--latency-ms N] [--llm]")
+        sys.exit(1)
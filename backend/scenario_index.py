@@ -0,0 +1,240 @@
+"""
+Scenario Name Index for EYProject
+
+Comparison requests name scenarios loosely ("base", "test", "Base Scenario").
+Resolving those names used to read every scenario from metadata.db and compare
+each candidate with each scenario name (substring checks and difflib ratios),
+several times per request. With hundreds of sweep-generated scenarios that is
+most of the time spent before the first LLM call.
+
+ScenarioNameIndex holds the scenarios of one metadata database with lookups by
+exact name, by casefolded name, by word and by character trigram. Trigrams
+narrow substring and fuzzy matches down to the few names sharing characters
+with the candidate, so difflib only runs on those. The index is built on first
+use and kept until ScenarioManager creates, renames or deletes a scenario.
+"""
+
+import os
+import re
+import difflib
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Any, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from scenario_manager import Scenario
+
+# Names compared with difflib per fuzzy match, best trigram overlap first
+MAX_FUZZY_CANDIDATES = 16
+# Lowest difflib ratio accepted as a fuzzy match
+MIN_FUZZY_RATIO = 0.5
+# Names a request is narrowed down to for prompts (see ScenarioNameIndex.candidates)
+MAX_REQUEST_CANDIDATES = 10
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def trigrams(text: str) -> set:
+    """Character trigrams of normalized text (none for texts shorter than 3 characters)"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ScenarioNameIndex:
+    """Exact, casefolded, word and trigram lookups over a list of scenarios"""
+
+    def __init__(self, scenarios: List["Scenario"]):
+        self.scenarios = list(scenarios)
+        self.names = [scenario.name for scenario in self.scenarios]
+        self._normalized = [_normalize(name) for name in self.names]
+        self._by_name: Dict[str, int] = {}
+        self._by_normalized: Dict[str, int] = {}
+        self._by_word: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._gram_counts: List[int] = []
+        # Names too short for trigrams are checked one by one
+        self._short: List[int] = []
+        for position, (name, normalized) in enumerate(zip(self.names, self._normalized)):
+            self._by_name.setdefault(name, position)
+            self._by_normalized.setdefault(normalized, position)
+            for word in normalized.split():
+                self._by_word.setdefault(word, position)
+            grams = trigrams(normalized)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(position)
+            if not grams:
+                self._short.append(position)
+
+    def __len__(self) -> int:
+        return len(self.scenarios)
+
+    def get(self, name: str) -> Optional["Scenario"]:
+        """Scenario with exactly this name"""
+        position = self._by_name.get(name)
+        return None if position is None else self.scenarios[position]
+
+    def _shared(self, grams: set) -> Dict[int, int]:
+        """Number of the given trigrams each scenario name contains"""
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for position in self._postings.get(gram, ()):
+                shared[position] += 1
+        return shared
+
+    def _containing(self, query: str, grams: set, shared: Dict[int, int]) -> List[int]:
+        """Positions of the names that contain query"""
+        if not grams:
+            return [p for p, normalized in enumerate(self._normalized) if query in normalized]
+        return sorted(p for p, count in shared.items() if count == len(grams) and query in self._normalized[p])
+
+    def _contained(self, text: str, shared: Dict[int, int]) -> List[int]:
+        """Positions of the names that text contains"""
+        positions = [p for p, count in shared.items() if count == self._gram_counts[p] and self._normalized[p] in text]
+        positions.extend(p for p in self._short if self._normalized[p] in text)
+        return sorted(positions)
+
+    def resolve(self, name: str) -> Optional["Scenario"]:
+        """
+        Scenario for a name from user input: exact name, then casefolded name, then
+        the first scenario whose name contains it, then the first scenario sharing a word
+        """
+        name = name.strip()
+        position = self._by_name.get(name)
+        if position is None:
+            query = _normalize(name)
+            position = self._by_normalized.get(query)
+            if position is None:
+                grams = trigrams(query)
+                containing = self._containing(query, grams, self._shared(grams))
+                if containing:
+                    position = containing[0]
+                else:
+                    words = [self._by_word[word] for word in query.split() if word in self._by_word]
+                    position = min(words) if words else None
+        return None if position is None else self.scenarios[position]
+
+    def best_match(self, name: str) -> Optional[Tuple[str, int]]:
+        """
+        (scenario name, score 0-100) of the closest name: 100 for a casefolded match,
+        80 when one name contains the other, else the difflib ratio if at least 0.5
+        """
+        matches = self.matches(name, limit=1)
+        return matches[0] if matches else None
+
+    def matches(self, name: str, limit: int = 2) -> List[Tuple[str, int]]:
+        """The best scored names for name (see best_match), highest score first"""
+        query = _normalize(name)
+        if not query:
+            return []
+        position = self._by_normalized.get(query)
+        if position is not None:
+            return [(self.names[position], 100)]
+        grams = trigrams(query)
+        shared = self._shared(grams)
+        substring = set(self._containing(query, grams, shared)) | set(self._contained(query, shared))
+        ranked = sorted(shared, key=lambda p: (-shared[p] / (len(grams) + self._gram_counts[p] - shared[p]), p))
+        candidates = substring | set(ranked[:MAX_FUZZY_CANDIDATES]) | set(self._short)
+
+        scored = []
+        for p in candidates:
+            ratio = difflib.SequenceMatcher(None, query, self._normalized[p]).ratio()
+            score = max(80 if p in substring else 0, int(ratio * 100) if ratio >= MIN_FUZZY_RATIO else 0)
+            if score:
+                scored.append((-score, p))
+        return [(self.names[p], -score) for score, p in sorted(scored)[:limit]]
+
+    def candidates(self, text: str, limit: int = MAX_REQUEST_CANDIDATES) -> List[str]:
+        """
+        Names text may refer to: the scenarios it mentions, then the best matches of
+        its words and word pairs ("base", "high demnd"), up to limit names in all
+        """
+        mentioned = self.find_in_text(text)
+        words = re.findall(r"\w+", _normalize(text))
+        scores: Dict[str, int] = {}
+        for phrase in words + [" ".join(pair) for pair in zip(words, words[1:])]:
+            if len(phrase) < 3:
+                continue
+            for name, score in self.matches(phrase):
+                if name not in mentioned and score > scores.get(name, 0):
+                    scores[name] = score
+        ranked = sorted(scores, key=lambda name: (-scores[name], self._by_name[name]))
+        return mentioned + ranked[:max(0, limit - len(mentioned))]
+
+    def find_in_text(self, text: str) -> List[str]:
+        """Names of the scenarios mentioned in text as whole words (casefolded), in creation order"""
+        normalized = _normalize(text)
+        return [self.names[p] for p in self._contained(normalized, self._shared(trigrams(normalized)))
+                if re.search(rf"(?<!\w){re.escape(self._normalized[p])}(?!\w)", normalized)]
+
+
+class ScenarioIndexCache:
+    """Scenario name indexes per metadata database, rebuilt after scenario changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, Tuple[int, ScenarioNameIndex]] = {}
+        self._generations: Dict[str, int] = defaultdict(int)
+        self.stats = {
+            "builds": 0,
+            "hits": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _key(metadata_db_path: str) -> str:
+        return os.path.abspath(metadata_db_path)
+
+    def get(self, scenario_manager) -> ScenarioNameIndex:
+        """Index of the scenario manager's scenarios, built on first use"""
+        key = self._key(scenario_manager.metadata_db_path)
+        with self._lock:
+            generation = self._generations[key]
+            cached = self._indexes.get(key)
+            if cached is not None and cached[0] == generation:
+                self.stats["hits"] += 1
+                return cached[1]
+        index = ScenarioNameIndex(scenario_manager.list_scenarios())
+        with self._lock:
+            self.stats["builds"] += 1
+            # A scenario changed while the index was built: use it for this lookup only
+            if self._generations[key] == generation:
+                self._indexes[key] = (generation, index)
+        print(f"DEBUG: Built scenario name index of {len(index)} scenarios")
+        return index
+
+    def invalidate(self, metadata_db_path: str):
+        """Drop the index of a metadata database after its scenarios changed"""
+        key = self._key(metadata_db_path)
+        with self._lock:
+            self._generations[key] += 1
+            self._indexes.pop(key, None)
+            self.stats["invalidations"] += 1
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            status = dict(self.stats)
+            status["indexes"] = {key: len(index) for key, (_, index) in self._indexes.items()}
+        return status
+
+
+# Global index cache instance
+scenario_index_cache: Optional[ScenarioIndexCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_scenario_index_cache() -> ScenarioIndexCache:
+    """Get the global scenario index cache, creating it on first use"""
+    global scenario_index_cache
+    with _cache_lock:
+        if scenario_index_cache is None:
+            scenario_index_cache = ScenarioIndexCache()
+        return scenario_index_cache
+
+
+def set_scenario_index_cache(cache: Optional[ScenarioIndexCache]):
+    """Set the global scenario index cache"""
+    global scenario_index_cache
+    with _cache_lock:
+        scenario_index_cache = cache
@@ -10,12 +10,35 @@ import os
 import sqlite3
 import shutil
 import json
+import math
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Tuple
 from dataclasses import dataclass, asdict
 from pathlib import Path
 import tempfile
 
+from scenario_index import get_scenario_index_cache
+from execution_pool import truncate_middle
+from job_manager import get_job_manager
+
+# Resource accounting and log pointer columns of execution_history, added to existing databases on start-up
+EXECUTION_METRIC_COLUMNS = [
+    ('return_code', 'INTEGER'),
+    ('cpu_user_ms', 'INTEGER'),
+    ('cpu_system_ms', 'INTEGER'),
+    ('peak_rss_kb', 'INTEGER'),
+    ('output_bytes', 'INTEGER'),
+    ('script', 'TEXT'),
+    ('source', 'TEXT'),
+    ('log_job_id', 'TEXT'),
+]
+
+# Characters of output/error kept per execution_history row (head and tail); the full output stays in the job log
+HISTORY_OUTPUT_LIMIT = int(os.getenv("EYPOR_HISTORY_OUTPUT_KB", "16")) * 1024
+
+# Metrics summarised by get_execution_stats
+EXECUTION_STAT_METRICS = ['execution_time_ms', 'cpu_ms', 'peak_rss_kb', 'output_bytes']
+
 
 @dataclass
 class Scenario:
@@ -105,6 +128,14 @@ class ExecutionHistory:
     timestamp: datetime
     execution_time_ms: Optional[int]
     output_files: Optional[str] = None  # JSON string of output files
+    return_code: Optional[int] = None
+    cpu_user_ms: Optional[int] = None
+    cpu_system_ms: Optional[int] = None
+    peak_rss_kb: Optional[int] = None
+    output_bytes: Optional[int] = None
+    script: Optional[str] = None  # Script/model file name, for per-script statistics
+    source: Optional[str] = None  # 'run', 'model', 'install' or 'agent'
+    log_job_id: Optional[str] = None  # Job whose full log is served by /jobs/{id}/logs/{stream}
 
 
 @dataclass
@@ -256,6 +287,13 @@ class ScenarioManager:
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 execution_time_ms INTEGER,
                 output_files TEXT,
+                return_code INTEGER,
+                cpu_user_ms INTEGER,
+                cpu_system_ms INTEGER,
+                peak_rss_kb INTEGER,
+                output_bytes INTEGER,
+                script TEXT,
+                source TEXT,
                 FOREIGN KEY (scenario_id) REFERENCES scenarios(id)
             )
         ''')
@@ -284,11 +322,20 @@ class ScenarioManager:
             # Column already exists
             pass
         
+        # Add resource accounting columns if they don't exist (for existing databases)
+        for column, column_type in EXECUTION_METRIC_COLUMNS:
+            try:
+                cursor.execute(f'ALTER TABLE execution_history ADD COLUMN {column} {column_type}')
+            except sqlite3.OperationalError:
+                # Column already exists
+                pass
+        
         # Create indexes for better performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_scenarios_name ON scenarios(name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_scenarios_parent ON scenarios(parent_scenario_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_execution_scenario ON execution_history(scenario_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_execution_timestamp ON execution_history(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_execution_script ON execution_history(script)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparison_created_at ON comparison_history(created_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparison_type ON comparison_history(comparison_type)')
         
@@ -325,6 +372,7 @@ class ScenarioManager:
             
             # Commit the scenario record first so it's available for copying
             conn.commit()
+            get_scenario_index_cache().invalidate(self.metadata_db_path)
             
             # If branching from another scenario, copy the database from parent
             if base_scenario_id is not None:
@@ -472,6 +520,66 @@ class ScenarioManager:
             traceback.print_exc()
             return False
     
+    def create_branch_scenarios(self, base_scenario_id: int, variants: List[Tuple[str, Optional[str]]],
+                                prepare: Optional[Callable[[sqlite3.Connection, int], None]] = None) -> List[Scenario]:
+        """Create many branches of a scenario at once (e.g. for a parameter sweep).
+        
+        variants is a list of (name, description). The base database is opened once and
+        cloned with the SQLite backup API; prepare(connection, index) may then modify each
+        clone inside a single transaction. All scenario records are inserted in one
+        metadata transaction. If anything fails, no scenario is created.
+        """
+        base_scenario = self.get_scenario(base_scenario_id)
+        if base_scenario is None or not os.path.exists(base_scenario.database_path):
+            raise ValueError(f"Base scenario {base_scenario_id} not found")
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        created_dirs = []
+        records = []
+        source = sqlite3.connect(base_scenario.database_path)
+        try:
+            for index, (name, description) in enumerate(variants):
+                # The index keeps directory names unique within the same millisecond
+                scenario_dir = os.path.join(self.scenarios_dir, f"scenario_{timestamp}_{index:04d}")
+                os.makedirs(scenario_dir)
+                created_dirs.append(scenario_dir)
+                database_path = os.path.join(scenario_dir, "database.db")
+                
+                target = sqlite3.connect(database_path)
+                try:
+                    source.backup(target)
+                    if prepare is not None:
+                        with target:
+                            prepare(target, index)
+                finally:
+                    target.close()
+                records.append((name, database_path, base_scenario_id, False, description))
+            
+            conn = sqlite3.connect(self.metadata_db_path)
+            try:
+                cursor = conn.cursor()
+                scenario_ids = []
+                for record in records:
+                    cursor.execute('''
+                        INSERT INTO scenarios (name, database_path, parent_scenario_id, is_base_scenario, description)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', record)
+                    scenario_ids.append(cursor.lastrowid)
+                conn.commit()
+                get_scenario_index_cache().invalidate(self.metadata_db_path)
+            finally:
+                conn.close()
+        except Exception:
+            for scenario_dir in created_dirs:
+                shutil.rmtree(scenario_dir, ignore_errors=True)
+            raise
+        finally:
+            source.close()
+        
+        print(f"DEBUG: Created {len(scenario_ids)} branch scenarios of scenario {base_scenario_id}")
+        by_id = {scenario.id: scenario for scenario in self.list_scenarios()}
+        return [by_id[scenario_id] for scenario_id in scenario_ids]
+    
     def list_scenarios(self) -> List[Scenario]:
         """List all scenarios"""
         conn = sqlite3.connect(self.metadata_db_path)
@@ -517,6 +625,7 @@ class ScenarioManager:
                 shutil.rmtree(scenario_dir)
             
             conn.commit()
+            get_scenario_index_cache().invalidate(self.metadata_db_path)
             
             # If this was the current scenario, switch to another one
             if self.state.current_scenario_id == scenario_id:
@@ -562,28 +671,67 @@ class ScenarioManager:
             cursor.execute(query, params)
             
             conn.commit()
+            get_scenario_index_cache().invalidate(self.metadata_db_path)
             return cursor.rowcount > 0
         finally:
             conn.close()
     
     def add_execution_history(self, scenario_id: int, command: str, output: Optional[str] = None, 
                             error: Optional[str] = None, execution_time_ms: Optional[int] = None, 
-                            output_files: Optional[str] = None) -> bool:
-        """Add execution history entry for a scenario"""
+                            output_files: Optional[str] = None, return_code: Optional[int] = None,
+                            cpu_user_ms: Optional[int] = None, cpu_system_ms: Optional[int] = None,
+                            peak_rss_kb: Optional[int] = None, output_bytes: Optional[int] = None,
+                            script: Optional[str] = None, source: Optional[str] = None,
+                            log_job_id: Optional[str] = None) -> bool:
+        """Add execution history entry for a scenario, with optional resource accounting"""
         conn = sqlite3.connect(self.metadata_db_path)
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
-                INSERT INTO execution_history (scenario_id, command, output, error, execution_time_ms, output_files)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (scenario_id, command, output, error, execution_time_ms, output_files))
+                INSERT INTO execution_history (scenario_id, command, output, error, execution_time_ms, output_files,
+                                               return_code, cpu_user_ms, cpu_system_ms, peak_rss_kb, output_bytes,
+                                               script, source, log_job_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (scenario_id, command, output, error, execution_time_ms, output_files,
+                  return_code, cpu_user_ms, cpu_system_ms, peak_rss_kb, output_bytes, script, source,
+                  log_job_id))
             
             conn.commit()
             return True
         finally:
             conn.close()
     
+    def log_execution(self, scenario_id: int, command: str, output: Optional[str] = None,
+                      error: Optional[str] = None, output_files: Optional[str] = None,
+                      result=None, script: Optional[str] = None, source: Optional[str] = None,
+                      log_job_id: Optional[str] = None) -> bool:
+        """
+        Add an execution history entry with a head/tail summary of the output.
+        
+        When the ExecutionResult of the run is passed, its return code and resource
+        usage are stored too. log_job_id points at the job whose full log is served
+        by /jobs/{id}/logs/{stream}; that job's logs are kept as long as the row exists.
+        """
+        # Cached results did not run, so they carry no resource usage
+        usage = result.resource_usage() if result is not None and not result.cached else {}
+        if log_job_id:
+            manager = get_job_manager()
+            if manager is not None:
+                manager.retain_logs(log_job_id)
+        return self.add_execution_history(
+            scenario_id=scenario_id,
+            command=command,
+            output=truncate_middle(output, HISTORY_OUTPUT_LIMIT),
+            error=truncate_middle(error, HISTORY_OUTPUT_LIMIT),
+            output_files=output_files,
+            return_code=result.return_code if result is not None else None,
+            script=script,
+            source=source,
+            log_job_id=log_job_id,
+            **usage
+        )
+    
     def get_execution_history(self, scenario_id: int, limit: Optional[int] = None) -> List[ExecutionHistory]:
         """Get execution history for a scenario"""
         conn = sqlite3.connect(self.metadata_db_path)
@@ -607,6 +755,89 @@ class ScenarioManager:
         finally:
             conn.close()
     
+    def get_log_job_ids(self) -> List[str]:
+        """Ids of the jobs whose full logs execution history rows point at"""
+        conn = sqlite3.connect(self.metadata_db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT DISTINCT log_job_id FROM execution_history WHERE log_job_id IS NOT NULL')
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def get_execution_stats(self, scenario_id: Optional[int] = None, script: Optional[str] = None,
+                            source: Optional[str] = None, limit: int = 5000) -> Dict[str, Any]:
+        """Per-scenario and per-script p50/p95/max of wall time, CPU time, peak RSS and output bytes"""
+        conn = sqlite3.connect(self.metadata_db_path)
+        cursor = conn.cursor()
+        
+        try:
+            query = '''
+                SELECT e.scenario_id, s.name, e.script, e.source, e.execution_time_ms,
+                       e.cpu_user_ms, e.cpu_system_ms, e.peak_rss_kb, e.output_bytes
+                FROM execution_history e LEFT JOIN scenarios s ON s.id = e.scenario_id
+                WHERE e.execution_time_ms IS NOT NULL
+            '''
+            params: List[Any] = []
+            if scenario_id is not None:
+                query += ' AND e.scenario_id = ?'
+                params.append(scenario_id)
+            if script:
+                query += ' AND e.script = ?'
+                params.append(script)
+            if source:
+                query += ' AND e.source = ?'
+                params.append(source)
+            query += ' ORDER BY e.timestamp DESC LIMIT ?'
+            params.append(limit)
+            
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        
+        by_scenario: Dict[Any, Dict[str, Any]] = {}
+        by_script: Dict[Any, Dict[str, Any]] = {}
+        for row in rows:
+            row_scenario_id, scenario_name, row_script, row_source = row[0], row[1], row[2], row[3]
+            cpu_ms = None
+            if row[5] is not None or row[6] is not None:
+                cpu_ms = (row[5] or 0) + (row[6] or 0)
+            values = {
+                'execution_time_ms': row[4],
+                'cpu_ms': cpu_ms,
+                'peak_rss_kb': row[7],
+                'output_bytes': row[8],
+            }
+            groups = [
+                (by_scenario, row_scenario_id, {'scenario_id': row_scenario_id, 'scenario_name': scenario_name}),
+                (by_script, (row_scenario_id, row_script, row_source),
+                 {'scenario_id': row_scenario_id, 'script': row_script, 'source': row_source}),
+            ]
+            for group, key, info in groups:
+                entry = group.setdefault(key, {**info, 'count': 0, 'samples': {m: [] for m in EXECUTION_STAT_METRICS}})
+                entry['count'] += 1
+                for metric, value in values.items():
+                    if value is not None:
+                        entry['samples'][metric].append(value)
+        
+        def summarise(groups: Dict[Any, Dict[str, Any]]) -> List[Dict[str, Any]]:
+            result = []
+            for entry in groups.values():
+                samples = entry.pop('samples')
+                for metric in EXECUTION_STAT_METRICS:
+                    entry[metric] = _percentile_summary(samples[metric])
+                result.append(entry)
+            result.sort(key=lambda e: (e['execution_time_ms'] or {}).get('p95') or 0, reverse=True)
+            return result
+        
+        return {
+            'total_executions': len(rows),
+            'by_scenario': summarise(by_scenario),
+            'by_script': summarise(by_script),
+        }
+    
     def add_analysis_file(self, filename: str, file_type: str, content: str, 
                          created_by_scenario_id: Optional[int] = None, is_global: bool = True) -> AnalysisFile:
         """Add an analysis file"""
@@ -732,7 +963,15 @@ class ScenarioManager:
             error=row[4],
             timestamp=datetime.fromisoformat(row[5]),
             execution_time_ms=row[6],
-            output_files=row[7] if len(row) > 7 else None
+            output_files=row[7] if len(row) > 7 else None,
+            return_code=row[8] if len(row) > 8 else None,
+            cpu_user_ms=row[9] if len(row) > 9 else None,
+            cpu_system_ms=row[10] if len(row) > 10 else None,
+            peak_rss_kb=row[11] if len(row) > 11 else None,
+            output_bytes=row[12] if len(row) > 12 else None,
+            script=row[13] if len(row) > 13 else None,
+            source=row[14] if len(row) > 14 else None,
+            log_job_id=row[15] if len(row) > 15 else None
         )
     
     def _row_to_comparison_history(self, row) -> ComparisonHistory:
@@ -959,6 +1198,19 @@ class ScenarioManager:
             conn.close()
 
 
+def _percentile_summary(values: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/max of a list of samples (nearest-rank), or None if there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    
+    def rank(p: float):
+        index = max(0, math.ceil(p / 100.0 * len(ordered)) - 1)
+        return ordered[min(index, len(ordered) - 1)]
+    
+    return {'p50': rank(50), 'p95': rank(95), 'max': ordered[-1]}
+
+
 # Global scenario manager instance
 _scenario_manager: Optional[ScenarioManager] = None
 
@@ -0,0 +1,150 @@
+"""
+Schema and Statistics Cache for EYProject
+
+The agent and several endpoints (/database/info, /database/schema, /sql/mode,
+/database/whitelist) need the tables, columns, row counts and a few sample rows
+of a scenario database. Reading them costs a PRAGMA table_info, a COUNT(*) scan
+and a sample query per table, and used to happen several times per request.
+
+SchemaCache keeps that information per database path together with a cheap
+version of the database: the file's mtime and size, the change counter and
+schema cookie from the SQLite header, and the mtime and size of the WAL file.
+The cached information is reused as long as the version is unchanged, so any
+write to the database (by the backend, a model run or an external tool) is
+picked up on the next lookup. Code that writes a database can also call
+invalidate() explicitly.
+"""
+
+import os
+import copy
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
+
+DEFAULT_MAX_DATABASES = int(os.getenv("EYPOR_SCHEMA_CACHE_MAX_DATABASES", "64"))
+SAMPLE_ROWS = 5
+
+
+def database_version(db_path: str) -> Optional[Tuple]:
+    """Cheap change fingerprint of a SQLite database (None if it does not exist)"""
+    try:
+        st = os.stat(db_path)
+        with open(db_path, "rb") as f:
+            header = f.read(100)
+    except OSError:
+        return None
+    # Bytes 24-27: file change counter, 40-43: schema cookie
+    version = (st.st_mtime_ns, st.st_size, header[24:28], header[40:44])
+    try:
+        wal = os.stat(db_path + "-wal")
+        version += (wal.st_mtime_ns, wal.st_size)
+    except OSError:
+        pass
+    return version
+
+
+def read_database_info(db_path: str, sample_rows: int = SAMPLE_ROWS) -> Dict[str, Any]:
+    """Tables with their columns, row count and first rows"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        table_names = [row[0] for row in cursor.fetchall()]
+
+        tables = {}
+        for table_name in table_names:
+            quoted = '"' + table_name.replace('"', '""') + '"'
+            cursor.execute(f"PRAGMA table_info({quoted})")
+            columns = [{"name": col[1], "type": col[2]} for col in cursor.fetchall()]
+            cursor.execute(f"SELECT COUNT(*) FROM {quoted}")
+            row_count = cursor.fetchone()[0]
+            cursor.execute(f"SELECT * FROM {quoted} LIMIT {int(sample_rows)}")
+            tables[table_name] = {
+                "columns": columns,
+                "row_count": row_count,
+                "sample_data": cursor.fetchall(),
+            }
+        return {"tables": tables, "total_tables": len(tables), "database_path": db_path}
+    finally:
+        conn.close()
+
+
+class SchemaCache:
+    """Per-database cache of schema information, validated by the database version"""
+
+    def __init__(self, max_databases: int = DEFAULT_MAX_DATABASES):
+        self.max_databases = max_databases
+        # abspath -> (version, info)
+        self._entries: "OrderedDict[str, Tuple[Tuple, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, db_path: str) -> Dict[str, Any]:
+        """
+        Schema information of a database: {"tables": {name: {"columns", "row_count",
+        "sample_data"}}, "total_tables", "database_path"}. Callers get their own copy.
+        Raises sqlite3.Error / OSError if the database cannot be read.
+        """
+        key = os.path.abspath(db_path)
+        version = database_version(key)
+        if version is None:
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return copy.deepcopy(entry[1])
+            self.stats["misses"] += 1
+
+        info = read_database_info(db_path)
+        # Only keep the result if nothing was written while it was being read
+        if database_version(key) == version:
+            with self._lock:
+                self._entries[key] = (version, info)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_databases:
+                    self._entries.popitem(last=False)
+        return copy.deepcopy(info)
+
+    def invalidate(self, db_path: Optional[str] = None):
+        """Drop the cached information of one database (or of all databases)"""
+        with self._lock:
+            if db_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(db_path), None)
+            self.stats["invalidations"] += 1
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "databases": len(self._entries),
+                "max_databases": self.max_databases,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                **self.stats,
+            }
+
+
+# Global cache instance
+schema_cache: Optional[SchemaCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_schema_cache() -> SchemaCache:
+    """Get the global schema cache instance, creating it on first use"""
+    global schema_cache
+    with _cache_lock:
+        if schema_cache is None:
+            schema_cache = SchemaCache()
+        return schema_cache
+
+
+def set_schema_cache(cache: Optional[SchemaCache]):
+    """Set the global schema cache instance"""
+    global schema_cache
+    with _cache_lock:
+        schema_cache = cache
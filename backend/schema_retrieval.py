@@ -0,0 +1,315 @@
+"""
+Schema Retrieval for EYProject
+
+The agent's prompts used to list every table and every column of the scenario
+database. Model databases contain many near-duplicate tables (for example
+outputs_hubs_basecase / outputs_hubs_default / outputs_hubs_modelinput), and
+client databases can have hundreds of tables, so most of that text is irrelevant
+to a given request while still costing tokens, latency and money.
+
+SchemaRetriever builds an index once per schema fingerprint and, per request:
+- groups tables with identical columns into families that are described once
+- ranks families by lexical relevance to the request (table names weigh more
+  than column names, rare terms more than common ones), optionally blended with
+  the cosine similarity of embeddings
+- keeps the top-k families, trims very wide tables to their relevant and key
+  columns, and lists the names of the omitted tables so they can still be asked for
+- logs how many prompt tokens the pruning saved
+
+Settings: EYPOR_SCHEMA_TOP_K (families to include, default 8),
+EYPOR_SCHEMA_MAX_COLUMNS (columns per table, default 30) and
+EYPOR_SCHEMA_EMBEDDINGS=1 to add an OpenAI embedding index.
+"""
+
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from generation_cache import schema_fingerprint
+
+DEFAULT_TOP_K = int(os.getenv("EYPOR_SCHEMA_TOP_K", "8"))
+DEFAULT_MAX_COLUMNS = int(os.getenv("EYPOR_SCHEMA_MAX_COLUMNS", "30"))
+MIN_TABLES = 3
+MAX_OMITTED_NAMES = 30
+MAX_INDEXES = 32
+TABLE_NAME_WEIGHT = 3.0
+EMBEDDING_WEIGHT = 0.5
+
+_STOP_WORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "to", "by", "and", "or", "with", "me", "my", "show",
+    "what", "which", "is", "are", "all", "each", "per", "from", "give", "list", "how", "many", "much",
+    "create", "make", "plot", "chart", "graph", "table", "data", "please", "can", "you", "i", "it",
+}
+
+
+def _stem(token: str) -> str:
+    """Singular form of simple plurals: cities -> city, routes -> route, hubs -> hub"""
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        return token[:-1]
+    return token
+
+
+def identifier_terms(name: str) -> List[str]:
+    """Terms of a table or column name: CostFactor_Opening -> [cost, factor, opening]"""
+    spaced = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name)
+    return [_stem(t) for t in re.split(r"[^A-Za-z0-9]+|(?<=[A-Za-z])(?=\d)", spaced.lower()) if t]
+
+
+def request_terms(text: str) -> List[str]:
+    terms = []
+    for word in re.findall(r"[A-Za-z][A-Za-z0-9_]*", text or ""):
+        terms.extend(t for t in identifier_terms(word) if t not in _STOP_WORDS and len(t) > 1)
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt token count (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _column_signature(table_info: Dict[str, Any]) -> Tuple:
+    return tuple((c.get("name"), (c.get("type") or "").upper()) for c in table_info.get("columns", []))
+
+
+def _format_columns(columns: List[Dict[str, Any]]) -> str:
+    return "".join(f"  - {c.get('name', 'UNKNOWN')} ({c.get('type', 'UNKNOWN')})\n" for c in columns)
+
+
+def full_schema_context(schema_info: Optional[Dict[str, Any]]) -> str:
+    """Every table with every column"""
+    if not schema_info or "tables" not in schema_info:
+        return "No schema information available"
+    context = "Available Tables:\n"
+    for table_name, table_info in schema_info["tables"].items():
+        context += f"\n{table_name}:\n"
+        context += _format_columns(table_info.get("columns", []))
+    return context
+
+
+class SchemaIndex:
+    """Relevance index of one schema: table families with their terms"""
+
+    def __init__(self, schema_info: Dict[str, Any], embed: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        self.tables: Dict[str, Dict[str, Any]] = schema_info.get("tables", {})
+
+        # Families: tables with identical columns, in schema order
+        by_signature: "OrderedDict[Tuple, List[str]]" = OrderedDict()
+        for name, info in self.tables.items():
+            by_signature.setdefault(_column_signature(info), []).append(name)
+        self.families: List[List[str]] = list(by_signature.values())
+
+        self.name_terms: List[Counter] = []
+        self.column_terms: List[Counter] = []
+        for family in self.families:
+            self.name_terms.append(Counter(t for name in family for t in identifier_terms(name)))
+            columns = self.tables[family[0]].get("columns", [])
+            self.column_terms.append(Counter(t for c in columns for t in identifier_terms(c.get("name", ""))))
+
+        document_frequency = Counter()
+        for names, columns in zip(self.name_terms, self.column_terms):
+            document_frequency.update(set(names) | set(columns))
+        n = len(self.families)
+        self.idf = {t: math.log(1 + n / df) for t, df in document_frequency.items()}
+
+        self.embed = embed
+        self.embeddings: Optional[List[List[float]]] = None
+        if embed is not None and self.families:
+            try:
+                self.embeddings = embed([self._family_document(i) for i in range(n)])
+            except Exception as e:
+                print(f"DEBUG: Schema embedding index unavailable: {e}")
+                self.embed = None
+
+    def _family_document(self, index: int) -> str:
+        family = self.families[index]
+        columns = ", ".join(c.get("name", "") for c in self.tables[family[0]].get("columns", []))
+        return f"Tables {', '.join(family)} with columns {columns}"
+
+    def score(self, terms: List[str], request: str = "") -> List[float]:
+        """Relevance of each family to the request terms"""
+        request_lower = (request or "").lower()
+        scores = []
+        for i, family in enumerate(self.families):
+            score = 0.0
+            for term in set(terms):
+                idf = self.idf.get(term)
+                if idf is None:
+                    continue
+                if term in self.name_terms[i]:
+                    score += TABLE_NAME_WEIGHT * idf
+                if term in self.column_terms[i]:
+                    score += idf * (1 + math.log(self.column_terms[i][term]))
+            # A table named literally in the request is always relevant
+            if any(name.lower() in request_lower for name in family):
+                score += 10.0
+            scores.append(score)
+
+        if self.embed is not None and self.embeddings and request:
+            try:
+                query = self.embed([request])[0]
+                top = max(scores) or 1.0
+                scores = [s + EMBEDDING_WEIGHT * top * _cosine(query, e) for s, e in zip(scores, self.embeddings)]
+            except Exception as e:
+                print(f"DEBUG: Schema embedding lookup failed: {e}")
+        return scores
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _openai_embedder() -> Optional[Callable[[List[str]], List[List[float]]]]:
+    try:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(model=os.getenv("EYPOR_SCHEMA_EMBEDDING_MODEL", "text-embedding-3-small"))
+        return embeddings.embed_documents
+    except Exception as e:
+        print(f"DEBUG: Schema embeddings disabled: {e}")
+        return None
+
+
+class SchemaRetriever:
+    """Builds relevance-pruned schema context, with one index per schema fingerprint"""
+
+    def __init__(self, top_k: int = DEFAULT_TOP_K, max_columns: int = DEFAULT_MAX_COLUMNS,
+                 embed: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        self.top_k = top_k
+        self.max_columns = max_columns
+        if embed is None and os.getenv("EYPOR_SCHEMA_EMBEDDINGS", "0") == "1":
+            embed = _openai_embedder()
+        self.embed = embed
+        self._indexes: "OrderedDict[str, SchemaIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "pruned_requests": 0,
+            "indexes_built": 0,
+            "tokens_full": 0,
+            "tokens_sent": 0,
+        }
+
+    def get_index(self, schema_info: Dict[str, Any]) -> SchemaIndex:
+        fingerprint = schema_fingerprint(schema_info)
+        with self._lock:
+            index = self._indexes.get(fingerprint)
+            if index is not None:
+                self._indexes.move_to_end(fingerprint)
+                return index
+        index = SchemaIndex(schema_info, self.embed)
+        with self._lock:
+            self._indexes[fingerprint] = index
+            while len(self._indexes) > MAX_INDEXES:
+                self._indexes.popitem(last=False)
+            self.stats["indexes_built"] += 1
+        return index
+
+    def _select_columns(self, columns: List[Dict[str, Any]], terms: set) -> Tuple[List[Dict[str, Any]], int]:
+        """Relevant and key (ID) columns first, then schema order, up to max_columns"""
+        if len(columns) <= self.max_columns:
+            return columns, 0
+
+        def priority(column):
+            column_terms = set(identifier_terms(column.get("name", "")))
+            if column_terms & terms:
+                return 0
+            if "id" in column_terms or "key" in column_terms:
+                return 1
+            return 2
+
+        ranked = sorted(range(len(columns)), key=lambda i: (priority(columns[i]), i))
+        keep = sorted(ranked[:self.max_columns])
+        return [columns[i] for i in keep], len(columns) - len(keep)
+
+    def build_context(self, schema_info: Optional[Dict[str, Any]], request: str) -> str:
+        """Schema context with the tables most relevant to request"""
+        full_context = full_schema_context(schema_info)
+        if not schema_info or not schema_info.get("tables"):
+            return full_context
+
+        index = self.get_index(schema_info)
+        terms = request_terms(request)
+        scores = index.score(terms, request)
+        order = sorted(range(len(index.families)), key=lambda i: (-scores[i], i))
+        selected = [i for i in order if scores[i] > 0][:self.top_k]
+        for i in order:
+            if len(selected) >= min(MIN_TABLES, len(order)):
+                break
+            if i not in selected:
+                selected.append(i)
+        # Keep the schema's own order in the prompt
+        selected.sort()
+
+        term_set = set(terms)
+        context = "Available Tables:\n"
+        for i in selected:
+            family = index.families[i]
+            columns, hidden = self._select_columns(index.tables[family[0]].get("columns", []), term_set)
+            context += f"\n{family[0]}:\n"
+            context += _format_columns(columns)
+            if hidden:
+                context += f"  ... and {hidden} more columns\n"
+            if len(family) > 1:
+                context += f"  (tables with the same columns: {', '.join(family[1:])})\n"
+
+        omitted = [name for i in range(len(index.families)) if i not in selected for name in index.families[i]]
+        if omitted:
+            shown = ", ".join(omitted[:MAX_OMITTED_NAMES])
+            more = f" and {len(omitted) - MAX_OMITTED_NAMES} more" if len(omitted) > MAX_OMITTED_NAMES else ""
+            context += f"\nOther tables (columns not shown): {shown}{more}\n"
+
+        full_tokens = estimate_tokens(full_context)
+        sent_tokens = min(estimate_tokens(context), full_tokens)
+        if sent_tokens == full_tokens:
+            context = full_context
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["tokens_full"] += full_tokens
+            self.stats["tokens_sent"] += sent_tokens
+            if sent_tokens < full_tokens:
+                self.stats["pruned_requests"] += 1
+        print(f"DEBUG: Schema context: {len(selected)}/{len(index.families)} table families "
+              f"({len(index.tables)} tables), ~{sent_tokens} tokens instead of ~{full_tokens} "
+              f"({full_tokens - sent_tokens} saved)")
+        return context
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            indexes = len(self._indexes)
+        stats.update({
+            "indexes": indexes,
+            "top_k": self.top_k,
+            "max_columns": self.max_columns,
+            "embeddings": self.embed is not None,
+            "tokens_saved": stats["tokens_full"] - stats["tokens_sent"],
+            "saved_ratio": round(1 - stats["tokens_sent"] / stats["tokens_full"], 3) if stats["tokens_full"] else 0.0,
+        })
+        return stats
+
+
+# Global retriever instance
+schema_retriever: Optional[SchemaRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_schema_retriever() -> SchemaRetriever:
+    """Get the global schema retriever instance, creating it on first use"""
+    global schema_retriever
+    with _retriever_lock:
+        if schema_retriever is None:
+            schema_retriever = SchemaRetriever()
+        return schema_retriever
+
+
+def set_schema_retriever(retriever: Optional[SchemaRetriever]):
+    """Set the global schema retriever instance"""
+    global schema_retriever
+    with _retriever_lock:
+        schema_retriever = retriever
@@ -0,0 +1,241 @@
+"""
+SQL Validation for EYProject
+
+A generated script with a misspelled table or column used to be discovered only
+after the script ran: a subprocess (or pool worker) start, the pandas/plotly
+imports and, in the worst case, the 120 second timeout. The SQL the scripts run
+is almost always a string literal, so it can be checked before execution:
+
+- extract_sql_literals walks the script's AST for read_sql_query / read_sql /
+  execute / executemany calls and resolves their SQL argument (string constants,
+  implicit or + concatenation, and variables assigned a constant string)
+- validate_sql prepares each statement with EXPLAIN on a read-only connection to
+  the scenario database, which reports unknown tables and columns and syntax
+  errors in milliseconds without running the query
+
+The agent feeds the errors back to the LLM for a fix and does not execute code
+whose SQL still does not prepare. SQL built at run time (f-strings, .format)
+is not checked.
+"""
+
+import ast
+import re
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Tuple
+
+SQL_CALLS = {"read_sql_query", "read_sql", "execute", "executemany"}
+
+_CREATED_TABLE = re.compile(
+    r"\bCREATE\s+(?:TEMP(?:ORARY)?\s+)?(?:TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?[\"`\[]?(\w+)", re.IGNORECASE)
+_NO_SUCH_TABLE = re.compile(r"no such table: (?:\w+\.)?(\w+)")
+_POSITIONAL_BINDINGS = re.compile(r"uses (\d+)")
+# Errors about the database file rather than the SQL
+_UNVERIFIABLE = re.compile(r"locked|unable to open|disk I/O|not a database|busy", re.IGNORECASE)
+
+
+@dataclass
+class SqlLiteral:
+    """A SQL string passed to a query call in generated code"""
+    sql: str
+    lineno: int
+    call: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sql": self.sql, "lineno": self.lineno, "call": self.call}
+
+
+@dataclass
+class SqlIssue:
+    """A SQL literal that failed to prepare"""
+    sql: str
+    lineno: int
+    error: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sql": self.sql, "lineno": self.lineno, "error": self.error}
+
+
+def _string_value(node: ast.AST, constants: Dict[str, str]) -> Optional[str]:
+    """Value of an expression built from string constants, or None if it is dynamic"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left = _string_value(node.left, constants)
+        right = _string_value(node.right, constants)
+        if left is not None and right is not None:
+            return left + right
+    return None
+
+
+def _call_name(node: ast.Call) -> Optional[str]:
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    return None
+
+
+def extract_sql_literals(code: str) -> List[SqlLiteral]:
+    """SQL strings of the query calls in code, in source order"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+
+    # Names assigned exactly one constant string anywhere in the script
+    assigned: Dict[str, List[Optional[str]]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    assigned.setdefault(target.id, []).append(_string_value(node.value, {}))
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)) and isinstance(node.target, ast.Name):
+            assigned.setdefault(node.target.id, []).append(None)
+    constants = {name: values[0] for name, values in assigned.items() if len(values) == 1 and values[0] is not None}
+
+    literals = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        name = _call_name(node)
+        if name not in SQL_CALLS:
+            continue
+        argument = node.args[0] if node.args else next(
+            (kw.value for kw in node.keywords if kw.arg in ("sql", "query")), None)
+        sql = _string_value(argument, constants) if argument is not None else None
+        if sql and sql.strip():
+            literals.append(SqlLiteral(sql=sql.strip(), lineno=node.lineno, call=name))
+    literals.sort(key=lambda literal: literal.lineno)
+    return literals
+
+
+class _AnyParameters(dict):
+    """Named bindings that accept every parameter name"""
+
+    def __missing__(self, key):
+        return None
+
+
+def validate_sql(conn: sqlite3.Connection, sql: str) -> Optional[str]:
+    """Error message if sql does not prepare against the connection's schema, else None"""
+    statement = sql.strip().rstrip(";")
+    parameters: Any = ()
+    for _ in range(2):
+        try:
+            conn.execute(f"EXPLAIN {statement}", parameters)
+            return None
+        except sqlite3.ProgrammingError as e:
+            # Placeholders without values: prepare again with NULL bindings
+            message = str(e)
+            positional = _POSITIONAL_BINDINGS.search(message)
+            if positional and parameters == ():
+                parameters = (None,) * int(positional.group(1))
+            elif "binding parameter" in message and parameters == ():
+                parameters = _AnyParameters()
+            else:
+                # Several statements or other API misuse: not something EXPLAIN can judge
+                return None
+        except sqlite3.Error as e:
+            return str(e)
+    return None
+
+
+def connect_read_only(db_path: str) -> sqlite3.Connection:
+    """Read-only connection, so validation can never modify the scenario database"""
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+
+class SqlValidator:
+    """Validates the SQL of generated scripts and counts the results"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            "scripts_checked": 0,
+            "statements_checked": 0,
+            "scripts_rejected": 0,
+            "fix_attempts": 0,
+            "fixed": 0,
+            "total_ms": 0.0,
+        }
+
+    def validate_code(self, code: str, db_path: str) -> Tuple[int, List[SqlIssue]]:
+        """(number of statements checked, issues) for the SQL literals of code"""
+        started_at = time.perf_counter()
+        literals = extract_sql_literals(code)
+        issues: List[SqlIssue] = []
+        # Comparison scripts attach other databases; their tables cannot be checked here
+        checkable = [literal for literal in literals if not literal.sql.upper().startswith(("ATTACH", "DETACH"))]
+        attaches = len(checkable) != len(literals)
+        created = {name.lower() for literal in literals for name in _CREATED_TABLE.findall(literal.sql)}
+        if checkable:
+            try:
+                conn = connect_read_only(db_path)
+            except sqlite3.Error as e:
+                print(f"DEBUG: SQL validation skipped, cannot open {db_path}: {e}")
+                return 0, []
+            try:
+                for literal in checkable:
+                    error = validate_sql(conn, literal.sql)
+                    if error is None:
+                        continue
+                    if _UNVERIFIABLE.search(error):
+                        print(f"DEBUG: SQL validation skipped: {error}")
+                        return 0, []
+                    missing = _NO_SUCH_TABLE.search(error)
+                    if missing and (attaches or missing.group(1).lower() in created):
+                        continue
+                    issues.append(SqlIssue(sql=literal.sql, lineno=literal.lineno, error=error))
+            finally:
+                conn.close()
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        with self._lock:
+            self.stats["scripts_checked"] += 1
+            self.stats["statements_checked"] += len(checkable)
+            self.stats["total_ms"] += elapsed_ms
+        if checkable:
+            print(f"DEBUG: SQL validation: {len(checkable)} statements, {len(issues)} errors in {elapsed_ms:.1f} ms")
+        return len(checkable), issues
+
+    def record(self, event: str):
+        """Count a fix attempt, a fixed script or a rejected script"""
+        with self._lock:
+            self.stats[event] += 1
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        checked = stats["scripts_checked"]
+        stats["avg_ms"] = round(stats.pop("total_ms") / checked, 2) if checked else 0.0
+        return stats
+
+
+def format_issues(issues: List[SqlIssue]) -> str:
+    """Issues as text for the LLM and the user"""
+    return "\n".join(f"- line {issue.lineno}: {issue.error}\n  SQL: {' '.join(issue.sql.split())}" for issue in issues)
+
+
+# Global validator instance
+sql_validator: Optional[SqlValidator] = None
+_validator_lock = threading.Lock()
+
+
+def get_sql_validator() -> SqlValidator:
+    """Get the global SQL validator instance, creating it on first use"""
+    global sql_validator
+    with _validator_lock:
+        if sql_validator is None:
+            sql_validator = SqlValidator()
+        return sql_validator
+
+
+def set_sql_validator(validator: Optional[SqlValidator]):
+    """Set the global SQL validator instance"""
+    global sql_validator
+    with _validator_lock:
+        sql_validator = validator
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test script for per-node and per-LLM-call timing of agent v2 requests
+"""
+
+import asyncio
+from types import SimpleNamespace
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from agent_metrics import AgentMetrics, LatencyHistogram, set_agent_metrics, get_agent_metrics
+from langgraph_agent_v2 import SimplifiedAgent
+
+USAGE = {"input_tokens": 120, "output_tokens": 8, "total_tokens": 128}
+
+
+def _fake_llm(count):
+    return GenericFakeChatModel(messages=iter([AIMessage(content="The objective minimizes cost", usage_metadata=USAGE)
+                                               for _ in range(count)]))
+
+
+def test_agent_metrics():
+    """Test histograms, request timings of run/arun/astream and the per request type aggregates"""
+
+    histogram = LatencyHistogram()
+    for duration_ms in (5, 40, 45, 800, 200000):
+        histogram.observe(duration_ms)
+    summary = histogram.to_dict()
+    assert summary["count"] == 5 and summary["buckets"]["le_10"] == 1 and summary["buckets"]["le_50"] == 2
+    assert summary["buckets"]["+Inf"] == 1 and summary["p50_ms"] == 50.0 and summary["p95_ms"] == 200000.0
+    print("✓ Latency histogram buckets and quantiles")
+
+    set_agent_metrics(AgentMetrics(max_requests=3))
+    try:
+        agent = SimplifiedAgent()
+        agent.llm = _fake_llm(10)
+
+        response, _, _, _ = agent.run("Explain the objective function", request_id="sync-1")
+        assert response == "The objective minimizes cost"
+        timings = get_agent_metrics().get_request("sync-1")
+        assert timings["request_type"] == "chat"
+        assert [n["node"] for n in timings["nodes"]] == ["classify_request", "handle_chat", "respond"]
+        assert timings["llm_calls"][0]["node"] == "handle_chat"
+        assert timings["tokens"] == {"input": 120, "output": 8, "total": 128}
+        assert timings["total_ms"] >= sum(timings["node_ms"].values())
+        print(f"✓ run() records nodes and LLM calls: {timings['node_ms']}")
+
+        # Concurrent requests keep their timings apart
+        async def _concurrent():
+            return await asyncio.gather(agent.arun("Explain the objective function", request_id="async-1"),
+                                        agent.arun("What does the model do?", request_id="async-2"))
+
+        asyncio.run(_concurrent())
+        for request_id in ("async-1", "async-2"):
+            timings = get_agent_metrics().get_request(request_id)
+            assert [n["node"] for n in timings["nodes"]] == ["classify_request", "handle_chat", "respond"]
+            assert len(timings["llm_calls"]) == 1
+        print("✓ Concurrent arun() requests are timed separately")
+
+        # Streaming returns the timings with the result; LLMs without callbacks are still node-timed
+        async def _stream():
+            return [event async for event in agent.astream("Explain the objective function", request_id="stream-1")]
+
+        events = asyncio.run(_stream())
+        assert events[0]["request_id"] == "stream-1" and events[-1]["event"] == "result"
+        assert events[-1]["timings"]["request_id"] == "stream-1" and "handle_chat" in events[-1]["timings"]["node_ms"]
+        agent.llm = SimpleNamespace(invoke=lambda messages: SimpleNamespace(content="plain"))
+        agent.run("Explain the objective function", request_id="plain-1")
+        assert get_agent_metrics().get_request("plain-1")["llm_calls"] == []
+        # Only the most recent max_requests are kept
+        assert get_agent_metrics().get_request("sync-1") is None
+        assert [t["request_id"] for t in get_agent_metrics().recent(2)] == ["plain-1", "stream-1"]
+        print("✓ Streaming result carries timings; old requests are dropped")
+
+        metrics = get_agent_metrics().get_metrics()
+        assert metrics["requests"] == 5 and metrics["total"]["chat"]["count"] == 5
+        assert metrics["nodes"]["handle_chat"]["chat"]["count"] == 5
+        assert metrics["llm_calls"]["handle_chat"]["chat"]["count"] == 4
+        assert metrics["tokens"]["chat"]["input"] == 360
+        print(f"✓ Aggregates per node and request type: {metrics['tokens']}")
+
+        print("\n🎉 All agent metrics tests passed!")
+
+    finally:
+        set_agent_metrics(None)
+
+
+if __name__ == "__main__":
+    test_agent_metrics()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared agent pool and per-model LLM clients
+"""
+
+import asyncio
+import threading
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from agent_pool import AgentPool, LLMClientPool
+from langgraph_agent_v2 import SimplifiedAgent, set_langgraph_model, get_langgraph_model, AVAILABLE_MODELS
+
+
+class _FakeClientPool(LLMClientPool):
+    """Client pool handing out fake chat models that answer with their model id"""
+
+    def __init__(self, gate: asyncio.Event = None):
+        super().__init__()
+        self.gate = gate
+
+    def get(self, ai_model, model_id):
+        with self._lock:
+            client = self._clients.get((ai_model, model_id))
+            if client is not None:
+                self.stats["client_reuses"] += 1
+                return client
+            client = _GatedModel(messages=iter([AIMessage(content=model_id) for _ in range(20)]))
+            client.gate = self.gate
+            self._clients[(ai_model, model_id)] = client
+            self.stats["clients_created"] += 1
+            return client
+
+
+class _GatedModel(GenericFakeChatModel):
+    """Fake chat model whose async calls wait for a gate"""
+    gate: object = None
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.gate is not None:
+            await self.gate.wait()
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def test_agent_pool():
+    """Test graph reuse, client sharing per model id and model switches during in-flight requests"""
+
+    previous_model = get_langgraph_model()
+    try:
+        # One compiled agent per provider, even when requested from many threads at once
+        pool = AgentPool(llm_pool=_FakeClientPool())
+        agents = []
+        threads = [threading.Thread(target=lambda: agents.append(pool.get_agent("openai"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(agent) for agent in agents}) == 1 and isinstance(agents[0], SimplifiedAgent)
+        assert pool.get_status()["agents"] == ["openai"]
+        print("✓ Concurrent get_agent() calls share one compiled agent")
+
+        # A model switch during a request: the request keeps its model, new requests use the new one
+        async def _switch_during_request():
+            gate = asyncio.Event()
+            agent = SimplifiedAgent(llm_pool=_FakeClientPool(gate))
+            set_langgraph_model("GPT-4o")
+            first = asyncio.create_task(agent.arun("Explain the objective function", request_id="pool-1"))
+            await asyncio.sleep(0.05)
+            assert agent.llm_pool.get_status()["in_flight_by_model"] == {"GPT-4o": 1}
+            set_langgraph_model("GPT-4.1")
+            second = asyncio.create_task(agent.arun("What does the model do?", request_id="pool-2"))
+            await asyncio.sleep(0.05)
+            assert agent.llm_pool.get_status()["in_flight_by_model"] == {"GPT-4o": 1, "GPT-4.1": 1}
+            gate.set()
+            return agent, await first, await second
+
+        agent, first, second = asyncio.run(_switch_during_request())
+        assert first[0] == AVAILABLE_MODELS["GPT-4o"] and second[0] == AVAILABLE_MODELS["GPT-4.1"]
+        status = agent.llm_pool.get_status()
+        assert status["in_flight_by_model"] == {} and status["clients_created"] == 2
+        print(f"✓ In-flight request finished on its model after a switch: {first[0]}, {second[0]}")
+
+        # Later requests reuse the client of their model
+        response, _, _, _ = agent.run("Explain the objective function")
+        assert response == AVAILABLE_MODELS["GPT-4.1"]
+        assert agent.llm_pool.get_status()["clients_created"] == 2
+        assert agent._current_model_id() == f"openai:{AVAILABLE_MODELS['GPT-4.1']}"
+        print(f"✓ Clients are reused per model id: {agent.llm_pool.get_status()['clients']}")
+
+        print("\n🎉 All agent pool tests passed!")
+
+    finally:
+        set_langgraph_model(previous_model)
+
+
+if __name__ == "__main__":
+    test_agent_pool()
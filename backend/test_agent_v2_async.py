@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test script for the async and streaming agent v2 code paths
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import tempfile
+import shutil
+from types import SimpleNamespace
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import HumanMessage, AIMessage
+from execution_pool import WorkerPool, set_execution_pool
+from generation_cache import GenerationCache, set_generation_cache
+from schema_cache import SchemaCache, set_schema_cache, get_schema_cache, database_version
+from langgraph_agent_v2 import SimplifiedAgent, DatabaseContext, EXECUTION_RECORDED_TAG
+
+LLM_DELAY = 0.5
+
+
+class _SlowLLM:
+    """Takes LLM_DELAY per call and records whether the sync or async API was used"""
+
+    def __init__(self, content="Here is an answer"):
+        self.content = content
+        self.sync_calls = 0
+        self.async_calls = 0
+
+    def invoke(self, messages):
+        self.sync_calls += 1
+        time.sleep(LLM_DELAY)
+        return SimpleNamespace(content=self.content)
+
+    async def ainvoke(self, messages):
+        self.async_calls += 1
+        await asyncio.sleep(LLM_DELAY)
+        return SimpleNamespace(content=self.content)
+
+
+def test_agent_v2_async():
+    """Test that arun awaits the LLM and concurrent requests overlap"""
+
+    test_dir = tempfile.mkdtemp(prefix="agent_v2_async_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_generation_cache(GenerationCache(db_path=os.path.join(test_dir, "generation_cache.db"), enabled=False))
+
+    try:
+        agent = SimplifiedAgent()
+        agent.llm = _SlowLLM()
+
+        response, _, _, _ = agent.run("Explain the objective function")
+        assert response == "Here is an answer" and agent.llm.sync_calls == 1
+        print("✓ run() keeps using the synchronous LLM API")
+
+        async def _concurrent(count):
+            started_at = time.perf_counter()
+            results = await asyncio.gather(*[agent.arun("Explain the objective function") for _ in range(count)])
+            return results, time.perf_counter() - started_at
+
+        results, elapsed = asyncio.run(_concurrent(5))
+        assert all(result[0] == "Here is an answer" for result in results)
+        assert agent.llm.async_calls == 5 and agent.llm.sync_calls == 1
+        assert elapsed < 2 * LLM_DELAY, f"requests did not overlap: {elapsed:.2f}s"
+        print(f"✓ 5 concurrent chat requests finished in {elapsed:.2f}s (one LLM call takes {LLM_DELAY}s)")
+
+        # Code generation nodes await the LLM too
+        db_path = os.path.join(test_dir, "database.db")
+        open(db_path, "wb").close()
+        db_context = DatabaseContext(scenario_id=1, database_path=db_path,
+                                     schema_info={"tables": {}}, temp_dir=test_dir)
+        agent.llm = _SlowLLM("```python\nprint('hubs')\n```")
+        state = {"messages": [HumanMessage(content="top hubs")], "user_request": "top hubs", "db_context": db_context}
+        state = asyncio.run(agent._ahandle_sql_query(state))
+        assert agent.llm.async_calls == 1 and agent.llm.sync_calls == 0
+        assert os.path.exists(os.path.join(test_dir, state["generated_files"][0]))
+        print("✓ SQL query generation awaits the LLM and writes the script")
+
+        print("\n🎉 All async agent tests passed!")
+
+    finally:
+        set_generation_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+async def _collect(agent, message):
+    return [event async for event in agent.astream(message)]
+
+
+def test_agent_v2_streaming():
+    """Test node, token, execution output and result events of astream()"""
+
+    test_dir = tempfile.mkdtemp(prefix="agent_v2_stream_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_generation_cache(GenerationCache(db_path=os.path.join(test_dir, "generation_cache.db"), enabled=False))
+    pool = WorkerPool(size=1)
+    set_execution_pool(pool)
+    set_schema_cache(SchemaCache())
+
+    try:
+        agent = SimplifiedAgent()
+        agent.llm = GenericFakeChatModel(messages=iter([AIMessage(content="The objective minimizes total cost")]))
+        events = asyncio.run(_collect(agent, "Explain the objective function"))
+        names = [event["event"] for event in events]
+        assert names[0] == "start" and names[-1] == "result"
+        nodes = [(e["node"], e["status"]) for e in events if e["event"] == "node"]
+        assert nodes[:2] == [("classify_request", "start"), ("classify_request", "end")]
+        assert ("handle_chat", "end") in nodes and ("respond", "end") in nodes
+        tokens = [e["text"] for e in events if e["event"] == "token"]
+        assert len(tokens) > 1 and "".join(tokens) == events[-1]["response"]
+        assert names.index("token") < names.index("result")
+        print(f"✓ Chat streams node transitions and {len(tokens)} tokens before the result")
+
+        # Script stdout lines arrive while the script is still running
+        db_path = os.path.join(test_dir, "database.db")
+        sqlite3.connect(db_path).close()
+        agent._get_database_context = lambda scenario_id=None: DatabaseContext(
+            scenario_id=1, database_path=db_path, schema_info={"tables": {}}, temp_dir=test_dir)
+        history = []
+        agent.scenario_manager = SimpleNamespace(log_execution=lambda **row: history.append(row))
+        code = ("```python\nimport time\nfor i in range(3):\n"
+                "    print('row', i, flush=True)\n    time.sleep(0.3)\n```")
+        agent.llm = GenericFakeChatModel(messages=iter([AIMessage(content=code)]))
+        events = asyncio.run(_collect(agent, "show the rows"))
+        lines = [e for e in events if e["event"] == "execution_output"]
+        assert [e["line"] for e in lines] == ["row 0", "row 1", "row 2"]
+        assert lines[-1]["elapsed_ms"] - lines[0]["elapsed_ms"] >= 400
+        assert events[-1]["event"] == "result" and events[-1]["execution_output"] == "row 0\nrow 1\nrow 2\n"
+        print("✓ Execution stdout lines are streamed as they are printed")
+
+        # The agent writes the history row with resource usage and tags the request,
+        # so the chat endpoints do not add a second row
+        assert len(history) == 1 and history[0]["source"] == "agent" and history[0]["result"].return_code == 0
+        assert events[-1]["timings"]["tags"][EXECUTION_RECORDED_TAG] == "agent"
+        print("✓ Script run recorded once in execution history")
+
+        # A streamed script that creates a table drops the cached schema
+        assert get_schema_cache().get(db_path)["tables"] == {}
+        version = database_version(db_path)
+        code = ("```python\nimport sqlite3\nconn = sqlite3.connect('database.db')\n"
+                "conn.execute('CREATE TABLE outputs_totals (cost REAL)')\nconn.commit()\nprint('created')\n```")
+        agent.llm = GenericFakeChatModel(messages=iter([AIMessage(content=code)]))
+        events = asyncio.run(_collect(agent, "save the totals"))
+        assert [e["line"] for e in events if e["event"] == "execution_output"] == ["created"]
+        assert database_version(db_path) != version
+        assert get_schema_cache().stats["invalidations"] == 1
+        assert "outputs_totals" in get_schema_cache().get(db_path)["tables"]
+        print("✓ Streamed scripts that write tables invalidate the schema cache")
+
+        print("\n🎉 All streaming agent tests passed!")
+
+    finally:
+        pool.shutdown()
+        set_execution_pool(None)
+        set_generation_cache(None)
+        set_schema_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_agent_v2_async()
+    test_agent_v2_streaming()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for the analysis template library
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+import shutil
+from execution_pool import WorkerPool, set_execution_pool
+from generation_cache import GenerationCache, set_generation_cache
+from schema_cache import read_database_info
+from analysis_templates import create_default_registry, set_template_registry
+from langgraph_agent_v2 import SimplifiedAgent, DatabaseContext
+
+
+class _NoLLM:
+    """Fails the test if the agent asks the LLM for code"""
+
+    def invoke(self, messages):
+        raise AssertionError("the LLM should not be called for a template match")
+
+    async def ainvoke(self, messages):
+        raise AssertionError("the LLM should not be called for a template match")
+
+
+def _create_hub_database(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE inputs_hubs (HubID TEXT, Location TEXT, Latitude REAL, Longitude REAL, Initial_Active INTEGER)")
+    conn.execute("CREATE TABLE inputs_params (Parameter TEXT, Value REAL)")
+    hubs = [(f"H{i}", f"Town {i}", 51 + i / 10, -1 + i / 10, int(i % 3 == 0)) for i in range(12)]
+    conn.executemany("INSERT INTO inputs_hubs VALUES (?, ?, ?, ?, ?)", hubs)
+    for scenario in ("basecase", "default"):
+        conn.execute(f"CREATE TABLE outputs_routes_{scenario} (HubID TEXT, DestinationID TEXT, Distance REAL, "
+                     f"Cost_Route REAL, Cost_Unit REAL, Active REAL, Supply REAL)")
+        rows = [(f"H{h}", f"D{d}", 10.0 * (h + d), 100.0 + h * d, 2.0 + d, float(d == h % 4), float(h * (d == h % 4)))
+                for h in range(12) for d in range(8)]
+        conn.executemany(f"INSERT INTO outputs_routes_{scenario} VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute(f"CREATE TABLE outputs_hubs_{scenario} (HubID TEXT, Location TEXT, Latitude REAL, Longitude REAL, Active REAL)")
+        conn.executemany(f"INSERT INTO outputs_hubs_{scenario} VALUES (?, ?, ?, ?, ?)",
+                         [(h[0], h[1], h[2], h[3], float(h[4])) for h in hubs])
+    conn.commit()
+    conn.close()
+
+
+def test_analysis_templates():
+    """Test slot filling, confidence, the rendered scripts and the agent's LLM-free path"""
+
+    test_dir = tempfile.mkdtemp(prefix="analysis_templates_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_generation_cache(GenerationCache(db_path=os.path.join(test_dir, "generation_cache.db"), enabled=False))
+    registry = create_default_registry(threshold=0.8, enabled=True)
+    set_template_registry(registry)
+    pool = WorkerPool(size=1)
+    set_execution_pool(pool)
+
+    try:
+        db_path = os.path.join(test_dir, "database.db")
+        _create_hub_database(db_path)
+        schema = read_database_info(db_path)
+
+        match = registry.match("Show the bottom 3 hubs by demand served in the basecase", schema, "visualization")
+        assert match.template_id == "top_hubs_by_demand" and match.confidence == 1.0
+        assert match.slots["table"] == "outputs_routes_basecase" and match.slots["n"] == 3
+        assert match.slots["order"] == "asc" and match.slots["chart"] == "bar"
+        match = registry.match("top hubs by supply", schema, "sql_query")
+        assert match.slots["table"] == "outputs_routes_default" and match.slots["n"] == 10 and match.slots["chart"] == "table"
+        match = registry.match("Box plot of the unit cost distribution of active routes", schema, "visualization")
+        assert match.template_id == "route_cost_distribution"
+        assert (match.slots["metric"], match.slots["active_only"], match.slots["chart"]) == ("Cost_Unit", True, "box")
+        match = registry.match("Map of active hubs", schema, "visualization")
+        assert match.template_id == "active_hub_map" and match.slots["status_column"] == "Initial_Active"
+        assert registry.match("Map of active hubs in the default scenario", schema, "visualization").slots["table"] == "outputs_hubs_default"
+        print("✓ Slots are filled from the request and the schema")
+
+        # Requests a template cannot fully express go to the LLM
+        assert registry.match("top 5 hubs by demand in the north region compared to last year", schema, "visualization") is None
+        assert registry.match("Map of active hubs", schema, "sql_query") is None
+        assert registry.match("top 5 hubs by demand excluding hub 3", schema, "visualization") is None
+        assert registry.match("show top 10 hubs by demand served with demand above 500", schema, "visualization") is None
+        assert registry.match("route cost distribution for routes over 250 km", schema, "visualization") is None
+        assert registry.match("top hubs by demand served in 2024", schema, "sql_query") is None
+        top_hubs = registry.templates["top_hubs_by_demand"]
+        assert top_hubs.match("top 5 hubs by demand hub", ["top", "hub", "demand", "hub"], schema, "sql_query").confidence == 1.0
+        assert registry.match("What is the total cost?", schema, "sql_query") is None
+        no_outputs = {"tables": {"inputs_hubs": schema["tables"]["inputs_hubs"]}}
+        assert registry.match("top hubs by demand", no_outputs, "visualization") is None
+        print("✓ Unsupported wording, request types and schemas are not matched")
+
+        # Every template's script runs against the database
+        for request, request_type in [("top 5 hubs by demand", "visualization"), ("top 5 hubs by demand", "sql_query"),
+                                      ("route cost distribution", "visualization"), ("route distance statistics", "sql_query"),
+                                      ("map of open hubs", "visualization")]:
+            match = registry.match(request, schema, request_type)
+            script = os.path.join(test_dir, f"{match.template_id}.py")
+            with open(script, "w", encoding="utf-8") as f:
+                f.write(registry.render(match, "database.db"))
+            result = pool.run(script, cwd=test_dir, timeout=60)
+            assert result.returncode == 0, result.stderr
+            assert any(path.endswith(".html") for path in result.written_files)
+        print("✓ Rendered scripts run and write their HTML output")
+
+        # Agent: a matched request goes straight to execution without the LLM
+        agent = SimplifiedAgent()
+        agent.llm = _NoLLM()
+        agent._get_database_context = lambda scenario_id=None: DatabaseContext(
+            scenario_id=1, database_path=db_path, schema_info=schema, temp_dir=test_dir)
+        agent.run("Plot the top 5 hubs by demand")
+        started_at = time.perf_counter()
+        response, files, output, error = agent.run("Create a histogram of the route cost distribution")
+        elapsed = time.perf_counter() - started_at
+        assert not error and files[0].startswith("visualization_")
+        with open(os.path.join(test_dir, files[0]), encoding="utf-8") as f:
+            assert 'analysis template "route_cost_distribution"' in f.read()
+        assert any(f.endswith(".html") for f in files)
+        assert elapsed < 1.0, f"templated request took {elapsed:.2f}s"
+        print(f"✓ Agent answered a templated request without the LLM in {elapsed:.2f}s")
+
+        status = registry.get_status()
+        assert status["matched"] >= 10 and status["below_threshold"] >= 1
+        print(f"✓ Template counters: matched {status['matched']} of {status['requests']}")
+
+        print("\n🎉 All analysis template tests passed!")
+
+    finally:
+        pool.shutdown()
+        set_execution_pool(None)
+        set_template_registry(None)
+        set_generation_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_analysis_templates()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for batch model execution across scenarios
+"""
+
+import os
+import json
+import asyncio
+import sqlite3
+import tempfile
+import shutil
+import sys
+from execution_pool import WorkerPool
+from job_manager import JobManager, JOB_RUNNING
+from batch_execution import BatchManager, written_tables
+
+
+def test_batch_execution():
+    """Test running one model against several scenario databases in parallel"""
+
+    test_dir = tempfile.mkdtemp(prefix="batch_execution_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    pool = WorkerPool(size=1, enabled=False)
+    manager = JobManager(log_root=os.path.join(test_dir, "job_logs"), max_concurrent=8)
+    batches = BatchManager(manager)
+
+    try:
+        # Three scenarios, each with its own database and directory
+        scenario_dirs = {}
+        for scenario_id, demand in ((1, 10), (2, 20), (3, 30)):
+            scenario_dir = os.path.join(test_dir, f"scenario_{scenario_id}")
+            os.makedirs(scenario_dir)
+            conn = sqlite3.connect(os.path.join(scenario_dir, "database.db"))
+            conn.execute("CREATE TABLE inputs_demand (value INTEGER)")
+            conn.execute("INSERT INTO inputs_demand VALUES (?)", (demand,))
+            conn.commit()
+            conn.close()
+            scenario_dirs[scenario_id] = scenario_dir
+
+        # The model addresses its database by a relative name, like uploaded runall.py files
+        model_dir = os.path.join(test_dir, "model")
+        os.makedirs(model_dir)
+        model = os.path.join(model_dir, "runall.py")
+        with open(model, "w", encoding="utf-8") as f:
+            f.write(
+                "import sqlite3, time\n"
+                "time.sleep(0.3)\n"
+                "conn = sqlite3.connect('project_data.db')\n"
+                "value = conn.execute('SELECT value FROM inputs_demand').fetchone()[0]\n"
+                "conn.execute('DROP TABLE IF EXISTS outputs_cost')\n"
+                "conn.execute('CREATE TABLE outputs_cost (cost INTEGER)')\n"
+                "conn.execute('INSERT INTO outputs_cost VALUES (?)', (value * 2,))\n"
+                "conn.commit()\n"
+                "open('result.csv', 'w').write(str(value * 2))\n"
+                "print('cost', value * 2)\n"
+            )
+
+        peak_running = []
+
+        def runner_factory(scenario_id):
+            def runner(job):
+                database_path = os.path.join(scenario_dirs[scenario_id], "database.db")
+                env = {"EYPOR_DB_REDIRECTS": json.dumps({"project_data.db": database_path})}
+                execution = pool.start_command([sys.executable, model], cwd=scenario_dirs[scenario_id],
+                                               env=env, capture_dir=job.log_dir)
+                job.attach(execution)
+                peak_running.append(sum(1 for j in manager.list_jobs() if j.status == JOB_RUNNING))
+                result = execution.wait(timeout=60)
+                return {
+                    "stdout": result.stdout,
+                    "stderr": result.stderr,
+                    "return_code": result.return_code,
+                    "output_tables": written_tables(result, database_path),
+                    "resource_usage": result.resource_usage(),
+                }
+            return runner
+
+        batch = batches.submit("runall.py", [(1, "Base"), (2, "High"), (3, "Peak")],
+                               runner_factory, max_concurrent=2)
+        assert batch.to_dict()["total"] == 3
+        print(f"✓ Submitted batch {batch.id}")
+
+        async def collect():
+            return [event async for event in batches.stream_progress(batch.id, poll_interval=0.05)]
+
+        events = asyncio.run(collect())
+        assert events[0].startswith("event: progress") and events[-1].startswith("event: done")
+        print(f"✓ Streamed {len(events) - 1} progress event(s) and a done event")
+
+        summary = batch.to_dict()
+        assert summary["status"] == "completed" and summary["progress"] == 1.0, summary
+        assert max(peak_running) <= 2
+        print(f"✓ Concurrency cap respected (peak running: {max(peak_running)})")
+
+        for entry in summary["scenarios"]:
+            scenario_id = entry["scenario_id"]
+            expected = {1: 20, 2: 40, 3: 60}[scenario_id]
+            assert entry["output_tables"] == [{"table": "outputs_cost"}]
+            assert entry["execution_time_ms"] is not None
+            with open(os.path.join(scenario_dirs[scenario_id], "result.csv")) as f:
+                assert f.read() == str(expected)
+        assert not os.path.exists(os.path.join(model_dir, "project_data.db"))
+        print("✓ Each scenario used its own database and working directory")
+
+        # A re-run rewriting the same number of rows still reports its output table
+        batch = batches.submit("runall.py", [(1, "Base")], runner_factory)
+        asyncio.run(batches.wait_for(batch.id))
+        assert batch.to_dict()["scenarios"][0]["output_tables"] == [{"table": "outputs_cost"}]
+        print("✓ Output tables come from the tables the run wrote, not row counts")
+
+        # Cancelling a batch cancels its remaining jobs
+        with open(model, "w", encoding="utf-8") as f:
+            f.write("import time\ntime.sleep(30)\n")
+        batch = batches.submit("runall.py", [(1, "Base"), (2, "High"), (3, "Peak")],
+                               runner_factory, max_concurrent=1)
+        batches.cancel(batch.id)
+        asyncio.run(batches.wait_for(batch.id))
+        assert batch.to_dict()["status"] == "cancelled"
+        print("✓ Cancelled batch stops all of its jobs")
+
+        print("\n🎉 All batch execution tests passed!")
+
+    finally:
+        pool.shutdown()
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_batch_execution()
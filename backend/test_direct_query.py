@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for direct answers of data questions with one in-process SELECT
+"""
+
+import os
+import sqlite3
+import asyncio
+import tempfile
+import shutil
+from types import SimpleNamespace
+from langchain_core.messages import HumanMessage
+from generation_cache import GenerationCache, set_generation_cache
+from direct_query import DirectQueryRunner, extract_sql, check_statement, set_direct_query_runner, get_direct_query_runner
+from langgraph_agent_v2 import SimplifiedAgent, DatabaseContext
+
+GOOD_SQL = "```sql\nSELECT Hub, Demand FROM inputs_hubs ORDER BY Demand DESC;\n```"
+BAD_SQL = GOOD_SQL.replace("Demand FROM", "Throughput FROM")
+
+
+class _ScriptedLLM:
+    """Returns the given responses in order and records the prompts"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def invoke(self, messages):
+        self.prompts.append(messages[-1].content)
+        return SimpleNamespace(content=self.responses.pop(0))
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+def test_direct_query():
+    """Test statement checks, row caps, timeouts, read-only connections and direct answers in the agent"""
+
+    test_dir = tempfile.mkdtemp(prefix="direct_query_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_generation_cache(GenerationCache(db_path=os.path.join(test_dir, "generation_cache.db"), enabled=False))
+    set_direct_query_runner(DirectQueryRunner(max_rows=3, timeout=0.2, connections_per_database=2))
+
+    try:
+        db_path = os.path.join(test_dir, "database.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE inputs_hubs (Hub TEXT, Demand REAL)")
+        conn.executemany("INSERT INTO inputs_hubs VALUES (?, ?)", [(f"H{i}", i * 10.0) for i in range(5)])
+        conn.commit()
+        conn.close()
+
+        assert extract_sql(GOOD_SQL) == "SELECT Hub, Demand FROM inputs_hubs ORDER BY Demand DESC"
+        assert extract_sql(" SELECT 1; ") == "SELECT 1"
+        assert check_statement("-- top hubs\nWITH t AS (SELECT 1) SELECT * FROM t") is None
+        assert check_statement("DELETE FROM inputs_hubs") == "Only SELECT statements can be answered directly"
+        assert check_statement("SELECT 1; DROP TABLE inputs_hubs") == "Only one SQL statement can be run"
+        assert check_statement("/* nothing */") == "The response contains no SQL statement"
+        print("✓ Only single SELECT statements are accepted")
+
+        runner = get_direct_query_runner()
+        result = runner.run(db_path, extract_sql(GOOD_SQL), "r1")
+        assert result.columns == ["Hub", "Demand"] and result.rows[0] == ["H4", 40.0]
+        assert len(result.rows) == 3 and result.truncated
+        assert "| H4 | 40.0 |" in result.preview() and "3+ rows" in result.preview()
+        assert runner.get_result("r1").to_dict()["html_url"] == "/query-results/r1/html"
+        print("✓ Results are capped at max_rows and flagged as truncated")
+
+        slow = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+        try:
+            runner.run(db_path, slow)
+            assert False, "the recursive query should time out"
+        except sqlite3.OperationalError as e:
+            assert "limit" in str(e)
+        pool = runner._pool(db_path)
+        conn = pool.acquire(1)
+        try:
+            conn.execute("DELETE FROM inputs_hubs")
+            assert False, "the pooled connection should be read-only"
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            pool.release(conn)
+        assert runner.run(db_path, "SELECT COUNT(*) FROM inputs_hubs").rows == [[5]]
+        print("✓ Slow queries are interrupted and pooled connections cannot write")
+
+        assert runner.get_status()["html_rendered"] == 0
+        html = runner.render_html("r1")
+        assert "<html>" in html and runner.render_html("r1") is html and runner.render_html("missing") is None
+        assert runner.get_status()["html_rendered"] == 1
+        print("✓ Table HTML is rendered once, on the first request")
+
+        # Agent: one LLM call, SQL fixed after an EXPLAIN error, no script file
+        agent = SimplifiedAgent()
+        db_context = DatabaseContext(scenario_id=1, database_path=db_path,
+                                     schema_info={"tables": {}}, temp_dir=test_dir)
+        state = {"messages": [HumanMessage(content="hubs by demand")], "user_request": "hubs by demand",
+                 "db_context": db_context, "generated_files": [], "request_type": "sql_query",
+                 "direct_answer": True}
+
+        agent.llm = _ScriptedLLM(BAD_SQL, GOOD_SQL)
+        result = agent._handle_sql_query(state)
+        assert len(agent.llm.prompts) == 2 and "no such column: Throughput" in agent.llm.prompts[1]
+        assert result["generated_files"] == [] and not result["direct_query"]["error"]
+        result = agent._execute_code(result)
+        assert not result["execution_error"] and result["query_result"]["rows"][0] == ["H4", 40.0]
+        assert "| H4 | 40.0 |" in result["execution_output"]
+        assert not [name for name in os.listdir(test_dir) if name.endswith(".py")]
+        print("✓ Direct answers run in-process without generating a script")
+
+        # Still invalid after the retries: the statement is not run
+        agent.llm = _ScriptedLLM(BAD_SQL, BAD_SQL, BAD_SQL)
+        result = asyncio.run(agent._ahandle_sql_query(state))
+        assert len(agent.llm.prompts) == 3
+        result = agent._execute_code(result)
+        assert "was not run" in result["execution_error"] and not result.get("query_result")
+        print("✓ SQL that cannot be fixed is rejected without running it")
+
+        print(f"✓ Direct query counters: {runner.get_status()}")
+
+        print("\n🎉 All direct query tests passed!")
+
+    finally:
+        set_direct_query_runner(None)
+        set_generation_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_direct_query()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test script for the execution result cache
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+import shutil
+from execution_pool import WorkerPool
+from execution_cache import ExecutionCache
+
+
+def _write(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _run(pool, cache, script, run_dir, bypass=False):
+    result = cache.lookup(script, cwd=run_dir, bypass=bypass)
+    if result is None:
+        started_at = time.time()
+        result = pool.run(script, cwd=run_dir, timeout=60)
+        cache.store(script, result, started_at, cwd=run_dir)
+    return result
+
+
+def test_execution_cache():
+    """Test hits, invalidation, bypass and eviction"""
+
+    test_dir = tempfile.mkdtemp(prefix="execution_cache_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    pool = WorkerPool(size=1, worker_env={"EYPOR_WORKER_PRELOAD": "json,sqlite3"})
+    cache = ExecutionCache(cache_dir=os.path.join(test_dir, "cache"), max_entries=2)
+
+    try:
+        run_dir = os.path.join(test_dir, "scenario")
+        os.makedirs(run_dir)
+        db_path = os.path.join(run_dir, "database.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE inputs_hubs (Hub TEXT)")
+        conn.execute("INSERT INTO inputs_hubs VALUES ('London')")
+        conn.commit()
+        conn.close()
+        # Make sure the database is older than the first run
+        old = time.time() - 10
+        os.utime(db_path, (old, old))
+
+        script = os.path.join(run_dir, "sql_query_1.py")
+        _write(script, (
+            "import sqlite3\n"
+            "hubs = [r[0] for r in sqlite3.connect('database.db').execute('SELECT Hub FROM inputs_hubs')]\n"
+            "print(hubs)\n"
+            "open('hubs_chart.html', 'w').write(str(hubs))\n"
+        ))
+
+        first = _run(pool, cache, script, run_dir)
+        assert first.return_code == 0 and not first.cached, first.stderr
+        assert cache.stats["stores"] == 1
+        print("✓ Successful run stored")
+
+        os.remove(os.path.join(run_dir, "hubs_chart.html"))
+        second = _run(pool, cache, script, run_dir)
+        assert second.cached and second.stdout == first.stdout
+        with open(os.path.join(run_dir, "hubs_chart.html")) as f:
+            assert f.read() == "['London']"
+        assert cache.stats["hits"] == 1
+        print("✓ Cache hit returns stdout and restores artifacts")
+
+        # Data change invalidates the entry
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO inputs_hubs VALUES ('Paris')")
+        conn.commit()
+        conn.close()
+        os.utime(db_path, (old + 1, old + 1))
+        third = _run(pool, cache, script, run_dir)
+        assert not third.cached and "Paris" in third.stdout
+        assert cache.stats["invalidated"] == 1
+        print("✓ Database change invalidates the cached result")
+
+        # Script change is a different key
+        _write(script, "print('changed')\n")
+        assert _run(pool, cache, script, run_dir).stdout.strip() == "changed"
+        assert _run(pool, cache, script, run_dir).cached
+        print("✓ Script content is part of the key")
+
+        # Explicit bypass
+        bypassed = _run(pool, cache, script, run_dir, bypass=True)
+        assert not bypassed.cached and cache.stats["bypassed"] == 1
+        print("✓ Bypass flag forces execution")
+
+        # Other input files are part of the validity check
+        csv_path = os.path.join(run_dir, "demand.csv")
+        _write(csv_path, "hub,demand\nLondon,10\n")
+        _write(script, "print(open('demand.csv').read().splitlines()[-1])\n")
+        assert _run(pool, cache, script, run_dir).stdout.strip() == "London,10"
+        assert _run(pool, cache, script, run_dir).cached
+        _write(csv_path, "hub,demand\nLondon,99\n")
+        changed = _run(pool, cache, script, run_dir)
+        assert not changed.cached and changed.stdout.strip() == "London,99"
+        assert cache.stats["invalidated"] == 2
+        assert _run(pool, cache, script, run_dir).cached
+        print("✓ A changed input file invalidates the cached result")
+
+        # Other scripts next to this one do not change its key; imported modules are validated
+        _write(os.path.join(run_dir, "helpers.py"), "LABEL = 'first'\n")
+        _write(script, "import helpers\nprint(helpers.LABEL)\n")
+        assert _run(pool, cache, script, run_dir).stdout.strip() == "first"
+        _write(os.path.join(run_dir, "sql_query_2.py"), "print('another query')\n")
+        assert _run(pool, cache, script, run_dir).cached
+        _write(os.path.join(run_dir, "helpers.py"), "LABEL = 'second'\n")
+        changed = _run(pool, cache, script, run_dir)
+        assert not changed.cached and changed.stdout.strip() == "second"
+        assert cache.stats["invalidated"] == 3
+        print("✓ Only imported local modules invalidate the cached result")
+
+        # Scripts that modify their database are not cached
+        _write(script, (
+            "import sqlite3\n"
+            "conn = sqlite3.connect('database.db')\n"
+            "conn.execute(\"INSERT INTO inputs_hubs VALUES ('Rome')\")\n"
+            "conn.commit()\n"
+        ))
+        _run(pool, cache, script, run_dir)
+        assert not _run(pool, cache, script, run_dir).cached
+        assert cache.stats["not_cacheable"] >= 2
+        print("✓ Runs that modify data are not cached")
+
+        # LRU eviction (max_entries=2)
+        for i in range(3):
+            _write(script, f"print({i})\n")
+            _run(pool, cache, script, run_dir)
+        status = cache.get_status()
+        assert status["entries"] == 2 and status["evictions"] >= 1
+        print(f"✓ LRU eviction keeps {status['entries']} entries")
+
+        # The index survives a restart
+        reloaded = ExecutionCache(cache_dir=cache.cache_dir, max_entries=2)
+        assert reloaded.lookup(script, cwd=run_dir).cached
+        print("✓ Cache index is persisted")
+
+        print("\n🎉 All execution cache tests passed!")
+
+    finally:
+        pool.shutdown()
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_execution_cache()
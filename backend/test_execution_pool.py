@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for the warm execution pool
+"""
+
+import os
+import tempfile
+import shutil
+from execution_pool import WorkerPool
+
+
+def _write(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_execution_pool():
+    """Test running scripts through warm workers"""
+
+    test_dir = tempfile.mkdtemp(prefix="execution_pool_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    # Keep the test fast: only preload the standard library
+    pool = WorkerPool(size=1, max_jobs_per_worker=3, worker_env={"EYPOR_WORKER_PRELOAD": "json,sqlite3"})
+
+    try:
+        # Output, cwd and __main__ semantics
+        script = os.path.join(test_dir, "hello.py")
+        _write(script, (
+            "import os, sys\n"
+            "if __name__ == '__main__':\n"
+            "    print('hello from', os.path.basename(os.getcwd()))\n"
+            "    print('oops', file=sys.stderr)\n"
+            "    open('result.txt', 'w').write('ok')\n"
+        ))
+        run_dir = os.path.join(test_dir, "run_dir")
+        os.makedirs(run_dir)
+
+        result = pool.run(script, cwd=run_dir, timeout=60)
+        assert result.return_code == 0, result.stderr
+        assert result.pooled
+        assert "hello from run_dir" in result.stdout
+        assert "oops" in result.stderr
+        assert os.path.exists(os.path.join(run_dir, "result.txt"))
+        print("✓ Script ran in a pooled worker with its own cwd and captured output")
+
+        # Fresh namespace per job: globals from the previous job must not leak
+        _write(script, "leaked = 42\n")
+        pool.run(script, timeout=60)
+        _write(script, "print('leaked' in globals())\n")
+        result = pool.run(script, timeout=60)
+        assert result.stdout.strip() == "False"
+        print("✓ Each job gets a fresh __main__ namespace")
+
+        # Local modules are re-imported so edits are picked up between jobs
+        _write(os.path.join(test_dir, "helper_module.py"), "VALUE = 1\n")
+        _write(script, "import helper_module\nprint(helper_module.VALUE)\n")
+        first = pool.run(script, timeout=60)
+        _write(os.path.join(test_dir, "helper_module.py"), "VALUE = 22\n")
+        second = pool.run(script, timeout=60)
+        assert first.stdout.strip() == "1" and second.stdout.strip() == "22"
+        print("✓ Local modules are not cached across jobs")
+
+        # Errors and sys.exit codes
+        _write(script, "raise ValueError('boom')\n")
+        result = pool.run(script, timeout=60)
+        assert result.return_code == 1 and "ValueError: boom" in result.stderr
+        _write(script, "import sys\nsys.exit(3)\n")
+        result = pool.run(script, timeout=60)
+        assert result.return_code == 3
+        print("✓ Exceptions and exit codes are reported")
+
+        # Workers are recycled after max_jobs_per_worker
+        assert pool.stats["workers_recycled"] >= 1
+        print(f"✓ Workers recycled: {pool.stats['workers_recycled']}")
+
+        # Timeouts kill the worker and the pool keeps working
+        _write(script, "import time\ntime.sleep(30)\n")
+        result = pool.run(script, timeout=1)
+        assert result.timed_out and result.return_code == -1
+        _write(script, "print('still alive')\n")
+        result = pool.run(script, timeout=60)
+        assert "still alive" in result.stdout
+        print("✓ Timed out jobs are killed and the pool recovers")
+
+        # Subprocess fallback has the same result shape
+        result = pool.run(script, timeout=60, use_pool=False)
+        assert not result.pooled and "still alive" in result.stdout
+        print("✓ Subprocess fallback works")
+
+        # Resource accounting for both execution paths
+        _write(script, "data = bytearray(20 * 1024 * 1024)\nsum(range(200000))\nprint('x' * 1000)\n")
+        for use_pool in (True, False):
+            result = pool.run(script, timeout=60, use_pool=use_pool)
+            usage = result.resource_usage()
+            assert usage["output_bytes"] >= 1000
+            if os.name != "nt":
+                assert usage["cpu_user_ms"] is not None and usage["cpu_system_ms"] is not None
+                assert usage["peak_rss_kb"] >= 20 * 1024, usage
+        print("✓ CPU time, peak RSS and output bytes are reported")
+
+        # Database redirection hooks: scripts run unmodified against the mapped database
+        import json
+        import sqlite3
+        scenario_db = os.path.join(test_dir, "scenario.db")
+        conn = sqlite3.connect(scenario_db)
+        conn.execute("CREATE TABLE inputs_hubs (Hub TEXT)")
+        conn.execute("INSERT INTO inputs_hubs VALUES ('London')")
+        conn.commit()
+        conn.close()
+        _write(script, (
+            "import sqlite3\n"
+            "conn = sqlite3.connect('project_data.db')\n"
+            "print(conn.execute('SELECT Hub FROM inputs_hubs').fetchone()[0])\n"
+        ))
+        redirect_env = {"EYPOR_DB_REDIRECTS": json.dumps({"project_data.db": scenario_db})}
+        for use_pool in (True, False):
+            result = pool.run(script, cwd=run_dir, timeout=60, env=redirect_env, use_pool=use_pool)
+            assert result.stdout.strip() == "London", result.stderr
+        assert not os.path.exists(os.path.join(run_dir, "project_data.db"))
+        print("✓ sqlite3.connect redirected to the scenario database (pool and subprocess)")
+
+        # Without the mapping the next job opens the literal file again
+        result = pool.run(script, cwd=run_dir, timeout=60)
+        assert result.return_code == 1 and "no such table" in result.stderr
+        print("✓ Redirects do not leak into the next job")
+
+        # Write manifest: files opened for writing are reported, files only read are not
+        _write(os.path.join(run_dir, "input.csv"), "a,b\n1,2\n")
+        _write(script, (
+            "import os, pathlib\n"
+            "open('input.csv').read()\n"
+            "with open('chart.html', 'w') as f:\n"
+            "    f.write('<html></html>')\n"
+            "pathlib.Path('data.json').write_text('{}')\n"
+            "open('tmp.part', 'w').write('x')\n"
+            "os.replace('tmp.part', 'report.csv')\n"
+        ))
+        for use_pool in (True, False):
+            result = pool.run(script, cwd=run_dir, timeout=60, use_pool=use_pool)
+            assert result.return_code == 0, result.stderr
+            written = {os.path.basename(p) for p in result.written_files}
+            assert {"chart.html", "data.json", "report.csv"} <= written, written
+            assert "input.csv" not in written
+        print("✓ Written files are reported from the write manifest (pool and subprocess)")
+
+        # A busy pool falls back to a subprocess instead of waiting without a deadline
+        pool.acquire_timeout = 0.2
+        _write(script, "import time\ntime.sleep(1)\nprint('done')\n")
+        busy = pool.start(script, cwd=run_dir)
+        fallback = pool.start(script, cwd=run_dir)
+        assert busy.worker is not None and fallback.worker is None
+        assert fallback.wait(timeout=60).stdout.strip() == "done" and busy.wait(timeout=60).pooled
+        assert pool.get_status()["acquire_timeouts"] == 1
+        print("✓ Busy pool falls back to a subprocess after the acquire timeout")
+
+        print("\n🎉 All execution pool tests passed!")
+
+    finally:
+        pool.shutdown()
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_execution_pool()
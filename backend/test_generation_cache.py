@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test script for the LLM generation cache
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+import shutil
+from types import SimpleNamespace
+from langchain_core.messages import HumanMessage
+from generation_cache import GenerationCache, normalize_request, schema_fingerprint, set_generation_cache
+from langgraph_agent_v2 import SimplifiedAgent, DatabaseContext
+
+
+class _FakeLLM:
+    """Counts invocations and returns a fixed script"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content="```python\nprint('top hubs')\n```")
+
+
+def _schema(demand_type="REAL", rows=3):
+    return {"tables": {"inputs_hubs": {
+        "columns": [{"name": "Hub", "type": "TEXT"}, {"name": "Demand", "type": demand_type}],
+        "row_count": rows,
+        "sample_data": [("H%d" % i, i) for i in range(rows)],
+    }}}
+
+
+def test_generation_cache():
+    """Test keys, hits, eviction, expiry and the agent's use of the cache"""
+
+    test_dir = tempfile.mkdtemp(prefix="generation_cache_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    try:
+        assert normalize_request("  Show the TOP 10 hubs by demand? ") == normalize_request("show the top 10 hubs  by demand")
+        assert normalize_request("top 10 hubs") != normalize_request("top 20 hubs")
+        assert schema_fingerprint(_schema(rows=3)) == schema_fingerprint(_schema(rows=50))
+        assert schema_fingerprint(_schema()) != schema_fingerprint(_schema(demand_type="INTEGER"))
+        print("✓ Keys ignore formatting and data values but not numbers or column types")
+
+        cache = GenerationCache(db_path=os.path.join(test_dir, "cache.db"), ttl_seconds=3600, max_entries=2, enabled=True)
+        fp = schema_fingerprint(_schema())
+        key = cache.make_key("sql_query", "Top hubs", "openai:gpt-4.1", fp, "database.db")
+        assert key != cache.make_key("sql_query", "Top hubs", "openai:gpt-4o", fp, "database.db")
+        assert key != cache.make_key("visualization", "Top hubs", "openai:gpt-4.1", fp, "database.db")
+        assert cache.lookup(key) is None
+        cache.store(key, "sql_query", "Top hubs", "openai:gpt-4.1", fp, "print(1)", "Lists hubs")
+        entry = cache.lookup(key)
+        assert entry.code == "print(1)" and entry.hits == 1
+        assert cache.lookup(key).hits == 2
+        print("✓ Stored code is returned with per-entry hit counts")
+
+        # Persistence across instances
+        reopened = GenerationCache(db_path=cache.db_path, ttl_seconds=3600, max_entries=2, enabled=True)
+        assert reopened.get_entry(key).hits == 2
+        print("✓ Entries survive a restart")
+
+        # LRU eviction beyond max_entries
+        for i in range(2):
+            time.sleep(0.01)
+            cache.store(f"k{i}", "sql_query", f"request {i}", "m", fp, "print(2)")
+        assert cache.get_entry(key) is None and cache.get_status()["entries"] == 2
+        cache.lookup("k0")
+        time.sleep(0.01)
+        cache.store("k2", "visualization", "chart", "m", fp, "print(3)")
+        assert cache.get_entry("k0") is not None and cache.get_entry("k1") is None
+        print("✓ Least recently used entries are evicted")
+
+        # TTL expiry, purge and invalidate
+        cache.ttl_seconds = 0
+        time.sleep(0.01)
+        assert cache.lookup("k0") is None and cache.stats["expired"] == 1
+        assert cache.purge(expired_only=True) == 1
+        cache.ttl_seconds = 3600
+        cache.store("k3", "sql_query", "table", "m", fp, "print(4)")
+        assert cache.purge(request_type="visualization") == 0
+        assert cache.invalidate("k3") and not cache.invalidate("k3")
+        assert cache.get_status()["entries"] == 0
+        print(f"✓ Expiry, purge and invalidate: {cache.get_status()}")
+
+        # Agent: the second identical request skips the LLM
+        db_path = os.path.join(test_dir, "database.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE inputs_hubs (Hub TEXT, Demand REAL)")
+        conn.commit()
+        conn.close()
+        agent_cache = GenerationCache(db_path=os.path.join(test_dir, "agent_cache.db"), enabled=True)
+        set_generation_cache(agent_cache)
+        agent = SimplifiedAgent()
+        agent.llm = _FakeLLM()
+        db_context = DatabaseContext(scenario_id=1, database_path=db_path, schema_info=_schema(), temp_dir=test_dir)
+
+        def _ask(request):
+            state = {"messages": [HumanMessage(content=request)], "user_request": request, "db_context": db_context}
+            return agent._handle_sql_query(state)
+
+        state = _ask("Show top hubs")
+        assert agent.llm.calls == 1 and not state["generation_cache_entry"]["hit"]
+        # Nothing is cached until the code ran successfully
+        agent._settle_generation_cache(state["generation_cache_entry"], SimpleNamespace(returncode=1, timed_out=False))
+        _ask("Show top hubs")
+        assert agent.llm.calls == 2
+        agent._settle_generation_cache(state["generation_cache_entry"], SimpleNamespace(returncode=0, timed_out=False))
+
+        state = _ask("show top hubs.")
+        assert agent.llm.calls == 2 and state["generation_cache_entry"]["hit"]
+        script = os.path.join(test_dir, state["generated_files"][0])
+        assert open(script, encoding="utf-8").read() == agent_cache.get_entry(state["generation_cache_entry"]["key"]).code
+        assert "reused previously generated code" in state["messages"][-1].content
+        print("✓ Agent reuses cached code without calling the LLM")
+
+        # Cached code that fails is dropped
+        agent._settle_generation_cache(state["generation_cache_entry"], SimpleNamespace(returncode=1, timed_out=False))
+        _ask("Show top hubs")
+        assert agent.llm.calls == 3
+        print("✓ Failing cached code is invalidated")
+
+        print("\n🎉 All generation cache tests passed!")
+
+    finally:
+        set_generation_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_generation_cache()
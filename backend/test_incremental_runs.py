@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental model re-runs
+"""
+
+import os
+import sqlite3
+import tempfile
+import shutil
+from execution_pool import WorkerPool
+from incremental_runs import IncrementalRunTracker, REASON_UNCHANGED
+
+
+def _write(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _execute(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def _run(pool, tracker, model, model_dir, force=False):
+    """Check, then run and record the model unless the check says skip"""
+    decision = tracker.check(model, cwd=model_dir, force=force)
+    if decision.skip:
+        return decision, decision.record.to_result()
+    execution = pool.start_command(["python", model], cwd=model_dir)
+    result = execution.wait(timeout=60)
+    tracker.record(model, result, cwd=model_dir, baseline=decision.baseline)
+    return decision, result
+
+
+def test_incremental_runs():
+    """Test which edits trigger a re-run and which are skipped"""
+
+    test_dir = tempfile.mkdtemp(prefix="incremental_runs_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    pool = WorkerPool(size=1, worker_env={"EYPOR_WORKER_PRELOAD": "json,sqlite3"})
+    tracker = IncrementalRunTracker(state_dir=os.path.join(test_dir, "state"))
+
+    try:
+        model_dir = os.path.join(test_dir, "model")
+        os.makedirs(model_dir)
+        db_path = os.path.join(model_dir, "project_data.db")
+        _execute(db_path, "CREATE TABLE inputs_demand (Hub TEXT, Demand REAL)")
+        _execute(db_path, "INSERT INTO inputs_demand VALUES ('London', 10)")
+        _execute(db_path, "CREATE TABLE inputs_hubs (Hub TEXT)")
+        _execute(db_path, "CREATE TABLE inputs_unused (Value INTEGER)")
+        _execute(db_path, "INSERT INTO inputs_unused VALUES (1)")
+        _write(os.path.join(model_dir, "settings.csv"), "factor\n2\n")
+
+        model = os.path.join(model_dir, "runall.py")
+        _write(model, (
+            "import sqlite3\n"
+            "factor = float(open('settings.csv').read().split()[1])\n"
+            "conn = sqlite3.connect('project_data.db')\n"
+            "total = conn.execute('SELECT SUM(Demand) FROM inputs_demand').fetchone()[0] * factor\n"
+            "conn.execute('SELECT COUNT(*) FROM inputs_hubs').fetchone()\n"
+            "conn.execute('DROP TABLE IF EXISTS outputs_total')\n"
+            "conn.execute('CREATE TABLE outputs_total (Total REAL)')\n"
+            "conn.execute('INSERT INTO outputs_total VALUES (?)', (total,))\n"
+            "conn.commit()\n"
+            "open('report.txt', 'w').write(str(total))\n"
+            "print('total', total)\n"
+        ))
+
+        # First run executes and records what the model read and wrote
+        decision, result = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and result.return_code == 0, result.stderr
+        assert result.tables_read == {db_path: ["inputs_demand", "inputs_hubs"]}, result.tables_read
+        assert result.tables_written == {db_path: ["outputs_total"]}, result.tables_written
+        assert os.path.join(model_dir, "settings.csv") in result.read_files
+        print("✓ Tables read and written are recorded by the sqlite3 authorizer")
+
+        # The first record has no start fingerprints for the tables it read, so
+        # the next run executes once more and provides them
+        decision, result = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and "not fingerprinted" in decision.reason
+        print("✓ Second run verifies the inputs of the first one")
+
+        decision, result = _run(pool, tracker, model, model_dir)
+        assert decision.skip and decision.reason == REASON_UNCHANGED
+        assert result.cached and "total 20.0" in result.stdout
+        print("✓ Re-run skipped with the stored output when nothing changed")
+
+        # Edits to tables the model never reads do not trigger a re-run
+        _execute(db_path, "UPDATE inputs_unused SET Value = 2")
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert decision.skip and decision.reason == REASON_UNCHANGED
+        print("✓ Edits to unread tables are ignored")
+
+        # Edits to a table the model reads do
+        _execute(db_path, "UPDATE inputs_demand SET Demand = 15")
+        decision, result = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and decision.changed_tables == ["inputs_demand"]
+        assert "input tables changed: inputs_demand" in decision.reason
+        assert "total 30.0" in result.stdout
+        print(f"✓ Changed input table triggers a re-run: {decision.reason}")
+
+        # Input files, output tables, output files and model code
+        _write(os.path.join(model_dir, "settings.csv"), "factor\n3\n")
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and "input files changed: settings.csv" in decision.reason
+
+        _execute(db_path, "DELETE FROM outputs_total")
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and "output tables changed: outputs_total" in decision.reason
+
+        os.remove(os.path.join(model_dir, "report.txt"))
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and "output files changed: report.txt" in decision.reason
+
+        # Modules next to the model only count once the model imports them
+        _write(os.path.join(model_dir, "helpers.py"), "X = 1\n")
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert decision.skip
+        with open(model, "a", encoding="utf-8") as f:
+            f.write("import helpers\n")
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and decision.reason == "model code changed"
+        _write(os.path.join(model_dir, "helpers.py"), "X = 2\n")
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and decision.reason == "model code changed"
+        assert _run(pool, tracker, model, model_dir)[0].skip
+        print("✓ Input files, outputs and model code changes trigger a re-run")
+
+        # An input edited while the model runs is not attributed to that run
+        decision = tracker.check(model, cwd=model_dir, force=True)
+        result = pool.start_command(["python", model], cwd=model_dir).wait(timeout=60)
+        _execute(db_path, "UPDATE inputs_demand SET Demand = 20")
+        assert not tracker.record(model, result, cwd=model_dir, baseline=decision.baseline)
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and decision.reason.startswith("no previous successful run")
+        print("✓ Runs whose inputs changed during the run are not recorded")
+
+        decision, _ = _run(pool, tracker, model, model_dir, force=True)
+        assert not decision.skip and decision.reason == "re-run forced"
+        print("✓ force=True always runs")
+
+        # A failed run forgets the record, so the next run executes
+        _execute(db_path, "DROP TABLE inputs_demand")
+        decision, result = _run(pool, tracker, model, model_dir)
+        assert result.return_code != 0
+        _execute(db_path, "CREATE TABLE inputs_demand (Hub TEXT, Demand REAL)")
+        _execute(db_path, "INSERT INTO inputs_demand VALUES ('Paris', 5)")
+        decision, _ = _run(pool, tracker, model, model_dir)
+        assert not decision.skip and decision.reason.startswith("no previous successful run")
+        _run(pool, tracker, model, model_dir)
+        print("✓ Failed runs are not recorded")
+
+        status = tracker.get_status()
+        assert status["records"] == 1 and status["skipped"] == 4
+        print(f"✓ Tracker status: {status}")
+
+        print("\n🎉 All incremental run tests passed!")
+
+    finally:
+        pool.shutdown()
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_incremental_runs()
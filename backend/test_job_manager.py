@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Test script for the execution job manager
+"""
+
+import os
+import json
+import asyncio
+import tempfile
+import shutil
+from execution_pool import WorkerPool
+import time
+import threading
+import job_manager
+from job_manager import JobManager, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED, JOB_QUEUED, JOB_RUNNING
+
+
+def test_job_manager():
+    """Test submitting, waiting on and streaming execution jobs"""
+
+    test_dir = tempfile.mkdtemp(prefix="job_manager_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    pool = WorkerPool(size=1, worker_env={"EYPOR_WORKER_PRELOAD": "json"})
+    manager = JobManager(log_root=os.path.join(test_dir, "job_logs"))
+
+    def make_runner(script_path):
+        def runner(job):
+            execution = pool.start(script_path, cwd=test_dir, capture_dir=job.log_dir)
+            job.attach(execution)
+            result = execution.wait(timeout=60)
+            return {"stdout": result.stdout, "stderr": result.stderr, "return_code": result.return_code}
+        return runner
+
+    try:
+        script = os.path.join(test_dir, "count.py")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write("import time\nfor i in range(3):\n    print('line', i, flush=True)\n    time.sleep(0.2)\n")
+
+        # Submitting returns immediately with a job id
+        job = manager.submit(make_runner(script), command="python count.py", scenario_id=7)
+        assert job.id and manager.get_job(job.id) is job
+        print(f"✓ Submitted job {job.id} (status: {job.status})")
+
+        # Streaming yields incremental output followed by a done event
+        async def collect():
+            return [event async for event in manager.stream_events(job.id, poll_interval=0.05)]
+
+        events = asyncio.run(collect())
+        stdout_events = [e for e in events if e.startswith("event: stdout")]
+        assert stdout_events, events
+        assert events[-1].startswith("event: done")
+        print(f"✓ Streamed {len(stdout_events)} stdout event(s) and a done event")
+
+        assert job.status == JOB_COMPLETED and job.return_code == 0
+        assert "line 2" in job.stdout
+        assert manager.read_log(job, "stdout", 0).decode().count("line") == 3
+        print("✓ Result and log stored on the job")
+
+        # Failing scripts are reported as failed jobs
+        with open(script, "w", encoding="utf-8") as f:
+            f.write("raise RuntimeError('model failed')\n")
+        failed = manager.submit(make_runner(script), command="python count.py")
+        asyncio.run(manager.wait_for(failed.id))
+        assert failed.status == JOB_FAILED and "model failed" in failed.stderr
+        print("✓ Failed job recorded with its stderr")
+
+        # Listing and filtering
+        assert [j.id for j in manager.list_jobs(scenario_id=7)] == [job.id]
+        print("✓ Jobs can be listed by scenario")
+
+        # Large output: bounded head/tail in memory, full log compressed on disk
+        with open(script, "w", encoding="utf-8") as f:
+            f.write("for i in range(200000):\n    print('iteration', i)\n")
+        job_manager.LOG_SEEK_INTERVAL = 1024 * 1024
+        chatty = manager.submit(make_runner(script), command="python chatty.py")
+        asyncio.run(manager.wait_for(chatty.id))
+        total = manager.log_size(chatty, "stdout")
+        assert total > 3 * 1024 * 1024 and chatty.log_bytes["stdout"] == total
+        assert len(chatty.stdout) < 200 * 1024 and "bytes omitted" in chatty.stdout
+        assert "iteration 0\n" in chatty.stdout and "iteration 199999\n" in chatty.stdout
+        assert chatty.log_path("stdout").endswith(".gz") and not os.path.exists(chatty.stdout_path)
+        full = manager.read_log(chatty, "stdout")
+        assert len(full) == total and full.count(b"\n") == 200000
+        assert manager.read_log(chatty, "stdout", total - 17, 17) == b"iteration 199999\n"
+        print(f"✓ {total} bytes of output kept as head/tail ({len(chatty.stdout)} chars) and a compressed log")
+
+        # Range reads start at the nearest gzip member
+        seek_points = chatty.log_seek_points["stdout"]
+        assert [point[0] for point in seek_points] == list(range(0, total, 1024 * 1024))
+        for offset in (0, 1024 * 1024 - 5, 2 * 1024 * 1024, total - 100):
+            assert manager.read_log(chatty, "stdout", offset, 4000) == full[offset:offset + 4000]
+        print(f"✓ Compressed log split into {len(seek_points)} seekable members")
+
+        # Streaming a compressed log opens it once and reads it sequentially
+        opened = []
+        open_log = manager._open_log
+        manager._open_log = lambda job, stream, offset: opened.append((stream, offset)) or open_log(job, stream, offset)
+
+        async def collect_chatty():
+            return [event async for event in manager.stream_events(chatty.id)]
+
+        events = asyncio.run(collect_chatty())
+        streamed = "".join(json.loads(e.split("data: ", 1)[1])["text"] for e in events if e.startswith("event: stdout"))
+        assert streamed.encode() == full
+        assert opened == [("stdout", 0), ("stderr", 0)], opened
+        print("✓ Compressed log streamed with one sequential reader per stream")
+
+        # Finished jobs and their logs outlive a restart and in-memory pruning
+        manager.retain_logs(chatty.id)
+        restarted = JobManager(log_root=manager.log_root, max_jobs_retained=1)
+        reloaded = restarted.get_job(chatty.id)
+        assert reloaded is not None and reloaded.is_finished and reloaded.logs_retained
+        assert restarted.read_log(reloaded, "stdout", total - 17, 17) == b"iteration 199999\n"
+        for i in range(2):
+            asyncio.run(restarted.wait_for(restarted.submit(make_runner(script), command="python chatty.py").id))
+        assert restarted.get_job(chatty.id) is not None
+        print("✓ Retained job logs are served after a restart and after pruning")
+
+        # The start-up sweep keeps only the logs history rows point at
+        capture_dir = os.path.join(test_dir, "agent_capture")
+        os.makedirs(capture_dir)
+        with open(os.path.join(capture_dir, "stdout.log"), "w", encoding="utf-8") as f:
+            f.write("agent output\n")
+        adopted = restarted.adopt(capture_dir, "python sql_query_1.py", kind="agent", return_code=0)
+        assert adopted.status == JOB_COMPLETED and not os.path.exists(capture_dir)
+        assert restarted.read_log(restarted.get_job(adopted.id), "stdout") == b"agent output\n"
+        # Pruning already removed the unretained jobs of the restarted manager
+        removed = JobManager(log_root=manager.log_root).sweep_logs([chatty.id, adopted.id])
+        assert removed == 2
+        assert sorted(os.listdir(manager.log_root)) == sorted([chatty.id, adopted.id])
+        print(f"✓ Adopted execution logs kept; {removed} unreferenced log directories swept")
+
+        print("\n🎉 All job manager tests passed!")
+
+    finally:
+        job_manager.LOG_SEEK_INTERVAL = 4 * 1024 * 1024
+        pool.shutdown()
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+def test_job_scheduler():
+    """Test concurrency limits, priorities and cancellation"""
+
+    test_dir = tempfile.mkdtemp(prefix="job_scheduler_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    manager = JobManager(log_root=os.path.join(test_dir, "job_logs"), max_concurrent=2, max_per_scenario=1)
+    release = threading.Event()
+    started = []
+
+    def blocking_runner(job):
+        started.append(job.id)
+        release.wait(10)
+        return {"stdout": "", "stderr": "", "return_code": 0}
+
+    try:
+        # Per-scenario limit: the second job of scenario 1 must wait, scenario 2 may run
+        a1 = manager.submit(blocking_runner, command="a1", scenario_id=1)
+        a2 = manager.submit(blocking_runner, command="a2", scenario_id=1)
+        b1 = manager.submit(blocking_runner, command="b1", scenario_id=2)
+        assert a1.status == JOB_RUNNING and b1.status == JOB_RUNNING
+        assert a2.status == JOB_QUEUED
+        metrics = manager.get_metrics()
+        assert metrics["running_jobs"] == 2 and metrics["queue_depth"] == 1
+        print("✓ Global and per-scenario limits respected")
+
+        # Priority: a high priority job jumps ahead of earlier queued work
+        low = manager.submit(blocking_runner, command="low", scenario_id=3)
+        high = manager.submit(blocking_runner, command="high", scenario_id=4, priority=10)
+
+        # Cancel a queued job
+        manager.cancel(low.id)
+        assert low.status == JOB_CANCELLED
+        print("✓ Queued job cancelled")
+
+        release.set()
+        for job in (a1, a2, b1, high):
+            assert job.done_event.wait(10)
+        assert started.index(high.id) < started.index(a2.id)
+        assert low.id not in started
+        print(f"✓ Jobs started in order: {[manager.get_job(j).command for j in started]}")
+
+        # Cancel a running process including its children
+        pool = WorkerPool(size=1, enabled=False)
+        script = os.path.join(test_dir, "spawn.py")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write("import subprocess, sys, time\n"
+                    "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+                    "print('spawned', flush=True)\n"
+                    "time.sleep(60)\n")
+
+        def process_runner(job):
+            execution = pool.start(script, cwd=test_dir, capture_dir=job.log_dir)
+            job.attach(execution)
+            result = execution.wait(timeout=60)
+            return {"stdout": result.stdout, "stderr": result.stderr, "return_code": result.return_code,
+                    "cancelled": result.cancelled}
+
+        running = manager.submit(process_runner, command="python spawn.py", scenario_id=5)
+        deadline = time.time() + 10
+        while b"spawned" not in manager.read_log(running, "stdout") and time.time() < deadline:
+            time.sleep(0.1)
+        manager.cancel(running.id)
+        assert running.done_event.wait(10)
+        assert running.status == JOB_CANCELLED
+        print("✓ Running job and its process group cancelled")
+
+        print("\n🎉 All job scheduler tests passed!")
+
+    finally:
+        release.set()
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_job_manager()
+    test_job_scheduler()
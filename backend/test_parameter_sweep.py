@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script for the parameter sweep engine
+"""
+
+import os
+import sys
+import json
+import asyncio
+import sqlite3
+import tempfile
+import shutil
+from execution_pool import WorkerPool
+from job_manager import JobManager
+from batch_execution import BatchManager
+from scenario_manager import ScenarioManager
+from parameter_sweep import SweepManager, SweepAxis
+
+
+def test_parameter_sweep():
+    """Test generating variants from a grid, running a model on them and collecting KPIs"""
+
+    test_dir = tempfile.mkdtemp(prefix="parameter_sweep_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    pool = WorkerPool(size=1, enabled=False)
+    scenario_manager = ScenarioManager(test_dir)
+    batch_manager = BatchManager(JobManager(log_root=os.path.join(test_dir, "job_logs"), max_concurrent=8))
+    sweeps = SweepManager(scenario_manager, batch_manager)
+
+    try:
+        # Base scenario with a hub location style input schema
+        source_db = os.path.join(test_dir, "upload.db")
+        conn = sqlite3.connect(source_db)
+        conn.execute("CREATE TABLE inputs_params (Parameter TEXT, Value REAL)")
+        conn.executemany("INSERT INTO inputs_params VALUES (?, ?)", [("MaxHubs", 3), ("Cost", 100)])
+        conn.execute("CREATE TABLE inputs_destinations (Location TEXT, Demand REAL)")
+        conn.executemany("INSERT INTO inputs_destinations VALUES (?, ?)", [("London", 100), ("Leeds", 50)])
+        conn.commit()
+        conn.close()
+        base = scenario_manager.create_scenario("Base", original_db_path=source_db)
+
+        model = os.path.join(test_dir, "runall.py")
+        with open(model, "w", encoding="utf-8") as f:
+            f.write(
+                "import sqlite3\n"
+                "conn = sqlite3.connect('database.db')\n"
+                "hubs = conn.execute(\"SELECT Value FROM inputs_params WHERE Parameter = 'MaxHubs'\").fetchone()[0]\n"
+                "demand = conn.execute('SELECT SUM(Demand) FROM inputs_destinations').fetchone()[0]\n"
+                "conn.execute('CREATE TABLE outputs_summary (Hubs INTEGER, TotalCost REAL)')\n"
+                "conn.execute('INSERT INTO outputs_summary VALUES (?, ?)', (hubs, demand * 10 / hubs))\n"
+                "conn.commit()\n"
+            )
+
+        def model_runner(job, scenario_id):
+            database_path = scenario_manager.get_scenario(scenario_id).database_path
+            env = {"EYPOR_DB_REDIRECTS": json.dumps({"database.db": database_path})}
+            execution = pool.start_command([sys.executable, model], cwd=os.path.dirname(database_path),
+                                           env=env, capture_dir=job.log_dir)
+            job.attach(execution)
+            result = execution.wait(timeout=60)
+            return {"stdout": result.stdout, "stderr": result.stderr, "return_code": result.return_code,
+                    "resource_usage": result.resource_usage()}
+
+        axes = [
+            SweepAxis.from_dict("MaxHubs", {"table": "inputs_params", "column": "Value",
+                                            "key_column": "Parameter", "key": "MaxHubs", "values": [2, 3, 5]}),
+            SweepAxis.from_dict("Demand", {"table": "inputs_destinations", "column": "Demand",
+                                           "mode": "percent", "values": [-10, 10]}),
+        ]
+        sweep = sweeps.create(base.id, axes, model_runner=model_runner, model_filename="runall.py", max_concurrent=3)
+        assert len(sweep.scenario_ids) == 6
+        print(f"✓ Sweep {sweep.id} generated {len(sweep.scenario_ids)} variants from a 3x2 grid")
+
+        asyncio.run(batch_manager.wait_for(sweep.batch.id))
+        table = sweep.kpi_table()
+        assert [row["status"] for row in table] == ["completed"] * 6, table
+        for row in table:
+            demand = 150 * (1 + row["Demand"] / 100.0)
+            assert row["outputs_summary.Hubs.sum"] == row["MaxHubs"]
+            assert abs(row["outputs_summary.TotalCost.sum"] - demand * 10 / row["MaxHubs"]) < 1e-6
+        print("✓ KPI table has one row per run with the swept values and model outputs")
+
+        # The base scenario is untouched
+        conn = sqlite3.connect(base.database_path)
+        assert conn.execute("SELECT Value FROM inputs_params WHERE Parameter = 'MaxHubs'").fetchone()[0] == 3
+        assert conn.execute("SELECT SUM(Demand) FROM inputs_destinations").fetchone()[0] == 150
+        conn.close()
+        print("✓ Base scenario unchanged")
+
+        csv_text = sweep.kpi_csv()
+        assert csv_text.splitlines()[0].startswith("run,scenario_id,scenario_name,MaxHubs,Demand,status")
+        print("✓ KPI table exported as CSV")
+
+        # Explicit runs and custom KPI queries, without a model
+        sweep = sweeps.create(base.id, axes, runs=[{"MaxHubs": 4}, {"Demand": 50}],
+                              kpi_queries={"hubs": "SELECT Value FROM inputs_params WHERE Parameter = 'MaxHubs'",
+                                           "demand": "SELECT SUM(Demand) FROM inputs_destinations"})
+        asyncio.run(batch_manager.wait_for(sweep.batch.id))
+        table = sweep.kpi_table()
+        assert (table[0]["hubs"], table[0]["demand"]) == (4, 150)
+        assert (table[1]["hubs"], table[1]["demand"]) == (3, 225)
+        print("✓ Explicit run list with custom KPI queries")
+
+        # Finished sweeps beyond the retention limit are forgotten, oldest first
+        oldest = sweeps.list_sweeps()[-1]
+        sweeps.max_sweeps_retained = 2
+        latest = sweeps.create(base.id, axes, runs=[{"MaxHubs": 5}])
+        asyncio.run(batch_manager.wait_for(latest.batch.id))
+        assert len(sweeps.list_sweeps()) == 2 and sweeps.get_sweep(oldest.id) is None
+        assert sweeps.get_sweep(latest.id) is latest and sweep in sweeps.list_sweeps()
+        print("✓ Oldest finished sweep pruned beyond the retention limit")
+
+        # Invalid input is rejected before any scenario is created
+        before = len(scenario_manager.list_scenarios())
+        bad_axes = [SweepAxis.from_dict("X", {"table": "inputs_params", "column": "Value",
+                                              "key_column": "Parameter", "key": "Missing", "values": [1]})]
+        try:
+            sweeps.create(base.id, bad_axes)
+            assert False, "expected ValueError"
+        except ValueError as e:
+            assert "no rows" in str(e)
+        try:
+            sweeps.create(base.id, [SweepAxis.from_dict("X", {"table": "inputs_params; DROP TABLE x",
+                                                              "column": "Value", "values": [1]})])
+            assert False, "expected ValueError"
+        except ValueError as e:
+            assert "does not exist" in str(e)
+        assert len(scenario_manager.list_scenarios()) == before
+        print("✓ Invalid sweeps create no scenarios")
+
+        print("\n🎉 All parameter sweep tests passed!")
+
+    finally:
+        pool.shutdown()
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_parameter_sweep()
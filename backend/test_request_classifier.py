@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the local request classifier
+"""
+
+import os
+import json
+import tempfile
+import shutil
+from request_classifier import (
+    RequestClassifier, ClassifierService, load_examples, run_benchmark, TRAIN_PATH, BENCHMARK_PATH
+)
+
+
+class _FakeLLM:
+    """Stands in for _llm_classify_request and counts calls"""
+
+    def __init__(self, label="chat"):
+        self.label = label
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return self.label
+
+
+def test_request_classifier():
+    """Test training, benchmark accuracy, threshold routing and retraining from the log"""
+
+    test_dir = tempfile.mkdtemp(prefix="request_classifier_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    try:
+        train = load_examples(TRAIN_PATH)
+        benchmark = load_examples(BENCHMARK_PATH)
+        assert len(train) >= 100 and len(benchmark) >= 50
+        assert not {e["text"] for e in train} & {e["text"] for e in benchmark}
+        print(f"✓ {len(train)} training and {len(benchmark)} benchmark examples, no overlap")
+
+        classifier = RequestClassifier().train(train)
+        prediction = classifier.predict("Increase the fixed cost of Leeds by 10%")
+        assert prediction.label == "db_modification" and 0 < prediction.confidence <= 1
+        assert abs(sum(prediction.probabilities.values()) - 1) < 0.01
+
+        report = run_benchmark(classifier, benchmark, threshold=0.55)
+        assert report["local_accuracy"] >= 0.85, report
+        assert report["fast_path_accuracy"] >= report["local_accuracy"]
+        print(f"✓ Benchmark: accuracy {report['local_accuracy']}, fast path {report['fast_path_rate']} "
+              f"at {report['fast_path_accuracy']} accuracy, {report['avg_local_ms']} ms per request")
+
+        llm = _FakeLLM("sql_query")
+        report = run_benchmark(classifier, benchmark, threshold=0.55, llm_classify=llm)
+        assert llm.calls == len(benchmark) and report["llm_accuracy"] == 0.2
+        print("✓ Benchmark against the LLM reports LLM and combined accuracy")
+
+        # Save and load round trip
+        model_path = os.path.join(test_dir, "model.json")
+        classifier.save(model_path)
+        loaded = RequestClassifier.load(model_path)
+        assert loaded.predict("Plot throughput per hub").to_dict() == classifier.predict("Plot throughput per hub").to_dict()
+        print("✓ Saved model predicts the same as the trained one")
+
+        # Threshold routing: confident predictions skip the LLM, others fall back and are logged
+        log_path = os.path.join(test_dir, "request_log.jsonl")
+        service = ClassifierService(model_path=model_path, log_path=log_path, threshold=0.55)
+        llm = _FakeLLM("chat")
+        label, source, _ = service.classify("Make a bar chart of demand per hub", llm)
+        assert (label, source) == ("visualization", "local") and llm.calls == 0
+
+        service.threshold = 1.01
+        label, source, prediction = service.classify("Tell me about hub Zeta", llm)
+        assert (label, source) == ("chat", "llm") and llm.calls == 1 and prediction is not None
+        with open(log_path, encoding="utf-8") as f:
+            logged = [json.loads(line) for line in f]
+        assert logged[0]["text"] == "Tell me about hub Zeta" and logged[0]["label"] == "chat"
+        service.record("keyword")
+
+        metrics = service.get_metrics()
+        assert (metrics["keyword"], metrics["local"], metrics["llm_fallback"]) == (1, 1, 1)
+        assert metrics["fast_path_rate"] == round(2 / 3, 3) and metrics["local_rate"] == 0.5
+        print(f"✓ Threshold routing and metrics: {metrics}")
+
+        # Missing model: trained from the shipped data on first use; retrain includes the log
+        service = ClassifierService(model_path=os.path.join(test_dir, "new", "model.json"), log_path=log_path)
+        assert service.classifier.trained_on == len(train) + 1
+        assert os.path.exists(service.model_path)
+        assert service.retrain().trained_on == len(train) + 1
+        print("✓ Missing model is trained on first use, including logged LLM labels")
+
+        print("\n🎉 All request classifier tests passed!")
+
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_request_classifier()
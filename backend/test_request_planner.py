@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for the combined request planning call of scenario comparisons
+"""
+
+import json
+import shutil
+import tempfile
+from langchain_core.messages import AIMessage
+from scenario_manager import ScenarioManager
+from request_classifier import ClassifierService, train_classifier, set_classifier_service
+from request_planner import RequestPlanner, parse_plan, set_request_planner, get_request_planner
+from langgraph_agent_v2 import SimplifiedAgent
+
+PLAN = {"request_type": "scenario_comparison", "scenarios": ["base", "test1"],
+        "comparison_type": "chart", "chart_type": "heatmap"}
+
+
+class _RecordingLLM:
+    """Answers plan, classification, extraction and code prompts and records them"""
+
+    def __init__(self, structured=True):
+        self.prompts = []
+        self.structured = structured
+
+    def with_structured_output(self, schema, method=None, strict=None):
+        if not self.structured:
+            raise NotImplementedError
+        assert schema["title"] == "request_plan" and method == "json_schema"
+        llm = self
+
+        class _Structured:
+            def invoke(self, messages):
+                llm.prompts.append(messages[-1].content)
+                return dict(PLAN)
+
+        return _Structured()
+
+    def invoke(self, messages):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        if prompt.startswith("Plan how to handle"):
+            return AIMessage(content=f"Here is the plan: {json.dumps(PLAN)}")
+        if prompt.startswith("Classify this user request"):
+            return AIMessage(content="scenario_comparison")
+        if "extract the scenario names" in prompt:
+            return AIMessage(content='["Base Scenario", "test1"]')
+        return AIMessage(content="```python\nprint('compared')\n```")
+
+
+def test_request_planner():
+    """Test plan parsing and the number of LLM calls of a comparison with and without the planner"""
+
+    test_dir = tempfile.mkdtemp(prefix="request_planner_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_classifier_service(ClassifierService(log_path=None, threshold=1.01,
+                                             classifier=train_classifier(log_path=None, model_path=None)))
+    try:
+        names = ["Base Scenario", "test1", "High Demand"]
+        plan = parse_plan('{"request_type": "scenario_comparison", "scenarios": ["test1", "test1", "nowhere"], '
+                          '"comparison_type": "pivot", "chart_type": "heatmap"}', names, source="text")
+        assert plan.scenarios == ["test1"] and plan.comparison_type == "analysis" and plan.chart_type == "heatmap"
+        assert parse_plan({"request_type": "poem"}, names) is None and parse_plan("no plan", names) is None
+        print("✓ Plans are validated against the scenarios and the allowed values")
+
+        scenario_manager = ScenarioManager(test_dir)
+        scenario_manager.create_scenario("Base Scenario", description="Planner test")
+        scenario_manager.create_scenario("test1", description="Planner test")
+        request = "which of base and test1 does better on cost"
+
+        # Planner: one structured call classifies and resolves the scenarios, then code generation
+        set_request_planner(RequestPlanner(enabled=True))
+        agent = SimplifiedAgent(scenario_manager=scenario_manager)
+        agent.llm = _RecordingLLM()
+        agent.run(request)
+        assert len(agent.llm.prompts) == 2, agent.llm.prompts
+        assert agent.llm.prompts[0].startswith("Plan how to handle") and "Chart Type: heatmap" in agent.llm.prompts[1]
+        assert "Base Scenario: " in agent.llm.prompts[1] and "test1: " in agent.llm.prompts[1]
+        assert get_request_planner().get_status()["structured"] == 1
+        assert 'Scenarios the request may refer to: ["test1", "Base Scenario"]' in agent.llm.prompts[0]
+        print("✓ Planned comparison: 2 LLM calls (plan, code)")
+
+        # Requests naming no scenario are planned without a scenario list
+        agent.llm = _RecordingLLM()
+        agent._plan_request("what is the total demand?")
+        assert "Scenarios the request may refer to" not in agent.llm.prompts[0]
+        print("✓ The plan prompt only lists scenarios the request may refer to")
+
+        # Models without structured output get the same plan as JSON text
+        agent.llm = _RecordingLLM(structured=False)
+        agent.run(request)
+        assert len(agent.llm.prompts) == 2 and "Chart Type: heatmap" in agent.llm.prompts[1]
+        status = get_request_planner().get_status()
+        assert status["text"] == 1 and status["text_only_models"] == ["_RecordingLLM:"]
+        print("✓ Text plans for models without structured output")
+
+        # Without the planner the same request needs classification, extraction and code generation
+        set_request_planner(RequestPlanner(enabled=False))
+        agent.llm = _RecordingLLM()
+        agent.run(request)
+        assert len(agent.llm.prompts) == 3, agent.llm.prompts
+        assert agent.llm.prompts[0].startswith("Classify this user request")
+        print("✓ Legacy path: 3 LLM calls (classify, extract, code)")
+
+        print("\n🎉 All request planner tests passed!")
+
+    finally:
+        set_request_planner(None)
+        set_classifier_service(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_request_planner()
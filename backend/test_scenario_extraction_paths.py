@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for deterministic scenario extraction before the LLM in comparisons
+"""
+
+import json
+import shutil
+import tempfile
+from langchain_core.messages import AIMessage
+from scenario_manager import ScenarioManager
+from scenario_index import ScenarioIndexCache, set_scenario_index_cache
+from request_classifier import ClassifierService, train_classifier, set_classifier_service
+from request_planner import RequestPlanner, set_request_planner
+from agent_metrics import AgentMetrics, set_agent_metrics, get_agent_metrics
+from langgraph_agent_v2 import SimplifiedAgent
+
+
+class _RecordingLLM:
+    """Answers plan, extraction and code prompts and records them"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, messages):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        if prompt.startswith("Plan how to handle"):
+            return AIMessage(content=json.dumps({"request_type": "scenario_comparison", "scenarios": ["Base Scenario", "test2"],
+                                                 "comparison_type": "analysis", "chart_type": "grouped_bars"}))
+        if "extract the scenario names" in prompt:
+            return AIMessage(content='["Base Scenario", "test2"]')
+        return AIMessage(content="```python\nprint('compared')\n```")
+
+
+def test_scenario_extraction_paths():
+    """Test which requests skip the LLM for scenario extraction and how the path is reported"""
+
+    test_dir = tempfile.mkdtemp(prefix="scenario_extraction_paths_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_scenario_index_cache(ScenarioIndexCache())
+    set_agent_metrics(AgentMetrics())
+    set_request_planner(RequestPlanner(enabled=True))
+    set_classifier_service(ClassifierService(log_path=None, threshold=1.01,
+                                             classifier=train_classifier(log_path=None, model_path=None)))
+    try:
+        scenario_manager = ScenarioManager(test_dir)
+        for name in ("Base Scenario", "test1", "test2", "High Demand"):
+            scenario_manager.create_scenario(name, description="Extraction path test")
+        agent = SimplifiedAgent(scenario_manager=scenario_manager)
+
+        assert agent._score_comparison_scenarios("compare base and test1") == [("Base Scenario", 80), ("test1", 100)]
+        assert agent._score_comparison_scenarios("compare base and test") == [("Base Scenario", 80), ("test1", 0)]
+        assert not agent._is_confident_extraction("compare base and test", [("Base Scenario", 80), ("test1", 0)])
+        assert not agent._is_confident_extraction("compare base and test1 and high demand",
+                                                  [("Base Scenario", 80), ("test1", 100)])
+        print("✓ Ties and scenarios left out of the match are not confident")
+
+        # Unambiguous names: only the code generation call
+        agent.llm = _RecordingLLM()
+        response, _, _, _ = agent.run("compare total cost between base and test1", request_id="deterministic")
+        assert len(agent.llm.prompts) == 1 and not agent.llm.prompts[0].startswith("Plan how to handle")
+        assert "Base Scenario: " in agent.llm.prompts[0] and "test1: " in agent.llm.prompts[0]
+        assert "Base Scenario, test1 (matched in the request, no LLM call)" in response
+        assert get_agent_metrics().get_request("deterministic")["tags"] == {"scenario_extraction": "deterministic"}
+        print("✓ Deterministic extraction: 1 LLM call (code)")
+
+        # "test" matches test1 and test2 equally: the planner decides
+        agent.llm = _RecordingLLM()
+        response, _, _, _ = agent.run("compare total cost between base and test", request_id="planner")
+        assert len(agent.llm.prompts) == 2 and agent.llm.prompts[0].startswith("Plan how to handle")
+        assert "test2: " in agent.llm.prompts[1] and "(planned by the LLM)" in response
+        print("✓ Ambiguous names go to the planner: 2 LLM calls (plan, code)")
+
+        # Without the planner the legacy extraction prompt is used
+        set_request_planner(RequestPlanner(enabled=False))
+        agent.llm = _RecordingLLM()
+        response, _, _, _ = agent.run("compare total cost between base and test", request_id="llm")
+        assert len(agent.llm.prompts) == 2 and "extract the scenario names" in agent.llm.prompts[0]
+        assert "(extracted by the LLM)" in response
+        print("✓ Legacy extraction prompt when the planner is disabled")
+
+        tags = get_agent_metrics().get_metrics()["tags"]
+        assert tags == {"scenario_extraction": {"deterministic": 1, "planner": 1, "llm": 1}}, tags
+        print(f"✓ Extraction paths in the agent metrics: {tags['scenario_extraction']}")
+
+        print("\n🎉 All scenario extraction path tests passed!")
+
+    finally:
+        set_classifier_service(None)
+        set_request_planner(None)
+        set_agent_metrics(None)
+        set_scenario_index_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_scenario_extraction_paths()
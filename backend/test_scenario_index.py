@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the cached scenario name index used by scenario resolution
+"""
+
+import time
+import shutil
+import tempfile
+from scenario_manager import ScenarioManager
+from scenario_index import ScenarioIndexCache, set_scenario_index_cache, get_scenario_index_cache
+from langgraph_agent_v2 import SimplifiedAgent
+
+
+class _CountingScenarioManager(ScenarioManager):
+    """Counts full scenario listings"""
+
+    def __init__(self, project_root: str):
+        self.listings = 0
+        super().__init__(project_root)
+
+    def list_scenarios(self):
+        self.listings += 1
+        return super().list_scenarios()
+
+
+def test_scenario_index():
+    """Test name resolution, index reuse across resolvers and invalidation on scenario changes"""
+
+    test_dir = tempfile.mkdtemp(prefix="scenario_index_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_scenario_index_cache(ScenarioIndexCache())
+    try:
+        scenario_manager = _CountingScenarioManager(test_dir)
+        base = scenario_manager.create_scenario("Base Scenario", description="Index test")
+        scenario_manager.create_scenario("test1", description="Index test")
+        scenario_manager.create_scenario("High Demand", description="Index test")
+        scenario_manager.create_branch_scenarios(base.id, [(f"Sweep capacity {i:03d}", None) for i in range(300)])
+        agent = SimplifiedAgent(scenario_manager=scenario_manager)
+
+        index = agent._scenario_index()
+        assert len(index) == 303
+        assert index.resolve("base").name == "Base Scenario" and index.resolve("BASE SCENARIO").name == "Base Scenario"
+        assert index.resolve("test").name == "test1" and index.resolve("demand").name == "High Demand"
+        assert index.resolve("sweep capacity 042").name == "Sweep capacity 042"
+        assert index.resolve("nowhere") is None
+        assert index.best_match("base scenario") == ("Base Scenario", 100)
+        assert index.best_match("high demnd")[0] == "High Demand"
+        assert index.best_match("Sweep capacty 117")[0] == "Sweep capacity 117"
+        assert index.find_in_text("how do test1 and high demand differ") == ["test1", "High Demand"]
+        print("✓ Exact, casefolded, substring, word and fuzzy lookups")
+
+        assert sorted(index.candidates("compare base and high demnd")) == ["Base Scenario", "High Demand"]
+        candidates = index.candidates("compare sweep capacity 042 with base scenario")
+        assert candidates[:2] == ["Base Scenario", "Sweep capacity 042"] and len(candidates) <= 10
+        assert index.candidates("what is the total cost?") == []
+        print("✓ Requests are narrowed down to the few scenarios they may refer to")
+
+        listings = scenario_manager.listings
+        started_at = time.perf_counter()
+        for _ in range(50):
+            assert agent._extract_comparison_scenarios("compare base and high demand") == ["Base Scenario", "High Demand"]
+            paths = agent._resolve_scenario_names(["base", "test1"])
+            context = agent._create_comparison_database_context(["Base Scenario", "Sweep capacity 007"])
+            assert context.multi_database_contexts["Sweep capacity 007"].scenario_id is not None
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        assert paths["base"] == base.database_path
+        assert scenario_manager.listings == listings, "resolvers should share the cached index"
+        print(f"✓ 150 resolutions over 303 scenarios without listing them again ({elapsed_ms:.0f} ms)")
+
+        scenario_manager.update_scenario(base.id, name="Reference")
+        assert agent._scenario_index().resolve("reference").id == base.id
+        assert agent._scenario_index().get("Base Scenario") is None
+        scenario_manager.delete_scenario(base.id)
+        assert agent._scenario_index().resolve("reference") is None
+        scenario_manager.create_scenario("Low Demand", description="Index test")
+        assert agent._scenario_index().best_match("low demand") == ("Low Demand", 100)
+        status = get_scenario_index_cache().get_status()
+        assert status["invalidations"] >= 4 and status["builds"] == 4
+        print(f"✓ Index rebuilt after create, rename and delete: {status['builds']} builds, {status['hits']} hits")
+
+        print("\n🎉 All scenario index tests passed!")
+
+    finally:
+        set_scenario_index_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_scenario_index()
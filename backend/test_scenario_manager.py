@@ -80,6 +80,31 @@ def test_scenario_manager():
         for entry in history:
             print(f"  - {entry.command} ({entry.timestamp})")
         
+        # Resource accounting and per-script statistics
+        for wall_ms in (100, 200, 300, 400):
+            manager.add_execution_history(
+                base_scenario.id,
+                "python sql_query_1.py",
+                "ok",
+                execution_time_ms=wall_ms,
+                return_code=0,
+                cpu_user_ms=wall_ms // 2,
+                cpu_system_ms=10,
+                peak_rss_kb=50000,
+                output_bytes=120,
+                script="sql_query_1.py",
+                source="run"
+            )
+        accounted = [h for h in manager.get_execution_history(base_scenario.id) if h.script]
+        assert len(accounted) == 4 and accounted[0].peak_rss_kb == 50000
+        stats = manager.get_execution_stats(scenario_id=base_scenario.id, script="sql_query_1.py")
+        script_stats = stats["by_script"][0]
+        assert script_stats["count"] == 4
+        assert script_stats["execution_time_ms"] == {"p50": 200, "p95": 400, "max": 400}
+        assert script_stats["cpu_ms"]["max"] == 210
+        assert stats["by_scenario"][0]["scenario_name"] == base_scenario.name
+        print(f"✓ Execution stats: {script_stats['execution_time_ms']}")
+        
         # Test analysis files
         print("\n--- Testing Analysis Files ---")
         
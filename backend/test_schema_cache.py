@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script for the schema and statistics cache
+"""
+
+import os
+import sqlite3
+import tempfile
+import shutil
+from schema_cache import SchemaCache
+
+
+def test_schema_cache():
+    """Test hits, automatic invalidation on writes and explicit invalidation"""
+
+    test_dir = tempfile.mkdtemp(prefix="schema_cache_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    cache = SchemaCache(max_databases=2)
+
+    try:
+        db_path = os.path.join(test_dir, "database.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE "inputs hubs" (Hub TEXT, Demand REAL)')
+        conn.executemany('INSERT INTO "inputs hubs" VALUES (?, ?)', [(f"H{i}", i) for i in range(8)])
+        conn.commit()
+
+        info = cache.get(db_path)
+        table = info["tables"]["inputs hubs"]
+        assert info["total_tables"] == 1 and table["row_count"] == 8
+        assert [c["name"] for c in table["columns"]] == ["Hub", "Demand"]
+        assert len(table["sample_data"]) == 5
+        print("✓ Tables, columns, row counts and sample rows read (quoted table names work)")
+
+        # Second lookup is a hit and callers cannot modify the cached copy
+        info["tables"].clear()
+        again = cache.get(db_path)
+        assert again["tables"]["inputs hubs"]["row_count"] == 8
+        assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+        print("✓ Unchanged database served from the cache")
+
+        # Writes through any connection change the database version
+        conn.execute('UPDATE "inputs hubs" SET Demand = 5 WHERE Hub = \'H0\'')
+        conn.commit()
+        assert cache.get(db_path)["tables"]["inputs hubs"]["sample_data"][0] == ("H0", 5.0)
+        conn.execute('INSERT INTO "inputs hubs" VALUES (\'H8\', 8)')
+        conn.commit()
+        assert cache.get(db_path)["tables"]["inputs hubs"]["row_count"] == 9
+        conn.execute("CREATE TABLE outputs_total (Total REAL)")
+        conn.commit()
+        assert "outputs_total" in cache.get(db_path)["tables"]
+        assert cache.stats["misses"] == 4
+        print("✓ Data and schema changes are picked up automatically")
+
+        # WAL mode: commits land in the -wal file
+        conn.execute("PRAGMA journal_mode=WAL")
+        cache.get(db_path)
+        conn.execute("DELETE FROM outputs_total")
+        conn.execute("INSERT INTO outputs_total VALUES (1)")
+        conn.commit()
+        assert cache.get(db_path)["tables"]["outputs_total"]["row_count"] == 1
+        conn.close()
+        print("✓ Changes in WAL mode are picked up")
+
+        # Explicit invalidation and LRU bound
+        cache.invalidate(db_path)
+        misses = cache.stats["misses"]
+        cache.get(db_path)
+        assert cache.stats["misses"] == misses + 1
+        for name in ("a.db", "b.db"):
+            other = os.path.join(test_dir, name)
+            sqlite3.connect(other).execute("CREATE TABLE t (x)").connection.close()
+            cache.get(other)
+        assert cache.get_status()["databases"] == 2
+        print(f"✓ Explicit invalidation and eviction: {cache.get_status()}")
+
+        try:
+            cache.get(os.path.join(test_dir, "missing.db"))
+            assert False, "missing database should raise"
+        except FileNotFoundError:
+            pass
+        assert not os.path.exists(os.path.join(test_dir, "missing.db"))
+        print("✓ Missing databases raise instead of being created")
+
+        print("\n🎉 All schema cache tests passed!")
+
+    finally:
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_schema_cache()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for relevance-pruned schema context
+"""
+
+from schema_retrieval import SchemaRetriever, full_schema_context, identifier_terms, request_terms
+from langgraph_agent_v2 import SimplifiedAgent
+
+
+def _columns(*names):
+    return [{"name": name, "type": "REAL"} for name in names]
+
+
+def _large_schema():
+    """A model database: input tables, per-scenario output copies and many unrelated tables"""
+    tables = {
+        "inputs_hubs": {"columns": _columns("HubID", "Location", "CostFactor_Opening", "CostFactor_Operating")},
+        "inputs_destinations": {"columns": _columns("DestinationID", "Location", "Demand")},
+        "inputs_routes": {"columns": _columns("HubID", "DestinationID", "Distance")},
+    }
+    for scenario in ("basecase", "default", "highdemand", "lowcost"):
+        tables[f"outputs_hubs_{scenario}"] = {"columns": _columns("HubID", "Open", "Cost_Operating_Fixed")}
+    for i in range(40):
+        tables[f"lookup_region_{i}"] = {"columns": _columns(f"Region{i}Code", "Population", "Area")}
+    tables["wide_table"] = {"columns": _columns(*[f"Metric{i}" for i in range(50)], "HubID", "Demand")}
+    return {"tables": tables}
+
+
+def test_schema_retrieval():
+    """Test term extraction, ranking, table families, column trimming and the agent hook"""
+
+    assert identifier_terms("CostFactor_Opening") == ["cost", "factor", "opening"]
+    assert identifier_terms("outputs_hubs_basecase") == ["output", "hub", "basecase"]
+    assert request_terms("Which hubs have the highest operating cost?") == ["hub", "have", "highest", "operating", "cost"]
+    print("✓ Table, column and request terms are split and singularised")
+
+    schema = _large_schema()
+    retriever = SchemaRetriever(top_k=4, max_columns=10)
+    full = full_schema_context(schema)
+    context = retriever.build_context(schema, "Which hubs have the highest operating cost?")
+    assert "\ninputs_hubs:\n" in context and "\noutputs_hubs_basecase:\n" in context
+    assert "\noutputs_hubs_default:\n" not in context
+    assert "(tables with the same columns: outputs_hubs_default, outputs_hubs_highdemand, outputs_hubs_lowcost)" in context
+    assert "\nlookup_region_3:\n" not in context and "Other tables (columns not shown): " in context
+    assert "lookup_region_28 and 11 more" in context
+    assert len(context) < len(full) / 4
+    print(f"✓ Relevant tables kept, identical tables collapsed: {len(context)} of {len(full)} characters")
+
+    # Very wide tables keep matching and key columns
+    context = retriever.build_context(schema, "demand per hub in wide_table")
+    wide = context.split("\nwide_table:\n")[1].split("\n\n")[0]
+    assert "  - HubID (REAL)" in wide and "  - Demand (REAL)" in wide and "... and 42 more columns" in wide
+    print("✓ Wide tables are trimmed to relevant and key columns")
+
+    # A request matching nothing still gets some tables
+    context = retriever.build_context(schema, "hello")
+    assert context.count("\n  - ") >= 3
+    # Small schemas are sent in full
+    small = {"tables": {"inputs_params": {"columns": _columns("Parameter", "Value")}}}
+    assert retriever.build_context(small, "show parameters") == full_schema_context(small)
+
+    status = retriever.get_status()
+    assert status["requests"] == 4 and status["indexes_built"] == 2 and status["tokens_saved"] > 0
+    print(f"✓ Indexes are built once per schema: {status}")
+
+    # Embeddings are blended into the ranking when configured
+    def _embed(texts):
+        return [[1.0, 0.0] if "Population" in text or "people" in text else [0.0, 1.0] for text in texts]
+
+    retriever = SchemaRetriever(top_k=2, embed=_embed)
+    context = retriever.build_context(schema, "where do most people live")
+    assert "\nlookup_region_0:\n" in context
+    print("✓ Embedding similarity finds tables without lexical matches")
+
+    # Agent: without a request the full schema is kept (file editing), with one it is pruned
+    agent = SimplifiedAgent()
+    assert agent._build_schema_context(schema) == full
+    assert len(agent._build_schema_context(schema, "operating cost per hub")) < len(full)
+    assert agent._build_schema_context(None, "anything") == "No schema information available"
+    print("✓ Agent prunes schema context per request")
+
+    print("\n🎉 All schema retrieval tests passed!")
+
+
+if __name__ == "__main__":
+    test_schema_retrieval()
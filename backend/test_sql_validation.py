@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for pre-execution SQL validation of generated code
+"""
+
+import os
+import sqlite3
+import asyncio
+import tempfile
+import shutil
+from types import SimpleNamespace
+from langchain_core.messages import HumanMessage
+from generation_cache import GenerationCache, set_generation_cache
+from sql_validation import SqlValidator, extract_sql_literals, set_sql_validator, get_sql_validator
+from langgraph_agent_v2 import SimplifiedAgent, DatabaseContext
+
+GOOD_CODE = '''```python
+import sqlite3
+import pandas as pd
+conn = sqlite3.connect("database.db")
+query = """SELECT Hub, Demand FROM inputs_hubs ORDER BY Demand DESC"""
+df = pd.read_sql_query(query, conn)
+print(df)
+```'''
+
+BAD_CODE = GOOD_CODE.replace("Demand FROM", "Throughput FROM")
+
+
+class _ScriptedLLM:
+    """Returns the given responses in order and records the prompts"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def invoke(self, messages):
+        self.prompts.append(messages[-1].content)
+        return SimpleNamespace(content=self.responses.pop(0))
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+def test_sql_validation():
+    """Test SQL extraction, EXPLAIN validation, the LLM fix loop and skipped execution"""
+
+    test_dir = tempfile.mkdtemp(prefix="sql_validation_test_")
+    print(f"Testing in directory: {test_dir}")
+
+    set_generation_cache(GenerationCache(db_path=os.path.join(test_dir, "generation_cache.db"), enabled=False))
+    set_sql_validator(SqlValidator())
+
+    try:
+        db_path = os.path.join(test_dir, "database.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE inputs_hubs (Hub TEXT, Demand REAL)")
+        conn.commit()
+        conn.close()
+
+        code = '''
+sql = "SELECT Hub FROM " + "inputs_hubs"
+df = pd.read_sql_query(sql, conn)
+cursor.execute("SELECT * FROM inputs_hubs WHERE Hub = ?", ("H1",))
+cursor.execute("UPDATE inputs_hubs SET Demand = :d", {"d": 1})
+conn.execute("CREATE TEMP TABLE top AS SELECT * FROM inputs_hubs")
+pd.read_sql(sql="SELECT * FROM top", con=conn)
+pd.read_sql_query(f"SELECT * FROM {table}", conn)
+'''
+        literals = extract_sql_literals(code)
+        assert [literal.sql for literal in literals] == [
+            "SELECT Hub FROM inputs_hubs",
+            "SELECT * FROM inputs_hubs WHERE Hub = ?",
+            "UPDATE inputs_hubs SET Demand = :d",
+            "CREATE TEMP TABLE top AS SELECT * FROM inputs_hubs",
+            "SELECT * FROM top",
+        ]
+        assert extract_sql_literals("def broken(:") == []
+        print("✓ SQL literals are extracted from query calls; dynamic SQL is skipped")
+
+        validator = SqlValidator()
+        checked, issues = validator.validate_code(code, db_path)
+        assert checked == 5 and issues == []
+        checked, issues = validator.validate_code(
+            'pd.read_sql_query("SELECT Hub, Throughput FROM inputs_hubs", conn)\n'
+            'conn.execute("SELECT * FROM hubs")\nconn.execute("SELEC 1")', db_path)
+        assert [issue.error for issue in issues] == [
+            "no such column: Throughput", "no such table: hubs", 'near "SELEC": syntax error']
+        assert issues[1].lineno == 2
+        # EXPLAIN never writes: the table is still empty and unchanged
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM inputs_hubs").fetchone()[0] == 0
+        conn.close()
+        print("✓ EXPLAIN reports unknown columns, unknown tables and syntax errors")
+
+        # Agent: a bad column is fed back to the LLM and fixed before execution
+        agent = SimplifiedAgent()
+        db_context = DatabaseContext(scenario_id=1, database_path=db_path,
+                                     schema_info={"tables": {}}, temp_dir=test_dir)
+        state = {"messages": [HumanMessage(content="top hubs")], "user_request": "top hubs",
+                 "db_context": db_context, "generated_files": [], "request_type": "sql_query"}
+
+        agent.llm = _ScriptedLLM(BAD_CODE, GOOD_CODE)
+        result = agent._handle_sql_query(state)
+        assert len(agent.llm.prompts) == 2 and "no such column: Throughput" in agent.llm.prompts[1]
+        assert not result["sql_validation_error"]
+        script = open(os.path.join(test_dir, result["generated_files"][0]), encoding="utf-8").read()
+        assert "Throughput" not in script
+        print("✓ SQL errors are sent back to the LLM and the fixed code is saved")
+
+        # Still invalid after the retries: the script is saved but not executed
+        agent.llm = _ScriptedLLM(BAD_CODE, BAD_CODE, BAD_CODE)
+        result = asyncio.run(agent._ahandle_sql_query(state))
+        assert len(agent.llm.prompts) == 3
+        assert "no such column: Throughput" in result["sql_validation_error"]
+        result = agent._execute_code(result)
+        assert "script was not run" in result["execution_error"] and not result.get("execution_output")
+        print("✓ Code whose SQL cannot be fixed is rejected without running it")
+
+        status = get_sql_validator().get_status()
+        assert status["fixed"] == 1 and status["scripts_rejected"] == 1 and status["fix_attempts"] == 3
+        print(f"✓ Validation counters: {status}")
+
+        print("\n🎉 All SQL validation tests passed!")
+
+    finally:
+        set_sql_validator(None)
+        set_generation_cache(None)
+        shutil.rmtree(test_dir, ignore_errors=True)
+        print(f"✓ Cleaned up test directory: {test_dir}")
+
+
+if __name__ == "__main__":
+    test_sql_validation()